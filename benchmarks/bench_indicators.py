@@ -0,0 +1,99 @@
+"""
+Benchmark: compiled vs original loops of the path-dependent indicators.
+
+Runs SuperTrend, MaSlope, heikinAshiDf and SmoothedHeikinAshi from
+utilities/custom_indicators.py with compiled=True (numba kernels) and
+compiled=False (original Python loops) on a synthetic OHLC series, checks
+that the outputs are identical and prints the timings.
+
+Usage (from the repo root):
+    python benchmarks/bench_indicators.py
+    python benchmarks/bench_indicators.py --bars 50000 --repeat 3
+"""
+import argparse
+import os
+import sys
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from utilities.custom_indicators import MaSlope, SmoothedHeikinAshi, SuperTrend, heikinAshiDf
+from utilities.jit import NUMBA_AVAILABLE
+
+
+def make_ohlc(bars, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range("2020-01-01", periods=bars, freq="1h")
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, bars)))
+    return pd.DataFrame({
+        "open": np.r_[close[0], close[:-1]],
+        "high": close * (1 + rng.uniform(0, 0.01, bars)),
+        "low": close * (1 - rng.uniform(0, 0.01, bars)),
+        "close": close,
+        "volume": 1.0,
+    }, index=index)
+
+
+def smoothed_heikin_ashi(df, compiled):
+    ha = SmoothedHeikinAshi(df["open"], df["high"], df["low"], df["close"], compiled=compiled)
+    return pd.concat([ha.smoothed_ha_open(), ha.smoothed_ha_close()], axis=1)
+
+
+def cases(df):
+    """name -> function(compiled) returning the DataFrame to compare"""
+    return {
+        "SuperTrend": lambda compiled: SuperTrend(
+            df["high"], df["low"], df["close"], compiled=compiled).st,
+        "MaSlope": lambda compiled: MaSlope(
+            df["close"], df["high"], df["low"], compiled=compiled).df[["ma", "xangle"]],
+        "heikinAshiDf": lambda compiled: heikinAshiDf(df.copy(), compiled=compiled),
+        "SmoothedHeikinAshi": lambda compiled: smoothed_heikin_ashi(df, compiled),
+    }
+
+
+def best_time(func, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run(bars=50_000, repeat=3, seed=0):
+    df = make_ohlc(bars, seed)
+    rows = []
+    for name, func in cases(df).items():
+        func(True)  # JIT compilation / cache load outside the timing
+        fast_time, fast = best_time(lambda: func(True), repeat)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", FutureWarning)
+            slow_time, slow = best_time(lambda: func(False), 1)
+        pd.testing.assert_frame_equal(fast, slow)
+        rows.append({
+            "indicator": name,
+            "original_s": slow_time,
+            "compiled_s": fast_time,
+            "speedup": slow_time / fast_time,
+        })
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bars", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{args.bars} bars, numba {'enabled' if NUMBA_AVAILABLE else 'not installed (pure Python fallback)'}")
+    table = run(args.bars, args.repeat)
+    print(table.to_string(index=False, float_format=lambda x: f"{x:.4f}"))
+
+
+if __name__ == "__main__":
+    main()
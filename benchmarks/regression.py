@@ -0,0 +1,267 @@
+"""
+Performance regression gate on benchmark runs.
+
+Keeps the JSON reports of benchmarks/suite.py per commit (one file per
+commit in benchmarks/results/, repeated runs of a commit are merged) and
+compares two of them benchmark by benchmark ("name@scale"):
+
+- speedup = baseline median / candidate median (> 1: candidate faster),
+  as in BenchmarkPalier1.compare()
+- bootstrap confidence interval of the speedup, resampling the repeated
+  times of both runs
+- verdict: "regression" when the whole interval is below 1 - threshold,
+  "improvement" when it is above 1 + threshold, "unchanged" otherwise
+
+Single-sample results (BenchmarkPalier1 files, --repeat 1) get a zero-width
+interval, so use --repeat 5 or more for a meaningful gate.
+
+Usage (from the repo root):
+    python benchmarks/regression.py run --scales small --repeat 5   # run, store, compare to last commit
+    python benchmarks/regression.py compare base.json candidate.json --threshold 0.05
+    python benchmarks/regression.py history --name strategy.envelope_v2
+Exit code 1 when a regression is flagged.
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+import sys
+from typing import List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+HISTORY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def benchmark_id(result: dict) -> str:
+    return f"{result['name']}@{result['scale']}" if result.get("scale") else result["name"]
+
+
+def load_report(path: str) -> dict:
+    """
+    Read a suite report, or a BenchmarkPalier1.save_results() file (its tests
+    become single-sample results).
+    """
+    with open(path, encoding="utf-8") as f:
+        report = json.load(f)
+    if "results" not in report and "tests" in report:
+        report = {
+            "environment": {"timestamp": report.get("timestamp"), "commit": None},
+            "config": {},
+            "results": [{"name": t["name"], "scale": None, "times_s": [t["time_seconds"]],
+                         "median_s": t["time_seconds"]} for t in report["tests"]],
+        }
+    return report
+
+
+def _summarise(result: dict):
+    times = result["times_s"]
+    result["median_s"] = statistics.median(times)
+    result["min_s"] = min(times)
+    if result.get("bars_pairs"):
+        result["throughput"] = result["bars_pairs"] / result["median_s"] if result["median_s"] > 0 else None
+
+
+def merge_reports(old: dict, new: dict) -> dict:
+    """Times of `new` appended to those of the same benchmarks in `old`."""
+    merged = {benchmark_id(r): dict(r, times_s=list(r["times_s"])) for r in old["results"]}
+    for result in new["results"]:
+        key = benchmark_id(result)
+        if key in merged:
+            merged[key]["times_s"].extend(result["times_s"])
+            merged[key]["peak_mem_mb"] = max(merged[key].get("peak_mem_mb") or 0, result.get("peak_mem_mb") or 0)
+        else:
+            merged[key] = dict(result, times_s=list(result["times_s"]))
+        _summarise(merged[key])
+    runs = old.get("runs", [old["environment"]]) + [new["environment"]]
+    return {"environment": new["environment"], "runs": runs, "config": new.get("config", {}),
+            "results": list(merged.values())}
+
+
+def record(report: dict, history_dir: str = HISTORY_DIR) -> str:
+    """
+    Store a suite report under its commit (merged with earlier runs of the
+    same commit). Uncommitted trees go to "<commit>-dirty".
+
+    Returns:
+        Path of the commit's file
+    """
+    env = report["environment"]
+    name = (env.get("commit") or "nogit")[:10] + ("-dirty" if env.get("dirty") else "")
+    path = os.path.join(history_dir, f"{name}.json")
+    if os.path.exists(path):
+        report = merge_reports(load_report(path), report)
+    os.makedirs(history_dir, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    return path
+
+
+def history(history_dir: str = HISTORY_DIR) -> pd.DataFrame:
+    """
+    One row per stored commit and benchmark, oldest run first: median,
+    throughput, samples, peak memory.
+    """
+    rows = []
+    for path in glob.glob(os.path.join(history_dir, "*.json")):
+        report = load_report(path)
+        env = report["environment"]
+        for result in report["results"]:
+            rows.append({
+                "timestamp": env.get("timestamp"),
+                "commit": os.path.splitext(os.path.basename(path))[0],
+                "benchmark": benchmark_id(result),
+                "median_s": result["median_s"],
+                "throughput": result.get("throughput"),
+                "samples": len(result["times_s"]),
+                "peak_mem_mb": result.get("peak_mem_mb"),
+            })
+    columns = ["timestamp", "commit", "benchmark", "median_s", "throughput", "samples", "peak_mem_mb"]
+    if not rows:
+        return pd.DataFrame(columns=columns)
+    return pd.DataFrame(rows, columns=columns).sort_values(["timestamp", "benchmark"], kind="stable",
+                                                           ignore_index=True)
+
+
+def speedup_interval(baseline: List[float], candidate: List[float], confidence: float = 0.95,
+                     n_boot: int = 2000, seed: int = 0):
+    """
+    Speedup (ratio of medians) and its percentile bootstrap interval.
+
+    Returns:
+        (speedup, low, high)
+    """
+    base = np.asarray(baseline, dtype=np.float64)
+    cand = np.asarray(candidate, dtype=np.float64)
+    speedup = float(np.median(base) / np.median(cand))
+    if len(base) < 2 and len(cand) < 2:
+        return speedup, speedup, speedup
+    rng = np.random.default_rng(seed)
+    ratios = (np.median(rng.choice(base, (n_boot, len(base))), axis=1)
+              / np.median(rng.choice(cand, (n_boot, len(cand))), axis=1))
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(ratios, [alpha, 1 - alpha])
+    return speedup, float(low), float(high)
+
+
+def compare(baseline: dict, candidate: dict, threshold: float = 0.05, confidence: float = 0.95,
+            n_boot: int = 2000, seed: int = 0) -> pd.DataFrame:
+    """
+    Benchmarks present in both reports, with speedup, interval and verdict.
+
+    Args:
+        threshold: Relative change ignored as noise (0.05 = 5%)
+        confidence: Level of the bootstrap interval
+    """
+    base_results = {benchmark_id(r): r for r in baseline["results"]}
+    rows = []
+    for result in candidate["results"]:
+        key = benchmark_id(result)
+        if key not in base_results:
+            continue
+        base_times = base_results[key]["times_s"]
+        speedup, low, high = speedup_interval(base_times, result["times_s"], confidence, n_boot, seed)
+        if high < 1 - threshold:
+            verdict = "regression"
+        elif low > 1 + threshold:
+            verdict = "improvement"
+        else:
+            verdict = "unchanged"
+        rows.append({
+            "benchmark": key,
+            "baseline_s": statistics.median(base_times),
+            "candidate_s": statistics.median(result["times_s"]),
+            "speedup": speedup,
+            "ci_low": low,
+            "ci_high": high,
+            "samples": f"{len(base_times)}/{len(result['times_s'])}",
+            "verdict": verdict,
+        })
+    return pd.DataFrame(rows, columns=["benchmark", "baseline_s", "candidate_s", "speedup", "ci_low",
+                                       "ci_high", "samples", "verdict"])
+
+
+def find_baseline(history_dir: str, exclude: Optional[str] = None, commit: Optional[str] = None) -> Optional[str]:
+    """
+    Stored report of `commit` (prefix), or the most recent one other than `exclude`.
+    """
+    reports = []
+    for path in glob.glob(os.path.join(history_dir, "*.json")):
+        name = os.path.splitext(os.path.basename(path))[0]
+        if commit is not None:
+            if name.startswith(commit):
+                return path
+            continue
+        if exclude is not None and path == exclude:
+            continue
+        reports.append((load_report(path)["environment"].get("timestamp") or "", path))
+    return max(reports)[1] if reports else None
+
+
+def print_comparison(table: pd.DataFrame) -> bool:
+    """Print the comparison; True if a regression is flagged."""
+    if table.empty:
+        print("No common benchmark")
+        return False
+    print(table.to_string(index=False, float_format=lambda x: f"{x:.4f}"))
+    regressions = table[table["verdict"] == "regression"]
+    for _, row in regressions.iterrows():
+        print(f"REGRESSION {row['benchmark']}: x{row['speedup']:.2f} "
+              f"[{row['ci_low']:.2f}, {row['ci_high']:.2f}]")
+    return not regressions.empty
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history-dir", default=HISTORY_DIR)
+    parser.add_argument("--threshold", type=float, default=0.05)
+    parser.add_argument("--confidence", type=float, default=0.95)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the suite, store it and compare to a baseline")
+    run_parser.add_argument("--scales", default="small")
+    run_parser.add_argument("--cases", nargs="*")
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument("--baseline", help="commit prefix of the baseline (default: latest other run)")
+
+    compare_parser = commands.add_parser("compare", help="compare two report files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+
+    history_parser = commands.add_parser("history", help="stored medians and throughputs")
+    history_parser.add_argument("--name", help="benchmark name prefix")
+
+    args = parser.parse_args()
+
+    if args.command == "history":
+        table = history(args.history_dir)
+        if args.name:
+            table = table[table["benchmark"].str.startswith(args.name)]
+        print(table.to_string(index=False))
+        return 0
+
+    if args.command == "compare":
+        baseline, candidate = load_report(args.baseline), load_report(args.candidate)
+    else:
+        from benchmarks import suite
+
+        report = suite.run(args.scales.split(","), args.cases, args.repeat)
+        path = record(report, args.history_dir)
+        print(f"Stored: {path}")
+        baseline_path = find_baseline(args.history_dir, exclude=path, commit=args.baseline)
+        if baseline_path is None:
+            print("No baseline to compare with")
+            return 0
+        print(f"Baseline: {baseline_path}")
+        baseline, candidate = load_report(baseline_path), load_report(path)
+
+    table = compare(baseline, candidate, args.threshold, args.confidence)
+    return 1 if print_comparison(table) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,326 @@
+"""
+Benchmark suite on deterministic synthetic universes (runs offline).
+
+Each case (strategy engines, batch indicators, regime detection, metrics,
+validation, CSV loading) runs on the universes of the selected scales
+(pairs x bars, utilities/synthetic_data.py). The results are written as
+JSON: repeated wall times, median, throughput in bars*pairs per second and
+peak traced memory, plus the commit and library versions, so that runs of
+different engines or commits can be compared.
+
+Usage (from the repo root):
+    python benchmarks/suite.py                          # small + medium
+    python benchmarks/suite.py --scales small --repeat 5 --cases strategy.
+    python benchmarks/suite.py --list
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from core import calculate_regime_series
+from core.regime_selector import prepare_regime_data
+from utilities import batch_indicators
+from utilities.bt_analysis import get_metrics
+from utilities.data_manager import ExchangeDataManager
+from utilities.jit import NUMBA_AVAILABLE
+from utilities.panel import build_panel
+from utilities.strategies.boltrend_multi import BollingerTrendMulti
+from utilities.strategies.boltrend_multi_fast import BollingerTrendMultiFast
+from utilities.strategies.envelopeMulti_v2 import EnvelopeMulti_v2
+from utilities.strategies.trixMulti import TrixMulti
+from utilities.strategies.trixMulti_fast import TrixMultiFast
+from utilities.synthetic_data import make_universe, write_exchange_csvs
+from utilities.validation import DataValidator
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# scale -> (pairs, bars of the oldest pair)
+SCALES: Dict[str, Tuple[int, int]] = {
+    "tiny": (2, 1_000),
+    "small": (4, 5_000),
+    "medium": (12, 20_000),
+    "large": (28, 50_000),
+}
+DEFAULT_SCALES = ("small", "medium")
+
+# A case gets (df_list, work_dir) and returns (function to time, bars*pairs it processes)
+Case = Callable[[Dict[str, pd.DataFrame], str], Tuple[Callable[[], object], int]]
+
+
+def bars_pairs(df_list: Dict[str, pd.DataFrame]) -> int:
+    return sum(len(df) for df in df_list.values())
+
+
+def oldest(df_list: Dict[str, pd.DataFrame]) -> str:
+    return min(df_list, key=lambda pair: df_list[pair].index[0])
+
+
+# ============================================================================
+# Cases
+# ============================================================================
+
+ENVELOPE_BACKTEST = {"initial_wallet": 1000, "leverage": 10, "stop_loss": 0.25, "risk_mode": "scaling"}
+
+
+def _envelope_strategy(df_list, compact=False):
+    params = {pair: {"src": "close", "ma_base_window": 7, "envelopes": [0.03, 0.05, 0.07], "size": 0.01}
+              for pair in df_list}
+    strategy = EnvelopeMulti_v2(df_list=df_list, oldest_pair=oldest(df_list), type=["long", "short"],
+                                params=params, compact=compact)
+    strategy.populate_indicators()
+    strategy.populate_buy_sell()
+    return strategy
+
+
+def case_envelope_v2(df_list, work_dir):
+    return lambda: _envelope_strategy(df_list).run_backtest(**ENVELOPE_BACKTEST), bars_pairs(df_list)
+
+
+def case_envelope_v2_compact(df_list, work_dir):
+    return (lambda: _envelope_strategy(df_list, compact=True).run_backtest(**ENVELOPE_BACKTEST),
+            bars_pairs(df_list))
+
+
+def _trix(cls, df_list):
+    params = {pair: {"trix_length": 9, "trix_signal_length": 21, "trix_signal_type": "ema",
+                     "long_ma_length": 200, "size": 0.1} for pair in df_list}
+    strategy = cls(df_list=df_list, oldest_pair=oldest(df_list), type=["long", "short"], params=params)
+    strategy.populate_indicators()
+    strategy.populate_buy_sell()
+    return strategy.run_backtest(initial_wallet=1000, leverage=2)
+
+
+def case_trix(df_list, work_dir):
+    return lambda: _trix(TrixMulti, df_list), bars_pairs(df_list)
+
+
+def case_trix_fast(df_list, work_dir):
+    return lambda: _trix(TrixMultiFast, df_list), bars_pairs(df_list)
+
+
+def _bollinger(cls, df_list):
+    params = {pair: {"bb_window": 100, "bb_std": 2.25, "long_ma_window": 500, "wallet_exposure": 0.1}
+              for pair in df_list}
+    strategy = cls(df_list=df_list, oldest_pair=oldest(df_list), parameters_obj=params, type=["long", "short"])
+    strategy.populate_indicators()
+    strategy.populate_buy_sell()
+    return strategy.run_backtest(initial_wallet=1000, leverage=1, max_var=0)
+
+
+def case_bollinger(df_list, work_dir):
+    return lambda: _bollinger(BollingerTrendMulti, df_list), bars_pairs(df_list)
+
+
+def case_bollinger_fast(df_list, work_dir):
+    return lambda: _bollinger(BollingerTrendMultiFast, df_list), bars_pairs(df_list)
+
+
+def case_batch_indicators(df_list, work_dir):
+    panel = build_panel(df_list, fields=("close",))
+    close, mask = panel.field("close"), panel.mask
+    windows = [7 + i % 20 for i in range(len(panel.pairs))]
+
+    def run():
+        batch_indicators.sma(close, windows, mask=mask)
+        batch_indicators.ema(close, windows, mask=mask)
+        batch_indicators.bollinger(close, windows, 2.0, mask=mask)
+        batch_indicators.trix(close, windows, 21, "ema", mask=mask)
+
+    return run, bars_pairs(df_list)
+
+
+def case_regime_detection(df_list, work_dir):
+    df_btc = df_list[oldest(df_list)]
+    return lambda: calculate_regime_series(prepare_regime_data(df_btc), confirm_n=12), len(df_btc)
+
+
+def case_metrics(df_list, work_dir):
+    result = _envelope_strategy(df_list).run_backtest(**ENVELOPE_BACKTEST)
+    trades, days = result["trades"], result["days"]
+    return lambda: get_metrics(trades, days), bars_pairs(df_list)
+
+
+def case_validation(df_list, work_dir):
+    return lambda: DataValidator.validate_multi_pair_data(df_list, use_cache=False), bars_pairs(df_list)
+
+
+def case_data_load(df_list, work_dir):
+    write_exchange_csvs(df_list, work_dir, exchange="binance", interval="1h")
+
+    def run():
+        exchange = ExchangeDataManager("binance", path_download=work_dir)
+        return {pair: exchange.load_data(pair, "1h") for pair in df_list}
+
+    return run, bars_pairs(df_list)
+
+
+CASES: Dict[str, Case] = {
+    "strategy.envelope_v2": case_envelope_v2,
+    "strategy.envelope_v2_compact": case_envelope_v2_compact,
+    "strategy.trix": case_trix,
+    "strategy.trix_fast": case_trix_fast,
+    "strategy.bollinger": case_bollinger,
+    "strategy.bollinger_fast": case_bollinger_fast,
+    "indicators.batch": case_batch_indicators,
+    "regime.detection": case_regime_detection,
+    "metrics.get_metrics": case_metrics,
+    "data.validation": case_validation,
+    "data.load_csv": case_data_load,
+}
+
+
+# ============================================================================
+# Runner
+# ============================================================================
+
+def environment() -> dict:
+    """Commit and library versions of the run."""
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True,
+                                  check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    status = git("status", "--porcelain", "--untracked-files=no")
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(status) if status is not None else None,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "numba": NUMBA_AVAILABLE,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def measure(func: Callable[[], object], repeat: int, warmup: int = 1) -> Tuple[List[float], int]:
+    """Wall times of `repeat` runs (after `warmup` untimed runs) and peak traced memory of one more."""
+    for _ in range(warmup):
+        func()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return times, peak
+
+
+def select_cases(patterns: Optional[Sequence[str]] = None) -> List[str]:
+    """Case names starting with one of `patterns` (all cases if None)."""
+    if not patterns:
+        return list(CASES)
+    names = [name for name in CASES if any(name.startswith(p) for p in patterns)]
+    if not names:
+        raise ValueError(f"No case matches {list(patterns)}")
+    return names
+
+
+def run(scales: Sequence[str] = DEFAULT_SCALES, cases: Optional[Sequence[str]] = None, repeat: int = 3,
+        warmup: int = 1, seed: int = 0, verbose: bool = True) -> dict:
+    """
+    Run the selected cases on every scale.
+
+    Returns:
+        {"environment": ..., "config": ..., "results": [one dict per case and scale]}
+    """
+    unknown = set(scales) - set(SCALES)
+    if unknown:
+        raise ValueError(f"Unknown scales: {unknown}")
+    names = select_cases(cases)
+    results = []
+    for scale in scales:
+        n_pairs, bars = SCALES[scale]
+        df_list = make_universe(n_pairs, bars, seed=seed, stagger=bars // (4 * n_pairs))
+        for name in names:
+            work_dir = tempfile.mkdtemp(prefix="bench_")
+            try:
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore")
+                    func, units = CASES[name](df_list, work_dir)
+                    times, peak = measure(func, repeat, warmup)
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+            median = statistics.median(times)
+            results.append({
+                "name": name,
+                "scale": scale,
+                "pairs": n_pairs,
+                "bars": bars,
+                "bars_pairs": units,
+                "times_s": times,
+                "median_s": median,
+                "min_s": min(times),
+                "throughput": units / median if median > 0 else None,
+                "peak_mem_mb": peak / 1e6,
+            })
+            if verbose:
+                print(f"{name:<30} {scale:<7} median {median:8.4f}s   "
+                      f"{units / median:14,.0f} bars*pairs/s   peak {peak / 1e6:8.1f} MB")
+    return {
+        "environment": environment(),
+        "config": {"scales": {s: SCALES[s] for s in scales}, "repeat": repeat, "warmup": warmup, "seed": seed},
+        "results": results,
+    }
+
+
+def save(report: dict, path: str):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default=",".join(DEFAULT_SCALES),
+                        help=f"comma-separated, among {', '.join(SCALES)}")
+    parser.add_argument("--cases", nargs="*", help="case name prefixes (default: all)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="JSON output (default benchmarks/results/<commit>.json)")
+    parser.add_argument("--list", action="store_true", help="list the cases and scales")
+    args = parser.parse_args()
+
+    if args.list:
+        for name in CASES:
+            print(name)
+        for scale, (n_pairs, bars) in SCALES.items():
+            print(f"{scale}: {n_pairs} pairs x {bars} bars")
+        return
+
+    report = run(args.scales.split(","), args.cases, args.repeat, args.warmup, args.seed)
+    out = args.out
+    if out is None:
+        commit = (report["environment"]["commit"] or "nogit")[:10]
+        out = os.path.join(ROOT, "benchmarks", "results", f"{commit}.json")
+    save(report, out)
+    print(f"Results: {out}")
+
+
+if __name__ == "__main__":
+    main()
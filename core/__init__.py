@@ -13,6 +13,9 @@ from .params_adapter import (
     CustomAdapter
 )
 from .backtest_comparator import BacktestComparator
+from .walk_forward import WalkForward, Fold, Pruner, composite_score
+from .successive_halving import SuccessiveHalving
+from .optimizer import TPEOptimizer, EnvelopeObjective, ENVELOPE_SPACE
 
 __all__ = [
     "Regime",
@@ -29,4 +32,12 @@ __all__ = [
     "RegimeBasedAdapter",
     "CustomAdapter",
     "BacktestComparator",
+    "WalkForward",
+    "Fold",
+    "Pruner",
+    "composite_score",
+    "SuccessiveHalving",
+    "TPEOptimizer",
+    "EnvelopeObjective",
+    "ENVELOPE_SPACE",
 ]
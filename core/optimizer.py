@@ -0,0 +1,433 @@
+"""
+Bayesian (TPE) optimisation of the envelope strategy.
+
+The grid sweeps of the notebooks spend most of their backtests on configs far
+from the best ones. The Tree-structured Parzen Estimator (Bergstra et al.,
+the algorithm behind hyperopt) proposes the next trial from the results so
+far: the finished trials are split into the best ones and the rest, each
+dimension gets a Parzen density for both groups, and the candidate with the
+highest good/bad density ratio is tried next.
+
+- trials run in a process pool and are reported as soon as they finish; a
+  new trial is proposed from every finished result while the others run
+- each finished trial is appended to a JSONL history file, so a crashed or
+  interrupted study resumes where it stopped (same file, larger n_trials)
+- the objective is any picklable callable params -> score (higher is better);
+  EnvelopeObjective scores EnvelopeMulti_v2 configs with the walk-forward
+  composite score
+
+Usage:
+    wf = WalkForward(df_list_full, df_btc_full, WF_FOLDS, BACKTEST_PARAMS)
+    optimizer = TPEOptimizer(ENVELOPE_SPACE, EnvelopeObjective(wf, PAIRS),
+                             history_path="tpe_major.jsonl")
+    optimizer.optimize(n_trials=200, max_workers=8)
+    optimizer.best_trial()
+"""
+import json
+import math
+import multiprocessing
+import os
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+from scipy.special import ndtr
+
+from core.walk_forward import WalkForward, composite_score
+
+
+# -- Search space --
+
+@dataclass(frozen=True)
+class IntParam:
+    """Integer in [low, high] (inclusive), on a `step` grid."""
+    low: int
+    high: int
+    step: int = 1
+    log: bool = False
+
+    @property
+    def bounds(self):
+        if self.log:
+            return math.log(self.low), math.log(self.high)
+        # Half a step on both sides: every integer gets the same share
+        return self.low - 0.5 * self.step, self.high + 0.5 * self.step
+
+    def to_internal(self, value):
+        return math.log(value) if self.log else float(value)
+
+    def from_internal(self, x):
+        value = math.exp(x) if self.log else x
+        value = self.low + round((value - self.low) / self.step) * self.step
+        return int(min(max(value, self.low), self.high))
+
+
+@dataclass(frozen=True)
+class FloatParam:
+    """Float in [low, high]."""
+    low: float
+    high: float
+    log: bool = False
+
+    @property
+    def bounds(self):
+        return self.to_internal(self.low), self.to_internal(self.high)
+
+    def to_internal(self, value):
+        return math.log(value) if self.log else float(value)
+
+    def from_internal(self, x):
+        value = math.exp(x) if self.log else x
+        return float(min(max(value, self.low), self.high))
+
+
+@dataclass(frozen=True)
+class ChoiceParam:
+    """One of `options` (any JSON value: str, number, list...)."""
+    options: tuple
+
+    def index(self, value) -> int:
+        return [json.dumps(option) for option in self.options].index(json.dumps(value))
+
+
+ENVELOPE_SPACE = {
+    "ma_base_window": IntParam(3, 15),
+    "envelope_mult": FloatParam(0.6, 1.6),
+    "size": FloatParam(0.06, 0.20),
+    "stop_loss": FloatParam(0.10, 0.50),
+    "gross_cap": FloatParam(1.0, 2.5),
+    "per_side_cap": FloatParam(0.5, 1.5),
+    "per_pair_cap": FloatParam(0.15, 0.5),
+    "risk_mode": ChoiceParam(("neutral", "scaling", "hybrid")),
+}
+
+
+# -- Trials --
+
+@dataclass
+class Trial:
+    number: int
+    params: Dict[str, Any]
+    value: Optional[float] = None
+    state: str = "complete"  # complete / fail
+    duration: float = 0.0
+    error: Optional[str] = None
+
+    def to_json(self) -> str:
+        return json.dumps({"number": self.number, "params": self.params, "value": self.value,
+                           "state": self.state, "duration": round(self.duration, 3), "error": self.error})
+
+
+def _json_value(value):
+    """numpy scalars -> Python, for the history file."""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+# -- TPE sampler --
+
+def _truncated_normal_pdf(x, mu, sigma, low, high):
+    """Density at x (n,) of the mixture of normals mu/sigma (k,) truncated to [low, high], per component."""
+    z = (x[:, None] - mu[None, :]) / sigma[None, :]
+    mass = ndtr((high - mu) / sigma) - ndtr((low - mu) / sigma)
+    return np.exp(-0.5 * z ** 2) / (sigma * math.sqrt(2 * math.pi) * mass)[None, :]
+
+
+class _Parzen:
+    """
+    Parzen density of observed internal values + a uniform prior component.
+    Each kernel's width is its largest gap to the neighbouring observations
+    (the bounds count as neighbours), like hyperopt's adaptive Parzen.
+    """
+
+    def __init__(self, observed: np.ndarray, low: float, high: float):
+        self.low, self.high = low, high
+        self.mu = observed
+        width = high - low
+        if len(observed):
+            order = np.argsort(observed, kind="stable")
+            points = np.r_[low, observed[order], high]
+            gaps = np.maximum(points[1:-1] - points[:-2], points[2:] - points[1:-1])
+            sigma = np.empty(len(observed))
+            sigma[order] = np.clip(gaps, width / min(100, len(observed) + 1), width)
+        else:
+            sigma = np.empty(0)
+        self.sigma = sigma
+
+    def sample(self, rng, n: int) -> np.ndarray:
+        component = rng.integers(0, len(self.mu) + 1, n)  # last = prior
+        out = rng.uniform(self.low, self.high, n)
+        for i in np.flatnonzero(component < len(self.mu)):
+            k = component[i]
+            while True:
+                x = rng.normal(self.mu[k], self.sigma[k])
+                if self.low <= x <= self.high:
+                    out[i] = x
+                    break
+        return out
+
+    def log_pdf(self, x: np.ndarray) -> np.ndarray:
+        density = np.full(len(x), 1 / (self.high - self.low))
+        if len(self.mu):
+            density = density + _truncated_normal_pdf(x, self.mu, self.sigma, self.low, self.high).sum(axis=1)
+        return np.log(density / (len(self.mu) + 1))
+
+
+class TPESampler:
+    """
+    TPE over the dimensions of a search space: `n_candidates` trials are
+    drawn from the good densities, dimension by dimension, and the one with
+    the highest total good/bad log ratio is proposed.
+
+    Args:
+        space: dict name -> IntParam / FloatParam / ChoiceParam
+        n_startup: random trials before the model is used
+        gamma: fraction of the finished trials forming the "good" group
+        max_good: cap on the size of the good group
+        n_candidates: candidates drawn from the good densities
+        seed: random seed
+    """
+
+    def __init__(self, space: Dict[str, Any], n_startup: int = 10, gamma: float = 0.1,
+                 max_good: int = 25, n_candidates: int = 24, seed: Optional[int] = None):
+        self.space = space
+        self.n_startup = n_startup
+        self.gamma = gamma
+        self.max_good = max_good
+        self.n_candidates = n_candidates
+        self.rng = np.random.default_rng(seed)
+
+    def sample_random(self) -> Dict[str, Any]:
+        params = {}
+        for name, dim in self.space.items():
+            if isinstance(dim, ChoiceParam):
+                params[name] = dim.options[self.rng.integers(len(dim.options))]
+            else:
+                params[name] = dim.from_internal(self.rng.uniform(*dim.bounds))
+        return params
+
+    def suggest(self, trials: Sequence[Trial]) -> Dict[str, Any]:
+        finished = [t for t in trials if t.state == "complete" and t.value is not None
+                    and all(name in t.params for name in self.space)]
+        if len(finished) < self.n_startup:
+            return self.sample_random()
+
+        finished.sort(key=lambda t: -t.value)
+        n_good = max(1, min(math.ceil(self.gamma * len(finished)), self.max_good))
+        good, bad = finished[:n_good], finished[n_good:]
+
+        log_ratio = np.zeros(self.n_candidates)
+        candidates = {}
+        for name, dim in self.space.items():
+            good_values = [t.params[name] for t in good]
+            bad_values = [t.params[name] for t in bad]
+            if isinstance(dim, ChoiceParam):
+                n = len(dim.options)
+                l = np.bincount([dim.index(v) for v in good_values], minlength=n) + 1.0
+                g = np.bincount([dim.index(v) for v in bad_values], minlength=n) + 1.0
+                l, g = l / l.sum(), g / g.sum()
+                drawn = self.rng.choice(n, size=self.n_candidates, p=l)
+                log_ratio += np.log(l[drawn]) - np.log(g[drawn])
+                candidates[name] = [dim.options[i] for i in drawn]
+            else:
+                low, high = dim.bounds
+                l = _Parzen(np.array([dim.to_internal(v) for v in good_values]), low, high)
+                g = _Parzen(np.array([dim.to_internal(v) for v in bad_values]), low, high)
+                drawn = l.sample(self.rng, self.n_candidates)
+                log_ratio += l.log_pdf(drawn) - g.log_pdf(drawn)
+                candidates[name] = [dim.from_internal(x) for x in drawn]
+
+        best = int(np.argmax(log_ratio))
+        return {name: values[best] for name, values in candidates.items()}
+
+
+# -- Optimizer --
+
+class TPEOptimizer:
+    """
+    Asynchronous TPE study with a persisted trial history.
+
+    Args:
+        space: dict name -> IntParam / FloatParam / ChoiceParam
+        objective: picklable callable params -> score (higher is better)
+        history_path: JSONL file the trials are appended to; existing trials
+                      are loaded (resume)
+        seed: random seed (offset by the number of loaded trials on resume)
+        **sampler_kwargs: TPESampler options (n_startup, gamma, max_good, n_candidates)
+    """
+
+    def __init__(self, space: Dict[str, Any], objective: Callable[[Dict[str, Any]], float],
+                 history_path: Optional[str] = None, seed: Optional[int] = None, **sampler_kwargs):
+        self.space = space
+        self.objective = objective
+        self.history_path = history_path
+        self.trials: List[Trial] = []
+        if history_path:
+            self.trials, clean = _read_history(history_path)
+            if not clean:
+                # Drop the line an interrupted run left half-written
+                with open(history_path, "w", encoding="utf-8") as f:
+                    f.writelines(trial.to_json() + "\n" for trial in self.trials)
+        if seed is not None:
+            seed += len(self.trials)
+        self.sampler = TPESampler(space, seed=seed, **sampler_kwargs)
+
+    @staticmethod
+    def load_history(path: str) -> List[Trial]:
+        """Trials of a history file (missing file: none; a truncated last line is ignored)."""
+        return _read_history(path)[0]
+
+    def _record(self, trial: Trial):
+        self.trials.append(trial)
+        if self.history_path:
+            with open(self.history_path, "a", encoding="utf-8") as f:
+                f.write(trial.to_json() + "\n")
+
+    def _suggest(self) -> Dict[str, Any]:
+        return {name: _json_value(value) for name, value in self.sampler.suggest(self.trials).items()}
+
+    def optimize(self, n_trials: int, max_workers: int = 1,
+                 callback: Optional[Callable[[Trial], None]] = None, verbose: bool = False) -> List[Trial]:
+        """
+        Run trials until the history holds `n_trials` of them.
+
+        Args:
+            max_workers: trials running at the same time (process pool when > 1)
+            callback: called with every finished trial, in completion order
+
+        Returns:
+            all trials (loaded + new), in completion order
+        """
+        def report(trial):
+            self._record(trial)
+            if callback is not None:
+                callback(trial)
+            if verbose:
+                best = self.best_trial()
+                value = "failed" if trial.value is None else f"{trial.value:.4f}"
+                print(f"   Trial {trial.number}: {value} (best #{best.number}: {best.value:.4f})"
+                      if best is not None else f"   Trial {trial.number}: {value}")
+
+        next_number = max((t.number for t in self.trials), default=-1) + 1
+        remaining = n_trials - len(self.trials)
+        if remaining <= 0:
+            return self.trials
+
+        if max_workers <= 1:
+            for number in range(next_number, next_number + remaining):
+                report(_run_trial(self.objective, number, self._suggest()))
+            return self.trials
+
+        # spawn, like WalkForward.evaluate_many()
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker, initargs=(self.objective,)) as pool:
+            running = set()
+            submitted = 0
+            while submitted < remaining or running:
+                while submitted < remaining and len(running) < max_workers:
+                    # Pending trials are not in the model yet: the proposal
+                    # only uses finished results
+                    running.add(pool.submit(_run_worker_trial, next_number + submitted, self._suggest()))
+                    submitted += 1
+                finished, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    report(future.result())
+        return self.trials
+
+    def best_trial(self) -> Optional[Trial]:
+        finished = [t for t in self.trials if t.state == "complete" and t.value is not None]
+        return max(finished, key=lambda t: t.value) if finished else None
+
+
+def _read_history(path: str):
+    """(trials, False if some line could not be read)."""
+    trials = []
+    clean = True
+    if not os.path.exists(path):
+        return trials, clean
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                clean = False
+                continue
+            trials.append(Trial(record["number"], record["params"], record.get("value"),
+                                record.get("state", "complete"), record.get("duration", 0.0),
+                                record.get("error")))
+    return trials, clean
+
+
+def _run_trial(objective, number: int, params: Dict[str, Any]) -> Trial:
+    start = time.perf_counter()
+    try:
+        value = float(objective(params))
+        if not math.isfinite(value):
+            raise ValueError(f"objective returned {value}")
+        return Trial(number, params, value, duration=time.perf_counter() - start)
+    except Exception as e:
+        return Trial(number, params, None, state="fail", duration=time.perf_counter() - start,
+                     error="".join(traceback.format_exception_only(type(e), e)).strip())
+
+
+# -- Process pool plumbing (the objective is sent once per worker) --
+
+_worker_objective = None
+
+
+def _init_worker(objective):
+    global _worker_objective
+    _worker_objective = objective
+
+
+def _run_worker_trial(number, params):
+    return _run_trial(_worker_objective, number, params)
+
+
+# -- Envelope objective --
+
+# run_backtest() kwargs a trial may set
+BACKTEST_KEYS = ("gross_cap", "per_side_cap", "per_pair_cap", "margin_cap", "risk_mode", "max_expo_cap")
+
+
+@dataclass
+class EnvelopeObjective:
+    """
+    Walk-forward score of an EnvelopeMulti_v2 config: mean composite test
+    score over the folds, fixed params (like the per-config aggregation of
+    the notebooks).
+
+    Trial params: ma_base_window, size, stop_loss, the envelopes either as
+    `envelopes` (a list) or as `envelope_mult` x `base_envelopes`, and any
+    of BACKTEST_KEYS.
+    """
+    walk_forward: WalkForward
+    pairs: Sequence[str]
+    base_envelopes: Sequence[float] = field(default_factory=lambda: [0.07, 0.1, 0.15])
+
+    def config(self, params: Dict[str, Any]):
+        if "envelopes" in params:
+            envelopes = list(params["envelopes"])
+        else:
+            envelopes = [round(e * params["envelope_mult"], 3) for e in self.base_envelopes]
+        return (params["ma_base_window"], envelopes, params["size"], params["stop_loss"])
+
+    def __call__(self, params: Dict[str, Any]) -> float:
+        wf = self.walk_forward
+        config = self.config(params)
+        params_coin = wf.params_coin(config, self.pairs)
+        overrides = {key: params[key] for key in BACKTEST_KEYS if key in params}
+        strategy = wf.history_strategy(self.pairs, params_coin) if wf.warm_indicators else None
+        scores = []
+        for window in wf.windows:
+            if not any(pair in window.train for pair in self.pairs):
+                continue
+            bt_train, bt_test = wf.train_test(window, self.pairs, params_coin, config[3], False,
+                                              strategy, **overrides)
+            scores.append(composite_score(bt_test, bt_train.get("sharpe_ratio", 0),
+                                          initial_wallet=wf.initial_wallet))
+        if not scores:
+            raise ValueError("no fold with data for these pairs")
+        return float(np.mean(scores))
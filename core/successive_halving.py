@@ -0,0 +1,136 @@
+"""
+Successive halving over the walk-forward folds.
+
+The exhaustive walk-forward runs every config on every fold (the Pruner only
+drops configs that fail hard rules on their first folds). Most configs of a
+grid are clearly worse than the best ones after a fold or two, so:
+
+- rung 1 runs every config on the first fold(s) (cheap budget)
+- the configs are ranked by their mean test score so far and only the top
+  1/eta go on to the next rung, which adds the next fold(s)
+- the last rung runs the survivors up to the last fold
+
+Each rung is one WalkForward.evaluate_many() call, so its configs fan out
+over the process pool; folds already run by a config are never re-run. The
+survivors end up with exactly the rows of the exhaustive run.
+
+Usage:
+    wf = WalkForward(df_list_full, df_btc_full, WF_FOLDS, BACKTEST_PARAMS)
+    halving = SuccessiveHalving(wf, eta=3)
+    df_results = halving.run(combos, pairs, profile="major", max_workers=8)
+    halving.rungs  # configs / kept / backtests per rung
+    halving.best(df_results, n=3)
+"""
+import math
+from typing import Any, Dict, List, Optional, Sequence
+
+import pandas as pd
+
+from core.walk_forward import Config, WalkForward
+
+
+def config_scores(df_results: pd.DataFrame) -> pd.Series:
+    """
+    Mean test score of each config (combo_idx), best of its fixed / adaptive
+    runs, like the notebook's per-config aggregation.
+    """
+    if len(df_results) == 0:
+        return pd.Series(dtype=float)
+    means = df_results.groupby(["combo_idx", "adaptive"])["test_score"].mean()
+    return means.groupby(level="combo_idx").max()
+
+
+class SuccessiveHalving:
+    """
+    Successive-halving scheduler on a WalkForward.
+
+    Args:
+        walk_forward: WalkForward holding the data and folds
+        eta: 1/eta of the configs is kept at each rung
+        rungs: cumulative fold count of each rung (default one more fold per
+               rung: [1, 2, ..., n_folds])
+        min_configs: never keep fewer configs than this
+    """
+
+    def __init__(self, walk_forward: WalkForward, eta: float = 3, rungs: Optional[Sequence[int]] = None,
+                 min_configs: int = 1):
+        n_folds = len(walk_forward.windows)
+        if rungs is None:
+            rungs = range(1, n_folds + 1)
+        rungs = sorted(set(int(r) for r in rungs))
+        if eta <= 1:
+            raise ValueError("eta must be > 1")
+        if not rungs or rungs[0] < 1 or rungs[-1] > n_folds:
+            raise ValueError(f"rungs must be fold counts between 1 and {n_folds}")
+        if rungs[-1] != n_folds:
+            rungs.append(n_folds)
+
+        self.walk_forward = walk_forward
+        self.eta = eta
+        self.rung_folds = rungs
+        self.min_configs = max(1, min_configs)
+        self.rungs: List[Dict[str, Any]] = []
+        self.survivors: List[int] = []
+
+    def run(self, grid: Sequence[Config], pairs: Sequence[str], profile: str = "",
+            adaptive: bool = True, max_workers: int = 1, verbose: bool = False) -> pd.DataFrame:
+        """
+        Successive halving of `grid` on `pairs`.
+
+        Returns:
+            DataFrame of every result row run, in config then fold order
+            (same columns as WalkForward.run())
+        """
+        configs = {combo_idx: tuple(config) for combo_idx, config in enumerate(grid)}
+        rows_by_config: Dict[int, List[Dict[str, Any]]] = {combo_idx: [] for combo_idx in configs}
+        alive = list(configs)
+        done = 0
+        self.rungs = []
+        self.survivors = []
+
+        for rung, n_folds in enumerate(self.rung_folds, start=1):
+            folds = list(range(done, n_folds))
+            tasks = [(combo_idx, configs[combo_idx], list(pairs), profile, adaptive, folds)
+                     for combo_idx in alive]
+            outcomes = self.walk_forward.evaluate_many(tasks, max_workers)
+
+            pruned = set()
+            for combo_idx, (config_rows, skip_reason) in zip(alive, outcomes):
+                rows_by_config[combo_idx].extend(config_rows)
+                if skip_reason is not None:
+                    pruned.add(combo_idx)
+            candidates = [combo_idx for combo_idx in alive if combo_idx not in pruned]
+
+            if n_folds == self.rung_folds[-1]:
+                kept = candidates
+            else:
+                scores = config_scores(pd.DataFrame(
+                    [row for combo_idx in candidates for row in rows_by_config[combo_idx]]))
+                n_keep = max(self.min_configs, math.ceil(len(alive) / self.eta))
+                # Stable: ties keep the grid order
+                ranked = sorted(candidates, key=lambda c: -scores.get(c, -math.inf))
+                kept = sorted(ranked[:n_keep])
+
+            self.rungs.append({
+                "rung": rung,
+                "folds": n_folds,
+                "configs": len(alive),
+                "pruned": len(pruned),
+                "kept": len(kept),
+                "backtests": sum(len(config_rows) for config_rows, _ in outcomes) * 2,
+            })
+            if verbose:
+                print(f"   Rung {rung} ({n_folds} folds): {len(alive)} configs -> {len(kept)} kept"
+                      + (f" ({len(pruned)} pruned)" if pruned else ""))
+            alive = kept
+            done = n_folds
+            if not alive:
+                break
+        self.survivors = alive
+
+        return pd.DataFrame([row for combo_idx in configs for row in rows_by_config[combo_idx]])
+
+    def best(self, df_results: pd.DataFrame, n: int = 1) -> pd.Series:
+        """Mean test score of the top `n` configs among the last rung's survivors."""
+        scores = config_scores(df_results[df_results["combo_idx"].isin(self.survivors)])
+        return scores.sort_values(ascending=False, kind="stable").head(n)
@@ -0,0 +1,472 @@
+"""
+Walk-forward optimisation of the envelope strategy.
+
+Module version of the walk-forward of strategies/envelopes/CELL_19_OPTIMIZED.py
+(same folds, configs, scores, early termination and result rows), without
+its per-config overhead:
+
+- the OHLCV of every pair is converted once to arrays; a fold is a
+  (start, end) row range per pair, found once with searchsorted, and each
+  backtest gets DataFrames that are views on those arrays instead of the
+  filter_df_list_by_dates() boolean-mask copies
+- the BTC regimes of each fold's train / test window are computed once per
+  fold instead of once per (fold, config)
+- optionally (warm_indicators=True), each config's indicators are computed
+  once on the whole history and the engine only simulates the fold windows
+- configs are independent and fan out over a process pool (the data is sent
+  once per worker, not once per task)
+- early termination (pruning) is a Pruner object, with the CELL-19 rules as
+  defaults
+
+Usage:
+    wf = WalkForward(df_list_full, df_btc_full, WF_FOLDS, BACKTEST_PARAMS)
+    results_by_profile = wf.run_profiles(PARAM_GRIDS_BY_PROFILE, PAIR_PROFILES, PAIRS,
+                                         adaptive=not TEST_MODE, max_workers=8)
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import product
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from core.params_adapter import FixedParamsAdapter, RegimeBasedAdapter
+from core.params_registry import DEFAULT_PARAMS
+from core.regime_selector import calculate_regime_series
+from utilities.memory import peak_rss_mb, trade_summary
+from utilities.panel import date_window
+from utilities.strategies.envelopeMulti_v2 import EnvelopeMulti_v2
+
+OHLCV = ["open", "high", "low", "close", "volume"]
+
+# A grid config: (ma_base_window, envelopes, size, stop_loss)
+Config = Tuple[int, Sequence[float], float, float]
+
+
+@dataclass
+class Fold:
+    """One walk-forward fold (dates inclusive, like filter_df_by_dates)."""
+    name: str
+    train_start: str
+    train_end: str
+    test_start: str
+    test_end: str
+
+    @classmethod
+    def from_dict(cls, fold: Dict[str, str]) -> "Fold":
+        return cls(fold["name"], fold["train_start"], fold["train_end"],
+                   fold["test_start"], fold["test_end"])
+
+
+@dataclass
+class FoldWindow:
+    """Row ranges of a fold into the shared arrays, and its regimes."""
+    name: str
+    train: Dict[str, Tuple[int, int]]
+    test: Dict[str, Tuple[int, int]]
+    regime_train: pd.Series
+    regime_test: pd.Series
+
+
+@dataclass
+class Pruner:
+    """
+    Early termination of a config, checked on the test (fixed params) result
+    of its first `folds` folds. Defaults are the CELL-19 rules.
+    """
+    folds: int = 2
+    min_trades: int = 10
+    max_drawdown: float = 50.0
+    min_score: float = -500.0
+
+    def reason(self, fold_count: int, n_trades: int, max_dd: float, score: float) -> Optional[str]:
+        """Skip reason, or None to keep going."""
+        if fold_count > self.folds:
+            return None
+        if n_trades < self.min_trades:
+            return f"<{self.min_trades} trades (fold {fold_count})"
+        if max_dd > self.max_drawdown:
+            return f"DD>{max_dd:.1f}% (fold {fold_count})"
+        if score < self.min_score:
+            return f"score<{self.min_score:g} (fold {fold_count})"
+        return None
+
+
+def max_drawdown_pct(df_days: pd.DataFrame) -> float:
+    """Max drawdown of the daily wallet, in percent (0 without days)."""
+    if len(df_days) == 0:
+        return 0
+    wallet = df_days["wallet"]
+    cummax = wallet.cummax()
+    return abs(((wallet - cummax) / cummax).min()) * 100
+
+
+def _n_trades(bt_result: Dict[str, Any]) -> int:
+    return bt_result["n_trades"] if "n_trades" in bt_result else len(bt_result["trades"])
+
+
+def _max_drawdown(bt_result: Dict[str, Any]) -> float:
+    if "day_max_drawdown_pct" in bt_result:
+        return bt_result["day_max_drawdown_pct"]
+    return max_drawdown_pct(bt_result["days"])
+
+
+def composite_score(bt_result: Dict[str, Any], train_sharpe: Optional[float] = None,
+                    initial_wallet: float = 1000) -> float:
+    """
+    Anti-overfitting composite score of a backtest (higher is better).
+
+    Args:
+        bt_result: run_backtest() result (any keep level)
+        train_sharpe: Sharpe of the train run when scoring a test run (adds the
+                      train/test consistency term), None when scoring a train run
+        initial_wallet: Initial wallet of the backtest
+    """
+    # run_backtest(keep="summary" / "metrics") results carry the trade_summary()
+    # scalars instead of the trades / days frames
+    summary = bt_result if "n_trades" in bt_result else trade_summary(bt_result["trades"], bt_result["days"])
+
+    n_trades = summary["n_trades"]
+    if n_trades < 10:
+        return -999
+    weight_penalty = n_trades / 30 if n_trades < 30 else 1.0
+
+    sharpe = bt_result.get("sharpe_ratio", 0)
+    if pd.isna(sharpe) or np.isinf(sharpe):
+        sharpe = 0
+    sharpe = np.clip(sharpe, -5, 10)
+
+    max_dd = summary["day_max_drawdown_pct"]
+    total_return = (summary["last_day_wallet"] / initial_wallet - 1) * 100
+    calmar = np.clip(total_return / max(max_dd, 1.0), -5, 10)
+
+    win_rate = summary["trade_win_rate"]
+    gross_profit = summary["gross_profit"]
+    gross_loss = summary["gross_loss"]
+    profit_factor = gross_profit / max(gross_loss, 1.0) if gross_loss > 0 else gross_profit
+    profit_factor_normalized = np.clip(profit_factor / 2, 0, 1)
+
+    if train_sharpe is not None:
+        consistency = np.clip(1 - abs(train_sharpe - sharpe) / max(0.1, abs(train_sharpe)), 0, 1)
+    else:
+        consistency = 0
+
+    dd_factor = np.clip(1 - min(max_dd, 100) / 100, 0, 1)
+
+    if train_sharpe is None:
+        score = (
+            sharpe * 0.35 +
+            calmar * 0.25 +
+            dd_factor * 0.20 +
+            win_rate * 0.10 +
+            profit_factor_normalized * 0.10
+        ) * weight_penalty
+    else:
+        score = (
+            sharpe * 0.30 +
+            consistency * 0.25 +
+            calmar * 0.20 +
+            dd_factor * 0.15 +
+            win_rate * 0.05 +
+            profit_factor_normalized * 0.05
+        ) * weight_penalty
+    return score
+
+
+class WalkForward:
+    """
+    Walk-forward runner on shared arrays.
+
+    Args:
+        df_list: dict pair -> OHLCV DataFrame over the whole period (sorted index)
+        df_btc: BTC DataFrame the regimes are computed on
+        folds: list of Fold or CELL-19 fold dicts
+        backtest_params: EnvelopeMulti_v2.run_backtest() kwargs (without
+                         stop_loss / params_adapter), e.g. BACKTEST_PARAMS
+        confirm_n: calculate_regime_series() hysteresis
+        pruner: early termination rules (None for the default Pruner()),
+                False to run every fold
+        warm_indicators: compute each config's indicators once on the whole
+                         history and only simulate the fold windows
+                         (run_backtest(window=...)), instead of recomputing
+                         them on every train / test slice like CELL-19: the
+                         first bars of a window are then warmed up by the
+                         bars before it instead of being NaN
+        keep: run_backtest() result retention ("metrics" by default: the
+              rows only need the metrics and trade_summary() scalars, so
+              the trades / days / exposure frames are dropped as soon as
+              each backtest ends); "full" keeps every frame
+    """
+
+    def __init__(
+        self,
+        df_list: Dict[str, pd.DataFrame],
+        df_btc: pd.DataFrame,
+        folds: Sequence,
+        backtest_params: Dict[str, Any],
+        confirm_n: int = 12,
+        pruner: Union[Pruner, bool, None] = None,
+        regime_params=None,
+        base_std: float = 0.10,
+        warm_indicators: bool = False,
+        keep: str = "metrics",
+    ):
+        self.backtest_params = dict(backtest_params)
+        self.keep = keep
+        self.warm_indicators = warm_indicators
+        self.leverage = self.backtest_params.get("leverage", 1)
+        self.initial_wallet = self.backtest_params.get("initial_wallet", 1000)
+        if pruner is None:
+            pruner = Pruner()
+        self.pruner = pruner if pruner is not False else None
+        self.regime_params = regime_params if regime_params is not None else DEFAULT_PARAMS
+        self.base_std = base_std
+        # pid -> peak RSS (MB) of the pool workers of the last evaluate_many()
+        self.worker_peak_rss_mb: Dict[int, Optional[float]] = {}
+
+        # -- Shared arrays, built once --
+        self.index = {pair: df.index for pair, df in df_list.items()}
+        self.values = {pair: df[OHLCV].to_numpy(dtype=np.float64) for pair, df in df_list.items()}
+
+        # -- Fold windows and regimes, computed once per fold --
+        self.folds = [fold if isinstance(fold, Fold) else Fold.from_dict(fold) for fold in folds]
+        self.windows = []
+        for fold in self.folds:
+            btc_train = df_btc.iloc[slice(*date_window(df_btc.index, fold.train_start, fold.train_end))]
+            btc_test = df_btc.iloc[slice(*date_window(df_btc.index, fold.test_start, fold.test_end))]
+            self.windows.append(FoldWindow(
+                name=fold.name,
+                train={pair: date_window(index, fold.train_start, fold.train_end)
+                       for pair, index in self.index.items()},
+                test={pair: date_window(index, fold.test_start, fold.test_end)
+                      for pair, index in self.index.items()},
+                regime_train=calculate_regime_series(btc_train, confirm_n=confirm_n),
+                regime_test=calculate_regime_series(btc_test, confirm_n=confirm_n),
+            ))
+
+    # -- Single backtests --
+
+    def fold_df_list(self, ranges: Dict[str, Tuple[int, int]], pairs: Sequence[str]) -> Dict[str, pd.DataFrame]:
+        """DataFrames of `pairs` on a fold window, as views on the shared arrays."""
+        df_list = {}
+        for pair in pairs:
+            if pair not in ranges:
+                continue
+            start, end = ranges[pair]
+            df_list[pair] = pd.DataFrame(self.values[pair][start:end], index=self.index[pair][start:end],
+                                         columns=OHLCV, copy=False)
+        return df_list
+
+    def params_coin(self, config: Config, pairs: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        ma_window, envelopes, size, _ = config
+        return {pair: {
+            "src": "close",
+            "ma_base_window": ma_window,
+            "envelopes": envelopes,
+            "size": size / self.leverage,
+        } for pair in pairs}
+
+    def backtest(self, df_list, params_coin, stop_loss, params_adapter, **backtest_params):
+        """
+        Same run as the notebook's run_single_backtest(); `backtest_params`
+        override self.backtest_params (caps, risk_mode...) and self.keep.
+        """
+        strategy = self.strategy(df_list, params_coin)
+        return strategy.run_backtest(**{"keep": self.keep, **self.backtest_params, **backtest_params},
+                                     stop_loss=stop_loss,
+                                     params_adapter=params_adapter)
+
+    def strategy(self, df_list, params_coin) -> EnvelopeMulti_v2:
+        """EnvelopeMulti_v2 on df_list with its indicators and signals populated."""
+        oldest_pair = min(df_list, key=lambda p: df_list[p].index.min())
+        strategy = EnvelopeMulti_v2(df_list=df_list, oldest_pair=oldest_pair,
+                                    type=["long", "short"], params=params_coin)
+        strategy.populate_indicators()
+        strategy.populate_buy_sell()
+        return strategy
+
+    def history_strategy(self, pairs: Sequence[str], params_coin) -> EnvelopeMulti_v2:
+        """strategy() on the whole history of `pairs` (warm_indicators mode)."""
+        return self.strategy(self.fold_df_list({pair: (0, len(self.index[pair])) for pair in pairs}, pairs),
+                             params_coin)
+
+    def train_test(self, window: FoldWindow, pairs, params_coin, stop_loss, adaptive,
+                   strategy: Optional[EnvelopeMulti_v2] = None, **backtest_params):
+        """
+        Train and test backtests of a fold. With a history_strategy(), only
+        the fold's rows of its oldest pair are simulated.
+        """
+        if adaptive:
+            adapter_train, adapter_test = (
+                RegimeBasedAdapter(base_params=params_coin, regime_series=regime,
+                                   regime_params=self.regime_params,
+                                   multipliers={"envelope_std": True}, base_std=self.base_std)
+                for regime in (window.regime_train, window.regime_test))
+        else:
+            adapter_train = FixedParamsAdapter(params_coin)
+            adapter_test = FixedParamsAdapter(params_coin)
+
+        if strategy is not None:
+            kwargs = {"keep": self.keep, **self.backtest_params, **backtest_params, "stop_loss": stop_loss}
+            oldest_pair = strategy.oldest_pair
+            bt_train = strategy.run_backtest(**kwargs, params_adapter=adapter_train,
+                                             window=window.train[oldest_pair])
+            bt_test = strategy.run_backtest(**kwargs, params_adapter=adapter_test,
+                                            window=window.test[oldest_pair])
+            return bt_train, bt_test
+
+        df_train = self.fold_df_list(window.train, pairs)
+        df_test = self.fold_df_list(window.test, pairs)
+        bt_train = self.backtest(df_train, params_coin, stop_loss, adapter_train, **backtest_params)
+        bt_test = self.backtest(df_test, params_coin, stop_loss, adapter_test, **backtest_params)
+        return bt_train, bt_test
+
+    # -- One config over all folds --
+
+    def evaluate(self, combo_idx: int, config: Config, pairs: Sequence[str], profile: str = "",
+                 adaptive: bool = True, folds: Optional[Sequence[int]] = None
+                 ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Run one config over the folds (fixed, then adaptive params).
+
+        Args:
+            folds: positions of the folds to run (default all); the pruner
+                   still sees the real fold numbers
+
+        Returns:
+            (result rows, skip reason or None)
+        """
+        ma_window, envelopes, size, stop_loss = config
+        params_coin = self.params_coin(config, pairs)
+        strategy = self.history_strategy(pairs, params_coin) if self.warm_indicators else None
+        rows = []
+        for fold_count, window in enumerate(self.windows, start=1):
+            if folds is not None and fold_count - 1 not in folds:
+                continue
+            if not any(pair in window.train for pair in pairs):
+                continue
+            skip_reason = None
+            for is_adaptive in ((False, True) if adaptive else (False,)):
+                bt_train, bt_test = self.train_test(window, pairs, params_coin, stop_loss, is_adaptive, strategy)
+                score_train = composite_score(bt_train, initial_wallet=self.initial_wallet)
+                sharpe_train = bt_train.get("sharpe_ratio", 0)
+                score_test = composite_score(bt_test, sharpe_train, initial_wallet=self.initial_wallet)
+                if not is_adaptive and self.pruner is not None:
+                    skip_reason = self.pruner.reason(fold_count, _n_trades(bt_test),
+                                                     _max_drawdown(bt_test), score_test)
+                rows.append({
+                    "profile": profile,
+                    "fold": window.name,
+                    "combo_idx": combo_idx,
+                    "ma_window": ma_window,
+                    "envelopes": str(envelopes),
+                    "size": size,
+                    "stop_loss": stop_loss,
+                    "adaptive": is_adaptive,
+                    "train_wallet": bt_train["wallet"],
+                    "train_sharpe": sharpe_train,
+                    "train_score": score_train,
+                    "train_trades": _n_trades(bt_train),
+                    "test_wallet": bt_test["wallet"],
+                    "test_sharpe": bt_test.get("sharpe_ratio", 0),
+                    "test_score": score_test,
+                    "test_trades": _n_trades(bt_test),
+                })
+            if skip_reason is not None:
+                return rows, skip_reason
+        return rows, None
+
+    # -- Grids --
+
+    def evaluate_many(self, tasks: Sequence[tuple], max_workers: int = 1) -> List[Tuple[List[Dict[str, Any]], Optional[str]]]:
+        """
+        evaluate() of every task (tuple of its positional args), in task order.
+
+        Args:
+            max_workers: 1 runs in this process, more fans the tasks out
+                         over a process pool (the peak RSS of each worker
+                         is then left in self.worker_peak_rss_mb)
+        """
+        if max_workers > 1 and len(tasks) > 1:
+            # spawn (the Windows default everywhere): forking a parent that already
+            # runs numba's parallel threads can deadlock
+            with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"),
+                                     initializer=_init_worker, initargs=(self,)) as pool:
+                outcomes = list(pool.map(_evaluate_task, tasks))
+            self.worker_peak_rss_mb = {}
+            for _, pid, rss in outcomes:
+                previous = self.worker_peak_rss_mb.get(pid)
+                self.worker_peak_rss_mb[pid] = rss if previous is None else max(previous, rss or 0)
+            return [outcome for outcome, _, _ in outcomes]
+        return [self.evaluate(*task) for task in tasks]
+
+    def run(self, grid: Sequence[Config], pairs: Sequence[str], profile: str = "",
+            adaptive: bool = True, max_workers: int = 1, verbose: bool = False) -> pd.DataFrame:
+        """
+        Walk-forward of every config of `grid` on `pairs`.
+
+        Args:
+            max_workers: 1 runs in this process, more fans the configs out
+                         over a process pool
+
+        Returns:
+            DataFrame of result rows, in config then fold order
+        """
+        tasks = [(combo_idx, tuple(config), list(pairs), profile, adaptive)
+                 for combo_idx, config in enumerate(grid)]
+        outcomes = self.evaluate_many(tasks, max_workers)
+
+        rows = []
+        skipped = 0
+        for (combo_idx, *_), (config_rows, skip_reason) in zip(tasks, outcomes):
+            rows.extend(config_rows)
+            if skip_reason is not None:
+                skipped += 1
+                if verbose:
+                    print(f"      Config#{combo_idx + 1} skipped: {skip_reason}")
+        if verbose:
+            print(f"   {len(rows)} results for {profile or 'grid'}"
+                  + (f", {skipped} configs skipped (early termination)" if skipped else ""))
+        return pd.DataFrame(rows)
+
+    def run_profiles(self, param_grids_by_profile: Dict[str, Dict[str, list]],
+                     pair_profiles: Dict[str, str], pairs: Sequence[str], adaptive: bool = True,
+                     max_workers: int = 1, verbose: bool = False) -> Dict[str, pd.DataFrame]:
+        """
+        Walk-forward per profile, like CELL-19: each profile's grid
+        (ma_base_window x envelope_sets x size x stop_loss) on its pairs.
+
+        Returns:
+            dict profile -> result DataFrame (profiles without pairs are skipped)
+        """
+        results = {}
+        for profile, grid in param_grids_by_profile.items():
+            pairs_in_profile = [pair for pair in pairs if pair_profiles.get(pair) == profile]
+            if len(pairs_in_profile) == 0:
+                if verbose:
+                    print(f"No pair in profile {profile}, skip")
+                continue
+            combos = list(product(grid["ma_base_window"], grid["envelope_sets"],
+                                  grid["size"], grid["stop_loss"]))
+            results[profile] = self.run(combos, pairs_in_profile, profile=profile, adaptive=adaptive,
+                                        max_workers=max_workers, verbose=verbose)
+        return results
+
+
+# -- Process pool plumbing (the WalkForward is sent once per worker) --
+
+_worker_walk_forward: Optional[WalkForward] = None
+
+
+def _init_worker(walk_forward: WalkForward):
+    global _worker_walk_forward
+    _worker_walk_forward = walk_forward
+
+
+def _evaluate_task(task):
+    """evaluate() of a task, with the worker's pid and peak RSS so far."""
+    return _worker_walk_forward.evaluate(*task), os.getpid(), peak_rss_mb()
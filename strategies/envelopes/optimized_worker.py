@@ -2,12 +2,14 @@
 Worker function optimisé pour CPU multi-processing
 Utilise numpy views et mémoire partagée au lieu de DataFrames
 """
+import os
 import numpy as np
 import pandas as pd
 from multiprocessing import shared_memory
 from utilities.strategies.envelopeMulti_v2 import EnvelopeMulti_v2
 from core.params_adapter import FixedParamsAdapter, RegimeBasedAdapter
 from core import DEFAULT_PARAMS
+from utilities.memory import peak_rss_mb
 
 
 def prepare_data_for_worker(df_list, regime_series=None):
@@ -48,12 +50,13 @@ def prepare_data_for_worker(df_list, regime_series=None):
 
 def reconstruct_df_from_arrays(pair_data):
     """Reconstruit un DataFrame minimal depuis les arrays numpy"""
+    # Les arrays restent en float32 (pas de copie float64)
     df = pd.DataFrame({
         'open': pair_data['open'],
         'high': pair_data['high'],
         'low': pair_data['low'],
         'close': pair_data['close'],
-    }, index=pd.DatetimeIndex(pair_data['index']))
+    }, index=pd.DatetimeIndex(pair_data['index']), copy=False)
 
     if pair_data['ma_base'] is not None and len(pair_data['ma_base']) > 0:
         df['ma_base'] = pair_data['ma_base']
@@ -71,7 +74,8 @@ def run_backtest_optimized_worker(args):
         args: tuple (config, pairs_data_dict, params_coin, stop_loss, regime_data, is_adaptive)
 
     Returns:
-        dict: Métriques du backtest (pas les DataFrames complets)
+        dict: Métriques du backtest (pas les DataFrames complets), avec le pid
+              et le pic RSS (MB) du worker
     """
     config, pairs_data, params_coin, stop_loss, regime_data, is_adaptive = args
 
@@ -98,12 +102,13 @@ def run_backtest_optimized_worker(args):
     else:
         adapter = FixedParamsAdapter(params_coin)
 
-    # Exécuter backtest
+    # Exécuter backtest (mode compact : float32 + signaux uint8, pas de float64 reconstruit)
     strategy = EnvelopeMulti_v2(
         df_list=df_list,
         oldest_pair=oldest_pair,
         type=["long", "short"],
-        params=params_coin
+        params=params_coin,
+        compact=True
     )
 
     strategy.populate_indicators()
@@ -112,19 +117,24 @@ def run_backtest_optimized_worker(args):
     # Paramètres backtest
     from optimize_multi_envelope import BACKTEST_PARAMS, INITIAL_WALLET
 
+    # keep="metrics" : trades / days libérés dès la fin du backtest, seuls
+    # les scalaires de trade_summary() sont conservés
     result = strategy.run_backtest(
         **BACKTEST_PARAMS,
         stop_loss=stop_loss,
-        params_adapter=adapter
+        params_adapter=adapter,
+        keep="metrics"
     )
 
     # Retourner UNIQUEMENT les métriques (pas les gros DataFrames)
     return {
         'config': config,
-        'wallet': result['days']['wallet'].iloc[-1] if len(result['days']) > 0 else INITIAL_WALLET,
+        'wallet': result['last_day_wallet'] if result['n_days'] > 0 else INITIAL_WALLET,
         'sharpe': result.get('sharpe_ratio', 0),
-        'n_trades': len(result['trades']),
-        'max_dd': calculate_max_dd_fast(result['days']) if len(result['days']) > 0 else 0,
+        'n_trades': result['n_trades'],
+        'max_dd': result['day_max_drawdown_pct'],
+        'pid': os.getpid(),
+        'peak_rss_mb': peak_rss_mb(),
     }
 
 
@@ -150,7 +160,8 @@ def run_backtests_parallel_optimized(configs, df_list, regime_series=None, max_w
         max_workers: Nombre de workers
 
     Returns:
-        list: Résultats des backtests
+        list: Résultats des backtests (le pic RSS de chaque worker est affiché
+              à la fin, comme WalkForward.worker_peak_rss_mb)
     """
     from concurrent.futures import ProcessPoolExecutor, as_completed
     from tqdm.auto import tqdm
@@ -195,9 +206,26 @@ def run_backtests_parallel_optimized(configs, df_list, regime_series=None, max_w
                 print(f"Erreur backtest: {e}")
                 results.append(None)
 
+    worker_rss = worker_peak_rss_mb(results)
+    if worker_rss:
+        print("Pic RSS par worker : " + ", ".join(
+            f"{pid}={rss:.0f} MB" if rss is not None else f"{pid}=n/a" for pid, rss in worker_rss.items()))
+
     return results
 
 
+def worker_peak_rss_mb(results):
+    """pid -> pic RSS (MB) de chaque worker, depuis les résultats de run_backtest_optimized_worker"""
+    worker_rss = {}
+    for result in results:
+        if result is None:
+            continue
+        previous = worker_rss.get(result['pid'])
+        rss = result['peak_rss_mb']
+        worker_rss[result['pid']] = rss if previous is None else max(previous, rss or 0)
+    return worker_rss
+
+
 # Fonction helper pour batch processing
 def batch_configs(configs, batch_size=12):
     """Groupe les configs en batches pour processing optimisé"""
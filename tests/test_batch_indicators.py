@@ -0,0 +1,155 @@
+"""
+Panel-wide indicators (utilities/batch_indicators.py) vs the per-pair
+`ta` / custom_indicators versions.
+
+Covers:
+1. SMA / EMA / Bollinger with per-pair windows on a staggered panel with holes
+   (compiled kernels and pandas fallback)
+2. Trix (sma and ema signal) with mixed per-pair parameters, both paths
+3. pack() / unpack() round trip and parameter length checks
+4. IndicatorStore *_many() batches only the missing pairs and shares the cache
+5. IndicatorStore misses on different data with the same pair and dates
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+import pytest
+import ta
+
+from utilities import batch_indicators
+from utilities.custom_indicators import Trix
+from utilities.indicator_store import IndicatorStore
+from utilities.panel import build_panel
+
+PAIRS = ["BTC/USDT:USDT", "ETH/USDT:USDT", "SOL/USDT:USDT", "ADA/USDT:USDT", "XRP/USDT:USDT"]
+
+
+@pytest.fixture
+def panel():
+    full_index = pd.date_range("2024-01-01", periods=1500, freq="1h")
+    df_list = {}
+    for seed, pair in enumerate(PAIRS):
+        rng = np.random.default_rng(seed)
+        index = full_index[seed * 120:]
+        if seed % 2:
+            # Missing candles in the middle of the history
+            index = index.delete(np.arange(400, 430))
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(index))))
+        df_list[pair] = pd.DataFrame({"open": close, "high": close, "low": close,
+                                      "close": close, "volume": 1.0}, index=index)
+    return build_panel(df_list), df_list
+
+
+@pytest.fixture(params=["compiled", "pandas"])
+def engine(request, monkeypatch):
+    if request.param == "pandas":
+        monkeypatch.setattr(batch_indicators, "NUMBA_AVAILABLE", False)
+    return request.param
+
+
+def column(panel, values, pair):
+    """Matrix column of a pair, on the pair's own rows."""
+    rows = panel.index.get_indexer(panel.to_df_list()[pair].index)
+    return values[rows, panel.pairs.index(pair)]
+
+
+def assert_pairs_equal(panel, values, expected):
+    for pair, series in expected.items():
+        np.testing.assert_array_equal(column(panel, values, pair), series.to_numpy())
+    # Nothing outside the pairs' bars
+    assert np.isnan(values[~panel.mask]).all()
+
+
+def test_moving_averages_and_bollinger(panel, engine):
+    panel, df_list = panel
+    close = panel.field("close")
+    # Flat stretch: pandas returns the repeated value / a zero std there
+    close[300:400, 1] = close[299, 1]
+    for pair in PAIRS:
+        df_list[pair]["close"] = close[panel.mask[:, panel.pairs.index(pair)], panel.pairs.index(pair)]
+    windows = [20, 50, 1, 100, 50]
+    devs = [2.0, 2.25, 2.0, 1.5, 3.0]
+
+    assert_pairs_equal(panel, batch_indicators.sma(close, windows, mask=panel.mask), {
+        pair: ta.trend.sma_indicator(df_list[pair]["close"], window=w) for pair, w in zip(PAIRS, windows)})
+    assert_pairs_equal(panel, batch_indicators.ema(close, 30, mask=panel.mask), {
+        pair: ta.trend.ema_indicator(df_list[pair]["close"], window=30) for pair in PAIRS})
+
+    lower, higher, mavg = batch_indicators.bollinger(close, windows, devs, mask=panel.mask)
+    bands = {pair: ta.volatility.BollingerBands(df_list[pair]["close"], window=w, window_dev=d)
+             for pair, w, d in zip(PAIRS, windows, devs)}
+    assert_pairs_equal(panel, lower, {pair: b.bollinger_lband() for pair, b in bands.items()})
+    assert_pairs_equal(panel, higher, {pair: b.bollinger_hband() for pair, b in bands.items()})
+    assert_pairs_equal(panel, mavg, {pair: b.bollinger_mavg() for pair, b in bands.items()})
+
+
+def test_trix(panel, engine):
+    panel, df_list = panel
+    close = panel.field("close")
+    lengths = [9, 12, 9, 7, 12]
+    signal_lengths = [21, 15, 21, 10, 15]
+    signal_types = ["sma", "ema", "ema", "sma", "ema"]
+
+    pct, signal, histo = batch_indicators.trix(close, lengths, signal_lengths, signal_types, mask=panel.mask)
+    expected = {pair: Trix(df_list[pair]["close"], length, signal_length, signal_type)
+                for pair, length, signal_length, signal_type
+                in zip(PAIRS, lengths, signal_lengths, signal_types)}
+    assert_pairs_equal(panel, pct, {pair: t.get_trix_pct_line() for pair, t in expected.items()})
+    assert_pairs_equal(panel, signal, {pair: t.get_trix_signal_line() for pair, t in expected.items()})
+    assert_pairs_equal(panel, histo, {pair: t.get_trix_histo() for pair, t in expected.items()})
+
+    with pytest.raises(ValueError):
+        batch_indicators.trix(close, 9, 21, "wma", mask=panel.mask)
+
+
+def test_pack_round_trip(panel):
+    panel, _ = panel
+    close = panel.field("close")
+    packed, order, counts = batch_indicators.pack(close, panel.mask)
+
+    assert list(counts) == [len(df) for df in panel.to_df_list().values()]
+    assert not np.isnan(packed[:counts.min()]).any()
+    np.testing.assert_array_equal(batch_indicators.unpack(packed, order, counts), close)
+
+    with pytest.raises(ValueError):
+        batch_indicators.sma(close, [20, 50], mask=panel.mask)
+
+
+def test_indicator_store_many(panel):
+    panel, df_list = panel
+    closes = {pair: df["close"] for pair, df in df_list.items()}
+    store = IndicatorStore()
+    single = store.bollinger(PAIRS[0], closes[PAIRS[0]], window=20, window_dev=2.0)
+
+    bands = store.bollinger_many(closes, {pair: (20, 2.0) for pair in PAIRS})
+    assert (store.hits, store.misses) == (1, len(PAIRS))
+    assert bands[PAIRS[0]] is single
+    for pair in PAIRS[1:]:
+        expected = IndicatorStore().bollinger(pair, closes[pair], window=20, window_dev=2.0)
+        for values, reference in zip(bands[pair], expected):
+            np.testing.assert_array_equal(values, reference)
+
+    long_mas = store.sma_many(closes, {pair: 50 for pair in PAIRS})
+    np.testing.assert_array_equal(long_mas[PAIRS[1]], store.sma(PAIRS[1], closes[PAIRS[1]], window=50))
+
+
+def test_indicator_store_keyed_on_content(panel):
+    panel, df_list = panel
+    close = df_list[PAIRS[0]]["close"]
+    store = IndicatorStore()
+    _, _, mavg = store.bollinger("BTC", close, window=20, window_dev=2)
+    _, _, scaled = store.bollinger("BTC", close * 3, window=20, window_dev=2)
+    assert store.misses == 2
+    np.testing.assert_allclose(scaled, mavg * 3)
+
+    # Same pair, dates and params, another source column (open = previous close)
+    store.bollinger_many({"BTC": close}, {"BTC": (20, 2)})
+    assert store.hits == 1
+    opens = {"BTC": close.shift(1).fillna(close.iloc[0])}
+    from_open = store.bollinger_many(opens, {"BTC": (20, 2)})["BTC"]
+    assert store.misses == 3
+    assert not np.array_equal(from_open[2], mavg, equal_nan=True)
+    assert store.bollinger("BTC", close.copy(), window=20, window_dev=2)[2] is mavg
@@ -0,0 +1,85 @@
+"""
+Tests for the benchmark regression gate (benchmarks/regression.py).
+
+Covers:
+1. Verdicts from the bootstrap interval of the speedup (regression,
+   improvement, noise within the threshold)
+2. Per-commit history: runs of a commit merged, rows ordered by run date
+3. BenchmarkPalier1 result files and the compare command's exit code
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+
+import numpy as np
+import pytest
+
+from benchmarks import regression
+
+
+def report(commit, timestamp, medians, seed=0, noise=0.01, repeat=7, dirty=False):
+    rng = np.random.default_rng(seed)
+    results = []
+    for name, median in medians.items():
+        times = list(median * (1 + noise * rng.standard_normal(repeat)))
+        results.append({"name": name, "scale": "small", "bars_pairs": 1000, "times_s": times,
+                        "median_s": float(np.median(times)), "peak_mem_mb": 1.0})
+    return {"environment": {"commit": commit, "timestamp": timestamp, "dirty": dirty},
+            "config": {}, "results": results}
+
+
+def test_verdicts():
+    baseline = report("a" * 40, "2025-01-01T00:00:00", {"slow": 1.0, "fast": 1.0, "same": 1.0, "noisy": 1.0})
+    candidate = report("b" * 40, "2025-01-02T00:00:00", {"slow": 1.25, "fast": 0.5, "same": 1.01, "noisy": 0.97},
+                       seed=1)
+    table = regression.compare(baseline, candidate, threshold=0.05).set_index("benchmark")
+
+    assert table.loc["slow@small", "verdict"] == "regression"
+    assert table.loc["slow@small", "ci_high"] < 0.95
+    assert table.loc["fast@small", "verdict"] == "improvement"
+    assert table.loc["fast@small", "speedup"] == pytest.approx(2.0, rel=0.05)
+    assert table.loc["same@small", "verdict"] == "unchanged"
+    assert table.loc["noisy@small", "verdict"] == "unchanged"
+    for row in table.itertuples():
+        assert row.ci_low <= row.speedup <= row.ci_high
+
+    assert regression.speedup_interval([2.0], [1.0]) == (2.0, 2.0, 2.0)
+
+
+def test_history_per_commit(tmp_path):
+    history_dir = str(tmp_path)
+    first = regression.record(report("a" * 40, "2025-01-01T00:00:00", {"bt": 1.0}), history_dir)
+    again = regression.record(report("a" * 40, "2025-01-01T01:00:00", {"bt": 1.0, "load": 0.1}, seed=2),
+                              history_dir)
+    latest = regression.record(report("b" * 40, "2025-01-02T00:00:00", {"bt": 0.8}), history_dir)
+    regression.record(report("b" * 40, "2025-01-03T00:00:00", {"bt": 0.9}, dirty=True), history_dir)
+
+    assert first == again and os.path.basename(first) == "aaaaaaaaaa.json"
+    merged = regression.load_report(first)
+    assert len(merged["runs"]) == 2
+    by_name = {regression.benchmark_id(r): r for r in merged["results"]}
+    assert len(by_name["bt@small"]["times_s"]) == 14 and len(by_name["load@small"]["times_s"]) == 7
+
+    table = regression.history(history_dir)
+    assert list(table["commit"]) == ["aaaaaaaaaa", "aaaaaaaaaa", "bbbbbbbbbb", "bbbbbbbbbb-dirty"]
+    assert list(table["samples"][:2]) == [14, 7]
+    assert regression.find_baseline(history_dir, exclude=latest).endswith("bbbbbbbbbb-dirty.json")
+    assert regression.find_baseline(history_dir, commit="aaaa") == first
+
+
+def test_palier1_files_and_exit_code(tmp_path, monkeypatch):
+    palier1 = tmp_path / "benchmark_results.json"
+    palier1.write_text(json.dumps({"timestamp": "2025-01-01T00:00:00",
+                                   "tests": [{"name": "Sans cache (recalcul)", "time_seconds": 2.0}]}))
+    loaded = regression.load_report(str(palier1))
+    assert loaded["results"][0]["times_s"] == [2.0]
+
+    base, cand = tmp_path / "base.json", tmp_path / "cand.json"
+    base.write_text(json.dumps(report("a" * 40, "2025-01-01", {"bt": 1.0})))
+    cand.write_text(json.dumps(report("b" * 40, "2025-01-02", {"bt": 1.5}, seed=1)))
+    monkeypatch.setattr(sys, "argv", ["regression.py", "compare", str(base), str(cand)])
+    assert regression.main() == 1
+    monkeypatch.setattr(sys, "argv", ["regression.py", "compare", str(cand), str(base)])
+    assert regression.main() == 0
@@ -0,0 +1,104 @@
+"""
+Equivalence tests: BollingerTrendMultiFast (array engine) vs BollingerTrendMulti (reference).
+
+Covers:
+1. Long/short without VaR gating (max_var=0), staggered listings
+2. VaR gating active (covariance refreshed every 1001 bars, entries rejected)
+3. Batched VaR equals the per-portfolio get_var()
+4. IndicatorStore reuse across runs
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utilities.VaR import ValueAtRisk
+from utilities.indicator_store import IndicatorStore
+from utilities.strategies.boltrend_multi import BollingerTrendMulti
+from utilities.strategies.boltrend_multi_fast import BollingerTrendMultiFast
+
+PAIRS = ["BTC/USDT:USDT", "ETH/USDT:USDT", "SOL/USDT:USDT", "ADA/USDT:USDT", "XRP/USDT:USDT"]
+
+
+def make_df_list(periods=2600):
+    df_list = {}
+    common = np.random.default_rng(42).normal(0, 0.008, periods)
+    for seed, pair in enumerate(PAIRS):
+        rng = np.random.default_rng(seed)
+        start = seed * 150  # staggered listings
+        index = pd.date_range("2023-01-01", periods=periods, freq="1h")[start:]
+        returns = (common + rng.normal(0, 0.008, periods))[start:]
+        close = 100 * np.exp(np.cumsum(returns))
+        df_list[pair] = pd.DataFrame({
+            "open": close, "high": close * 1.005, "low": close * 0.995,
+            "close": close, "volume": 1.0,
+        }, index=index)
+    return df_list
+
+
+def make_params():
+    return {
+        pair: {"bb_window": 20 + 5 * i, "bb_std": 2.0, "long_ma_window": 100, "wallet_exposure": 0.3}
+        for i, pair in enumerate(PAIRS)
+    }
+
+
+def run(cls, max_var, **kwargs):
+    strat = cls(df_list=make_df_list(), oldest_pair=PAIRS[0], parameters_obj=make_params(),
+                type=["long", "short"], **kwargs)
+    strat.populate_indicators()
+    strat.populate_buy_sell()
+    return strat.run_backtest(initial_wallet=1000, leverage=1.6, max_var=max_var,
+                              maker_fee=0.00017, taker_fee=0.00051)
+
+
+@pytest.mark.parametrize("max_var", [0, 0.05])
+def test_bollinger_fast_matches_reference(max_var):
+    reference = run(BollingerTrendMulti, max_var)
+    fast = run(BollingerTrendMultiFast, max_var)
+
+    assert len(reference["trades"]) > 50
+    pd.testing.assert_frame_equal(fast["trades"], reference["trades"])
+    pd.testing.assert_frame_equal(fast["days"], reference["days"])
+    assert fast["wallet"] == reference["wallet"]
+
+
+def test_var_gating_rejects_entries():
+    without_var = run(BollingerTrendMultiFast, 0)
+    with_var = run(BollingerTrendMultiFast, 0.05)
+    assert len(with_var["trades"]) < len(without_var["trades"])
+    assert with_var["days"]["risk"].max() > 0
+
+
+def test_get_var_batch_matches_get_var():
+    df_list = make_df_list()
+    for df in df_list.values():
+        df["iloc"] = range(len(df))
+    var = ValueAtRisk(df_list=df_list)
+    var.update_cov(current_date=df_list[PAIRS[0]].index[-1], occurance_data=1000)
+
+    rng = np.random.default_rng(0)
+    exposures = rng.choice([0.0, 0.3, 0.6], size=(20, 2 * len(PAIRS)))
+    exposures[0] = 0.0
+    batch = var.get_var_batch(exposures)
+    for row, risk in zip(exposures, batch):
+        positions = {pair: {"long": row[2 * i], "short": row[2 * i + 1]} for i, pair in enumerate(PAIRS)}
+        expected = var.get_var(positions)
+        assert var.get_var_from_exposure(row) == expected
+        assert risk == pytest.approx(expected, rel=1e-9, abs=1e-12)
+    assert batch[0] == 0
+
+
+def test_indicator_store_shared_between_runs():
+    store = IndicatorStore()
+    first = run(BollingerTrendMultiFast, 0, indicator_store=store)
+    misses = store.misses
+    second = run(BollingerTrendMultiFast, 0, indicator_store=store)
+
+    assert misses == 2 * len(PAIRS)
+    assert store.misses == misses
+    assert store.hits == 2 * len(PAIRS)
+    assert second["wallet"] == first["wallet"]
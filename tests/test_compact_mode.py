@@ -0,0 +1,76 @@
+"""
+Tests for the compact-memory mode of EnvelopeMulti_v2.
+
+Covers:
+1. Compact frames: float32 prices/indicators, uint8 signal bits, no pair/null columns
+2. Same trades as the float64 pipeline on well-separated signals
+3. Memory per pair-year reduced
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from utilities.memory import estimate_universe_mb, strategy_memory
+from utilities.strategies.envelopeMulti_v2 import EnvelopeMulti_v2
+
+PAIRS = ["BTC/USDT:USDT", "ETH/USDT:USDT", "SOL/USDT:USDT"]
+
+
+def make_df_list(periods=24 * 120):
+    df_list = {}
+    for seed, pair in enumerate(PAIRS):
+        rng = np.random.default_rng(seed)
+        index = pd.date_range("2023-01-01", periods=periods, freq="1h")
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, periods)))
+        df_list[pair] = pd.DataFrame({
+            "open": close, "high": close * 1.012, "low": close * 0.988,
+            "close": close, "volume": 1000.0,
+        }, index=index)
+    return df_list
+
+
+def run(compact):
+    params = {p: {"src": "close", "ma_base_window": 7, "envelopes": [0.02, 0.04, 0.06], "size": 0.1}
+              for p in PAIRS}
+    strat = EnvelopeMulti_v2(df_list=make_df_list(), oldest_pair=PAIRS[0],
+                             type=["long", "short"], params=params, compact=compact)
+    strat.populate_indicators()
+    strat.populate_buy_sell()
+    memory = strategy_memory(strat)
+    result = strat.run_backtest(initial_wallet=1000, leverage=3, stop_loss=0.2)
+    return strat, memory, result
+
+
+def test_compact_frames_layout():
+    strat, _, _ = run(compact=True)
+    df = strat.df_list[PAIRS[0]]
+    assert df["close"].dtype == np.float32
+    assert df["ma_low_3"].dtype == np.float32
+    assert df["long_bits"].dtype == np.uint8
+    assert not any(col.startswith("open_long_") or col in ("pair", "null") for col in df.columns)
+    assert strat.signal_matrix.dtype == np.uint8
+    assert strat.signal_matrix.shape == (len(df), len(PAIRS))
+
+
+def test_compact_matches_standard():
+    _, memory_std, standard = run(compact=False)
+    _, memory_compact, compact = run(compact=True)
+
+    assert len(standard["trades"]) > 20
+    assert len(compact["trades"]) == len(standard["trades"])
+    assert (compact["trades"]["close_reason"] == standard["trades"]["close_reason"]).all()
+    assert not isinstance(compact["wallet"], np.float32)
+    assert abs(compact["wallet"] / standard["wallet"] - 1) < 1e-4
+
+    ratio = memory_compact["bytes_per_pair_year"] / memory_std["bytes_per_pair_year"]
+    print(f"\nStandard: {memory_std['bytes_per_pair_year'] / 1e6:.2f} MB/pair-year, "
+          f"compact: {memory_compact['bytes_per_pair_year'] / 1e6:.2f} MB/pair-year ({ratio:.0%})")
+    print(f"28 pairs x 5 years x 16 workers: "
+          f"{estimate_universe_mb(memory_std['bytes_per_pair_year'], workers=16):.0f} MB -> "
+          f"{estimate_universe_mb(memory_compact['bytes_per_pair_year'], workers=16):.0f} MB")
+    # Both modes hold the engine's panel and signal bits, the frames make the difference
+    assert memory_compact["panel"] < memory_std["panel"]
+    assert ratio < 0.6
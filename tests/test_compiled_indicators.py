@@ -0,0 +1,62 @@
+"""
+Compiled (numba) vs original loops of the path-dependent indicators in
+utilities/custom_indicators.py: outputs must be identical.
+
+Covers SuperTrend, MaSlope, heikinAshiDf and SmoothedHeikinAshi.
+"""
+import sys
+import os
+import warnings
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utilities.custom_indicators import MaSlope, SmoothedHeikinAshi, SuperTrend, heikinAshiDf
+
+
+@pytest.fixture
+def ohlc():
+    rng = np.random.default_rng(7)
+    n = 3000
+    index = pd.date_range("2023-01-01", periods=n, freq="1h")
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    return pd.DataFrame({
+        "open": np.r_[close[0], close[:-1]],
+        "high": close * (1 + rng.uniform(0, 0.01, n)),
+        "low": close * (1 - rng.uniform(0, 0.01, n)),
+        "close": close,
+        "volume": 1.0,
+    }, index=index)
+
+
+def legacy(func, *args, **kwargs):
+    # The original loops index Series by position (pandas FutureWarning)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", FutureWarning)
+        return func(*args, compiled=False, **kwargs)
+
+
+def test_supertrend_identical(ohlc):
+    fast = SuperTrend(ohlc["high"], ohlc["low"], ohlc["close"], atr_window=10, atr_multi=3)
+    slow = legacy(SuperTrend, ohlc["high"], ohlc["low"], ohlc["close"], atr_window=10, atr_multi=3)
+    pd.testing.assert_frame_equal(fast.st, slow.st)
+    assert fast.super_trend_direction().nunique() == 2
+
+
+def test_ma_slope_identical(ohlc):
+    fast = MaSlope(ohlc["close"], ohlc["high"], ohlc["low"], long_ma=200)
+    slow = legacy(MaSlope, ohlc["close"], ohlc["high"], ohlc["low"], long_ma=200)
+    pd.testing.assert_series_equal(fast.ma_line(), slow.ma_line())
+    pd.testing.assert_series_equal(fast.x_angle(), slow.x_angle())
+
+
+def test_heikin_ashi_identical(ohlc):
+    pd.testing.assert_frame_equal(heikinAshiDf(ohlc.copy()), legacy(heikinAshiDf, ohlc.copy()))
+
+    fast = SmoothedHeikinAshi(ohlc["open"], ohlc["high"], ohlc["low"], ohlc["close"])
+    slow = legacy(SmoothedHeikinAshi, ohlc["open"], ohlc["high"], ohlc["low"], ohlc["close"])
+    pd.testing.assert_series_equal(fast.smoothed_ha_open(), slow.smoothed_ha_open())
+    pd.testing.assert_series_equal(fast.smoothed_ha_close(), slow.smoothed_ha_close())
+    assert fast.smoothed_ha_open().notna().sum() > 2900
@@ -0,0 +1,180 @@
+"""
+Tests for the OHLCV catalogue index (utilities/data_catalog.py).
+
+Covers:
+1. Row count / first-last timestamp / gap ranges
+2. Incremental refresh (unchanged, appended, rewritten files)
+3. Gap checks through DataValidator without reading data
+4. Appends to a large file only read the checksum blocks and the new rows
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import warnings
+import numpy as np
+import pandas as pd
+import pytest
+
+from utilities import data_catalog
+from utilities.data_catalog import SAMPLE_BYTES, DataCatalog, find_gaps
+from utilities.validation import DataValidator
+
+HOUR_MS = 3600000
+
+
+def write_csv(path, timestamps, mode="w"):
+    df = pd.DataFrame({
+        "date": timestamps,
+        "open": 1.0, "high": 1.0, "low": 1.0, "close": 1.0, "volume": 1.0,
+    })
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, mode) as f:
+        df.to_csv(f, index=False, header=(mode == "w"))
+
+
+def make_catalog(tmp_path):
+    return DataCatalog(tmp_path / "binance", intervals_ms={"1h": HOUR_MS})
+
+
+def test_find_gaps():
+    ts = np.array([0, 1, 2, 5, 6, 9]) * HOUR_MS
+    assert find_gaps(ts, HOUR_MS) == [[3 * HOUR_MS, 4 * HOUR_MS], [7 * HOUR_MS, 8 * HOUR_MS]]
+    assert find_gaps(ts, None) == []
+
+
+def test_catalog_entry(tmp_path):
+    csv = tmp_path / "binance" / "1h" / "BTC-USDT-USDT.csv"
+    ts = [i * HOUR_MS for i in range(10) if i not in (4, 5)]
+    write_csv(csv, ts)
+
+    catalog = make_catalog(tmp_path).refresh()
+    entry = catalog.get("BTC/USDT:USDT", "1h")
+
+    assert entry["rows"] == 8
+    assert entry["first_ts"] == 0
+    assert entry["last_ts"] == 9 * HOUR_MS
+    assert entry["gaps"] == [[4 * HOUR_MS, 5 * HOUR_MS]]
+    assert entry["missing_bars"] == 2
+    assert (tmp_path / "binance" / "catalog.json").exists()
+
+    # Index is persisted and reloaded without scanning
+    reloaded = make_catalog(tmp_path)
+    assert reloaded.get("BTC/USDT:USDT", "1h") == entry
+
+
+def test_catalog_incremental_append(tmp_path):
+    csv = tmp_path / "binance" / "1h" / "ETH-USDT-USDT.csv"
+    write_csv(csv, [i * HOUR_MS for i in range(5)])
+    catalog = make_catalog(tmp_path).refresh()
+    checksum_before = catalog.get("ETH/USDT:USDT", "1h")["checksum"]
+
+    # Downloader appends (first appended row duplicates the last stored one)
+    write_csv(csv, [4 * HOUR_MS, 5 * HOUR_MS, 8 * HOUR_MS], mode="a")
+    entry = catalog.refresh().get("ETH/USDT:USDT", "1h")
+
+    assert entry["rows"] == 7
+    assert entry["last_ts"] == 8 * HOUR_MS
+    assert entry["gaps"] == [[6 * HOUR_MS, 7 * HOUR_MS]]
+    assert entry["checksum"] != checksum_before
+
+    # Same result as a full rescan from scratch
+    os.remove(tmp_path / "binance" / "catalog.json")
+    fresh = make_catalog(tmp_path).refresh().get("ETH/USDT:USDT", "1h")
+    for key in ("rows", "first_ts", "last_ts", "gaps", "missing_bars", "checksum"):
+        assert fresh[key] == entry[key]
+
+
+def test_catalog_append_reads_tail_only(tmp_path, monkeypatch):
+    csv = tmp_path / "binance" / "1h" / "BTC-USDT-USDT.csv"
+    write_csv(csv, [i * HOUR_MS for i in range(20_000)])
+    assert csv.stat().st_size > 8 * SAMPLE_BYTES
+    catalog = make_catalog(tmp_path).refresh()
+
+    bytes_read = []
+
+    class CountingFile:
+        def __init__(self, f):
+            self.f = f
+
+        def read(self, *args):
+            data = self.f.read(*args)
+            bytes_read.append(len(data))
+            return data
+
+        def __getattr__(self, name):
+            return getattr(self.f, name)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            self.f.close()
+
+    monkeypatch.setattr(data_catalog, "open", lambda *args, **kwargs: CountingFile(open(*args, **kwargs)),
+                        raising=False)
+    size_before = csv.stat().st_size
+    write_csv(csv, [i * HOUR_MS for i in range(20_000, 20_010)], mode="a")
+    entry = catalog.refresh(save=False).get("BTC/USDT:USDT", "1h")
+
+    assert entry["rows"] == 20_010
+    appended = csv.stat().st_size - size_before
+    assert sum(bytes_read) <= 4 * SAMPLE_BYTES + appended
+
+    # A rewrite of the first rows is not taken for an append
+    monkeypatch.undo()
+    content = csv.read_bytes()
+    first_line_end = content.index(b"\n") + 1
+    prepended = b"%d,1.0,1.0,1.0,1.0,1.0\n" % -HOUR_MS
+    csv.write_bytes(content[:first_line_end] + prepended + content[first_line_end:])
+    entry = catalog.refresh(save=False).get("BTC/USDT:USDT", "1h")
+    assert entry["rows"] == 20_011
+    assert entry["first_ts"] == -HOUR_MS
+
+
+def test_catalog_rewrite_and_delete(tmp_path):
+    csv = tmp_path / "binance" / "1h" / "SOL-USDT-USDT.csv"
+    write_csv(csv, [0, 3 * HOUR_MS])
+    catalog = make_catalog(tmp_path).refresh()
+    assert catalog.get("SOL/USDT:USDT", "1h")["missing_bars"] == 2
+
+    # Gap repaired by a rewrite of the file
+    write_csv(csv, [i * HOUR_MS for i in range(4)])
+    assert catalog.refresh().get("SOL/USDT:USDT", "1h")["gaps"] == []
+
+    os.remove(csv)
+    assert catalog.refresh().get("SOL/USDT:USDT", "1h") is None
+
+
+def test_catalog_dataframe(tmp_path):
+    write_csv(tmp_path / "binance" / "1h" / "BTC-USDT-USDT.csv", [0, HOUR_MS])
+    df = make_catalog(tmp_path).refresh().to_dataframe()
+    assert list(df.columns[:6]) == ["exchange", "timeframe", "pair", "occurences", "start_date", "end_date"]
+    assert df.iloc[0]["exchange"] == "binance"
+    assert df.iloc[0]["occurences"] == 2
+
+
+def test_validator_catalog_gaps(tmp_path):
+    write_csv(tmp_path / "binance" / "1h" / "BTC-USDT-USDT.csv", [0, HOUR_MS, 2 * HOUR_MS])
+    write_csv(tmp_path / "binance" / "1h" / "DOGE-USDT-USDT.csv", [0, 5 * HOUR_MS])
+    catalog = make_catalog(tmp_path).refresh()
+    pairs = ["BTC/USDT:USDT", "DOGE/USDT:USDT", "XRP/USDT:USDT"]
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        all_valid, errors = DataValidator.validate_catalog_gaps(catalog, pairs, "1h")
+    assert not all_valid
+    assert set(errors) == {"DOGE/USDT:USDT", "XRP/USDT:USDT"}
+    assert "4 missing bars" in errors["DOGE/USDT:USDT"][0]
+    assert len(caught) == 1
+
+    # Tolerance and period restriction
+    all_valid, _ = DataValidator.validate_catalog_gaps(
+        catalog, pairs[:2], "1h", max_missing_bars=4, on_gap="ignore")
+    assert all_valid
+    all_valid, _ = DataValidator.validate_catalog_gaps(
+        catalog, pairs[:2], "1h", start_date="1970-01-01 06:00", on_gap="ignore")
+    assert all_valid
+
+    with pytest.raises(ValueError):
+        DataValidator.validate_catalog_gaps(catalog, pairs[:2], "1h", on_gap="raise")
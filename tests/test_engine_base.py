@@ -0,0 +1,131 @@
+"""
+Tests for the shared multi-pair engine core (utilities/strategies/engine_base.py).
+
+Covers:
+1. PositionBook.to_close() iterates like the original engines' set construction
+2. A minimal strategy only supplying signals + sizing runs on df_list and on a DataPanel
+3. EnvelopeMulti_v2 on the engine: per-level bits of both modes match the signal columns
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from utilities.panel import build_panel
+from utilities.strategies.engine_base import SIGNAL_BITS, MultiPairEngine, PositionBook
+from utilities.strategies.envelopeMulti_v2 import EnvelopeMulti_v2
+
+PAIRS = ["BTC/USDT:USDT", "ETH/USDT:USDT", "SOL/USDT:USDT", "ADA/USDT:USDT"]
+
+
+def test_position_book_close_order():
+    rng = np.random.default_rng(0)
+    book = PositionBook()
+    current_positions = {}
+    for _ in range(200):
+        pair = PAIRS[rng.integers(len(PAIRS))]
+        if pair in book:
+            book.close(pair)
+            del current_positions[pair]
+        else:
+            position = {"side": "LONG" if rng.random() < 0.5 else "SHORT"}
+            book.open(pair, position)
+            current_positions[pair] = position
+        close_row = [p for p in PAIRS if rng.random() < 0.5]
+        for side in ("LONG", "SHORT"):
+            expected = set({k: v for k, v in current_positions.items() if v["side"] == side}).intersection(set(close_row))
+            assert list(book.to_close(side, close_row)) == list(expected)
+
+
+class MaCross(MultiPairEngine):
+    open_reason = "Market"
+    close_reason = "Market"
+
+    def populate_indicators(self):
+        for df in self.df_list.values():
+            df["ma"] = df["close"].rolling(20).mean()
+
+    def pair_signals(self, pair):
+        df = self.df_list[pair]
+        above = (df["close"] > df["ma"]).to_numpy()
+        below = (df["close"] < df["ma"]).to_numpy()
+        return {"open_long": above, "close_long": below, "open_short": below, "close_short": above}
+
+    def position_size(self, pair, wallet, leverage):
+        return 0.2 * wallet * leverage
+
+    def run_backtest(self, initial_wallet=1000, leverage=1):
+        wallet, recorder = self.run_engine(self._loop_index(), initial_wallet, leverage,
+                                           open_fee_rate=0.0005, close_fee_rate=0.0005,
+                                           valuation_fee_rate=0.0005)
+        return recorder.result(wallet)
+
+
+def make_df_list():
+    df_list = {}
+    for seed, pair in enumerate(PAIRS):
+        rng = np.random.default_rng(seed)
+        index = pd.date_range("2024-01-01", periods=1000, freq="1h")[seed * 50:]
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(index))))
+        df_list[pair] = pd.DataFrame({"open": close, "high": close, "low": close,
+                                      "close": close, "volume": 1.0}, index=index)
+    return df_list
+
+
+def run(df_list, oldest_pair):
+    strat = MaCross(df_list, oldest_pair, type=["long", "short"])
+    strat.populate_indicators()
+    strat.populate_buy_sell()
+    return strat.run_backtest(leverage=2)
+
+
+def test_minimal_strategy_runs():
+    result = run(make_df_list(), PAIRS[0])
+    trades = result["trades"]
+
+    assert len(trades) > 50
+    assert set(trades["pair"]) == set(PAIRS)
+    assert (trades["close_date"] > trades.index).all()
+    assert list(result["days"].columns) == ["day", "wallet", "price", "long_exposition",
+                                            "short_exposition", "risk"]
+
+    from_panel = run(build_panel(make_df_list()), None)
+    pd.testing.assert_frame_equal(from_panel["trades"], trades)
+    assert from_panel["wallet"] == result["wallet"]
+
+
+def envelope(df_list, compact):
+    params = {pair: {"src": "close", "ma_base_window": 5, "envelopes": [0.01, 0.02, 0.03], "size": 0.1}
+              for pair in PAIRS}
+    strat = EnvelopeMulti_v2(df_list, PAIRS[0], type=["long", "short"], params=params, compact=compact)
+    strat.populate_indicators()
+    strat.populate_buy_sell()
+    return strat
+
+
+def test_envelope_runs_on_engine():
+    df_list = make_df_list()
+    for df in df_list.values():
+        df["high"] = df["close"] * 1.02
+        df["low"] = df["close"] * 0.98
+    standard = envelope({pair: df.copy() for pair, df in df_list.items()}, compact=False)
+    compact = envelope({pair: df.copy() for pair, df in df_list.items()}, compact=True)
+    assert isinstance(standard, MultiPairEngine)
+
+    for col, pair in enumerate(PAIRS):
+        df = standard.df_list[pair]
+        rows = standard.panel.index.get_indexer(df.index)
+        for level in (1, 2, 3):
+            bit = 1 << (level - 1)
+            assert ((standard.level_bits["LONG"][rows, col] & bit) != 0).tolist() == df[f"open_long_{level}"].tolist()
+            assert ((standard.level_bits["SHORT"][rows, col] & bit) != 0).tolist() == df[f"open_short_{level}"].tolist()
+        opens = (standard.signal_matrix[rows, col] & SIGNAL_BITS["open_long"]) != 0
+        assert opens.tolist() == df["open_long_1"].tolist()
+    np.testing.assert_array_equal(compact.level_bits["LONG"], standard.level_bits["LONG"])
+    np.testing.assert_array_equal(compact.signal_matrix, standard.signal_matrix)
+
+    result = standard.run_backtest(initial_wallet=1000, leverage=2, stop_loss=0.2)
+    assert len(result["trades"]) > 20
+    assert set(result["trades"]["open_reason"]) >= {"Limit Envelop 1", "Limit Envelop 2"}
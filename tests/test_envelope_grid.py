@@ -0,0 +1,69 @@
+"""
+Tests for the single-pair Envelope grid scan (utilities/strategies/envelope_grid.py).
+
+Covers:
+1. Every grid row matches Envelope.run_backtest() (wallet, trades, metrics)
+2. Fixed-size mode (reinvest=False) and ohlc4 source
+3. Combinations without trades, unsorted envelope sets are rejected
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utilities.strategies.envelope import Envelope
+from utilities.strategies.envelope_grid import scan_envelope_grid
+
+
+def make_df(periods=24 * 90, seed=3):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range("2024-01-01", periods=periods, freq="1h")
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.012, periods)))
+    return pd.DataFrame({
+        "open": np.r_[close[0], close[:-1]],
+        "high": close * (1 + rng.uniform(0, 0.03, periods)),
+        "low": close * (1 - rng.uniform(0, 0.03, periods)),
+        "close": close, "volume": 1.0,
+    }, index=index)
+
+
+def reference(df, window, envelopes, **kwargs):
+    run_kwargs = {k: kwargs.pop(k) for k in ("leverage", "reinvest") if k in kwargs}
+    strat = Envelope(df.copy(), ma_base_window=window, envelopes=envelopes, **kwargs)
+    strat.populate_indicators()
+    strat.populate_buy_sell()
+    return strat.run_backtest(initial_wallet=1000, **run_kwargs)
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"type": ["long"]},
+    {"type": ["long", "short"], "leverage": 3},
+    {"type": ["short"], "reinvest": False, "leverage": 2, "src": "ohlc4"},
+])
+def test_grid_matches_envelope(kwargs):
+    df = make_df()
+    windows = [3, 5, 8]
+    envelope_sets = [[0.01, 0.02, 0.03], [0.015, 0.03]]
+    grid = scan_envelope_grid(df, windows, envelope_sets, **kwargs)
+
+    assert len(grid) == len(windows) * len(envelope_sets)
+    for row in grid.itertuples():
+        result = reference(df, row.ma_base_window, list(row.envelopes), **dict(kwargs))
+        assert result is not None
+        assert row.total_trades == result["total_trades"] > 10
+        assert row.wallet == pytest.approx(result["wallet"], rel=1e-12)
+        for metric in ("win_rate", "avg_profit", "max_drawdown", "sharpe_ratio"):
+            assert getattr(row, metric) == pytest.approx(result[metric], rel=1e-9)
+
+
+def test_grid_without_trades():
+    df = make_df(periods=200)
+    grid = scan_envelope_grid(df, [5], [[0.5]], type=["long"])
+    assert grid.loc[0, "total_trades"] == 0
+    assert grid.loc[0, "wallet"] == 1000
+    assert np.isnan(grid.loc[0, "sharpe_ratio"])
+    with pytest.raises(ValueError):
+        scan_envelope_grid(df, [5], [[0.05, 0.03]])
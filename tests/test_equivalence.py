@@ -0,0 +1,72 @@
+"""
+Tests for the engine-equivalence harness (utilities/equivalence.py).
+
+Covers:
+1. Compact mode equivalent to the reference loop on random cases (float32 tolerance)
+2. diff_results(): exact columns, per-kind tolerances, event counters
+3. A buggy engine is caught and its case shrunk to a minimal failing one
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dataclasses import replace
+
+import pytest
+
+from utilities.equivalence import (EquivalenceCase, Tolerances, assert_equivalent, check, compact_engine,
+                                   diff_results, minimise, reference_engine)
+
+CASE = EquivalenceCase(
+    seed=7, n_pairs=3, universe_bars=1200, stagger=100, regimes=("high_vol", "range"),
+    pairs=(0, 1, 2), window=(0, 1200), ma_base_window=7, envelopes=(0.01, 0.02), size=0.05,
+    backtest_params={"initial_wallet": 1000, "leverage": 2, "stop_loss": 0.1, "risk_mode": "scaling"},
+)
+
+
+def test_compact_engine_equivalent():
+    assert_equivalent(compact_engine, n_cases=3, seed=1, tolerances=Tolerances(rtol=1e-3), max_bars=800)
+
+
+def test_diff_results_tolerances():
+    reference = reference_engine(CASE.df_list(), CASE)
+    assert len(reference["trades"]) > 20
+    assert diff_results(reference, reference_engine(CASE.df_list(), CASE)) == []
+
+    candidate = dict(reference, trades=reference["trades"].copy(),
+                     event_counters=dict(reference["event_counters"]))
+    candidate["trades"].iloc[3, candidate["trades"].columns.get_loc("close_price")] *= 1 + 1e-6
+    mismatches = diff_results(reference, candidate)
+    assert [(m.section, m.row, m.column) for m in mismatches] == [("trades", 3, "close_price")]
+    assert diff_results(reference, candidate, Tolerances(price_rtol=1e-5)) == []
+
+    candidate["trades"].iloc[5, candidate["trades"].columns.get_loc("close_reason")] = "Liquidation"
+    candidate["event_counters"]["hit_stop_loss"] += 1
+    columns = {(m.section, m.column) for m in diff_results(reference, candidate, Tolerances(rtol=1e-3))}
+    assert columns == {("trades", "close_reason"), ("event_counters", "hit_stop_loss")}
+
+
+def drops_last_level(df_list, case):
+    """Bug: ignores the deepest envelope level."""
+    if len(case.envelopes) > 1:
+        case = replace(case, envelopes=case.envelopes[:-1])
+    return reference_engine(df_list, case)
+
+
+def test_buggy_engine_minimised():
+    minimal, mismatches = minimise(CASE, drops_last_level)
+    assert mismatches
+    assert len(minimal.pairs) == 1
+    assert minimal.envelopes == CASE.envelopes  # the bug needs two levels
+    assert minimal.window[1] - minimal.window[0] < 1200 / 2
+
+    failures = check(drops_last_level, cases=[CASE, minimal], shrink=False)
+    assert len(failures) == 2 and failures[0].minimal is CASE
+    with pytest.raises(AssertionError, match="minimal"):
+        assert_equivalent(drops_last_level, cases=[minimal], shrink=False)
+
+    def crashes(df_list, case):
+        raise RuntimeError("kernel failed")
+
+    failure, = check(crashes, cases=[minimal], shrink=False)
+    assert "kernel failed" in str(failure.mismatches[0])
@@ -0,0 +1,98 @@
+"""
+Tests for the backtest EventLog (utilities/logger.py).
+
+Covers:
+1. Exact counts, per-type sampling and buffer limit
+2. flush(): echo of the default types only, per-type echo cap, empty buffer
+3. KillSwitch and run_backtest emit events instead of printing
+4. Echoed events don't propagate to the "backtest" logger
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logging
+
+import pandas as pd
+
+from utilities.logger import EventLog, get_event_logger, in_worker_process
+from utilities.margin import KillSwitch
+from utilities.strategies.envelopeMulti_v2 import EnvelopeMulti_v2
+from utilities.synthetic_data import make_universe
+
+DATE = pd.Timestamp("2024-01-01 10:00")
+
+
+def test_sampling_and_limit():
+    log = EventLog(echo=False, sample={"cap_rejection": 10}, max_events=5)
+    for i in range(25):
+        log.emit("cap_rejection", DATE, "BTC/USDT:USDT", float(i), "Gross exposure")
+    for _ in range(4):
+        log.emit("stop_loss", DATE, "ETH/USDT:USDT", 1.0, "LONG")
+    assert log.counts["cap_rejection"] == 25 and log.counts["stop_loss"] == 4
+    # cap rejections 0, 10, 20 kept, then the buffer is full after 2 stops
+    frame = log.to_frame()
+    assert list(frame["value"][:3]) == [0.0, 10.0, 20.0]
+    assert len(frame) == 5 and log.dropped == 2
+
+
+def test_flush_echo():
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    logger = logging.getLogger("test_event_log")
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+    log = EventLog(echo=True, max_echo=2, logger=logger)
+    for hour in range(3):
+        log.emit("kill_switch_on", DATE + pd.Timedelta(hours=hour), value=-9.5, detail="day PnL")
+    log.emit("stop_loss", DATE, "BTC/USDT:USDT", 100.0, "LONG")
+    frame = log.flush()
+
+    messages = [record.getMessage() for record in records]
+    assert messages[0] == "Kill-switch TRIGGERED (day PnL: -9.50%) at 2024-01-01 10:00:00"
+    assert messages[-1] == "... 1 more kill_switch_on events"
+    assert len(messages) == 3  # stop losses are not echoed by default
+    assert len(frame) == 4 and log.events == []
+    assert not in_worker_process()
+
+
+def test_kill_switch_and_backtest_events(capsys):
+    log = EventLog(echo=False)
+    ks = KillSwitch(event_log=log)
+    ks.update(DATE, 1000, 1000)
+    assert ks.update(DATE + pd.Timedelta(minutes=30), 900, 1000)
+    ks.update(DATE + pd.Timedelta(hours=25), 900, 1000)
+    assert list(log.to_frame()["kind"]) == ["kill_switch_on", "kill_switch_off"]
+
+    df_list = make_universe(3, 2000, seed=1, regimes=("bull", "crash", "high_vol"))
+    params = {p: {"src": "close", "ma_base_window": 7, "envelopes": [0.03, 0.05], "size": 0.1} for p in df_list}
+    strat = EnvelopeMulti_v2(df_list=df_list, oldest_pair=next(iter(df_list)), type=["long", "short"], params=params)
+    strat.populate_indicators()
+    strat.populate_buy_sell()
+    capsys.readouterr()
+    run_log = EventLog(echo=False)
+    result = strat.run_backtest(initial_wallet=1000, leverage=100, stop_loss=0.05, event_log=run_log)
+    assert capsys.readouterr().out == ""
+    events = result["events"]
+    assert run_log.counts["extreme_leverage"] == 1
+    assert run_log.counts["liquidation"] > 0
+    assert (events["kind"] == "liquidation").sum() == run_log.counts["liquidation"]
+    assert run_log.counts["liquidation"] == (result["trades"]["close_reason"] == "Liquidation").sum()
+
+
+def test_echo_does_not_propagate():
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    parent = logging.getLogger("backtest")
+    parent.addHandler(handler)
+    try:
+        log = EventLog(echo=True)
+        log.emit("kill_switch_off", DATE)
+        log.flush()
+    finally:
+        parent.removeHandler(handler)
+    assert records == []
+    assert get_event_logger().propagate is False
@@ -0,0 +1,117 @@
+"""
+Tests for intrabar fill resolution (utilities/intrabar.py).
+
+Covers:
+1. First-touch lookups on lazily partitioned 1m data
+2. Entry + stop-loss inside the same 1h bar
+3. Stop-loss + close at ma_base inside the same 1h bar
+4. Default engine (intrabar=None) unchanged
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from utilities.intrabar import IntrabarResolver
+from utilities.resample import resample_ohlcv
+from utilities.strategies.envelopeMulti_v2 import EnvelopeMulti_v2
+
+PAIR = "BTC/USDT:USDT"
+PARAMS = {PAIR: {"src": "close", "ma_base_window": 3, "envelopes": [0.05], "size": 0.1}}
+
+
+def minute_path(hours):
+    """
+    Build 1m bars from a list of per-hour moves.
+
+    Each hour is a list of (minute, price) breakpoints; the price holds until
+    the next breakpoint.
+    """
+    prices = []
+    for moves in hours:
+        hour = np.empty(60)
+        for minute, price in moves:
+            hour[minute:] = price
+        prices.append(hour)
+    prices = np.concatenate(prices)
+    index = pd.date_range("2024-01-01", periods=len(prices), freq="1min", name="date")
+    return pd.DataFrame({"open": prices, "high": prices, "low": prices,
+                         "close": prices, "volume": 1.0}, index=index)
+
+
+def write_minutes(tmp_path, df_1m):
+    path = tmp_path / "binance" / "1m" / "BTC-USDT-USDT.csv"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    out = df_1m.copy()
+    out.index = out.index.asi8 // 1_000_000
+    out.to_csv(path, index_label="date")
+    return tmp_path / "binance"
+
+
+def run(df_1m, intrabar=None):
+    df_1h = resample_ohlcv(df_1m, "1h")
+    strat = EnvelopeMulti_v2(df_list={PAIR: df_1h}, oldest_pair=PAIR, type=["long"], params=PARAMS)
+    strat.populate_indicators()
+    strat.populate_buy_sell()
+    return strat.run_backtest(initial_wallet=1000, leverage=1, stop_loss=0.1,
+                              use_kill_switch=False, intrabar=intrabar)
+
+
+def test_first_touch(tmp_path):
+    df_1m = minute_path([[(0, 100)]] * 24 + [[(0, 100), (10, 94), (40, 80)]])
+    resolver = IntrabarResolver(write_minutes(tmp_path, df_1m))
+    bar = pd.Timestamp("2024-01-02 00:00")
+
+    assert resolver.first_touch(PAIR, bar, 95, "down") == bar.value // 1_000_000 + 10 * 60000
+    assert resolver.first_touch(PAIR, bar, 85, "down") == bar.value // 1_000_000 + 40 * 60000
+    assert resolver.first_touch(PAIR, bar, 101, "up") is None
+    assert resolver.first_event(PAIR, bar, 85, "down", 95, "down") == "b"
+    assert resolver.extreme_after(PAIR, bar, bar.value // 1_000_000, "low") == 80
+    # Unknown pair: no minute data, caller keeps bar-level logic
+    assert resolver.first_touch("ETH/USDT:USDT", bar, 95, "down") is None
+    assert (tmp_path / "binance" / "_intrabar" / "1m" / "BTC-USDT-USDT" / "2024-01.npz").exists()
+
+
+def test_entry_and_stop_same_bar(tmp_path):
+    # Hour 24: entry at 95 (minute 10) then crash through the stop (85.5) at minute 40
+    # Hour 25: instant recovery above ma_base
+    df_1m = minute_path([[(0, 100)]] * 24 + [[(0, 100), (10, 94), (40, 80)], [(0, 100)]] + [[(0, 100)]] * 3)
+
+    bar_level = run(df_1m)
+    assert bar_level["trades"].iloc[0]["close_reason"] == "Market"
+
+    resolver = IntrabarResolver(write_minutes(tmp_path, df_1m))
+    refined = run(df_1m, intrabar=resolver)
+    trade = refined["trades"].iloc[0]
+    assert trade["close_reason"] == "Stop Loss"
+    assert trade["close_date"] == pd.Timestamp("2024-01-02 00:00")
+    assert trade["close_price"] == 80
+    assert refined["event_counters"]["intrabar_same_bar_exits"] == 1
+
+
+def test_stop_and_close_same_bar(tmp_path):
+    # Hour 24: entry at 95, closes at 94 -> ma_base of hour 25 = 98
+    entry = [[(0, 100)]] * 24 + [[(0, 100), (10, 94)]]
+    # Hour 25 touches both ma_base (>= 98) and the stop (<= 85.5)
+    up_first = minute_path(entry + [[(0, 94), (5, 99), (30, 80)]] + [[(0, 80)]] * 3)
+    down_first = minute_path(entry + [[(0, 94), (5, 80), (30, 99)]] + [[(0, 99)]] * 3)
+
+    assert run(up_first)["trades"].iloc[0]["close_reason"] == "Stop Loss"
+
+    refined = run(up_first, intrabar=IntrabarResolver(write_minutes(tmp_path / "a", up_first)))
+    trade = refined["trades"].iloc[0]
+    assert trade["close_reason"] == "Market"
+    assert trade["close_price"] == 98
+    assert refined["event_counters"]["intrabar_close_first"] == 1
+
+    refined = run(down_first, intrabar=IntrabarResolver(write_minutes(tmp_path / "b", down_first)))
+    assert refined["trades"].iloc[0]["close_reason"] == "Stop Loss"
+    assert refined["event_counters"]["intrabar_close_first"] == 0
+
+
+def test_default_mode_has_no_intrabar_counters():
+    df_1m = minute_path([[(0, 100)]] * 24 + [[(0, 100), (10, 94)], [(0, 100)]])
+    result = run(df_1m)
+    assert "intrabar_refined_bars" not in result["event_counters"]
@@ -8,6 +8,8 @@ Tests des fonctions critiques :
 3. apply_close() - Fermeture avec fees
 4. check_exposure_caps() - Vérification des caps d'exposition
 5. KillSwitch - Pause trading sur drawdown
+6. BarKillSwitch / compute_pause_windows() - Mêmes pauses que KillSwitch
+7. MMRBrackets - MMR par tranche de notionnel
 """
 
 import sys
@@ -20,8 +22,15 @@ from utilities.margin import (
     apply_close,
     check_exposure_caps,
     get_mmr,
-    KillSwitch
+    KillSwitch,
+    BarKillSwitch,
+    compute_pause_windows,
+    MMRBrackets,
+    MMR_TABLE
 )
+from utilities.logger import EventLog
+import json
+import numpy as np
 import pandas as pd
 
 
@@ -421,6 +430,133 @@ def test_killswitch_unpause_after_24h():
     assert not is_paused, "Should be unpaused after 24h"
 
 
+# ============================================================================
+# Tests BarKillSwitch / compute_pause_windows()
+# ============================================================================
+
+def _equity_curve(seed, periods=24 * 60, freq="1h"):
+    """Equity avec des chutes brutales (pauses jour et heure)"""
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0, 0.01, periods)
+    crashes = rng.choice(periods, 15, replace=False)
+    returns[crashes] -= rng.uniform(0.05, 0.2, 15)
+    index = pd.date_range("2024-01-01", periods=periods, freq=freq)
+    return pd.Series(1000 * np.exp(np.cumsum(returns)), index=index)
+
+
+def _legacy_events(equity):
+    log = EventLog(echo=False)
+    ks = KillSwitch(event_log=log)
+    paused = [ks.update(dt, value, 1000) for dt, value in equity.items()]
+    return paused, log.to_frame()
+
+
+@pytest.mark.parametrize("seed,freq", [(0, "1h"), (1, "1h"), (2, "15min"), (3, "4h")])
+def test_bar_killswitch_matches_killswitch(seed, freq):
+    """Test 25: BarKillSwitch et compute_pause_windows() = KillSwitch bar par bar"""
+    equity = _equity_curve(seed, freq=freq)
+    paused, legacy = _legacy_events(equity)
+    assert (legacy["kind"] == "kill_switch_on").sum() >= 2
+
+    log = EventLog(echo=False)
+    bar_ks = BarKillSwitch(equity.index, event_log=log)
+    assert [bar_ks.update(i, value) for i, value in enumerate(equity)] == paused
+    pd.testing.assert_frame_equal(log.to_frame(), legacy)
+
+    windows = compute_pause_windows(equity)
+    triggers = legacy[legacy["kind"] == "kill_switch_on"]
+    assert list(windows["start"]) == list(triggers["date"])
+    assert list(windows["trigger"]) == list(triggers["detail"])
+    np.testing.assert_allclose(windows["pnl_pct"], triggers["value"])
+
+
+def test_pause_windows_gap():
+    """Test 26: Barre à 24h d'écart après une pause = même heure, pas de reset"""
+    index = pd.DatetimeIndex(["2024-01-01 10:00", "2024-01-01 10:30", "2024-01-02 10:30", "2024-01-02 10:45"])
+    equity = pd.Series([1000.0, 870.0, 890.0, 850.0], index=index)  # -15% vs 10:00, -4.5% vs reprise
+    paused, legacy = _legacy_events(equity)
+    windows = compute_pause_windows(equity)
+    assert paused == [False, True, False, True]
+    assert list(windows["start_bar"]) == [1, 3]
+    assert list(windows["resume_bar"]) == [2, 4]
+    assert len(compute_pause_windows(equity.iloc[:0])) == 0
+
+
+# ============================================================================
+# Tests MMRBrackets
+# ============================================================================
+
+# Format de /fapi/v1/leverageBracket (Binance), cum = maintenance continue aux bornes
+BRACKETS_SNAPSHOT = [
+    {"symbol": "BTCUSDT", "brackets": [
+        {"bracket": 1, "initialLeverage": 125, "notionalCap": 50000, "notionalFloor": 0,
+         "maintMarginRatio": 0.004, "cum": 0.0},
+        {"bracket": 2, "initialLeverage": 100, "notionalCap": 500000, "notionalFloor": 50000,
+         "maintMarginRatio": 0.005, "cum": 50.0},
+        {"bracket": 3, "initialLeverage": 50, "notionalCap": 10000000, "notionalFloor": 500000,
+         "maintMarginRatio": 0.01, "cum": 2550.0},
+    ]},
+]
+
+
+def test_mmr_brackets_flat_matches_get_mmr():
+    """Test 27: MMRBrackets.flat() = compute_liq_price() avec get_mmr()"""
+    brackets = MMRBrackets.flat()
+    for pair in ["BTC/USDT:USDT", "SOL/USDT:USDT", "RANDOM/USDT:USDT"]:
+        for side in ["LONG", "SHORT"]:
+            expected = compute_liq_price(100.0, side, 20, get_mmr(pair))
+            assert brackets.liq_price(100.0, side, 20, pair, notional=1e6) == expected
+    assert MMRBrackets.flat(MMR_TABLE).lookup("RANDOM/USDT:USDT", 10)[0] == MMR_TABLE["default"]
+
+
+def test_mmr_brackets_snapshot_lookup(tmp_path):
+    """Test 28: Snapshot JSON, tranche par notionnel, lookup scalaire = searchsorted"""
+    path = tmp_path / "brackets.json"
+    path.write_text(json.dumps(BRACKETS_SNAPSHOT))
+    brackets = MMRBrackets.from_json(str(path), default_mmr=0.02)
+
+    assert brackets.lookup("BTC/USDT:USDT", 10_000) == (0.004, 0.0, 125.0)
+    assert brackets.lookup("BTC/USDT:USDT", 50_000) == (0.005, 50.0, 100.0)
+    assert brackets.max_leverage("BTC/USDT:USDT", 2_000_000) == 50.0
+    assert brackets.lookup("ETH/USDT:USDT", 10_000)[0] == 0.02
+
+    notionals = np.array([1.0, 49_999.0, 50_000.0, 600_000.0, 5e7])
+    mmr, cum, leverage = brackets.lookup_many("BTC/USDT:USDT", notionals)
+    assert list(zip(mmr, cum, leverage)) == [brackets.lookup("BTC/USDT:USDT", n) for n in notionals]
+
+    # Maintenance continue à la borne, liq plus proche de l'entrée pour un gros notionnel
+    below, above = brackets.effective_mmr("BTC/USDT:USDT", 49_999.99), brackets.effective_mmr("BTC/USDT:USDT", 50_000)
+    assert abs(below * 49_999.99 - above * 50_000) < 1e-3
+    small = brackets.liq_price(50000, "LONG", 20, "BTC/USDT:USDT", notional=10_000)
+    large = brackets.liq_price(50000, "LONG", 20, "BTC/USDT:USDT", notional=5_000_000)
+    assert small == compute_liq_price(50000, "LONG", 20, 0.004)
+    assert small < large < 50000
+
+
+def test_mmr_brackets_backtest():
+    """Test 29: run_backtest(mmr_brackets=...) : flat = défaut, tranches hautes = liq plus tôt"""
+    from utilities.strategies.envelopeMulti_v2 import EnvelopeMulti_v2
+    from utilities.synthetic_data import make_universe
+
+    df_list = make_universe(2, 2000, seed=1, regimes=("bull", "crash", "high_vol"),
+                            pairs=["BTC/USDT:USDT", "SOL/USDT:USDT"])
+    params = {p: {"src": "close", "ma_base_window": 7, "envelopes": [0.03, 0.05], "size": 0.2} for p in df_list}
+    strat = EnvelopeMulti_v2(df_list=df_list, oldest_pair="BTC/USDT:USDT", type=["long", "short"], params=params)
+    strat.populate_indicators()
+    strat.populate_buy_sell()
+    kwargs = dict(initial_wallet=1000, leverage=20, stop_loss=0.5, use_kill_switch=False)
+
+    default = strat.run_backtest(**kwargs)
+    flat = strat.run_backtest(**kwargs, mmr_brackets=MMRBrackets.flat())
+    pd.testing.assert_frame_equal(flat["trades"], default["trades"])
+
+    tiered = strat.run_backtest(**kwargs, mmr_brackets=MMRBrackets(
+        {"default": [{"notionalFloor": 0, "maintMarginRatio": 0.01},
+                     {"notionalFloor": 100, "maintMarginRatio": 0.03, "cum": 2.0}]}))
+    n_liq = lambda r: (r["trades"]["close_reason"] == "Liquidation").sum()
+    assert n_liq(tiered) > n_liq(default)
+
+
 # ============================================================================
 # Exécution des tests
 # ============================================================================
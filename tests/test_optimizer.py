@@ -0,0 +1,138 @@
+"""
+Tests for the TPE optimiser (core/optimizer.py).
+
+Covers:
+1. TPE reaches the best grid result in fewer trials than the grid
+2. History file: failed trials recorded, resume continues the numbering
+3. Process pool: asynchronous trials all reported and persisted
+4. EnvelopeObjective = mean fixed test score of the walk-forward rows
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+from itertools import product
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.optimizer import (ChoiceParam, EnvelopeObjective, FloatParam, IntParam, TPEOptimizer,
+                            TPESampler)
+from core.walk_forward import WalkForward
+
+SPACE = {
+    "ma_base_window": IntParam(3, 30),
+    "envelope_mult": FloatParam(0.5, 2.0),
+    "stop_loss": FloatParam(0.05, 0.5, log=True),
+    "risk_mode": ChoiceParam(("neutral", "scaling", "hybrid")),
+}
+
+
+def bumpy(params):
+    """Smooth optimum at ma 17 / mult 1.23 / stop 0.12 / hybrid, noise-free."""
+    return -(((params["ma_base_window"] - 17) / 10) ** 2
+             + (params["envelope_mult"] - 1.23) ** 2
+             + np.log(params["stop_loss"] / 0.12) ** 2
+             + (0.0 if params["risk_mode"] == "hybrid" else 0.3))
+
+
+def failing(params):
+    if params["ma_base_window"] < 8:
+        raise RuntimeError("not enough bars")
+    return bumpy(params)
+
+
+def test_tpe_beats_grid():
+    grid = [dict(zip(SPACE, values)) for values in product(
+        [5, 10, 15, 20, 25], [0.6, 0.9, 1.2, 1.5, 1.8], [0.05, 0.1, 0.2, 0.4], ["neutral", "scaling", "hybrid"])]
+    grid_best = max(bumpy(params) for params in grid)
+
+    trials_to_best = []
+    for seed in range(3):
+        optimizer = TPEOptimizer(SPACE, bumpy, seed=seed)
+        optimizer.optimize(100)
+        values = [trial.value for trial in optimizer.trials]
+        reached = [i for i, value in enumerate(values, start=1) if value >= grid_best]
+        assert reached, f"seed {seed}: best {max(values):.4f} < grid {grid_best:.4f}"
+        trials_to_best.append(reached[0])
+    assert max(trials_to_best) < len(grid) / 2
+
+    # The model concentrates the late trials near the optimum
+    late = optimizer.trials[-20:]
+    assert np.mean([t.params["risk_mode"] == "hybrid" for t in late]) > 0.5
+    for trial in optimizer.trials:
+        assert 3 <= trial.params["ma_base_window"] <= 30
+        assert isinstance(trial.params["ma_base_window"], int)
+        assert 0.05 <= trial.params["stop_loss"] <= 0.5
+
+
+def test_history_and_resume(tmp_path):
+    path = str(tmp_path / "study.jsonl")
+    first = TPEOptimizer(SPACE, failing, history_path=path, seed=1, n_startup=5)
+    first.optimize(12)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"number": 12, "par')  # interrupted while writing
+
+    resumed = TPEOptimizer(SPACE, failing, history_path=path, seed=1, n_startup=5)
+    assert [t.to_json() for t in resumed.trials] == [t.to_json() for t in first.trials]
+    resumed.optimize(20)
+
+    assert [t.number for t in resumed.trials] == list(range(20))
+    failed = [t for t in resumed.trials if t.state == "fail"]
+    assert failed and all(t.value is None and "not enough bars" in t.error for t in failed)
+    assert resumed.best_trial().state == "complete"
+    reloaded = TPEOptimizer.load_history(path)
+    assert [t.number for t in reloaded] == list(range(20))
+    # Nothing left to run
+    assert len(TPEOptimizer(SPACE, failing, history_path=path).optimize(20)) == 20
+
+
+def test_process_pool(tmp_path):
+    path = str(tmp_path / "pool.jsonl")
+    reported = []
+    optimizer = TPEOptimizer(SPACE, bumpy, history_path=path, seed=0, n_startup=4)
+    optimizer.optimize(10, max_workers=2, callback=reported.append)
+
+    assert sorted(t.number for t in reported) == list(range(10))
+    with open(path, encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f]
+    assert [line["number"] for line in lines] == [t.number for t in reported]
+    for trial in reported:
+        assert trial.value == pytest.approx(bumpy(trial.params))
+
+
+def test_sampler_validation():
+    sampler = TPESampler({"envelopes": ChoiceParam(([0.05, 0.1], [0.07, 0.1, 0.15]))}, seed=0)
+    assert sampler.sample_random()["envelopes"] in ([0.05, 0.1], [0.07, 0.1, 0.15])
+    assert IntParam(3, 15, step=2).from_internal(6.2) == 7
+    assert IntParam(3, 15, step=2).from_internal(40) == 15
+
+
+def test_envelope_objective():
+    pairs = ["BTC/USDT:USDT", "ETH/USDT:USDT"]
+    df_list = {}
+    for seed, pair in enumerate(pairs):
+        rng = np.random.default_rng(seed)
+        index = pd.date_range("2024-01-01", "2024-02-10", freq="1h")
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.012, len(index))))
+        df_list[pair] = pd.DataFrame({"open": np.r_[close[0], close[:-1]], "high": close * 1.006,
+                                      "low": close * 0.994, "close": close, "volume": 1.0}, index=index)
+    folds = [{"train_start": "2024-01-01", "train_end": "2024-01-20", "test_start": "2024-01-21",
+              "test_end": "2024-01-31", "name": "Fold1"},
+             {"train_start": "2024-01-01", "train_end": "2024-01-31", "test_start": "2024-02-01",
+              "test_end": "2024-02-10", "name": "Fold2"}]
+    wf = WalkForward(df_list, df_list["BTC/USDT:USDT"], folds,
+                     {"initial_wallet": 1000, "leverage": 5, "risk_mode": "scaling"}, pruner=False)
+    objective = EnvelopeObjective(wf, pairs, base_envelopes=[0.02, 0.04])
+
+    params = {"ma_base_window": 5, "envelope_mult": 1.5, "size": 0.3, "stop_loss": 0.25}
+    assert objective.config(params) == (5, [0.03, 0.06], 0.3, 0.25)
+    rows = wf.run([objective.config(params)], pairs, adaptive=False)
+    assert objective(params) == pytest.approx(rows["test_score"].mean())
+
+    # Trial-level run_backtest kwargs reach the engine
+    capped = objective({**params, "envelopes": [0.02], "per_pair_cap": 0.01})
+    uncapped = objective({**params, "envelopes": [0.02]})
+    assert capped != uncapped
@@ -0,0 +1,102 @@
+"""
+Tests for the aligned multi-pair panel (utilities/panel.py).
+
+Covers:
+1. Alignment on the union of timestamps + validity mask
+2. ExchangeDataManager.load_panel() caching
+3. EnvelopeMulti_v2 fed with a panel gives the same backtest as with df_list
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from utilities.panel import build_panel, presence_mask
+from utilities.strategies.envelopeMulti_v2 import EnvelopeMulti_v2
+
+
+def make_pair(start, periods, base=100.0, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range(start, periods=periods, freq="1h", name="date")
+    close = base * np.exp(np.cumsum(rng.normal(0, 0.01, periods)))
+    return pd.DataFrame({
+        "open": close, "high": close * 1.01, "low": close * 0.99,
+        "close": close, "volume": 1.0,
+    }, index=index)
+
+
+def staggered_df_list():
+    btc = make_pair("2024-01-01", 300, seed=1)
+    eth = make_pair("2024-01-05", 200, base=50, seed=2)
+    eth = eth.drop(eth.index[50:60])  # hole in the listing
+    return {"BTC/USDT:USDT": btc, "ETH/USDT:USDT": eth}
+
+
+def test_build_panel_alignment():
+    df_list = staggered_df_list()
+    panel = build_panel(df_list)
+
+    assert panel.shape == (300, 2, 5)
+    assert panel.mask[:, 0].all()
+    assert panel.mask[:, 1].sum() == 190
+    assert not panel.mask[0, 1]
+    assert np.isnan(panel.field("close")[0, 1])
+    assert panel.oldest_pair() == "BTC/USDT:USDT"
+
+    pd.testing.assert_frame_equal(panel.pair_frame("ETH/USDT:USDT"), df_list["ETH/USDT:USDT"],
+                                  check_freq=False)
+
+    sub = panel.slice("2024-01-05", "2024-01-06 23:00")
+    assert len(sub.index) == 48
+    assert sub.mask[:, 1].all()
+
+    mask, col = presence_mask(df_list, df_list["BTC/USDT:USDT"].index)
+    np.testing.assert_array_equal(mask, panel.mask)
+    assert col == {"BTC/USDT:USDT": 0, "ETH/USDT:USDT": 1}
+
+
+def test_load_panel_cache(tmp_path):
+    from utilities.data_manager import ExchangeDataManager
+
+    for pair, df in staggered_df_list().items():
+        path = tmp_path / "binance" / "1h" / f"{pair.replace('/', '-').replace(':', '-')}.csv"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        out = df.copy()
+        out.index = out.index.asi8 // 1_000_000
+        out.to_csv(path, index_label="date")
+
+    exchange = ExchangeDataManager("binance", path_download=str(tmp_path))
+    pairs = ["BTC/USDT:USDT", "ETH/USDT:USDT"]
+    panel = exchange.load_panel(pairs, "1h")
+    # load_data drops the last bar of each pair
+    assert panel.mask.sum(axis=0).tolist() == [299, 189]
+    assert exchange.load_panel(pairs, "1h") is panel
+
+    # Rebuilt when a source file changes
+    btc_path = tmp_path / "binance" / "1h" / "BTC-USDT-USDT.csv"
+    btc_path.write_text(btc_path.read_text().rsplit("\n", 2)[0] + "\n")
+    assert exchange.load_panel(pairs, "1h") is not panel
+
+
+def test_envelope_from_panel_matches_df_list():
+    params = {
+        pair: {"src": "close", "ma_base_window": 5, "envelopes": [0.01, 0.02], "size": 0.1}
+        for pair in ("BTC/USDT:USDT", "ETH/USDT:USDT")
+    }
+
+    def run(df_list, oldest_pair):
+        strat = EnvelopeMulti_v2(df_list=df_list, oldest_pair=oldest_pair,
+                                 type=["long", "short"], params=params)
+        strat.populate_indicators()
+        strat.populate_buy_sell()
+        return strat.run_backtest(initial_wallet=1000, leverage=2, stop_loss=0.2)
+
+    reference = run(staggered_df_list(), "BTC/USDT:USDT")
+    from_panel = run(build_panel(staggered_df_list()), None)
+
+    assert len(reference["trades"]) > 0
+    assert from_panel["wallet"] == reference["wallet"]
+    pd.testing.assert_frame_equal(from_panel["trades"], reference["trades"])
+    assert from_panel["event_counters"] == reference["event_counters"]
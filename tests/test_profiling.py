@@ -0,0 +1,80 @@
+"""
+Tests for the run_backtest phase profiler (utilities/profiling.py).
+
+Covers:
+1. profile=True returns per-phase counters without changing the backtest
+2. A PhaseProfiler passed to several runs accumulates their counters
+3. Runs without closed trades return the profile and the event counters
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utilities.profiling import PHASES, PhaseProfiler
+from utilities.strategies.envelopeMulti_v2 import EnvelopeMulti_v2
+
+PAIRS = ["BTC/USDT:USDT", "ETH/USDT:USDT"]
+BACKTEST_PARAMS = {"initial_wallet": 1000, "leverage": 5, "stop_loss": 0.25, "risk_mode": "scaling"}
+
+
+@pytest.fixture(scope="module")
+def strategy():
+    df_list = {}
+    for seed, pair in enumerate(PAIRS):
+        rng = np.random.default_rng(seed)
+        index = pd.date_range("2024-01-01", "2024-01-31", freq="1h")
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.012, len(index))))
+        df_list[pair] = pd.DataFrame({"open": np.r_[close[0], close[:-1]], "high": close * 1.006,
+                                      "low": close * 0.994, "close": close, "volume": 1.0}, index=index)
+    params = {pair: {"src": "close", "ma_base_window": 5, "envelopes": [0.02, 0.04], "size": 0.06}
+              for pair in PAIRS}
+    strat = EnvelopeMulti_v2(df_list=df_list, oldest_pair=PAIRS[0], type=["long", "short"], params=params)
+    strat.populate_indicators()
+    strat.populate_buy_sell()
+    return strat
+
+
+def test_profile_counters(strategy):
+    plain = strategy.run_backtest(**BACKTEST_PARAMS)
+    profiled = strategy.run_backtest(**BACKTEST_PARAMS, profile=True)
+
+    assert "phase_profile" not in plain
+    pd.testing.assert_frame_equal(profiled["trades"], plain["trades"])
+    assert profiled["event_counters"] == plain["event_counters"]
+
+    profile = profiled["phase_profile"]
+    assert list(profile.index) == list(PHASES)
+    n_bars = len(strategy.df_list[PAIRS[0]])
+    for phase in ("equity_update", "liquidation_scan", "stop_loss_scan", "ma_base_close",
+                  "open_long", "open_short"):
+        assert profile.loc[phase, "calls"] == n_bars
+    assert profile.loc["daily_snapshot", "calls"] == 31
+    assert profile.loc["loop", "calls"] == 1
+    assert profile.loc["cap_checks", "calls"] > 0
+    assert profile.loc["intrabar_exits", "calls"] == 0
+    assert (profile["total_ms"] > 0).drop(["intrabar_exits"]).all()
+    assert profile.loc["loop", "share"] == pytest.approx(1.0)
+    assert profile.drop(["loop", "cap_checks"])["share"].sum() < 1.0
+
+
+def test_profiler_accumulates(strategy):
+    profiler = PhaseProfiler()
+    first = strategy.run_backtest(**BACKTEST_PARAMS, profile=profiler)["phase_profile"]
+    second = strategy.run_backtest(**BACKTEST_PARAMS, profile=profiler)["phase_profile"]
+    assert PhaseProfiler.resolve(profiler) is profiler
+    assert PhaseProfiler.resolve(False) is None
+    assert (second["calls"] == 2 * first["calls"]).all()
+    assert second.loc["loop", "total_ms"] > first.loc["loop", "total_ms"]
+    profiler.reset()
+    assert profiler.to_frame()["calls"].sum() == 0
+
+
+def test_profile_without_trades(strategy):
+    result = strategy.run_backtest(**BACKTEST_PARAMS, profile=True, window=(0, 3))
+    assert len(result["trades"]) == 0
+    assert result["phase_profile"].loc["loop", "calls"] == 1
+    assert set(result["event_counters"]) == set(strategy.run_backtest(**BACKTEST_PARAMS)["event_counters"])
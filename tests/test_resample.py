@@ -0,0 +1,124 @@
+"""
+Tests for timeframe resampling (utilities/resample.py).
+
+Covers:
+1. OHLCV aggregation and bucket alignment (epoch, weekly, monthly)
+2. Incomplete trailing bucket handling
+3. ExchangeDataManager.load_data() fallback to a base timeframe + npz cache
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utilities.resample import can_derive, read_ohlcv_csv, resample_ohlcv
+
+HOUR_MS = 3600000
+
+
+def make_ohlcv(start, periods, freq="1h", seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range(start, periods=periods, freq=freq, name="date")
+    close = 100 + rng.standard_normal(periods).cumsum()
+    open_ = np.r_[100, close[:-1]]
+    return pd.DataFrame({
+        "open": open_,
+        "high": np.maximum(open_, close) + rng.random(periods),
+        "low": np.minimum(open_, close) - rng.random(periods),
+        "close": close,
+        "volume": rng.random(periods) * 1000,
+    }, index=index)
+
+
+def write_csv(path, df):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    out = df.copy()
+    out.index = out.index.asi8 // 1_000_000
+    out.to_csv(path, index_label="date")
+
+
+def test_resample_aggregation():
+    df = make_ohlcv("2024-01-01 02:00", 30)
+    out = resample_ohlcv(df, "4h")
+
+    # First bucket is aligned on 00:00 UTC and only holds 02:00-03:00
+    assert out.index[0] == pd.Timestamp("2024-01-01 00:00")
+    assert out.index.name == "date"
+    bucket = df.loc["2024-01-01 04:00":"2024-01-01 07:00"]
+    row = out.loc["2024-01-01 04:00"]
+    assert row["open"] == bucket["open"].iloc[0]
+    assert row["high"] == bucket["high"].max()
+    assert row["low"] == bucket["low"].min()
+    assert row["close"] == bucket["close"].iloc[-1]
+    assert row["volume"] == pytest.approx(bucket["volume"].sum())
+
+    # Data ends at 07:00 on day 2: the 04:00 bucket is complete, nothing after it
+    assert out.index[-1] == pd.Timestamp("2024-01-02 04:00")
+    partial = resample_ohlcv(df.iloc[:-1], "4h")
+    assert partial.index[-1] == pd.Timestamp("2024-01-02 00:00")
+    kept = resample_ohlcv(df.iloc[:-1], "4h", drop_partial=False)
+    assert kept.index[-1] == pd.Timestamp("2024-01-02 04:00")
+
+
+def test_resample_calendar_and_gaps():
+    df = make_ohlcv("2024-01-03", 24 * 40)
+    weekly = resample_ohlcv(df, "1w")
+    assert (weekly.index.dayofweek == 0).all()
+    assert weekly.index[0] == pd.Timestamp("2024-01-01")
+    monthly = resample_ohlcv(df, "1M", drop_partial=False)
+    assert list(monthly.index) == [pd.Timestamp("2024-01-01"), pd.Timestamp("2024-02-01")]
+
+    # Missing source bars produce no empty bucket
+    holed = df.drop(df.loc["2024-01-05 00:00":"2024-01-05 23:00"].index)
+    daily = resample_ohlcv(holed, "1d")
+    assert pd.Timestamp("2024-01-05") not in daily.index
+    assert not daily.isna().any().any()
+
+
+def test_can_derive():
+    intervals_ms = {"1m": 60000, "1h": HOUR_MS, "4h": 4 * HOUR_MS, "12h": 12 * HOUR_MS,
+                    "1d": 24 * HOUR_MS, "1w": 168 * HOUR_MS, "1M": 2629746000}
+    assert can_derive("1h", "4h", intervals_ms)
+    assert can_derive("1m", "1M", intervals_ms)
+    assert not can_derive("4h", "1h", intervals_ms)
+    assert not can_derive("1h", "1h", intervals_ms)
+    assert not can_derive("1w", "1M", intervals_ms)
+
+
+def test_load_data_from_base_timeframe(tmp_path):
+    from utilities.data_manager import ExchangeDataManager
+
+    df_1h = make_ohlcv("2024-01-01", 24 * 10)
+    write_csv(tmp_path / "binance" / "1h" / "BTC-USDT-USDT.csv", df_1h)
+    exchange = ExchangeDataManager("binance", path_download=str(tmp_path))
+
+    df_4h = exchange.load_data("BTC/USDT:USDT", "4h", start_date="2024-01-02", end_date="2024-01-05")
+    expected = resample_ohlcv(read_ohlcv_csv(tmp_path / "binance" / "1h" / "BTC-USDT-USDT.csv"),
+                              "4h", drop_partial=False)
+    expected = expected.loc["2024-01-02":"2024-01-05"].iloc[:-1]
+    pd.testing.assert_frame_equal(df_4h, expected, check_freq=False)
+
+    cache = tmp_path / "binance" / "_resampled" / "4h" / "BTC-USDT-USDT.1h.npz"
+    assert cache.exists()
+    # Second load comes from the cache and is identical
+    pd.testing.assert_frame_equal(
+        exchange.load_data("BTC/USDT:USDT", "4h", start_date="2024-01-02", end_date="2024-01-05"),
+        df_4h)
+
+    # Cache is invalidated when the source file changes
+    write_csv(tmp_path / "binance" / "1h" / "BTC-USDT-USDT.csv", df_1h * 2)
+    reloaded = exchange.load_data("BTC/USDT:USDT", "4h", start_date="2024-01-02", end_date="2024-01-05")
+    assert reloaded["volume"].sum() == pytest.approx(df_4h["volume"].sum() * 2)
+
+    # Native files keep priority unless a base timeframe is forced
+    native = make_ohlcv("2024-01-01", 10, freq="4h", seed=1)
+    write_csv(tmp_path / "binance" / "4h" / "BTC-USDT-USDT.csv", native)
+    assert len(exchange.load_data("BTC/USDT:USDT", "4h")) == 9
+    forced = ExchangeDataManager("binance", path_download=str(tmp_path), base_interval="1h")
+    assert len(forced.load_data("BTC/USDT:USDT", "4h")) == 59
+
+    with pytest.raises(FileNotFoundError):
+        exchange.load_data("BTC/USDT:USDT", "30m")
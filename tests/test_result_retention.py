@@ -0,0 +1,74 @@
+"""
+Tests for the result retention levels of run_backtest(keep=...).
+
+Covers:
+1. "summary" / "metrics" drop the frames and keep the scoring scalars
+2. composite_score() is the same on every retention level
+3. The fast engines accept keep, invalid levels raise
+4. Retained bytes and peak RSS instrumentation
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from core.walk_forward import composite_score
+from utilities.memory import peak_rss_mb, result_nbytes
+from utilities.strategies.envelopeMulti_v2 import EnvelopeMulti_v2
+from utilities.strategies.trixMulti_fast import TrixMultiFast
+from utilities.synthetic_data import make_universe
+
+BACKTEST = {"initial_wallet": 1000, "leverage": 3, "stop_loss": 0.2}
+
+
+def envelope(df_list):
+    params = {p: {"src": "close", "ma_base_window": 7, "envelopes": [0.02, 0.04, 0.06], "size": 0.1}
+              for p in df_list}
+    strat = EnvelopeMulti_v2(df_list=df_list, oldest_pair=next(iter(df_list)),
+                             type=["long", "short"], params=params)
+    strat.populate_indicators()
+    strat.populate_buy_sell()
+    return strat
+
+
+def test_keep_levels():
+    strat = envelope(make_universe(3, 3000, seed=2))
+    full = strat.run_backtest(**BACKTEST)
+    summary = strat.run_backtest(**BACKTEST, keep="summary")
+    metrics = strat.run_backtest(**BACKTEST, keep="metrics")
+
+    assert len(full["trades"]) > 20
+    assert "keep" not in full
+    assert "days" in summary and "trades" not in summary and "exposure_history" not in summary
+    assert not {"trades", "days", "exposure_history", "margin_history"} & set(metrics)
+    for result in (summary, metrics):
+        assert result["n_trades"] == len(full["trades"])
+        assert result["wallet"] == full["wallet"]
+        assert result["sharpe_ratio"] == full["sharpe_ratio"]
+        assert result["event_counters"] == full["event_counters"]
+        assert result["last_day_wallet"] == full["days"]["wallet"].iloc[-1]
+
+    assert composite_score(metrics) == composite_score(full)
+    assert composite_score(summary, 1.2) == composite_score(full, 1.2)
+    assert result_nbytes(metrics) < result_nbytes(summary) < result_nbytes(full)
+
+
+def test_keep_fast_engine_and_invalid():
+    df_list = make_universe(2, 2000, seed=3)
+    params = {p: {"trix_length": 9, "trix_signal_length": 21, "trix_signal_type": "ema",
+                  "long_ma_length": 200, "size": 0.1} for p in df_list}
+    strat = TrixMultiFast(df_list=df_list, oldest_pair=next(iter(df_list)), type=["long", "short"], params=params)
+    strat.populate_indicators()
+    strat.populate_buy_sell()
+    full = strat.run_backtest(initial_wallet=1000, leverage=2)
+    metrics = strat.run_backtest(initial_wallet=1000, leverage=2, keep="metrics")
+    assert "trades" not in metrics and metrics["n_trades"] == len(full["trades"])
+
+    with pytest.raises(ValueError):
+        envelope(make_universe(2, 500, seed=4)).run_backtest(**BACKTEST, keep="everything")
+
+
+def test_peak_rss():
+    rss = peak_rss_mb()
+    assert rss is None or rss > 1
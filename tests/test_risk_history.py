@@ -0,0 +1,88 @@
+"""
+Tests for the per-bar exposure / margin history of EnvelopeMulti_v2.
+
+Covers:
+1. RiskHistory: preallocated samples every `stride` bars, derived columns
+2. run_backtest fills exposure_history / margin_history without changing trades
+3. history_stride=None records nothing
+4. The history is returned by runs without closed trades
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utilities.strategies.engine_base import RiskHistory
+from utilities.strategies.envelopeMulti_v2 import EnvelopeMulti_v2
+from utilities.synthetic_data import make_universe
+
+BACKTEST = {"initial_wallet": 1000, "leverage": 3, "stop_loss": 0.2}
+
+
+def test_risk_history_recorder():
+    index = pd.date_range("2024-01-01", periods=10, freq="1h")
+    history = RiskHistory(index, stride=3)
+    positions = {"A": {"side": "LONG", "size": 100.0}, "B": {"side": "SHORT", "size": 40.0}}
+    for bar_i in range(7):
+        if history.due(bar_i):
+            history.record(bar_i, positions, used_margin=50.0, equity=1000.0 + bar_i)
+    assert len(history.bars) == 4
+
+    df_exposure, df_margin = history.frames()
+    assert list(df_exposure.index) == list(index[[0, 3, 6]])
+    assert (df_exposure["gross_exposure"] == 140.0).all()
+    assert list(df_margin["free_margin"]) == [950.0, 953.0, 956.0]
+    assert df_margin["margin_ratio"].iloc[0] == pytest.approx(0.05)
+
+    with pytest.raises(ValueError):
+        RiskHistory(index, stride=0)
+
+
+def test_backtest_history():
+    df_list = make_universe(3, 3000, seed=5)
+    params = {p: {"src": "close", "ma_base_window": 7, "envelopes": [0.02, 0.04, 0.06], "size": 0.1}
+              for p in df_list}
+    strat = EnvelopeMulti_v2(df_list=df_list, oldest_pair=next(iter(df_list)),
+                             type=["long", "short"], params=params)
+    strat.populate_indicators()
+    strat.populate_buy_sell()
+
+    per_bar = strat.run_backtest(**BACKTEST)
+    strided = strat.run_backtest(**BACKTEST, history_stride=24)
+    off = strat.run_backtest(**BACKTEST, history_stride=None)
+
+    pd.testing.assert_frame_equal(per_bar["trades"], off["trades"])
+    assert off["exposure_history"].empty and off["margin_history"].empty
+
+    df_exposure, df_margin = per_bar["exposure_history"], per_bar["margin_history"]
+    assert len(df_exposure) == len(df_margin) == 3000
+    assert df_margin["equity"].iloc[0] == 1000
+    assert (df_exposure["gross_exposure"] > 0).any()
+    np.testing.assert_allclose(df_margin["free_margin"], df_margin["equity"] - df_margin["used_margin"])
+    np.testing.assert_allclose(df_exposure["gross_exposure"],
+                               df_exposure["long_exposure"] + df_exposure["short_exposure"])
+
+    assert len(strided["margin_history"]) == 125
+    pd.testing.assert_frame_equal(strided["margin_history"], df_margin.iloc[::24])
+
+
+def test_history_without_closed_trades():
+    df_list = make_universe(3, 3000, seed=5)
+    params = {p: {"src": "close", "ma_base_window": 7, "envelopes": [0.02, 0.04, 0.06], "size": 0.1}
+              for p in df_list}
+    strat = EnvelopeMulti_v2(df_list=df_list, oldest_pair=next(iter(df_list)),
+                             type=["long", "short"], params=params)
+    strat.populate_indicators()
+    strat.populate_buy_sell()
+    trades = strat.run_backtest(**BACKTEST)["trades"]
+
+    # Stop before the first close: positions are open, none is closed
+    end = strat.df_list[strat.oldest_pair].index.get_loc(trades["close_date"].min())
+    result = strat.run_backtest(**BACKTEST, window=(0, end))
+    assert len(result["trades"]) == 0
+    assert len(result["margin_history"]) == end
+    assert (result["exposure_history"]["gross_exposure"] > 0).any()
+    assert (result["margin_history"]["used_margin"] > 0).any()
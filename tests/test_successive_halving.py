@@ -0,0 +1,84 @@
+"""
+Tests for the successive-halving scheduler (core/successive_halving.py).
+
+Covers:
+1. Same best config as the exhaustive walk-forward, with fewer backtests;
+   survivors have exactly the exhaustive rows
+2. Rung sizes follow eta / min_configs, invalid settings raise
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.successive_halving import SuccessiveHalving, config_scores
+from core.walk_forward import WalkForward
+
+PAIRS = ["BTC/USDT:USDT", "ETH/USDT:USDT"]
+FOLDS = [
+    {"train_start": "2024-01-01", "train_end": "2024-01-14", "test_start": "2024-01-15",
+     "test_end": "2024-01-24", "name": "Fold1"},
+    {"train_start": "2024-01-01", "train_end": "2024-01-24", "test_start": "2024-01-25",
+     "test_end": "2024-02-03", "name": "Fold2"},
+    {"train_start": "2024-01-01", "train_end": "2024-02-03", "test_start": "2024-02-04",
+     "test_end": "2024-02-13", "name": "Fold3"},
+]
+BACKTEST_PARAMS = {
+    "initial_wallet": 1000,
+    "leverage": 5,
+    "maker_fee": 0.0002,
+    "taker_fee": 0.0006,
+    "reinvest": True,
+    "liquidation": True,
+    "risk_mode": "scaling",
+}
+GRID = [(ma_window, envelopes, 0.3, 0.25)
+        for ma_window in (5, 10, 20)
+        for envelopes in ([0.01], [0.02, 0.04], [0.03])]
+
+
+@pytest.fixture(scope="module")
+def walk_forward():
+    df_list = {}
+    for seed, pair in enumerate(PAIRS):
+        rng = np.random.default_rng(seed + 10)
+        index = pd.date_range("2024-01-01", "2024-02-13", freq="1h")
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.012, len(index))))
+        df_list[pair] = pd.DataFrame({
+            "open": np.r_[close[0], close[:-1]], "high": close * 1.006,
+            "low": close * 0.994, "close": close, "volume": 1.0,
+        }, index=index)
+    return WalkForward(df_list, df_list["BTC/USDT:USDT"], FOLDS, BACKTEST_PARAMS, pruner=False)
+
+
+def test_same_best_config_fewer_backtests(walk_forward):
+    exhaustive = walk_forward.run(GRID, PAIRS, adaptive=False)
+    halving = SuccessiveHalving(walk_forward, eta=3)
+    results = halving.run(GRID, PAIRS, adaptive=False)
+
+    assert [rung["configs"] for rung in halving.rungs] == [9, 3, 1]
+    assert sum(rung["backtests"] for rung in halving.rungs) == 2 * (9 + 3 + 1)
+    assert 2 * len(exhaustive) == 2 * 9 * 3
+
+    expected_best = config_scores(exhaustive).sort_values(ascending=False, kind="stable").head(1)
+    pd.testing.assert_series_equal(halving.best(results), expected_best)
+    # Survivors carry exactly the exhaustive rows
+    survivors = results[results["combo_idx"].isin(halving.survivors)].reset_index(drop=True)
+    pd.testing.assert_frame_equal(
+        survivors, exhaustive[exhaustive["combo_idx"].isin(halving.survivors)].reset_index(drop=True))
+
+
+def test_rung_sizes(walk_forward):
+    halving = SuccessiveHalving(walk_forward, eta=2, rungs=[2], min_configs=2)
+    assert halving.rung_folds == [2, 3]
+    halving.run(GRID[:5], PAIRS, adaptive=False)
+    assert [(rung["configs"], rung["kept"]) for rung in halving.rungs] == [(5, 3), (3, 3)]
+    assert [rung["backtests"] for rung in halving.rungs] == [2 * 5 * 2, 2 * 3]
+
+    with pytest.raises(ValueError):
+        SuccessiveHalving(walk_forward, eta=1)
+    with pytest.raises(ValueError):
+        SuccessiveHalving(walk_forward, rungs=[4])
@@ -0,0 +1,95 @@
+"""
+Equivalence tests: TrixMultiFast (array engine) vs TrixMulti (reference).
+
+Covers:
+1. Multi-pair long/short with many same-bar signals (open order matters)
+2. Multi-timeframe combs (1h + 4h) with staggered listings
+3. start_date / end_date filtering
+4. window=(start_idx, end_idx) rows = the same dates, df_list left untouched
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utilities.panel import date_window
+from utilities.strategies.trixMulti import TrixMulti
+from utilities.strategies.trixMulti_fast import TrixMultiFast
+
+
+def make_ohlcv(start, periods, freq, seed):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range(start, periods=periods, freq=freq, name="date")
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, periods)))
+    return pd.DataFrame({
+        "open": np.r_[close[0], close[:-1]], "high": close * 1.005,
+        "low": close * 0.995, "close": close, "volume": 1.0,
+    }, index=index)
+
+
+def make_inputs():
+    df_list, params = {}, {}
+    specs = [
+        ("1h", "BTC", "2024-01-01", 2000),
+        ("1h", "ETH", "2024-01-01", 2000),
+        ("1h", "SOL", "2024-01-10", 1700),
+        ("4h", "BTC", "2024-01-01", 500),
+        ("4h", "ADA", "2024-01-15", 400),
+    ]
+    for seed, (tf, coin, start, periods) in enumerate(specs):
+        comb = f"{tf}-p-{coin}/USDT:USDT"
+        df_list[comb] = make_ohlcv(start, periods, tf, seed)
+        params[comb] = {
+            "trix_length": 7 + seed, "trix_signal_length": 9,
+            "trix_signal_type": "ema" if seed % 2 else "sma",
+            "long_ma_length": 50, "size": 0.15,
+        }
+    return df_list, params
+
+
+def make_strategy(cls, type=("long", "short")):
+    df_list, params = make_inputs()
+    strat = cls(df_list=df_list, oldest_pair="1h-p-BTC/USDT:USDT", type=list(type), params=params)
+    strat.populate_indicators()
+    strat.populate_buy_sell()
+    return strat
+
+
+def run(cls, start_date=None, end_date=None, type=("long", "short")):
+    strat = make_strategy(cls, type)
+    return strat.run_backtest(initial_wallet=1000, leverage=2, start_date=start_date, end_date=end_date)
+
+
+@pytest.mark.parametrize("kwargs", [
+    {},
+    {"type": ("long",)},
+    {"start_date": "2024-01-20", "end_date": "2024-03-01"},
+])
+def test_trix_fast_matches_reference(kwargs):
+    reference = run(TrixMulti, **kwargs)
+    fast = run(TrixMultiFast, **kwargs)
+
+    assert len(reference["trades"]) > 50
+    pd.testing.assert_frame_equal(fast["trades"], reference["trades"])
+    pd.testing.assert_frame_equal(fast["days"], reference["days"])
+    assert fast["wallet"] == reference["wallet"]
+
+
+@pytest.mark.parametrize("cls", [TrixMulti, TrixMultiFast])
+def test_window_matches_dates(cls):
+    strat = make_strategy(cls)
+    lengths = {comb: len(df) for comb, df in strat.df_list.items()}
+    window = date_window(strat.df_list[strat.oldest_pair].index, "2024-01-20", "2024-03-01")
+
+    by_window = strat.run_backtest(initial_wallet=1000, leverage=2, window=window)
+    by_dates = strat.run_backtest(initial_wallet=1000, leverage=2, start_date="2024-01-20", end_date="2024-03-01")
+    full = strat.run_backtest(initial_wallet=1000, leverage=2)
+
+    pd.testing.assert_frame_equal(by_window["trades"], by_dates["trades"])
+    pd.testing.assert_frame_equal(by_window["days"], by_dates["days"])
+    # The windowed runs did not truncate the data of the next run
+    assert {comb: len(df) for comb, df in strat.df_list.items()} == lengths
+    pd.testing.assert_frame_equal(full["trades"], run(cls)["trades"])
@@ -0,0 +1,96 @@
+"""
+Tests for the vectorised data validation (utilities/validation.py).
+
+Covers:
+1. validate_multi_pair_data() gives the messages of validate_ohlcv_dataframe()
+   (NaN, inf, high < low, close outside range, negative volume, gaps,
+   unsorted and empty frames)
+2. validate_panel(): per-pair counts and offending date ranges
+3. Fingerprint cache: hit on unchanged data, miss once the data changes
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utilities.panel import build_panel
+from utilities.validation import DataValidator, frame_fingerprint
+
+
+def make_df(seed, n=500):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range("2024-01-01", periods=n, freq="1h")
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    return pd.DataFrame({"open": np.r_[close[0], close[:-1]], "high": close * 1.01,
+                         "low": close * 0.99, "close": close, "volume": 1.0}, index=index)
+
+
+@pytest.fixture
+def df_list():
+    DataValidator.clear_cache()
+    clean = make_df(0)
+    dirty = make_df(1)
+    dirty.iloc[10:13, dirty.columns.get_loc("close")] = np.nan
+    dirty.iloc[40, dirty.columns.get_loc("open")] = np.inf
+    dirty.iloc[60, dirty.columns.get_loc("high")] = dirty["low"].iloc[60] * 0.9
+    dirty.iloc[80, dirty.columns.get_loc("volume")] = -1.0
+    dirty = dirty.drop(dirty.index[200:205])
+    unsorted = make_df(2).iloc[::-1]
+    return {"CLEAN": clean, "DIRTY": dirty, "UNSORTED": unsorted, "EMPTY": make_df(3).iloc[:0]}
+
+
+def test_same_messages_as_legacy(df_list):
+    expected = {}
+    for pair, df in df_list.items():
+        is_valid, errors = DataValidator.validate_ohlcv_dataframe(df, pair)
+        if not is_valid:
+            expected[pair] = errors
+
+    all_valid, errors = DataValidator.validate_multi_pair_data(df_list, use_cache=False)
+    assert not all_valid
+    assert errors == expected
+    assert set(errors) == {"DIRTY", "UNSORTED", "EMPTY"}
+    assert DataValidator.validate_multi_pair_data({"CLEAN": df_list["CLEAN"]}) == (True, {})
+
+
+def test_panel_report(df_list):
+    frames = {pair: df_list[pair] for pair in ("CLEAN", "DIRTY")}
+    report = DataValidator.validate_panel(build_panel(frames), use_cache=False)
+    _, expected = DataValidator.validate_multi_pair_data(frames, use_cache=False)
+
+    assert not report.valid
+    assert report.invalid_pairs() == ["DIRTY"]
+    assert report.errors() == expected
+    assert report.counts.loc["CLEAN"].sum() == 0
+    counts = report.counts.loc["DIRTY"]
+    assert (counts["nan_close"], counts["inf_open"], counts["high_lt_low"], counts["gaps"]) == (3, 1, 1, 1)
+
+    dirty = frames["DIRTY"]
+    ranges = report.ranges["DIRTY"]
+    assert ranges["nan_close"] == [(dirty.index[10], dirty.index[12])]
+    assert ranges["negative_volume"] == [(dirty.index[80], dirty.index[80])]
+    assert ranges["gaps"] == [(dirty.index[199], dirty.index[200])]
+
+
+def test_cache(df_list):
+    frames = {pair: df_list[pair] for pair in ("CLEAN", "DIRTY")}
+    panel = build_panel(frames)
+    first = DataValidator.validate_panel(panel)
+    assert DataValidator.validate_panel(panel) is first
+    assert DataValidator.validate_panel(build_panel(frames)) is first
+
+    changed = {pair: df.copy() for pair, df in frames.items()}
+    changed["CLEAN"].iloc[5, changed["CLEAN"].columns.get_loc("low")] = -1.0
+    assert frame_fingerprint(changed["CLEAN"]) != frame_fingerprint(frames["CLEAN"])
+    report = DataValidator.validate_panel(build_panel(changed))
+    assert report is not first
+    assert report.counts.loc["CLEAN", "non_positive_low"] == 1
+
+    _, errors = DataValidator.validate_multi_pair_data(frames)
+    assert DataValidator.validate_multi_pair_data(frames)[1] == errors
+    assert len(DataValidator._pair_cache) == 2
+    _, changed_errors = DataValidator.validate_multi_pair_data(changed)
+    assert "CLEAN" in changed_errors and "CLEAN" not in errors
@@ -0,0 +1,202 @@
+"""
+Tests for the walk-forward module (core/walk_forward.py).
+
+Covers:
+1. Same rows as the CELL-19 notebook loop (filter_df_list_by_dates copies,
+   regimes recomputed per config), fixed + adaptive, with early termination
+2. Process pool gives the same rows as the in-process run
+3. Fold windows are views: the shared arrays are never modified
+4. EnvelopeMulti_v2 run_backtest(window=...) on full-history indicators, and
+   the warm_indicators walk-forward built on it
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core import DEFAULT_PARAMS, calculate_regime_series
+from core.params_adapter import FixedParamsAdapter, RegimeBasedAdapter
+from core.walk_forward import Pruner, WalkForward, composite_score, max_drawdown_pct
+from utilities.panel import date_window
+from utilities.strategies.envelopeMulti_v2 import EnvelopeMulti_v2
+
+PAIRS = ["BTC/USDT:USDT", "ETH/USDT:USDT", "SOL/USDT:USDT"]
+FOLDS = [
+    {"train_start": "2024-01-01", "train_end": "2024-01-20", "test_start": "2024-01-21",
+     "test_end": "2024-01-31", "name": "Fold1"},
+    {"train_start": "2024-01-01", "train_end": "2024-01-31", "test_start": "2024-02-01",
+     "test_end": "2024-02-10", "name": "Fold2"},
+]
+BACKTEST_PARAMS = {
+    "initial_wallet": 1000,
+    "leverage": 5,
+    "maker_fee": 0.0002,
+    "taker_fee": 0.0006,
+    "reinvest": True,
+    "liquidation": True,
+    "risk_mode": "scaling",
+}
+GRID = [
+    (5, [0.02, 0.04], 0.3, 0.25),
+    (10, [0.03], 0.2, 0.25),
+    (400, [0.5], 0.2, 0.25),  # never trades: pruned after the first fold
+]
+
+
+def make_df_list():
+    df_list = {}
+    for seed, pair in enumerate(PAIRS):
+        rng = np.random.default_rng(seed)
+        index = pd.date_range("2024-01-01", "2024-02-10", freq="1h")[seed * 24:]
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.012, len(index))))
+        df_list[pair] = pd.DataFrame({
+            "open": np.r_[close[0], close[:-1]], "high": close * 1.006,
+            "low": close * 0.994, "close": close, "volume": 1.0,
+        }, index=index)
+    return df_list
+
+
+def reference_walk_forward(df_list_full, df_btc_full, grid, pairs):
+    """The CELL-19 loop, with the notebook's filtering and backtest helpers."""
+    def filter_df_by_dates(df, start_date, end_date):
+        mask = (df.index >= pd.Timestamp(start_date)) & (df.index <= pd.Timestamp(end_date))
+        return df[mask]
+
+    def run_single_backtest(df_list, params_coin, stop_loss, adapter):
+        oldest_pair = min(df_list, key=lambda p: df_list[p].index.min())
+        strategy = EnvelopeMulti_v2(df_list=df_list, oldest_pair=oldest_pair,
+                                    type=["long", "short"], params=params_coin)
+        strategy.populate_indicators()
+        strategy.populate_buy_sell()
+        return strategy.run_backtest(**BACKTEST_PARAMS, stop_loss=stop_loss, params_adapter=adapter)
+
+    rows = []
+    pruner = Pruner()
+    for combo_idx, (ma_window, envelopes, size, stop_loss) in enumerate(grid):
+        for fold_count, fold in enumerate(FOLDS, start=1):
+            regime = {}
+            frames = {}
+            for phase in ("train", "test"):
+                start, end = fold[f"{phase}_start"], fold[f"{phase}_end"]
+                frames[phase] = {p: filter_df_by_dates(df, start, end) for p, df in df_list_full.items() if p in pairs}
+                regime[phase] = calculate_regime_series(filter_df_by_dates(df_btc_full, start, end), confirm_n=12)
+            params_coin = {p: {"src": "close", "ma_base_window": ma_window, "envelopes": envelopes,
+                               "size": size / BACKTEST_PARAMS["leverage"]} for p in pairs}
+            skip = None
+            for adaptive in (False, True):
+                bt = {}
+                for phase in ("train", "test"):
+                    if adaptive:
+                        adapter = RegimeBasedAdapter(base_params=params_coin, regime_series=regime[phase],
+                                                     regime_params=DEFAULT_PARAMS,
+                                                     multipliers={"envelope_std": True}, base_std=0.10)
+                    else:
+                        adapter = FixedParamsAdapter(params_coin)
+                    bt[phase] = run_single_backtest(frames[phase], params_coin, stop_loss, adapter)
+                score_train = composite_score(bt["train"])
+                sharpe_train = bt["train"].get("sharpe_ratio", 0)
+                score_test = composite_score(bt["test"], sharpe_train)
+                if not adaptive:
+                    skip = pruner.reason(fold_count, len(bt["test"]["trades"]),
+                                         max_drawdown_pct(bt["test"]["days"]), score_test)
+                rows.append({
+                    "profile": "major", "fold": fold["name"], "combo_idx": combo_idx,
+                    "ma_window": ma_window, "envelopes": str(envelopes), "size": size,
+                    "stop_loss": stop_loss, "adaptive": adaptive,
+                    "train_wallet": bt["train"]["wallet"], "train_sharpe": sharpe_train,
+                    "train_score": score_train, "train_trades": len(bt["train"]["trades"]),
+                    "test_wallet": bt["test"]["wallet"], "test_sharpe": bt["test"].get("sharpe_ratio", 0),
+                    "test_score": score_test, "test_trades": len(bt["test"]["trades"]),
+                })
+            if skip is not None:
+                break
+    return pd.DataFrame(rows)
+
+
+@pytest.fixture(scope="module")
+def walk_forward():
+    df_list = make_df_list()
+    return WalkForward(df_list, df_list["BTC/USDT:USDT"], FOLDS, BACKTEST_PARAMS), df_list
+
+
+def test_matches_notebook_loop(walk_forward):
+    wf, df_list = walk_forward
+    pairs = ["BTC/USDT:USDT", "ETH/USDT:USDT"]
+    before = {pair: df.copy() for pair, df in df_list.items()}
+
+    results = wf.run_profiles({"major": {"ma_base_window": [10], "envelope_sets": [[0.03]],
+                                         "size": [0.3], "stop_loss": [0.25]},
+                               "mid-cap": {"ma_base_window": [5], "envelope_sets": [[0.03]],
+                                           "size": [0.3], "stop_loss": [0.25]}},
+                              {"BTC/USDT:USDT": "major", "ETH/USDT:USDT": "major", "SOL/USDT:USDT": "low"},
+                              pairs)
+    grid_results = wf.run(GRID, pairs, profile="major")
+    expected = reference_walk_forward(df_list, df_list["BTC/USDT:USDT"], GRID, pairs)
+
+    pd.testing.assert_frame_equal(grid_results, expected)
+    assert (expected["test_trades"] > 10).any()
+    # The never-trading config stops after its first fold
+    assert list(expected[expected["combo_idx"] == 2]["fold"]) == ["Fold1", "Fold1"]
+    # mid-cap has no pair in this universe
+    assert list(results) == ["major"]
+    assert set(results["major"]["ma_window"]) == {10}
+    # Shared arrays untouched by the runs
+    for pair, df in df_list.items():
+        pd.testing.assert_frame_equal(df, before[pair])
+        np.testing.assert_array_equal(wf.values[pair], before[pair].to_numpy())
+
+
+def test_process_pool_same_rows(walk_forward):
+    wf, _ = walk_forward
+    pairs = ["BTC/USDT:USDT", "SOL/USDT:USDT"]
+    sequential = wf.run(GRID[:2], pairs, adaptive=False)
+    pooled = wf.run(GRID[:2], pairs, adaptive=False, max_workers=2)
+    pd.testing.assert_frame_equal(pooled, sequential)
+    assert set(sequential["adaptive"]) == {False}
+    assert 1 <= len(wf.worker_peak_rss_mb) <= 2
+
+
+def test_envelope_window(walk_forward):
+    wf, df_list = walk_forward
+    pairs = ["BTC/USDT:USDT", "ETH/USDT:USDT"]
+    params_coin = wf.params_coin((5, [0.02, 0.04], 0.3, 0.25), pairs)
+    window = date_window(df_list[pairs[0]].index, "2024-01-21", "2024-01-31 23:00")
+
+    strategy = wf.history_strategy(pairs, params_coin)
+    by_window = strategy.run_backtest(**BACKTEST_PARAMS, stop_loss=0.25, window=window)
+    # Reference: same full-history indicators, data sliced after populate
+    reference = wf.history_strategy(pairs, params_coin)
+    reference.df_list = {pair: df.loc["2024-01-21":"2024-01-31 23:00"] for pair, df in reference.df_list.items()}
+    expected = reference.run_backtest(**BACKTEST_PARAMS, stop_loss=0.25)
+
+    assert len(expected["trades"]) > 10
+    pd.testing.assert_frame_equal(by_window["trades"], expected["trades"])
+    pd.testing.assert_frame_equal(by_window["days"], expected["days"])
+    # Warmed up: can trade on the first bars of the window, unlike a sliced copy
+    assert by_window["trades"]["open_date"].min() < pd.Timestamp("2024-01-21 04:00")
+
+    compact = EnvelopeMulti_v2(df_list=wf.fold_df_list({p: (0, len(wf.index[p])) for p in pairs}, pairs),
+                               oldest_pair=pairs[0], type=["long", "short"], params=params_coin, compact=True)
+    compact.populate_indicators()
+    compact.populate_buy_sell()
+    compact_result = compact.run_backtest(**BACKTEST_PARAMS, stop_loss=0.25, window=window)
+    assert list(compact_result["trades"]["close_reason"]) == list(by_window["trades"]["close_reason"])
+
+
+def test_warm_indicators(walk_forward):
+    wf, df_list = walk_forward
+    pairs = ["BTC/USDT:USDT", "ETH/USDT:USDT"]
+    warm = WalkForward(df_list, df_list["BTC/USDT:USDT"], FOLDS, BACKTEST_PARAMS, warm_indicators=True)
+    # Every runner gets its own default Pruner, False disables pruning
+    assert warm.pruner == Pruner() and warm.pruner is not wf.pruner
+    assert WalkForward(df_list, df_list["BTC/USDT:USDT"], FOLDS, BACKTEST_PARAMS, pruner=False).pruner is None
+    results = warm.run(GRID[:2], pairs)
+    cold = wf.run(GRID[:2], pairs)
+
+    assert list(results.columns) == list(cold.columns)
+    assert results[["fold", "combo_idx", "adaptive"]].equals(cold[["fold", "combo_idx", "adaptive"]])
+    # Windows start warmed up: more test trades than on the sliced copies
+    assert results["test_trades"].sum() > cold["test_trades"].sum()
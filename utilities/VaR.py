@@ -3,6 +3,7 @@ import pandas as pd
 import math
 import numpy as np
 from scipy.stats import norm
+from scipy.special import ndtri
 from typing import Dict, Tuple
 
 
@@ -28,6 +29,8 @@ class ValueAtRisk:
         self.conf_level = 0.05  # 95% confidence level
         self.initial_balance = initial_balance
         self.current_balance = initial_balance
+        self._arrays = None
+        self._arrays_source = None
 
     def update_cov(self, current_date: pd.Timestamp, occurance_data: int = 1000) -> pd.DataFrame:
         """
@@ -77,6 +80,100 @@ class ValueAtRisk:
         self.avg_return = returns.mean()
         return returns
 
+    def update_cov_arrays(self, closes: Dict[str, np.ndarray], positions: Dict[str, int],
+                          occurance_data: int = 1000) -> pd.DataFrame:
+        """
+        Same as update_cov() from close arrays instead of DataFrame lookups.
+
+        Args:
+            closes: Close prices of each pair (its own rows, float64)
+            positions: Row of the current date in each pair (-1 if the pair has no bar)
+            occurance_data: Number of historical periods to use (default 1000)
+
+        Returns:
+            DataFrame of returns used for calculation
+        """
+        columns = []
+        values = np.full((occurance_data, 2 * len(self.df_list)), -1.0)
+        for col, pair in enumerate(self.df_list):
+            columns += ["long_"+pair, "short_"+pair]
+            pos = positions.get(pair, -1)
+            if pos >= 0 and pos - occurance_data >= 0:
+                # Same arithmetic as pct_change(): close / close.shift(1) - 1
+                close = closes[pair][pos-occurance_data:pos]
+                values[0, 2*col:2*col+2] = np.nan
+                values[1:, 2*col] = close[1:] / close[:-1] - 1
+                values[1:, 2*col+1] = -values[1:, 2*col]
+        returns = pd.DataFrame(values[:-1], columns=columns)
+        self.cov = returns.cov().fillna(0.0)
+        self.avg_return = returns.mean()
+        return returns
+
+    def _cov_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """avg_return / cov as numpy arrays, rebuilt after each update_cov*()."""
+        if self._arrays_source is not self.cov:
+            self._arrays = (self.avg_return.to_numpy(), self.cov.to_numpy())
+            self._arrays_source = self.cov
+        return self._arrays
+
+    def get_var_from_exposure(self, exposure: np.ndarray) -> float:
+        """
+        Same as get_var() for an exposure vector ordered like the covariance
+        columns: [long_pair1, short_pair1, long_pair2, ...].
+        """
+        usd_in_position = 0
+        for pair_exposure in (exposure[0::2] + exposure[1::2]).tolist():
+            usd_in_position += pair_exposure
+        if usd_in_position == 0:
+            return 0
+        avg_return, cov = self._cov_arrays()
+        weights = exposure / usd_in_position
+        port_mean = avg_return.dot(weights)
+        port_stdev = np.sqrt(weights.T.dot(cov).dot(weights))
+        mean_investment = (1+port_mean) * usd_in_position
+        stdev_investment = usd_in_position * port_stdev
+        # norm.ppf(q, loc, scale) is computed by scipy as ndtri(q) * scale + loc,
+        # NaN unless scale > 0 (same result, without its per-call overhead)
+        if stdev_investment > 0:
+            cutoff1 = ndtri(self.conf_level) * stdev_investment + mean_investment
+        else:
+            cutoff1 = np.nan
+        var_1d1 = usd_in_position - cutoff1
+        return var_1d1 / self.current_balance * 100
+
+    def get_var_batch(self, exposures: np.ndarray) -> np.ndarray:
+        """
+        VaR of several candidate portfolios at once.
+
+        Args:
+            exposures: (n_candidates, 2 * n_pairs) matrix, rows ordered like
+                get_var_from_exposure()
+
+        Returns:
+            VaR (% of current balance) per candidate. Matches get_var() up to
+            floating point summation order.
+        """
+        exposures = np.atleast_2d(exposures)
+        result = np.zeros(len(exposures))
+        # Sequential sum (same order as get_var)
+        usd_in_position = np.cumsum(exposures[:, 0::2] + exposures[:, 1::2], axis=1)[:, -1]
+        invested = usd_in_position != 0
+        if not invested.any():
+            return result
+        avg_return, cov = self._cov_arrays()
+        usd = usd_in_position[invested]
+        weights = exposures[invested] / usd[:, None]
+        port_mean = weights @ avg_return
+        with np.errstate(invalid="ignore"):
+            port_stdev = np.sqrt(((weights @ cov) * weights).sum(axis=1))
+        mean_investment = (1 + port_mean) * usd
+        stdev_investment = usd * port_stdev
+        cutoff = np.full(len(usd), np.nan)
+        valid = stdev_investment > 0
+        cutoff[valid] = ndtri(self.conf_level) * stdev_investment[valid] + mean_investment[valid]
+        result[invested] = (usd - cutoff) / self.current_balance * 100
+        return result
+
     def get_var(self, positions: Dict[str, Dict[str, float]]) -> float:
         """
         Calculate portfolio Value at Risk.
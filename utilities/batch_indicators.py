@@ -0,0 +1,359 @@
+"""
+Indicators for every pair of an aligned panel in one call.
+
+The strategies compute their indicators pair by pair with `ta` on single
+Series. Here the input is a bars x pairs matrix (DataPanel.field("close"))
+and each function returns matrices of the same shape:
+
+    close = panel.field("close")
+    long_ma = sma(close, window=500, mask=panel.mask)
+    lower, higher, mavg = bollinger(close, window=[100] * 26 + [80, 80], window_dev=2.25,
+                                    mask=panel.mask)
+
+- window (and the other parameters) can be one value or one value per pair
+- each pair is computed on its own bars only (mask), as if the indicator
+  was run on the pair's DataFrame: NaN lead-ins start at the pair's listing
+  and holes in the panel do not enter the windows
+- values are identical to the `ta` / custom_indicators versions
+
+With numba, one compiled pass per indicator walks all the columns with the
+same arithmetic as pandas' rolling / ewm (Kahan-compensated sums, Welford
+variance). Without it, the pairs' bars are packed to the top of the matrix
+and pairs sharing the same parameters go through one pandas rolling / ewm
+call on a 2-D block.
+"""
+from typing import Dict, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from utilities.jit import NUMBA_AVAILABLE, njit, prange
+
+Param = Union[int, float, str, Sequence]
+
+
+def _per_pair(param: Param, n_pairs: int) -> list:
+    if isinstance(param, (list, tuple, np.ndarray)):
+        if len(param) != n_pairs:
+            raise ValueError(f"Expected {n_pairs} per-pair values, got {len(param)}")
+        return list(param)
+    return [param] * n_pairs
+
+
+def _groups(*params) -> Dict[tuple, list]:
+    """Parameter tuple -> columns using it."""
+    groups = {}
+    for col, key in enumerate(zip(*params)):
+        groups.setdefault(key, []).append(col)
+    return groups
+
+
+def pack(values: np.ndarray, mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Move the valid bars of each pair to the top of its column.
+
+    Returns:
+        (packed, order, counts): packed[:counts[c], c] are the pair's own bars,
+        in time order, NaN below
+    """
+    if mask is None:
+        mask = ~np.isnan(values)
+    order = np.argsort(~mask, axis=0, kind="stable")
+    counts = mask.sum(axis=0)
+    packed = np.take_along_axis(values, order, axis=0).astype(np.float64)
+    packed[np.arange(len(values))[:, None] >= counts] = np.nan
+    return packed, order, counts
+
+
+def unpack(packed: np.ndarray, order: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Inverse of pack(): back to the panel rows, NaN where the pair has no bar."""
+    out = np.full(packed.shape, np.nan)
+    valid = np.arange(len(packed))[:, None] < counts
+    cols = np.broadcast_to(np.arange(packed.shape[1]), packed.shape)
+    out[order[valid], cols[valid]] = packed[valid]
+    return out
+
+
+def split(panel, values: np.ndarray) -> Dict[str, np.ndarray]:
+    """pair -> column of `values` on the pair's own bars (the rows of its DataFrame)."""
+    return {pair: values[panel.mask[:, col], col] for col, pair in enumerate(panel.pairs)}
+
+
+# -- Compiled kernels (pandas _libs/window/aggregations arithmetic, fixed windows) --
+# Transposed layout: values[pair, bar], each pair contiguous in memory; pairs are
+# independent and spread over the cores (prange)
+
+@njit(cache=True, parallel=True)
+def _rolling_mean_kernel(values, mask, windows):
+    n_pairs, n_bars = values.shape
+    out = np.full((n_pairs, n_bars), np.nan)
+    for c in prange(n_pairs):
+        rows = np.flatnonzero(mask[c])
+        window = windows[c]
+        sum_x = 0.0
+        compensation_add = 0.0
+        compensation_remove = 0.0
+        nobs = 0
+        neg_ct = 0
+        same_count = 0
+        prev_value = values[c, rows[0]] if len(rows) > 0 else np.nan
+        for i in range(len(rows)):
+            if window <= 1:
+                # pandas restarts the sum when windows do not overlap
+                sum_x = 0.0
+                compensation_add = 0.0
+                compensation_remove = 0.0
+                nobs = 0
+                neg_ct = 0
+                same_count = 0
+                prev_value = values[c, rows[i]]
+            elif i >= window:
+                val = values[c, rows[i - window]]
+                if val == val:
+                    nobs -= 1
+                    y = -val - compensation_remove
+                    t = sum_x + y
+                    compensation_remove = t - sum_x - y
+                    sum_x = t
+                    if np.signbit(val):
+                        neg_ct -= 1
+            val = values[c, rows[i]]
+            if val == val:
+                nobs += 1
+                y = val - compensation_add
+                t = sum_x + y
+                compensation_add = t - sum_x - y
+                sum_x = t
+                if np.signbit(val):
+                    neg_ct += 1
+                if val == prev_value:
+                    same_count += 1
+                else:
+                    same_count = 1
+                prev_value = val
+            if nobs >= window and nobs > 0:
+                result = sum_x / nobs
+                if same_count >= nobs:
+                    result = prev_value
+                elif neg_ct == 0 and result < 0:
+                    result = 0.0
+                elif neg_ct == nobs and result > 0:
+                    result = 0.0
+                out[c, rows[i]] = result
+    return out
+
+
+@njit(cache=True, parallel=True)
+def _rolling_std_kernel(values, mask, windows, ddof):
+    n_pairs, n_bars = values.shape
+    out = np.full((n_pairs, n_bars), np.nan)
+    for c in prange(n_pairs):
+        rows = np.flatnonzero(mask[c])
+        window = windows[c]
+        mean_x = 0.0
+        ssqdm_x = 0.0
+        nobs = 0.0
+        compensation_add = 0.0
+        compensation_remove = 0.0
+        same_count = 0
+        prev_value = values[c, rows[0]] if len(rows) > 0 else np.nan
+        for i in range(len(rows)):
+            if window <= 1:
+                mean_x = 0.0
+                ssqdm_x = 0.0
+                nobs = 0.0
+                compensation_add = 0.0
+                compensation_remove = 0.0
+                same_count = 0
+                prev_value = values[c, rows[i]]
+            elif i >= window:
+                val = values[c, rows[i - window]]
+                if val == val:
+                    nobs -= 1
+                    if nobs:
+                        prev_mean = mean_x - compensation_remove
+                        y = val - compensation_remove
+                        t = y - mean_x
+                        compensation_remove = t + mean_x - y
+                        mean_x = mean_x - t / nobs
+                        ssqdm_x = ssqdm_x - (val - prev_mean) * (val - mean_x)
+                    else:
+                        mean_x = 0.0
+                        ssqdm_x = 0.0
+            val = values[c, rows[i]]
+            if val == val:
+                nobs += 1
+                if val == prev_value:
+                    same_count += 1
+                else:
+                    same_count = 1
+                prev_value = val
+                prev_mean = mean_x - compensation_add
+                y = val - compensation_add
+                t = y - mean_x
+                compensation_add = t + mean_x - y
+                mean_x = mean_x + t / nobs
+                ssqdm_x = ssqdm_x + (val - prev_mean) * (val - mean_x)
+            if nobs >= window and nobs > ddof:
+                if nobs == 1 or same_count >= nobs:
+                    result = 0.0
+                else:
+                    result = ssqdm_x / (nobs - ddof)
+                # zsqrt(): negative variances are rounding noise
+                out[c, rows[i]] = np.sqrt(result) if result >= 0 else 0.0
+    return out
+
+
+@njit(cache=True, parallel=True)
+def _ewm_kernel(values, mask, spans):
+    """ewm(span, min_periods=span, adjust=False).mean()"""
+    n_pairs, n_bars = values.shape
+    out = np.full((n_pairs, n_bars), np.nan)
+    for c in prange(n_pairs):
+        rows = np.flatnonzero(mask[c])
+        if len(rows) == 0:
+            continue
+        span = spans[c]
+        alpha = 1.0 / (1.0 + (span - 1) / 2.0)
+        old_wt_factor = 1.0 - alpha
+        new_wt = alpha
+        weighted = values[c, rows[0]]
+        nobs = 1 if weighted == weighted else 0
+        if nobs >= span:
+            out[c, rows[0]] = weighted
+        old_wt = 1.0
+        for i in range(1, len(rows)):
+            cur = values[c, rows[i]]
+            is_observation = cur == cur
+            if is_observation:
+                nobs += 1
+            if weighted == weighted:
+                old_wt *= old_wt_factor
+                if is_observation:
+                    if weighted != cur:
+                        weighted = old_wt * weighted + new_wt * cur
+                        weighted /= old_wt + new_wt
+                    old_wt = 1.0
+            elif is_observation:
+                weighted = cur
+            if nobs >= span:
+                out[c, rows[i]] = weighted
+    return out
+
+
+@njit(cache=True, parallel=True)
+def _pct_change_kernel(values, mask):
+    n_pairs, n_bars = values.shape
+    out = np.full((n_pairs, n_bars), np.nan)
+    for c in prange(n_pairs):
+        rows = np.flatnonzero(mask[c])
+        for i in range(1, len(rows)):
+            out[c, rows[i]] = values[c, rows[i]] / values[c, rows[i - 1]] - 1
+    return out
+
+
+# -- pandas fallback, on the packed matrix --
+
+def _pandas_rolling(packed, windows, func, **kwargs):
+    out = np.empty(packed.shape)
+    for (w,), cols in _groups(list(windows)).items():
+        rolling = pd.DataFrame(packed[:, cols]).rolling(int(w), min_periods=int(w))
+        out[:, cols] = getattr(rolling, func)(**kwargs).to_numpy()
+    return out
+
+
+def _pandas_ewm(packed, spans):
+    out = np.empty(packed.shape)
+    for (w,), cols in _groups(list(spans)).items():
+        out[:, cols] = pd.DataFrame(packed[:, cols]).ewm(
+            span=int(w), min_periods=int(w), adjust=False).mean().to_numpy()
+    return out
+
+
+def _pandas_pct_change(packed):
+    # Series.pct_change(): only NaN lead-ins inside a pair's bars, nothing to pad
+    out = np.full(packed.shape, np.nan)
+    out[1:] = packed[1:] / packed[:-1] - 1
+    return out
+
+
+# -- Dispatch, on the transposed (pairs x bars) layout --
+
+def _transposed(values, mask, window):
+    values = np.asarray(values, dtype=np.float64)
+    if mask is None:
+        mask = ~np.isnan(values)
+    windows = np.array([int(w) for w in _per_pair(window, values.shape[1])], dtype=np.int64)
+    return (np.ascontiguousarray(values.T), np.ascontiguousarray(np.asarray(mask, dtype=np.bool_).T),
+            windows)
+
+
+def _run(kernel, fallback, values_t, mask_t, *args):
+    if NUMBA_AVAILABLE:
+        return kernel(values_t, mask_t, *args)
+    packed, order, counts = pack(values_t.T, mask_t.T)
+    return unpack(fallback(packed), order, counts).T
+
+
+def _sma(values_t, mask_t, windows):
+    return _run(_rolling_mean_kernel, lambda packed: _pandas_rolling(packed, windows, "mean"),
+                values_t, mask_t, windows)
+
+
+def _std(values_t, mask_t, windows):
+    return _run(_rolling_std_kernel, lambda packed: _pandas_rolling(packed, windows, "std", ddof=0),
+                values_t, mask_t, windows, 0)
+
+
+def _ema(values_t, mask_t, windows):
+    return _run(_ewm_kernel, lambda packed: _pandas_ewm(packed, windows), values_t, mask_t, windows)
+
+
+def _pct_change(values_t, mask_t):
+    return _run(_pct_change_kernel, _pandas_pct_change, values_t, mask_t)
+
+
+# Results are returned as transposed views: (bars x pairs), each pair's
+# column contiguous in memory.
+
+def sma(values: np.ndarray, window: Param, mask: Optional[np.ndarray] = None) -> np.ndarray:
+    """ta.trend.sma_indicator for every pair."""
+    return _sma(*_transposed(values, mask, window)).T
+
+
+def ema(values: np.ndarray, window: Param, mask: Optional[np.ndarray] = None) -> np.ndarray:
+    """ta.trend.ema_indicator for every pair."""
+    return _ema(*_transposed(values, mask, window)).T
+
+
+def bollinger(values: np.ndarray, window: Param, window_dev: Param,
+              mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """ta.volatility.BollingerBands for every pair: (lower band, higher band, middle band)."""
+    values_t, mask_t, windows = _transposed(values, mask, window)
+    window_dev = np.array([float(d) for d in _per_pair(window_dev, len(values_t))])[:, None]
+    mavg = _sma(values_t, mask_t, windows)
+    mstd = _std(values_t, mask_t, windows)
+    return (mavg - window_dev * mstd).T, (mavg + window_dev * mstd).T, mavg.T
+
+
+def trix(values: np.ndarray, trix_length: Param, trix_signal_length: Param,
+         trix_signal_type: Param = "sma",
+         mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """custom_indicators.Trix for every pair: (trix_pct_line, trix_signal_line, trix_histo)."""
+    values_t, mask_t, lengths = _transposed(values, mask, trix_length)
+    n_pairs = len(values_t)
+    trix_line = _ema(_ema(_ema(values_t, mask_t, lengths), mask_t, lengths), mask_t, lengths)
+    trix_pct_line = _pct_change(trix_line, mask_t) * 100
+
+    trix_signal_line = np.full(values_t.shape, np.nan)
+    groups = _groups(_per_pair(trix_signal_length, n_pairs), _per_pair(trix_signal_type, n_pairs))
+    for (length, signal_type), rows in groups.items():
+        block, block_mask = trix_pct_line[rows], mask_t[rows]
+        block_lengths = np.full(len(rows), int(length), dtype=np.int64)
+        if signal_type == "sma":
+            trix_signal_line[rows] = _sma(block, block_mask, block_lengths)
+        elif signal_type == "ema":
+            trix_signal_line[rows] = _ema(block, block_mask, block_lengths)
+        else:
+            raise ValueError(f"Unknown trix_signal_type: {signal_type}")
+    return trix_pct_line.T, trix_signal_line.T, (trix_pct_line - trix_signal_line).T
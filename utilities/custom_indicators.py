@@ -3,6 +3,7 @@ import numpy as np
 import pandas as pd
 import requests
 import ta
+from utilities.jit import njit
 
 def get_n_columns(df, columns, n=1):
     dt = df.copy()
@@ -179,27 +180,65 @@ class VMC():
         return pd.Series(money_flow, name="money_flow")
 
 
-def heikinAshiDf(df):
+@njit(cache=True)
+def _ha_open_kernel(first_open, ha_close):
+    """ha_open[i+1] = (ha_open[i] + ha_close[i]) / 2"""
+    ha_open = np.empty(len(ha_close))
+    if len(ha_close) == 0:
+        return ha_open
+    ha_open[0] = first_open
+    for i in range(len(ha_close) - 1):
+        ha_open[i + 1] = (ha_open[i] + ha_close[i]) / 2
+    return ha_open
+
+def heikinAshiDf(df, compiled=True):
     df['HA_Close'] = (df.open + df.high + df.low + df.close)/4
-    ha_open = [(df.open[0] + df.close[0]) / 2]
-    [ha_open.append((ha_open[i] + df.HA_Close.values[i]) / 2)
-     for i in range(0, len(df)-1)]
+    if compiled:
+        first_open = (df.open.iloc[0] + df.close.iloc[0]) / 2
+        ha_open = _ha_open_kernel(float(first_open), df.HA_Close.to_numpy(dtype=np.float64))
+    else:
+        ha_open = [(df.open[0] + df.close[0]) / 2]
+        [ha_open.append((ha_open[i] + df.HA_Close.values[i]) / 2)
+         for i in range(0, len(df)-1)]
     df['HA_Open'] = ha_open
     df['HA_High'] = df[['HA_Open', 'HA_Close', 'high']].max(axis=1)
     df['HA_Low'] = df[['HA_Open', 'HA_Close', 'low']].min(axis=1)
     return df
 
+@njit(cache=True)
+def _smoothed_ha_open_kernel(smooth_open, smooth_close, ha_close):
+    """Seed on the first smoothed bar (from index 1), then (prev ha_open + prev ha_close) / 2"""
+    n = len(ha_close)
+    ha_open = np.full(n, np.nan)
+    start = 0
+    for i in range(1, n):
+        if not np.isnan(smooth_open[i]):
+            ha_open[i] = (smooth_open[i] + smooth_close[i]) / 2
+            start = i
+            break
+    for i in range(start + 1, n):
+        ha_open[i] = (ha_open[i-1] + ha_close[i-1]) / 2
+    return ha_open
+
 class SmoothedHeikinAshi():
-    def __init__(self, open, high, low, close, smooth1=5, smooth2=3):
+    def __init__(self, open, high, low, close, smooth1=5, smooth2=3, compiled=True):
         self.open = open.copy()
         self.high = high.copy()
         self.low = low.copy()
         self.close = close.copy()
         self.smooth1 = smooth1
         self.smooth2 = smooth2
+        self.compiled = compiled
         self._run()
 
     def _calculate_ha_open(self):
+        if self.compiled:
+            return pd.Series(_smoothed_ha_open_kernel(
+                self.smooth_open.to_numpy(dtype=np.float64),
+                self.smooth_close.to_numpy(dtype=np.float64),
+                self.ha_close.to_numpy(dtype=np.float64),
+            ), index=self.open.index)
+
         ha_open = pd.Series(np.nan, index=self.open.index)
         start = 0
         for i in range(1, len(ha_open)):
@@ -247,6 +286,29 @@ def volume_anomality(df, volume_window=10):
               "VolAnomaly"] = (-1) * dfInd["VolAnomaly"]
     return dfInd["VolAnomaly"]
 
+@njit(cache=True)
+def _supertrend_kernel(close, final_upperband, final_lowerband):
+    """SuperTrend direction; adjusts the final bands in place (same rules as SuperTrend._run)"""
+    n = len(close)
+    supertrend = np.ones(n, dtype=np.bool_)
+    for curr in range(1, n):
+        prev = curr - 1
+        if close[curr] > final_upperband[prev]:
+            supertrend[curr] = True
+        elif close[curr] < final_lowerband[prev]:
+            supertrend[curr] = False
+        else:
+            supertrend[curr] = supertrend[prev]
+            if supertrend[curr] and final_lowerband[curr] < final_lowerband[prev]:
+                final_lowerband[curr] = final_lowerband[prev]
+            if not supertrend[curr] and final_upperband[curr] > final_upperband[prev]:
+                final_upperband[curr] = final_upperband[prev]
+        if supertrend[curr]:
+            final_upperband[curr] = np.nan
+        else:
+            final_lowerband[curr] = np.nan
+    return supertrend
+
 class SuperTrend():
     def __init__(
         self,
@@ -254,13 +316,15 @@ class SuperTrend():
         low,
         close,
         atr_window=10,
-        atr_multi=3
+        atr_multi=3,
+        compiled=True
     ):
         self.high = high
         self.low = low
         self.close = close
         self.atr_window = atr_window
         self.atr_multi = atr_multi
+        self.compiled = compiled
         self._run()
         
     def _run(self):
@@ -281,6 +345,17 @@ class SuperTrend():
         # notice that final bands are set to be equal to the respective bands
         final_upperband = upperband = hl2 + (self.atr_multi * atr)
         final_lowerband = lowerband = hl2 - (self.atr_multi * atr)
+
+        if self.compiled:
+            upper = final_upperband.to_numpy(dtype=np.float64, copy=True)
+            lower = final_lowerband.to_numpy(dtype=np.float64, copy=True)
+            supertrend = _supertrend_kernel(self.close.to_numpy(dtype=np.float64), upper, lower)
+            self.st = pd.DataFrame({
+                'Supertrend': supertrend,
+                'Final Lowerband': pd.Series(lower, index=final_lowerband.index),
+                'Final Upperband': pd.Series(upper, index=final_upperband.index)
+            })
+            return
         
         # initialize Supertrend column to True
         supertrend = [True] * len(self.close)
@@ -325,6 +400,17 @@ class SuperTrend():
     def super_trend_direction(self):
         return self.st['Supertrend']
     
+@njit(cache=True)
+def _adaptive_ma_kernel(final, close):
+    """ma[i] = ma[i-1] + final[i]**2 * (close[i] - ma[i-1])"""
+    ma = np.empty(len(close))
+    if len(close) == 0:
+        return ma
+    ma[0] = (final[0]**2) * close[0]
+    for i in range(1, len(close)):
+        ma[i] = ma[i-1] + (final[i]**2) * (close[i] - ma[i-1])
+    return ma
+
 class MaSlope():
     """ Slope adaptative moving average
     """
@@ -338,7 +424,8 @@ class MaSlope():
         major_length: int = 14,
         minor_length: int = 6,
         slope_period: int = 34,
-        slope_ir: int = 25
+        slope_ir: int = 25,
+        compiled: bool = True
     ):
         self.close = close
         self.high = high
@@ -348,6 +435,7 @@ class MaSlope():
         self.minor_length = minor_length
         self.slope_period = slope_period
         self.slope_ir = slope_ir
+        self.compiled = compiled
         self._run()
 
     def _run(self):
@@ -362,12 +450,16 @@ class MaSlope():
         df.loc[df['hh'] != df['ll'],'mult'] = abs(2 * df['close'] - df['ll'] - df['hh']) / (df['hh'] - df['ll'])
         df['final'] = df['mult'] * (minAlpha - majAlpha) + majAlpha
 
-        ma_first = (df.iloc[0]['final']**2) * df.iloc[0]['close']
+        if self.compiled:
+            col_ma = _adaptive_ma_kernel(df['final'].to_numpy(dtype=np.float64),
+                                         df['close'].to_numpy(dtype=np.float64))
+        else:
+            ma_first = (df.iloc[0]['final']**2) * df.iloc[0]['close']
 
-        col_ma = [ma_first]
-        for i in range(1, len(df)):
-            ma1 = col_ma[i-1]
-            col_ma.append(ma1 + (df.iloc[i]['final']**2) * (df.iloc[i]['close'] - ma1))
+            col_ma = [ma_first]
+            for i in range(1, len(df)):
+                ma1 = col_ma[i-1]
+                col_ma.append(ma1 + (df.iloc[i]['final']**2) * (df.iloc[i]['close'] - ma1))
 
         df['ma'] = col_ma
         pi = math.atan(1) * 4
@@ -0,0 +1,291 @@
+"""
+Catalogue index for the local OHLCV database.
+
+Keeps, per exchange directory, a small JSON index describing every stored
+CSV (row count, first/last timestamp, gap ranges, checksum). The index is
+refreshed incrementally: untouched files are skipped (size and mtime), files
+that were only appended to (the normal downloader behaviour) are read and
+parsed from the previous end of file only, and rewritten files are rescanned
+completely.
+
+The checksum covers the first and last SAMPLE_BYTES of the indexed part of
+the file, so checking that the old content is still in place reads at most
+2 * SAMPLE_BYTES whatever the file size. A rewrite that keeps both of these
+blocks byte-identical at the same offsets is taken for an append.
+
+Layout:
+    <path_data>/catalog.json
+    <path_data>/<timeframe>/<PAIR>.csv
+
+Usage:
+    catalog = DataCatalog(exchange.path_data, intervals_ms={"1h": 3600000})
+    catalog.refresh()
+    entry = catalog.get("BTC/USDT:USDT", "1h")
+    print(entry["rows"], entry["gaps"])
+"""
+import hashlib
+import io
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+CATALOG_FILENAME = "catalog.json"
+# Version 2: sampled checksum (first / last SAMPLE_BYTES) instead of a full-file md5
+CATALOG_VERSION = 2
+SAMPLE_BYTES = 65536
+
+
+def pair_to_filename(coin: str) -> str:
+    """Convert a ccxt symbol into the file stem used by ExchangeDataManager."""
+    return coin.replace('/', '-').replace(':', '-')
+
+
+def _read_timestamps(raw: bytes) -> np.ndarray:
+    """Read the first column (timestamp in ms) of header-less CSV bytes as int64."""
+    if not raw.strip():
+        return np.array([], dtype=np.int64)
+    ts = pd.read_csv(io.BytesIO(raw), usecols=[0], header=None)
+    return ts.iloc[:, 0].to_numpy(dtype=np.int64)
+
+
+def sampled_checksum(f, size: int) -> str:
+    """md5 of the first and last SAMPLE_BYTES of the first `size` bytes of an open binary file."""
+    h = hashlib.md5()
+    f.seek(0)
+    h.update(f.read(min(size, SAMPLE_BYTES)))
+    start = max(size - SAMPLE_BYTES, 0)
+    f.seek(start)
+    h.update(f.read(size - start))
+    return h.hexdigest()
+
+
+def find_gaps(timestamps: np.ndarray, interval_ms: Optional[int]) -> List[List[int]]:
+    """
+    Find missing bars in a sorted array of unique timestamps.
+
+    Args:
+        timestamps: Sorted unique timestamps (ms)
+        interval_ms: Expected spacing between bars (None disables detection)
+
+    Returns:
+        List of [first_missing_ts, last_missing_ts] ranges (inclusive, ms)
+    """
+    if interval_ms is None or len(timestamps) < 2:
+        return []
+    diffs = np.diff(timestamps)
+    holes = np.nonzero(diffs > interval_ms)[0]
+    return [
+        [int(timestamps[i] + interval_ms), int(timestamps[i + 1] - interval_ms)]
+        for i in holes
+    ]
+
+
+def count_missing(gaps: List[List[int]], interval_ms: Optional[int]) -> int:
+    """Number of bars covered by a list of gap ranges."""
+    if not interval_ms:
+        return 0
+    return int(sum((end - start) // interval_ms + 1 for start, end in gaps))
+
+
+class DataCatalog:
+    """Incremental index of the CSV files of one exchange directory."""
+
+    def __init__(self, path_data: str, intervals_ms: Optional[Dict[str, int]] = None):
+        """
+        Args:
+            path_data: Exchange directory (contains one sub-folder per timeframe)
+            intervals_ms: Mapping timeframe -> bar duration in ms, used for gap
+                detection. Timeframes missing from the mapping (or with
+                irregular duration such as "1M") are indexed without gaps.
+        """
+        self.path_data = Path(path_data)
+        self.intervals_ms = intervals_ms or {}
+        self.catalog_path = self.path_data / CATALOG_FILENAME
+        self.entries: Dict[str, dict] = {}
+        self._load()
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+    def _load(self) -> None:
+        if not self.catalog_path.exists():
+            return
+        try:
+            with open(self.catalog_path) as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, OSError):
+            return
+        if data.get("version") == CATALOG_VERSION:
+            self.entries = data.get("entries", {})
+
+    def save(self) -> None:
+        """Write the index next to the data (atomic replace)."""
+        self.path_data.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.catalog_path.with_suffix(".json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"version": CATALOG_VERSION, "entries": self.entries}, f)
+        os.replace(tmp_path, self.catalog_path)
+
+    # ------------------------------------------------------------------
+    # Indexing
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _key(timeframe: str, file_stem: str) -> str:
+        return f"{timeframe}/{file_stem}"
+
+    def _interval_ms(self, timeframe: str) -> Optional[int]:
+        interval = self.intervals_ms.get(timeframe)
+        # Monthly bars have no fixed duration: gap detection would be wrong
+        if interval is None or timeframe == "1M":
+            return None
+        return int(interval)
+
+    def _build_entry(self, timeframe: str, file_stem: str, timestamps: np.ndarray,
+                     checksum: str, size: int, stat: os.stat_result) -> dict:
+        timestamps = np.unique(timestamps)
+        interval_ms = self._interval_ms(timeframe)
+        gaps = find_gaps(timestamps, interval_ms)
+        return {
+            "timeframe": timeframe,
+            "pair": file_stem,
+            "rows": int(len(timestamps)),
+            "first_ts": int(timestamps[0]) if len(timestamps) else None,
+            "last_ts": int(timestamps[-1]) if len(timestamps) else None,
+            "gaps": gaps,
+            "missing_bars": count_missing(gaps, interval_ms),
+            "checksum": checksum,
+            "file_size": size,
+            "mtime_ns": stat.st_mtime_ns,
+        }
+
+    def _update_appended(self, entry: dict, f, stat: os.stat_result) -> Optional[dict]:
+        """
+        Extend an entry with rows appended since the last scan (None if not an
+        append). Only the checksum blocks and the bytes after the previous end
+        of file are read.
+        """
+        old_size = entry.get("file_size", 0)
+        if stat.st_size <= old_size or entry.get("last_ts") is None:
+            return None
+        if sampled_checksum(f, old_size) != entry.get("checksum"):
+            return None
+
+        f.seek(old_size)
+        appended = f.read()
+        size = old_size + len(appended)
+        new_ts = _read_timestamps(appended)
+        # Rows older than the indexed end mean the file is not a plain append
+        if (new_ts < entry["last_ts"]).any():
+            return None
+        new_ts = np.unique(new_ts[new_ts > entry["last_ts"]])
+
+        interval_ms = self._interval_ms(entry["timeframe"])
+        bridge = np.concatenate([[entry["last_ts"]], new_ts])
+        new_gaps = find_gaps(bridge, interval_ms)
+
+        updated = dict(entry)
+        updated["rows"] = entry["rows"] + int(len(new_ts))
+        if len(new_ts):
+            updated["last_ts"] = int(new_ts[-1])
+        updated["gaps"] = entry["gaps"] + new_gaps
+        updated["missing_bars"] = entry.get("missing_bars", 0) + count_missing(new_gaps, interval_ms)
+        updated["checksum"] = sampled_checksum(f, size)
+        updated["file_size"] = size
+        updated["mtime_ns"] = stat.st_mtime_ns
+        return updated
+
+    def index_file(self, timeframe: str, file_path: Path) -> Optional[dict]:
+        """(Re)index a single CSV file, reusing the stored entry when possible."""
+        file_stem = file_path.stem
+        key = self._key(timeframe, file_stem)
+        stat = file_path.stat()
+        entry = self.entries.get(key)
+
+        if entry and entry.get("file_size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns:
+            return entry
+
+        with open(file_path, "rb") as f:
+            if entry:
+                updated = self._update_appended(entry, f, stat)
+                if updated is not None:
+                    self.entries[key] = updated
+                    return updated
+            f.seek(0)
+            raw = f.read()
+            checksum = sampled_checksum(f, len(raw))
+
+        try:
+            body = raw.split(b"\n", 1)[1] if b"\n" in raw else b""
+            timestamps = _read_timestamps(body)
+        except (pd.errors.EmptyDataError, ValueError):
+            self.entries.pop(key, None)
+            return None
+
+        self.entries[key] = self._build_entry(timeframe, file_stem, timestamps, checksum, len(raw), stat)
+        return self.entries[key]
+
+    def refresh(self, timeframes: Optional[List[str]] = None, save: bool = True) -> "DataCatalog":
+        """
+        Bring the index up to date with the files on disk.
+
+        Args:
+            timeframes: Only scan these timeframe folders (default: all)
+            save: Persist the index after the scan
+        """
+        if not self.path_data.exists():
+            return self
+
+        seen = set()
+        for tf_dir in sorted(p for p in self.path_data.iterdir() if p.is_dir()):
+            timeframe = tf_dir.name
+            if timeframes is not None and timeframe not in timeframes:
+                continue
+            for file_path in sorted(tf_dir.glob("*.csv")):
+                if self.index_file(timeframe, file_path) is not None:
+                    seen.add(self._key(timeframe, file_path.stem))
+
+        # Drop entries whose file disappeared
+        for key in list(self.entries):
+            timeframe = key.split("/", 1)[0]
+            if (timeframes is None or timeframe in timeframes) and key not in seen:
+                del self.entries[key]
+
+        if save and (self.entries or self.catalog_path.exists()):
+            self.save()
+        return self
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+    def get(self, coin: str, timeframe: str) -> Optional[dict]:
+        """Return the entry of a pair (ccxt symbol or file stem), None if unknown."""
+        return self.entries.get(self._key(timeframe, pair_to_filename(coin)))
+
+    def get_gaps(self, coin: str, timeframe: str) -> List[List[int]]:
+        """Gap ranges [first_missing_ms, last_missing_ms] of a pair."""
+        entry = self.get(coin, timeframe)
+        return entry["gaps"] if entry else []
+
+    def to_dataframe(self, exchange_name: Optional[str] = None) -> pd.DataFrame:
+        """Summary table compatible with ExchangeDataManager.explore_data()."""
+        exchange_name = exchange_name or self.path_data.name
+        rows = []
+        for entry in self.entries.values():
+            if entry["first_ts"] is None:
+                continue
+            rows.append({
+                "exchange": exchange_name,
+                "timeframe": entry["timeframe"],
+                "pair": entry["pair"],
+                "occurences": entry["rows"],
+                "start_date": str(datetime.fromtimestamp(entry["first_ts"] / 1000)),
+                "end_date": str(datetime.fromtimestamp(entry["last_ts"] / 1000)),
+                "gaps": len(entry["gaps"]),
+                "missing_bars": entry["missing_bars"],
+            })
+        return pd.DataFrame(rows)
@@ -9,6 +9,9 @@ from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
 from tqdm.auto import tqdm
 from asyncio import Semaphore
+from utilities.data_catalog import DataCatalog, pair_to_filename
+from utilities.resample import can_derive, load_resampled, read_ohlcv_csv
+from utilities.panel import OHLCV_FIELDS, build_panel
 
 sem = Semaphore(500) # 500 concurrent requests
 
@@ -101,7 +104,7 @@ class ExchangeDataManager:
         }
     }
 
-    def __init__(self, exchange_name, path_download="./") -> None:
+    def __init__(self, exchange_name, path_download="./", base_interval=None) -> None:
         """La fonction prend une chaîne et si possible la convertit en objet ccxt.
         La fonction crée également un chemin vers un dossier appelé nommé dans le répertoire parent
         du répertoire courant, et crée un sous-dossier dans ce dossier avec le nom de l'échange.
@@ -109,6 +112,9 @@ class ExchangeDataManager:
         Args:
             cex (_type_): L'échange que vous souhaitez utiliser
             path_download (str, optional): Chemin du dossier à créer exemple ./database. Defaults to "./".
+            base_interval (str, optional): Timeframe de base (ex: "1m" ou "1h"). Si renseigné, les
+                timeframes plus larges sont toujours recalculés à partir de celui-ci au lieu de lire
+                leur propre fichier. Defaults to None (fichier natif, sinon rééchantillonnage).
 
         Raises:
             NotImplementedError: Raise si l'exchange n'est pas paramétré/supporté
@@ -120,6 +126,9 @@ class ExchangeDataManager:
         except Exception:
             raise NotImplementedError(
                 f"L'échange {self.exchange_name} n'est pas supporté")
+        if base_interval is not None and base_interval not in ExchangeDataManager.INTERVALS:
+            raise ValueError(f"Intervalle {base_interval} inconnu")
+        self.base_interval = base_interval
         self.intervals_dict = ExchangeDataManager.INTERVALS
         
         self.exchange = self.exchange_dict["ccxt_object"]
@@ -128,6 +137,39 @@ class ExchangeDataManager:
             Path(os.path.join(dirname(__file__), self.path_download, self.exchange_name)).resolve())
         os.makedirs(self.path_data, exist_ok=True)
         self.pbar = None
+        self._catalog = None
+        self._panels = {}
+
+    @property
+    def catalog(self) -> DataCatalog:
+        """Index des fichiers de l'échange (chargé au premier accès, sans scan)."""
+        if self._catalog is None:
+            self._catalog = DataCatalog(
+                self.path_data,
+                intervals_ms={k: v["interval_ms"] for k, v in self.intervals_dict.items()}
+            )
+        return self._catalog
+
+    def refresh_catalog(self, intervals=None) -> DataCatalog:
+        """
+        Met à jour l'index (incrémental : seuls les fichiers modifiés sont relus)
+
+        :param intervals: liste de timeframes à rescanner, tous par défaut
+        """
+        return self.catalog.refresh(timeframes=intervals)
+
+    def get_gaps(self, coin, interval):
+        """
+        Retourne les trous de la série sous forme de liste de (début, fin) en datetime UTC
+
+        :param coin: la paire
+        :param interval: le timeframe
+        """
+        self.catalog.refresh(timeframes=[interval])
+        return [
+            (pd.to_datetime(start, unit='ms'), pd.to_datetime(end, unit='ms'))
+            for start, end in self.catalog.get_gaps(coin, interval)
+        ]
 
     def load_data(self, coin, interval, start_date="1990", end_date="2050") -> pd.DataFrame:
         """
@@ -138,20 +180,110 @@ class ExchangeDataManager:
         :param interval: l'intervalle de temps entre chaque point de données
         :param start_date: La date de début des données que vous souhaitez charger
         :param end_date: La date à laquelle vous souhaitez mettre fin à vos données
+
+        Si le fichier du timeframe n'existe pas (ou si base_interval est défini), les bougies
+        sont construites à partir du plus petit timeframe stocké compatible (voir load_resampled).
         """
         file_path = f"{self.path_data}/{interval}/"
-        file_name = f"{file_path}{coin.replace('/', '-').replace(':', '-')}.csv"
-        if not os.path.exists(file_name):
+        file_name = f"{file_path}{pair_to_filename(coin)}.csv"
+        base = None
+        if self.base_interval is not None or not os.path.exists(file_name):
+            base = self.find_base_interval(coin, interval)
+        if base is not None:
+            df = self.load_resampled(coin, interval, base)
+        elif not os.path.exists(file_name):
             raise FileNotFoundError(f"Le fichier {file_name} n'existe pas")
+        else:
+            df = read_ohlcv_csv(file_name)
 
-        df = pd.read_csv(file_name, index_col=0)
-        df.index = pd.to_datetime(df.index, unit='ms')
-        df = df.groupby(df.index).first()
         df = df.loc[start_date:end_date]
         df = df.iloc[:-1]
 
         return df
 
+    def find_base_interval(self, coin, interval):
+        """
+        Retourne le timeframe stocké à partir duquel construire `interval`, None si aucun
+
+        :param coin: la paire
+        :param interval: le timeframe demandé
+        """
+        if interval not in self.intervals_dict:
+            return None
+        intervals_ms = {k: v["interval_ms"] for k, v in self.intervals_dict.items()}
+        if self.base_interval is not None:
+            candidates = [self.base_interval]
+        else:
+            # Du plus fin au plus large : le plus fin disponible donne les bougies exactes
+            candidates = sorted(intervals_ms, key=intervals_ms.get)
+        for base in candidates:
+            if not can_derive(base, interval, intervals_ms):
+                continue
+            if os.path.exists(f"{self.path_data}/{base}/{pair_to_filename(coin)}.csv"):
+                return base
+        return None
+
+    def load_resampled(self, coin, interval, base_interval):
+        """
+        Construit les bougies `interval` à partir du fichier `base_interval` (série complète).
+        Le résultat est mis en cache dans <path_data>/_resampled/ et recalculé
+        uniquement si le fichier source a changé.
+
+        :param coin: la paire
+        :param interval: le timeframe à construire
+        :param base_interval: le timeframe stocké utilisé comme source
+        """
+        stem = pair_to_filename(coin)
+        source = f"{self.path_data}/{base_interval}/{stem}.csv"
+        if not os.path.exists(source):
+            raise FileNotFoundError(f"Le fichier {source} n'existe pas")
+        cache_path = f"{self.path_data}/_resampled/{interval}/{stem}.{base_interval}.npz"
+        return load_resampled(
+            source, interval,
+            base_interval_ms=self.intervals_dict[base_interval]["interval_ms"],
+            cache_path=cache_path,
+        )
+
+    def _source_signature(self, coin, interval):
+        """(taille, mtime) du fichier source utilisé par load_data pour cette paire"""
+        file_name = f"{self.path_data}/{interval}/{pair_to_filename(coin)}.csv"
+        if self.base_interval is not None or not os.path.exists(file_name):
+            base = self.find_base_interval(coin, interval)
+            if base is not None:
+                file_name = f"{self.path_data}/{base}/{pair_to_filename(coin)}.csv"
+        if not os.path.exists(file_name):
+            return None
+        stat = os.stat(file_name)
+        return (file_name, stat.st_size, stat.st_mtime_ns)
+
+    def load_panel(self, pairs, interval, start_date="1990", end_date="2050", fields=OHLCV_FIELDS):
+        """
+        Charge plusieurs paires alignées sur un index commun (union des dates)
+
+        Le panel est construit une seule fois puis gardé en mémoire ; il est reconstruit
+        uniquement si un des fichiers sources a changé.
+
+        :param pairs: liste des paires
+        :param interval: le timeframe
+        :param start_date: date de début (même sémantique que load_data)
+        :param end_date: date de fin (même sémantique que load_data)
+        :param fields: colonnes à garder
+        :return: DataPanel (values: bougies x paires x champs, mask: bougies x paires)
+        """
+        key = (tuple(pairs), interval, str(start_date), str(end_date), tuple(fields))
+        signature = tuple(self._source_signature(pair, interval) for pair in pairs)
+        cached = self._panels.get(key)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        df_list = {
+            pair: self.load_data(pair, interval, start_date=start_date, end_date=end_date)
+            for pair in pairs
+        }
+        panel = build_panel(df_list, fields=fields)
+        self._panels[key] = (signature, panel)
+        return panel
+
     async def download_data(
         self,
         coins,
@@ -188,7 +320,7 @@ class ExchangeDataManager:
 
                 file_path = f"{self.path_data}/{interval}/"
                 os.makedirs(file_path, exist_ok=True)
-                file_name = f"{file_path}{coin.replace('/', '-').replace(':', '-')}.csv"
+                file_name = f"{file_path}{pair_to_filename(coin)}.csv"
 
                 dt_or_false = await self.is_data_missing(file_name, last_dt)
                 if dt_or_false:
@@ -243,9 +375,63 @@ class ExchangeDataManager:
 
                 print("\033[H\033[J", end="")
 
+            # Les fichiers ont seulement été complétés en fin : mise à jour incrémentale
+            self.catalog.refresh(timeframes=[interval])
+
         # Close exchange connection after all downloads
         await self.exchange.close()
 
+    async def repair_gaps(self, coins, intervals):
+        """
+        Télécharge uniquement les plages manquantes référencées dans le catalogue
+        et les réinsère dans les fichiers csv (tri + dédoublonnage)
+
+        :param coins: liste des paires à réparer
+        :param intervals: liste de timeframes, par ex. ['1h']
+        :return: dict {(coin, interval): nombre de bougies ajoutées}
+        """
+        await self.exchange.load_markets()
+        self.catalog.refresh(timeframes=intervals)
+        repaired = {}
+
+        for interval in intervals:
+            interval_ms = self.intervals_dict[interval]["interval_ms"]
+            for coin in coins:
+                gaps = self.catalog.get_gaps(coin, interval)
+                if not gaps:
+                    continue
+                print(f"\tRéparation de {len(gaps)} trou(s) pour {coin} en {interval}...")
+
+                tasks = []
+                for gap_start, gap_end in gaps:
+                    current_timestamp = gap_start
+                    while current_timestamp <= gap_end:
+                        tasks.append(self.download_tf_with_semaphore(coin, interval, current_timestamp, sem))
+                        current_timestamp += self.exchange_dict["limit_size_request"] * interval_ms
+
+                self.pbar = tqdm(tasks)
+                results = await asyncio.gather(*tasks)
+                self.pbar.close()
+
+                rows = [candle for result in results if result for candle in result
+                        if any(start <= candle[0] <= end for start, end in gaps)]
+                repaired[(coin, interval)] = len(rows)
+                if not rows:
+                    print("\tAucune donnée disponible sur l'exchange pour ces plages")
+                    continue
+
+                file_name = f"{self.path_data}/{interval}/{pair_to_filename(coin)}.csv"
+                df_file = pd.read_csv(file_name)
+                df_new = pd.DataFrame(rows, columns=['date', 'open', 'high', 'low', 'close', 'volume'])
+                merged = pd.concat([df_file, df_new], ignore_index=True)
+                merged = merged.drop_duplicates(subset='date', keep='first').sort_values('date')
+                merged.to_csv(file_name, index=False)
+
+            self.catalog.refresh(timeframes=[interval])
+
+        await self.exchange.close()
+        return repaired
+
     async def download_tf_with_semaphore(self, coin, interval, current_timestamp, sem: Semaphore):
         async with sem:
             return await self.download_tf(coin, interval, current_timestamp)
@@ -331,32 +517,26 @@ class ExchangeDataManager:
             raise ValueError(f"Intervalle {interval} inconnu")
         
     def explore_data(self):
-        files_data = []
-        for path, subdirs, files in os.walk(self.path_download):
-            for name in files:
-                if os.path.join(path, name).endswith('.csv'):
-                    current_file = os.path.join(path, name)
-                    # Use os.sep for cross-platform compatibility instead of hardcoded "\\"
-                    file_split = current_file.split(os.sep)
-                    try:
-                        df_file = pd.read_csv(current_file)
-                    except Exception:
-                        continue
-
-                    # Parse path components safely
-                    try:
-                        files_data.append({
-                            "exchange": file_split[-3] if len(file_split) >= 3 else "unknown",
-                            "timeframe": file_split[-2] if len(file_split) >= 2 else "unknown",
-                            "pair": file_split[-1][:-4],
-                            "occurences": len(df_file),
-                            "start_date": str(datetime.fromtimestamp(df_file.iloc[0]["date"]/1000)),
-                            "end_date": str(datetime.fromtimestamp(df_file.iloc[-1]["date"]/1000))
-                        })
-                    except (IndexError, KeyError):
-                        continue
-                    
-        return pd.DataFrame(files_data)        
+        """
+        Résumé des données stockées (paires, nombre de bougies, dates, trous)
+
+        Utilise les catalogues d'index de chaque échange : seuls les fichiers
+        modifiés depuis le dernier appel sont relus.
+        """
+        root = Path(self.path_download)
+        if not root.is_dir():
+            return pd.DataFrame()
+
+        frames = []
+        for exchange_dir in sorted(p for p in root.iterdir() if p.is_dir()):
+            catalog = DataCatalog(
+                exchange_dir,
+                intervals_ms={k: v["interval_ms"] for k, v in self.intervals_dict.items()}
+            ).refresh()
+            if catalog.entries:
+                frames.append(catalog.to_dataframe(exchange_name=exchange_dir.name))
+
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
 
 
 class TooManyError(Exception):
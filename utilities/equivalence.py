@@ -0,0 +1,335 @@
+"""
+Equivalence harness: reference EnvelopeMulti_v2 loop vs accelerated engines.
+
+Draws random synthetic universes and parameter sets, runs the reference
+engine and a candidate engine on each one and diffs trades (pair, dates,
+side, reasons, prices, sizes, fees, wallet), daily snapshots, event counters
+and the final wallet with configurable float tolerances. A failing case is
+then shrunk (fewer pairs, shorter bar window, fewer envelope levels) to the
+smallest case that still fails.
+
+An engine is a function (df_list, case) -> run_backtest() result dict:
+
+    failures = check(compact_engine, n_cases=20, tolerances=Tolerances(rtol=1e-3))
+    for failure in failures:
+        print(failure)   # minimal case + first mismatches
+
+    assert_equivalent(my_engine, n_cases=50)  # in a test
+"""
+from dataclasses import dataclass, field, replace
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utilities.strategies.envelopeMulti_v2 import EnvelopeMulti_v2
+from utilities.synthetic_data import REGIMES, make_universe
+
+TRADE_EXACT = ["pair", "open_date", "close_date", "position", "open_reason", "close_reason"]
+TRADE_PRICES = ["open_price", "close_price"]
+TRADE_SIZES = ["open_fee", "close_fee", "open_trade_size", "close_trade_size"]
+DAY_SIZES = ["long_exposition", "short_exposition"]
+
+
+@dataclass
+class Tolerances:
+    """
+    Relative / absolute tolerances per kind of value (numpy.isclose rules).
+    rtol applies to every float unless a specific one is given.
+    """
+    rtol: float = 1e-9
+    atol: float = 1e-9
+    price_rtol: Optional[float] = None
+    size_rtol: Optional[float] = None
+    wallet_rtol: Optional[float] = None
+
+    def close(self, kind: str, reference, candidate) -> np.ndarray:
+        rtol = getattr(self, f"{kind}_rtol")
+        rtol = self.rtol if rtol is None else rtol
+        reference = np.asarray(reference, dtype=np.float64)
+        candidate = np.asarray(candidate, dtype=np.float64)
+        return np.isclose(candidate, reference, rtol=rtol, atol=self.atol, equal_nan=True)
+
+
+@dataclass
+class Mismatch:
+    section: str
+    row: Optional[object]
+    column: str
+    reference: object
+    candidate: object
+
+    def __str__(self):
+        where = f"{self.section}[{self.row}]" if self.row is not None else self.section
+        return f"{where}.{self.column}: reference={self.reference!r} candidate={self.candidate!r}"
+
+
+@dataclass
+class EquivalenceCase:
+    """
+    One randomised scenario. The universe is generated once for `universe_bars`
+    bars; `pairs` and `window` select the part that is backtested, so that
+    shrinking a case never changes the prices it sees.
+    """
+    seed: int
+    n_pairs: int
+    universe_bars: int
+    stagger: int
+    regimes: Tuple[str, ...]
+    pairs: Tuple[int, ...]
+    window: Tuple[int, int]
+    ma_base_window: int
+    envelopes: Tuple[float, ...]
+    size: float
+    type: Tuple[str, ...] = ("long", "short")
+    backtest_params: Dict[str, object] = field(default_factory=dict)
+
+    def df_list(self) -> Dict[str, pd.DataFrame]:
+        universe = make_universe(self.n_pairs, self.universe_bars, seed=self.seed, stagger=self.stagger,
+                                 regimes=self.regimes)
+        names = list(universe)
+        start = universe[names[0]].index[self.window[0]]
+        end = universe[names[0]].index[self.window[1] - 1]
+        df_list = {}
+        for i in self.pairs:
+            df = universe[names[i]].loc[start:end]
+            if len(df):
+                df_list[names[i]] = df
+        return df_list
+
+    def params_coin(self, df_list: Dict[str, pd.DataFrame]) -> Dict[str, dict]:
+        return {pair: {"src": "close", "ma_base_window": self.ma_base_window,
+                       "envelopes": list(self.envelopes), "size": self.size} for pair in df_list}
+
+    def describe(self) -> str:
+        return (f"seed={self.seed} pairs={list(self.pairs)}/{self.n_pairs} window={self.window} "
+                f"ma={self.ma_base_window} envelopes={list(self.envelopes)} size={self.size} "
+                f"type={list(self.type)} {self.backtest_params}")
+
+
+@dataclass
+class Failure:
+    case: EquivalenceCase
+    minimal: EquivalenceCase
+    mismatches: List[Mismatch]
+
+    def __str__(self):
+        lines = [f"case:    {self.case.describe()}", f"minimal: {self.minimal.describe()}"]
+        lines += [f"  {m}" for m in self.mismatches[:10]]
+        if len(self.mismatches) > 10:
+            lines.append(f"  ... {len(self.mismatches) - 10} more")
+        return "\n".join(lines)
+
+
+Engine = Callable[[Dict[str, pd.DataFrame], EquivalenceCase], dict]
+
+
+# ============================================================================
+# Engines
+# ============================================================================
+
+def _run_envelope(df_list, case, **strategy_kwargs):
+    oldest_pair = min(df_list, key=lambda pair: df_list[pair].index[0])
+    strategy = EnvelopeMulti_v2(df_list=df_list, oldest_pair=oldest_pair, type=list(case.type),
+                                params=case.params_coin(df_list), **strategy_kwargs)
+    strategy.populate_indicators()
+    strategy.populate_buy_sell()
+    return strategy.run_backtest(**case.backtest_params)
+
+
+def reference_engine(df_list, case):
+    """EnvelopeMulti_v2 standard (float64 DataFrames) loop."""
+    return _run_envelope(df_list, case)
+
+
+def compact_engine(df_list, case):
+    """EnvelopeMulti_v2 compact mode (float32 prices, uint8 signal matrix)."""
+    return _run_envelope(df_list, case, compact=True)
+
+
+# ============================================================================
+# Diff
+# ============================================================================
+
+def _diff_frame(section, reference, candidate, exact, by_kind, tolerances, limit):
+    mismatches = []
+    if len(reference) != len(candidate):
+        mismatches.append(Mismatch(section, None, "len", len(reference), len(candidate)))
+    n = min(len(reference), len(candidate))
+    for column in exact + [c for columns in by_kind.values() for c in columns]:
+        if column not in reference.columns and column not in candidate.columns:
+            continue
+        if column not in reference.columns or column not in candidate.columns:
+            mismatches.append(Mismatch(section, None, column, column in reference.columns,
+                                       column in candidate.columns))
+            continue
+        ref = reference[column].to_numpy()[:n]
+        cand = candidate[column].to_numpy()[:n]
+        if column in exact:
+            bad = np.flatnonzero(ref != cand)
+        else:
+            kind = next(kind for kind, columns in by_kind.items() if column in columns)
+            bad = np.flatnonzero(~tolerances.close(kind, ref, cand))
+        for row in bad[:limit]:
+            mismatches.append(Mismatch(section, int(row), column, ref[row], cand[row]))
+    return sorted(mismatches, key=lambda m: (m.row is not None, m.row if m.row is not None else -1))
+
+
+def diff_results(reference: dict, candidate: dict, tolerances: Optional[Tolerances] = None,
+                 limit: int = 5) -> List[Mismatch]:
+    """
+    Differences between two run_backtest() results (empty list = equivalent).
+
+    Args:
+        limit: Rows reported per column
+    """
+    tolerances = tolerances or Tolerances()
+    mismatches = []
+    if not tolerances.close("wallet", reference["wallet"], candidate["wallet"]):
+        mismatches.append(Mismatch("result", None, "wallet", reference["wallet"], candidate["wallet"]))
+
+    mismatches += _diff_frame("trades", reference["trades"].reset_index(drop=True),
+                              candidate["trades"].reset_index(drop=True), TRADE_EXACT,
+                              {"price": TRADE_PRICES, "size": TRADE_SIZES, "wallet": ["wallet"]},
+                              tolerances, limit)
+    ref_days, cand_days = reference["days"].reset_index(drop=True), candidate["days"].reset_index(drop=True)
+    mismatches += _diff_frame("days", ref_days, cand_days, ["day"],
+                              {"price": ["price"], "size": DAY_SIZES, "wallet": ["wallet"]}, tolerances, limit)
+
+    ref_counters = reference.get("event_counters", {})
+    cand_counters = candidate.get("event_counters", {})
+    for key in sorted(set(ref_counters) | set(cand_counters)):
+        ref, cand = ref_counters.get(key), cand_counters.get(key)
+        if ref is None or cand is None:
+            equal = ref is cand
+        elif isinstance(ref, (int, np.integer)) and isinstance(cand, (int, np.integer)):
+            equal = ref == cand
+        else:
+            equal = bool(tolerances.close("size", ref, cand))
+        if not equal:
+            mismatches.append(Mismatch("event_counters", None, key, ref, cand))
+    return mismatches
+
+
+# ============================================================================
+# Random cases, check and minimisation
+# ============================================================================
+
+def draw_case(rng: np.random.Generator, max_pairs: int = 4, max_bars: int = 1500) -> EquivalenceCase:
+    """Random universe and parameter draw."""
+    n_pairs = int(rng.integers(1, max_pairs + 1))
+    bars = int(rng.integers(max(200, max_bars // 3), max_bars + 1))
+    n_levels = int(rng.integers(1, 4))
+    first = float(rng.uniform(0.01, 0.05))
+    envelopes = tuple(round(first + step * i, 4) for i, step in enumerate([float(rng.uniform(0.005, 0.03))]
+                                                                           * n_levels))
+    leverage = int(rng.choice([1, 2, 5, 10, 20]))
+    regimes = tuple(str(r) for r in rng.choice(sorted(REGIMES), size=int(rng.integers(1, 4))))
+    return EquivalenceCase(
+        seed=int(rng.integers(2 ** 31)),
+        n_pairs=n_pairs,
+        universe_bars=bars,
+        stagger=int(rng.integers(0, bars // (2 * n_pairs) + 1)),
+        regimes=regimes,
+        pairs=tuple(range(n_pairs)),
+        window=(0, bars),
+        ma_base_window=int(rng.integers(3, 30)),
+        envelopes=envelopes,
+        size=round(float(rng.uniform(0.02, 0.3)) / leverage, 5),
+        type=(("long", "short"), ("long",), ("short",))[int(rng.integers(3))],
+        backtest_params={
+            "initial_wallet": 1000,
+            "leverage": leverage,
+            "stop_loss": round(float(rng.uniform(0.03, 0.5)), 3),
+            "risk_mode": str(rng.choice(["neutral", "scaling", "hybrid"])),
+            "reinvest": bool(rng.integers(2)),
+            "per_pair_cap": round(float(rng.uniform(0.1, 1.0)), 3),
+        },
+    )
+
+
+def compare_case(case: EquivalenceCase, engine: Engine, reference: Engine = reference_engine,
+                 tolerances: Optional[Tolerances] = None) -> List[Mismatch]:
+    """Mismatches of `engine` against `reference` on one case (engine errors count as a mismatch)."""
+    df_list = case.df_list()
+    expected = reference({pair: df.copy() for pair, df in df_list.items()}, case)
+    try:
+        result = engine({pair: df.copy() for pair, df in df_list.items()}, case)
+    except Exception as exc:
+        return [Mismatch("engine", None, "exception", None, f"{type(exc).__name__}: {exc}")]
+    return diff_results(expected, result, tolerances)
+
+
+def _simplifications(case: EquivalenceCase, min_bars: int):
+    """Smaller variants of a case, most aggressive first."""
+    if len(case.pairs) > 1:
+        for i in range(len(case.pairs)):
+            yield replace(case, pairs=case.pairs[:i] + case.pairs[i + 1:])
+    first, last = case.window
+    length = last - first
+    for new_length in (length // 2, length * 3 // 4):
+        if new_length >= min_bars:
+            yield replace(case, window=(first, first + new_length))
+            yield replace(case, window=(last - new_length, last))
+    if len(case.envelopes) > 1:
+        yield replace(case, envelopes=case.envelopes[:-1])
+    if len(case.type) > 1:
+        for side in case.type:
+            yield replace(case, type=(side,))
+
+
+def minimise(case: EquivalenceCase, engine: Engine, reference: Engine = reference_engine,
+             tolerances: Optional[Tolerances] = None, max_steps: int = 100) -> Tuple[EquivalenceCase, List[Mismatch]]:
+    """
+    Greedy shrinking: keep applying the first simplification that still fails.
+
+    Returns:
+        (smallest failing case, its mismatches)
+    """
+    mismatches = compare_case(case, engine, reference, tolerances)
+    min_bars = max(50, 2 * case.ma_base_window + 24)
+    for _ in range(max_steps):
+        for smaller in _simplifications(case, min_bars):
+            try:
+                smaller_mismatches = compare_case(smaller, engine, reference, tolerances)
+            except Exception:
+                # The reference itself cannot run this variant (e.g. no bar left)
+                continue
+            if smaller_mismatches:
+                case, mismatches = smaller, smaller_mismatches
+                break
+        else:
+            break
+    return case, mismatches
+
+
+def check(engine: Engine, n_cases: int = 20, seed: int = 0, reference: Engine = reference_engine,
+          tolerances: Optional[Tolerances] = None, shrink: bool = True, max_pairs: int = 4,
+          max_bars: int = 1500, cases: Optional[Sequence[EquivalenceCase]] = None) -> List[Failure]:
+    """
+    Run `engine` and `reference` on `n_cases` random cases (or the given ones).
+
+    Returns:
+        One Failure per failing case, with its minimised version
+    """
+    if cases is None:
+        rng = np.random.default_rng(seed)
+        cases = [draw_case(rng, max_pairs, max_bars) for _ in range(n_cases)]
+    failures = []
+    for case in cases:
+        mismatches = compare_case(case, engine, reference, tolerances)
+        if not mismatches:
+            continue
+        minimal = case
+        if shrink:
+            minimal, mismatches = minimise(case, engine, reference, tolerances)
+        failures.append(Failure(case, minimal, mismatches))
+    return failures
+
+
+def assert_equivalent(engine: Engine, n_cases: int = 20, seed: int = 0, **kwargs):
+    """check() that raises AssertionError with the minimised failures."""
+    failures = check(engine, n_cases, seed, **kwargs)
+    if failures:
+        raise AssertionError(f"{len(failures)} case(s) differ\n"
+                             + "\n\n".join(str(failure) for failure in failures))
@@ -0,0 +1,147 @@
+"""
+Shared store of indicator arrays.
+
+Indicators are computed once per (pair, indicator, params, data) and
+reused by every backtest that asks for them, e.g. all the runs of a
+parameter sweep that only change leverage / max_var / fees:
+
+    store = IndicatorStore()
+    lower, higher, mavg = store.bollinger(pair, df["close"], window=100, window_dev=2.25)
+    long_ma = store.sma(pair, df["close"], window=500)
+
+The *_many() variants take every pair at once and compute the missing ones
+in a single panel-wide call (utilities/batch_indicators.py):
+
+    bands = store.bollinger_many(closes, {pair: (100, 2.25) for pair in closes})
+
+The data is identified by a content hash of the input series (index and
+values), so a store shared across datasets with the same pairs and dates
+(another exchange, a repaired file, another source column) never returns
+the indicators of the other one.
+
+Values are computed with the same `ta` calls as the strategies, so engines
+reading from the store produce identical signals. Arrays are returned
+read-only: never modify them in place.
+"""
+from typing import Callable, Dict, Tuple
+
+import numpy as np
+import pandas as pd
+import ta
+
+from utilities import batch_indicators
+from utilities.panel import build_panel
+from utilities.validation import series_fingerprint
+
+
+class IndicatorStore:
+
+    def __init__(self):
+        self._cache: Dict[tuple, tuple] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def clear(self):
+        self._cache.clear()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _span(series: pd.Series) -> tuple:
+        """Identity of the data an indicator was computed on: length and content hash."""
+        return (len(series), series_fingerprint(series))
+
+    def get(self, pair: str, name: str, params: tuple, series: pd.Series,
+            compute: Callable[[pd.Series], tuple]) -> tuple:
+        """
+        Cached tuple of arrays for (pair, name, params) on `series`.
+
+        Args:
+            compute: function series -> tuple of pd.Series / arrays, only called on a miss
+        """
+        key = (pair, name, params, self._span(series))
+        arrays = self._cache.get(key)
+        if arrays is not None:
+            self.hits += 1
+            return arrays
+        self.misses += 1
+        arrays = tuple(np.asarray(values, dtype=np.float64) for values in compute(series))
+        for values in arrays:
+            values.flags.writeable = False
+        self._cache[key] = arrays
+        return arrays
+
+    def get_many(self, name: str, params: Dict[str, tuple], series: Dict[str, pd.Series],
+                 compute: Callable[[Dict[str, pd.Series], Dict[str, tuple]], Dict[str, tuple]]) -> Dict[str, tuple]:
+        """
+        get() for several pairs: pair -> cached tuple of arrays.
+
+        Args:
+            params: pair -> params tuple
+            compute: function (series by pair, params by pair) -> tuple by pair,
+                     called once with the missing pairs only
+        """
+        results, missing = {}, {}
+        for pair, values in series.items():
+            key = (pair, name, params[pair], self._span(values))
+            arrays = self._cache.get(key)
+            if arrays is not None:
+                self.hits += 1
+                results[pair] = arrays
+            else:
+                self.misses += 1
+                missing[pair] = key
+        if missing:
+            computed = compute({pair: series[pair] for pair in missing},
+                               {pair: params[pair] for pair in missing})
+            for pair, key in missing.items():
+                arrays = tuple(np.asarray(values, dtype=np.float64) for values in computed[pair])
+                for values in arrays:
+                    values.flags.writeable = False
+                self._cache[key] = arrays
+                results[pair] = arrays
+        return {pair: results[pair] for pair in series}
+
+    @staticmethod
+    def _batch(compute: Callable[[np.ndarray, np.ndarray, list], tuple]):
+        """Adapt a batch_indicators call (close matrix, mask, params list) to get_many()."""
+        def compute_many(series, params):
+            panel = build_panel({pair: values.to_frame("close") for pair, values in series.items()},
+                                fields=("close",))
+            outputs = compute(panel.field("close"), panel.mask, [params[pair] for pair in panel.pairs])
+            return {pair: tuple(batch_indicators.split(panel, values)[pair] for values in outputs)
+                    for pair in panel.pairs}
+        return compute_many
+
+    def bollinger(self, pair: str, close: pd.Series, window: int,
+                  window_dev: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(lower band, higher band, middle band), as BollingerTrendMulti computes them."""
+        def compute(series):
+            bol_band = ta.volatility.BollingerBands(close=series, window=window, window_dev=window_dev)
+            return bol_band.bollinger_lband(), bol_band.bollinger_hband(), bol_band.bollinger_mavg()
+        return self.get(pair, "bollinger", (window, window_dev), close, compute)
+
+    def sma(self, pair: str, close: pd.Series, window: int) -> np.ndarray:
+        """Simple moving average (ta.trend.sma_indicator)."""
+        def compute(series):
+            return (ta.trend.sma_indicator(close=series, window=window),)
+        return self.get(pair, "sma", (window,), close, compute)[0]
+
+    def bollinger_many(self, closes: Dict[str, pd.Series],
+                       params: Dict[str, Tuple[int, float]]) -> Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """bollinger() for every pair; params: pair -> (window, window_dev)."""
+        def compute(close, mask, pair_params):
+            windows, window_devs = zip(*pair_params)
+            return batch_indicators.bollinger(close, list(windows), list(window_devs), mask=mask)
+        return self.get_many("bollinger", params, closes, self._batch(compute))
+
+    def sma_many(self, closes: Dict[str, pd.Series], windows: Dict[str, int]) -> Dict[str, np.ndarray]:
+        """sma() for every pair; windows: pair -> window."""
+        def compute(close, mask, pair_params):
+            return (batch_indicators.sma(close, [window for window, in pair_params], mask=mask),)
+        arrays = self.get_many("sma", {pair: (window,) for pair, window in windows.items()},
+                               closes, self._batch(compute))
+        return {pair: values[0] for pair, values in arrays.items()}
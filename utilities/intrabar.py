@@ -0,0 +1,253 @@
+"""
+Intrabar event sequencing from high-resolution (1m) data.
+
+The bar engines only see the high/low of each 1h bar, so when two events
+can happen inside the same bar (entry + stop, stop + close at ma_base,
+liquidation + close) they have to assume an order. IntrabarResolver answers
+"which level was touched first" from the minute data, and is only queried
+for those ambiguous bars.
+
+Minute data is loaded lazily: the first query on a pair splits its CSV into
+monthly .npz partitions (cached on disk, keyed by the source file size and
+mtime), and only the months that are actually queried are kept in memory.
+
+Layout:
+    <path_data>/1m/<PAIR>.csv                          (source)
+    <path_data>/_intrabar/1m/<PAIR>/<YYYY-MM>.npz      (partitions)
+
+Usage:
+    resolver = IntrabarResolver(exchange.path_data, bar_interval="1h")
+    bt_result = strat.run_backtest(..., intrabar=resolver)
+"""
+import shutil
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utilities.data_catalog import pair_to_filename
+
+PARTITION_DIRNAME = "_intrabar"
+SIGNATURE_FILENAME = "signature.npy"
+CSV_CHUNKSIZE = 500_000
+
+INTERVAL_MS = {
+    "1m": 60000,
+    "5m": 300000,
+    "15m": 900000,
+    "1h": 3600000,
+    "4h": 14400000,
+    "1d": 86400000,
+}
+
+
+def _month_key(ts_ms: int) -> str:
+    return str(np.datetime64(int(ts_ms), "ms").astype("datetime64[M]"))
+
+
+class IntrabarResolver:
+    """Lazy minute-data lookups used to order events inside a bar."""
+
+    def __init__(self, path_data: str, interval: str = "1m", bar_interval: str = "1h",
+                 max_cached_months: int = 48):
+        """
+        Args:
+            path_data: Exchange directory of the local database
+                (ExchangeDataManager.path_data)
+            interval: High-resolution timeframe used for sequencing
+            bar_interval: Timeframe of the backtested bars
+            max_cached_months: Number of (pair, month) slices kept in memory
+        """
+        if interval not in INTERVAL_MS or bar_interval not in INTERVAL_MS:
+            raise ValueError(f"Unsupported intervals: {interval} / {bar_interval}")
+        if INTERVAL_MS[bar_interval] <= INTERVAL_MS[interval]:
+            raise ValueError("bar_interval must be coarser than interval")
+        self.path_data = Path(path_data)
+        self.interval = interval
+        self.bar_ms = INTERVAL_MS[bar_interval]
+        self.max_cached_months = max_cached_months
+        self._months: "OrderedDict[Tuple[str, str], Optional[tuple]]" = OrderedDict()
+        self._partitioned = {}
+        self.lookups = 0
+
+    # ------------------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------------------
+    def _source(self, pair: str) -> Path:
+        return self.path_data / self.interval / f"{pair_to_filename(pair)}.csv"
+
+    def _partition_dir(self, pair: str) -> Path:
+        return self.path_data / PARTITION_DIRNAME / self.interval / pair_to_filename(pair)
+
+    def _ensure_partitions(self, pair: str) -> bool:
+        """Split the minute CSV of a pair into monthly files (once per source version)."""
+        if pair in self._partitioned:
+            return self._partitioned[pair]
+
+        source = self._source(pair)
+        if not source.exists():
+            self._partitioned[pair] = False
+            return False
+
+        stat = source.stat()
+        signature = np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+        part_dir = self._partition_dir(pair)
+        sig_path = part_dir / SIGNATURE_FILENAME
+        if sig_path.exists() and np.array_equal(np.load(sig_path), signature):
+            self._partitioned[pair] = True
+            return True
+
+        if part_dir.exists():
+            shutil.rmtree(part_dir)
+        part_dir.mkdir(parents=True)
+
+        pending = {}
+        for chunk in pd.read_csv(source, usecols=[0, 2, 3], chunksize=CSV_CHUNKSIZE):
+            ts = chunk.iloc[:, 0].to_numpy(dtype=np.int64)
+            high = chunk.iloc[:, 1].to_numpy(dtype=np.float64)
+            low = chunk.iloc[:, 2].to_numpy(dtype=np.float64)
+            months = ts.astype("datetime64[ms]").astype("datetime64[M]")
+            for month in np.unique(months):
+                mask = months == month
+                pending.setdefault(str(month), []).append((ts[mask], high[mask], low[mask]))
+            # Months are contiguous in the stored files: flush the finished ones
+            last_month = str(months[-1]) if len(months) else None
+            for key in [k for k in pending if k != last_month]:
+                self._write_month(part_dir, key, pending.pop(key))
+        for key, parts in pending.items():
+            self._write_month(part_dir, key, parts)
+
+        np.save(sig_path, signature)
+        # Drop stale in-memory slices of this pair
+        for key in [k for k in self._months if k[0] == pair]:
+            del self._months[key]
+        self._partitioned[pair] = True
+        return True
+
+    @staticmethod
+    def _write_month(part_dir: Path, key: str, parts: list) -> None:
+        path = part_dir / f"{key}.npz"
+        if path.exists():
+            with np.load(path) as previous:
+                parts = [(previous["ts"], previous["high"], previous["low"])] + parts
+        ts = np.concatenate([p[0] for p in parts])
+        high = np.concatenate([p[1] for p in parts])
+        low = np.concatenate([p[2] for p in parts])
+        # Sorted, first occurrence of duplicated timestamps (as load_data)
+        ts, first = np.unique(ts, return_index=True)
+        np.savez(path, ts=ts, high=high[first], low=low[first])
+
+    def _month(self, pair: str, key: str) -> Optional[tuple]:
+        cache_key = (pair, key)
+        if cache_key in self._months:
+            self._months.move_to_end(cache_key)
+            return self._months[cache_key]
+
+        data = None
+        path = self._partition_dir(pair) / f"{key}.npz"
+        if path.exists():
+            with np.load(path) as npz:
+                data = (npz["ts"], npz["high"], npz["low"])
+        self._months[cache_key] = data
+        if len(self._months) > self.max_cached_months:
+            self._months.popitem(last=False)
+        return data
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+    def bar_slice(self, pair: str, bar_open) -> Optional[tuple]:
+        """
+        Minute arrays (ts_ms, high, low) covering one bar, None if unavailable.
+
+        Args:
+            pair: ccxt symbol
+            bar_open: Open time of the bar (Timestamp)
+        """
+        if not self._ensure_partitions(pair):
+            return None
+        start = int(pd.Timestamp(bar_open).value // 1_000_000)
+        end = start + self.bar_ms
+
+        pieces = []
+        key = _month_key(start)
+        while True:
+            data = self._month(pair, key)
+            if data is not None:
+                ts, high, low = data
+                lo, hi = np.searchsorted(ts, [start, end])
+                if hi > lo:
+                    pieces.append((ts[lo:hi], high[lo:hi], low[lo:hi]))
+            next_key = str(np.datetime64(key, "M") + 1)
+            # Bars spanning a month boundary (1d bars on the 1st, ...)
+            if int(np.datetime64(next_key, "ms").astype(np.int64)) >= end:
+                break
+            key = next_key
+
+        if not pieces:
+            return None
+        if len(pieces) == 1:
+            return pieces[0]
+        return tuple(np.concatenate(arrays) for arrays in zip(*pieces))
+
+    def first_touch(self, pair: str, bar_open, level: float, direction: str,
+                    start_ts: Optional[int] = None) -> Optional[int]:
+        """
+        Timestamp (ms) of the first minute of the bar that reaches a price level.
+
+        Args:
+            pair: ccxt symbol
+            bar_open: Open time of the bar
+            level: Price level
+            direction: "down" (low <= level) or "up" (high >= level)
+            start_ts: Ignore minutes before this timestamp (ms)
+
+        Returns:
+            Minute open time in ms, None if never touched or no minute data
+        """
+        data = self.bar_slice(pair, bar_open)
+        if data is None:
+            return None
+        self.lookups += 1
+        ts, high, low = data
+        if direction == "down":
+            touched = low <= level
+        elif direction == "up":
+            touched = high >= level
+        else:
+            raise ValueError(f"Invalid direction: {direction}")
+        if start_ts is not None:
+            touched &= ts >= start_ts
+        hits = np.flatnonzero(touched)
+        return int(ts[hits[0]]) if len(hits) else None
+
+    def first_event(self, pair: str, bar_open, level_a: float, direction_a: str,
+                    level_b: float, direction_b: str) -> Optional[str]:
+        """
+        Which of two levels is touched first inside a bar.
+
+        Returns:
+            "a", "b", "both" (same minute), or None when minute data cannot tell
+        """
+        t_a = self.first_touch(pair, bar_open, level_a, direction_a)
+        t_b = self.first_touch(pair, bar_open, level_b, direction_b)
+        if t_a is None and t_b is None:
+            return None
+        if t_b is None or (t_a is not None and t_a < t_b):
+            return "a"
+        if t_a is None or t_b < t_a:
+            return "b"
+        return "both"
+
+    def extreme_after(self, pair: str, bar_open, start_ts: int, side: str) -> Optional[float]:
+        """Lowest low (side="low") or highest high (side="high") from start_ts to the bar end."""
+        data = self.bar_slice(pair, bar_open)
+        if data is None:
+            return None
+        ts, high, low = data
+        mask = ts >= start_ts
+        if not mask.any():
+            return None
+        return float(low[mask].min()) if side == "low" else float(high[mask].max())
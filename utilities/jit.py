@@ -0,0 +1,39 @@
+"""
+Optional numba JIT for the backtest kernels.
+
+    from utilities.jit import njit, NUMBA_AVAILABLE
+
+    @njit(cache=True)
+    def kernel(values):
+        ...
+
+    @njit(cache=True, parallel=True)
+    def per_pair_kernel(values):
+        for c in prange(values.shape[0]):   # columns on all cores
+            ...
+
+numba is not a hard dependency: without it, njit returns the function
+unchanged and the kernels run as plain Python on the same numpy arrays
+(same results, much slower). Set NUMBA_DISABLE_JIT=1 to force that path
+while debugging.
+"""
+try:
+    import numba
+    from numba import prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    numba = None
+    prange = range
+    NUMBA_AVAILABLE = False
+
+
+def njit(*args, **kwargs):
+    """numba.njit when numba is installed, identity decorator otherwise."""
+    if NUMBA_AVAILABLE:
+        return numba.njit(*args, **kwargs)
+    if len(args) == 1 and callable(args[0]) and not kwargs:
+        return args[0]
+
+    def decorator(func):
+        return func
+    return decorator
@@ -1,11 +1,17 @@
 """
 Logging configuration for the backtesting framework.
-Provides consistent logging across all modules.
+Provides consistent logging across all modules, and the EventLog that
+buffers the events of a backtest run (liquidations, stops, cap rejections,
+kill-switch) instead of printing them from the bar loop.
 """
 import logging
+import multiprocessing
 import sys
 from pathlib import Path
 from datetime import datetime
+from typing import Dict, Optional, Union
+
+import pandas as pd
 
 
 def setup_logger(
@@ -81,6 +87,143 @@ def get_strategy_logger(level: int = logging.INFO) -> logging.Logger:
     return setup_logger("strategy", level=level)
 
 
+# ============================================================================
+# Backtest event log
+# ============================================================================
+
+# Event types and the message each one is echoed with
+EVENT_MESSAGES = {
+    "liquidation": "Liquidation {pair} {detail} @ {value:.4f} at {date}",
+    "wallet_depleted": "Liquidation le {date:%Y-%m-%d}: {detail}",
+    "stop_loss": "Stop loss {pair} {detail} @ {value:.4f} at {date}",
+    "cap_rejection": "Position rejected {pair} at {date}: {detail}",
+    "margin_rejection": "Margin cap exceeded {pair} at {date}: {value:.2f} needed",
+    "kill_switch_on": "Kill-switch TRIGGERED ({detail}: {value:.2f}%) at {date}",
+    "kill_switch_off": "Kill-switch expired at {date}. Trading resumed.",
+    "extreme_leverage": "[Extreme leverage] per_pair_cap reduced: {detail}",
+}
+EVENT_TYPES = tuple(EVENT_MESSAGES)
+# Echoed by default (the events the engines used to print)
+ECHO_EVENTS = ("wallet_depleted", "kill_switch_on", "kill_switch_off", "extreme_leverage")
+_WARNING_EVENTS = ("liquidation", "wallet_depleted", "kill_switch_on")
+
+
+def in_worker_process() -> bool:
+    """True in a multiprocessing child (e.g. a ProcessPoolExecutor worker)."""
+    return multiprocessing.parent_process() is not None
+
+
+def get_event_logger(level: int = logging.INFO) -> logging.Logger:
+    """Console logger the EventLog echoes to (no log file)."""
+    logger = setup_logger("backtest.events", level=level, log_to_file=False)
+    # Own console handler: don't echo twice (nor to the log file) through "backtest"
+    logger.propagate = False
+    return logger
+
+
+class EventLog:
+    """
+    In-memory buffer of typed backtest events, flushed at the end of a run.
+
+    emit() only counts the event and appends a tuple; messages are formatted
+    at flush(). Every event is counted, but only one in `sample` of each
+    type is buffered (int for all types, or dict type -> n) and at most
+    `max_events` in total; flush() echoes at most `max_echo` events per type
+    to the logger, then a "... N more" line.
+
+    Args:
+        echo: Log the ECHO_EVENTS at flush (default: True in the main
+              process, False in worker processes)
+        sample: Keep one event in `sample` per type (None keeps all)
+        max_events: Buffer size
+        max_echo: Echoed events per type and flush
+        echo_events: Types echoed (default ECHO_EVENTS)
+        logger: Logger to echo to (default get_event_logger())
+
+    Example:
+        log = EventLog(sample={"cap_rejection": 100})
+        result = strategy.run_backtest(**params, event_log=log)
+        result["events"]   # DataFrame kind / date / pair / value / detail
+        log.counts         # exact count per type
+    """
+
+    def __init__(
+        self,
+        echo: Optional[bool] = None,
+        sample: Union[int, Dict[str, int], None] = None,
+        max_events: int = 10_000,
+        max_echo: int = 20,
+        echo_events=ECHO_EVENTS,
+        logger: Optional[logging.Logger] = None,
+    ):
+        self.echo = not in_worker_process() if echo is None else echo
+        if isinstance(sample, dict):
+            self.every = {kind: int(sample.get(kind, 1)) for kind in EVENT_TYPES}
+        else:
+            self.every = dict.fromkeys(EVENT_TYPES, int(sample or 1))
+        if min(self.every.values()) < 1:
+            raise ValueError("sample must be >= 1")
+        self.max_events = max_events
+        self.max_echo = max_echo
+        self.echo_events = tuple(echo_events)
+        self.logger = logger
+        self.counts = dict.fromkeys(EVENT_TYPES, 0)
+        self.dropped = 0
+        self.events = []
+
+    def emit(self, kind: str, date, pair: Optional[str] = None, value: float = float("nan"), detail: str = ""):
+        """Record one event (`kind` among EVENT_TYPES)."""
+        count = self.counts[kind] + 1
+        self.counts[kind] = count
+        if (count - 1) % self.every[kind]:
+            return
+        if len(self.events) >= self.max_events:
+            self.dropped += 1
+            return
+        self.events.append((kind, date, pair, value, detail))
+
+    def to_frame(self) -> pd.DataFrame:
+        """Buffered events, one row each."""
+        frame = pd.DataFrame(self.events, columns=["kind", "date", "pair", "value", "detail"])
+        frame["kind"] = pd.Categorical(frame["kind"], categories=EVENT_TYPES)
+        return frame
+
+    @staticmethod
+    def message(event) -> str:
+        kind, date, pair, value, detail = event
+        return EVENT_MESSAGES[kind].format(date=date, pair=pair or "", value=value, detail=detail)
+
+    def flush(self) -> pd.DataFrame:
+        """
+        Echo the buffered events (if enabled) and empty the buffer.
+
+        Returns:
+            The flushed events (to_frame())
+        """
+        frame = self.to_frame()
+        if self.echo and self.events:
+            logger = self.logger or get_event_logger()
+            echoed = dict.fromkeys(EVENT_TYPES, 0)
+            for event in self.events:
+                kind = event[0]
+                if kind not in self.echo_events:
+                    continue
+                echoed[kind] += 1
+                if echoed[kind] <= self.max_echo:
+                    level = logging.WARNING if kind in _WARNING_EVENTS else logging.INFO
+                    logger.log(level, self.message(event))
+            for kind, n in echoed.items():
+                if n > self.max_echo:
+                    logger.info(f"... {n - self.max_echo} more {kind} events")
+        self.events = []
+        return frame
+
+    def reset(self):
+        self.counts = dict.fromkeys(EVENT_TYPES, 0)
+        self.dropped = 0
+        self.events = []
+
+
 # Example usage in modules:
 # from utilities.logger import get_backtest_logger
 # logger = get_backtest_logger()
@@ -3,15 +3,20 @@ Margin & Liquidation Utilities for Leveraged Trading Backtests
 ================================================================
 
 Provides functions for:
-- Computing liquidation prices
+- Computing liquidation prices (flat or tiered MMR)
 - Updating equity (wallet + unrealized PnL)
 - Applying position closes with fees
 - Checking exposure caps
 """
 
+import json
+from bisect import bisect_right
+
 import numpy as np
 import pandas as pd
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
+
+from utilities.logger import EventLog
 
 # ============================================================================
 # MMR (Maintenance Margin Rate) Configuration
@@ -89,6 +94,122 @@ def compute_liq_price(
         raise ValueError(f"Invalid side: {side}. Must be 'LONG' or 'SHORT'")
 
 
+# ============================================================================
+# Tiered MMR (notional brackets)
+# ============================================================================
+
+def snapshot_symbol(pair: str) -> str:
+    """Exchange symbol of a ccxt pair in bracket snapshots: "BTC/USDT:USDT" -> "BTCUSDT"."""
+    return pair.split(":")[0].replace("/", "")
+
+
+class MMRBrackets:
+    """
+    Tiered maintenance margin: per pair, notional brackets with their MMR,
+    maintenance amount ("cum") and max leverage, as in the exchanges'
+    leverage-bracket endpoints.
+
+    Each pair's brackets are compiled once into sorted floor / mmr / cum /
+    max-leverage arrays; a lookup is a binary search on the floors
+    (bisect for one notional, np.searchsorted for an array of them), cheap
+    enough to recompute the liquidation price on every averaging-down fill.
+
+    With maintenance margin = notional * mmr - cum, the liquidation price is
+    compute_liq_price() with the effective rate mmr - cum / notional.
+
+    Example:
+        brackets = MMRBrackets.from_json("data/binance_brackets.json")
+        liq = brackets.liq_price(50000, "LONG", 20, "BTC/USDT:USDT", notional=250_000)
+    """
+
+    def __init__(self, brackets: Dict[str, List[dict]], default_mmr: float = MMR_TABLE["default"]):
+        """
+        Args:
+            brackets: pair (ccxt pair or exchange symbol) -> list of brackets,
+                      each {"notionalFloor", "maintMarginRatio"} and optionally
+                      "cum" and "initialLeverage" (Binance field names); a
+                      "default" entry applies to unlisted pairs
+            default_mmr: Flat MMR of pairs without brackets nor "default"
+        """
+        self.default_mmr = default_mmr
+        self.tables = {}
+        for pair, pair_brackets in brackets.items():
+            ordered = sorted(pair_brackets, key=lambda b: float(b.get("notionalFloor", 0)))
+            if not ordered:
+                raise ValueError(f"No bracket for {pair}")
+            floors = [float(b.get("notionalFloor", 0)) for b in ordered]
+            floors[0] = 0.0  # notionals below the first floor use the first bracket
+            self.tables[pair] = (
+                floors,
+                [float(b["maintMarginRatio"]) for b in ordered],
+                [float(b.get("cum", 0)) for b in ordered],
+                [float(b.get("initialLeverage", np.inf)) for b in ordered],
+            )
+        self.arrays = {pair: tuple(np.asarray(column, dtype=np.float64) for column in table)
+                       for pair, table in self.tables.items()}
+        self._resolved = {}
+
+    @classmethod
+    def from_json(cls, path: str, default_mmr: float = MMR_TABLE["default"]) -> "MMRBrackets":
+        """
+        Load a local snapshot: either the Binance /fapi/v1/leverageBracket
+        response (list of {"symbol", "brackets"}) or a dict pair -> brackets.
+        """
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, list):
+            data = {entry["symbol"]: entry["brackets"] for entry in data}
+        return cls(data, default_mmr)
+
+    @classmethod
+    def flat(cls, table: Dict[str, float] = MMR_TABLE) -> "MMRBrackets":
+        """One bracket per pair from a flat MMR table (same liq prices as get_mmr())."""
+        return cls({pair: [{"notionalFloor": 0, "maintMarginRatio": mmr}] for pair, mmr in table.items()},
+                   table.get("default", MMR_TABLE["default"]))
+
+    def _table(self, pair: str):
+        """Brackets of a pair (by pair, exchange symbol, then "default"), None if flat."""
+        if pair not in self._resolved:
+            symbol = snapshot_symbol(pair)
+            key = next((k for k in (pair, symbol, "default") if k in self.tables), None)
+            self._resolved[pair] = key
+        key = self._resolved[pair]
+        return None if key is None else self.tables[key]
+
+    def lookup(self, pair: str, notional: float) -> Tuple[float, float, float]:
+        """(mmr, cum, max leverage) of the bracket of `notional`."""
+        table = self._table(pair)
+        if table is None:
+            return self.default_mmr, 0.0, np.inf
+        floors, mmrs, cums, leverages = table
+        i = bisect_right(floors, abs(notional)) - 1
+        return mmrs[i], cums[i], leverages[i]
+
+    def lookup_many(self, pair: str, notionals) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """lookup() of an array of notionals: (mmr, cum, max leverage) arrays."""
+        notionals = np.abs(np.asarray(notionals, dtype=np.float64))
+        self._table(pair)
+        key = self._resolved[pair]
+        if key is None:
+            n = len(notionals)
+            return np.full(n, self.default_mmr), np.zeros(n), np.full(n, np.inf)
+        floors, mmrs, cums, leverages = self.arrays[key]
+        i = np.searchsorted(floors, notionals, side="right") - 1
+        return mmrs[i], cums[i], leverages[i]
+
+    def effective_mmr(self, pair: str, notional: float) -> float:
+        """MMR with the bracket's maintenance amount folded in: mmr - cum / notional."""
+        mmr, cum, _ = self.lookup(pair, notional)
+        return mmr - cum / abs(notional) if notional else mmr
+
+    def max_leverage(self, pair: str, notional: float) -> float:
+        return self.lookup(pair, notional)[2]
+
+    def liq_price(self, entry_price: float, side: str, leverage: float, pair: str, notional: float) -> float:
+        """compute_liq_price() with the MMR of the position's notional bracket."""
+        return compute_liq_price(entry_price, side, leverage, self.effective_mmr(pair, notional))
+
+
 # ============================================================================
 # Equity Calculation (Wallet + Unrealized PnL)
 # ============================================================================
@@ -276,7 +397,8 @@ class KillSwitch:
         self,
         day_pnl_threshold: float = -0.08,   # -8%
         hour_pnl_threshold: float = -0.12,  # -12%
-        pause_hours: int = 24
+        pause_hours: int = 24,
+        event_log: Optional[EventLog] = None
     ):
         """
         Initialize kill-switch.
@@ -285,10 +407,13 @@ class KillSwitch:
             day_pnl_threshold: Daily PnL threshold (e.g., -0.08 for -8%)
             hour_pnl_threshold: Hourly PnL threshold (e.g., -0.12 for -12%)
             pause_hours: Hours to pause trading after trigger
+            event_log: Where kill_switch_on / kill_switch_off events go
+                       (default: a new EventLog, see utilities/logger.py)
         """
         self.day_threshold = day_pnl_threshold
         self.hour_threshold = hour_pnl_threshold
         self.pause_hours = pause_hours
+        self.event_log = event_log if event_log is not None else EventLog()
 
         self.is_paused = False
         self.pause_until = None
@@ -318,7 +443,7 @@ class KillSwitch:
             if current_datetime >= self.pause_until:
                 self.is_paused = False
                 self.pause_until = None
-                print(f"Kill-switch expired at {current_datetime}. Trading resumed.")
+                self.event_log.emit("kill_switch_off", current_datetime)
 
         # If already paused, stay paused
         if self.is_paused:
@@ -344,13 +469,13 @@ class KillSwitch:
         if day_pnl_pct <= self.day_threshold:
             self.is_paused = True
             self.pause_until = current_datetime + pd.Timedelta(hours=self.pause_hours)
-            print(f"Kill-switch TRIGGERED (day PnL: {day_pnl_pct*100:.2f}%) at {current_datetime}. Paused until {self.pause_until}")
+            self.event_log.emit("kill_switch_on", current_datetime, value=day_pnl_pct * 100, detail="day PnL")
             return True
 
         if hour_pnl_pct <= self.hour_threshold:
             self.is_paused = True
             self.pause_until = current_datetime + pd.Timedelta(hours=self.pause_hours)
-            print(f"Kill-switch TRIGGERED (1h PnL: {hour_pnl_pct*100:.2f}%) at {current_datetime}. Paused until {self.pause_until}")
+            self.event_log.emit("kill_switch_on", current_datetime, value=hour_pnl_pct * 100, detail="1h PnL")
             return True
 
         return False
@@ -361,3 +486,173 @@ class KillSwitch:
         self.pause_until = None
         self.day_start_equity = None
         self.hour_start_equity = None
+
+
+class BarKillSwitch:
+    """
+    KillSwitch on integer bar positions, for the backtest loop.
+
+    The day / hour bucket of every bar and the bar trading resumes at after
+    a trigger are precomputed from the index, so update() only compares
+    integers. Same triggers as KillSwitch.update() on the same equity:
+    the hour bucket is the hour of the day, as in KillSwitch (a bar
+    exactly 24h after the last tracked one stays in its hour bucket).
+
+    Args:
+        index: DatetimeIndex of the bars update() is called on
+        day_pnl_threshold / hour_pnl_threshold / pause_hours: as KillSwitch
+        event_log: Where kill_switch_on / kill_switch_off events go
+    """
+
+    def __init__(
+        self,
+        index: pd.DatetimeIndex,
+        day_pnl_threshold: float = -0.08,
+        hour_pnl_threshold: float = -0.12,
+        pause_hours: int = 24,
+        event_log: Optional[EventLog] = None
+    ):
+        self.day_threshold = day_pnl_threshold
+        self.hour_threshold = hour_pnl_threshold
+        self.pause_hours = pause_hours
+        self.event_log = event_log if event_log is not None else EventLog()
+        self.index = index
+        self.day_ids, self.hour_ids, self.resume_bars = _kill_switch_buckets(index, pause_hours)
+        self.reset()
+
+    def update(self, bar_i: int, current_equity: float) -> bool:
+        """
+        Update the state on bar `bar_i` (bars in increasing order).
+
+        Returns:
+            True if trading is paused, False otherwise
+        """
+        if self.is_paused:
+            if bar_i < self.resume_bar:
+                return True
+            self.is_paused = False
+            self.event_log.emit("kill_switch_off", self.index[bar_i])
+
+        day = self.day_ids[bar_i]
+        if day != self.last_day:
+            self.day_start_equity = current_equity
+            self.last_day = day
+        hour = self.hour_ids[bar_i]
+        if hour != self.last_hour:
+            self.hour_start_equity = current_equity
+            self.last_hour = hour
+
+        day_start = self.day_start_equity
+        if day_start > 0 and (current_equity - day_start) / day_start <= self.day_threshold:
+            self._trigger(bar_i, (current_equity - day_start) / day_start, "day PnL")
+            return True
+        hour_start = self.hour_start_equity
+        if hour_start > 0 and (current_equity - hour_start) / hour_start <= self.hour_threshold:
+            self._trigger(bar_i, (current_equity - hour_start) / hour_start, "1h PnL")
+            return True
+        return False
+
+    def _trigger(self, bar_i: int, pnl_pct: float, detail: str):
+        self.is_paused = True
+        self.resume_bar = self.resume_bars[bar_i]
+        self.event_log.emit("kill_switch_on", self.index[bar_i], value=pnl_pct * 100, detail=detail)
+
+    def reset(self):
+        """Reset kill-switch state."""
+        self.is_paused = False
+        self.resume_bar = 0
+        self.day_start_equity = None
+        self.hour_start_equity = None
+        self.last_day = None
+        self.last_hour = None
+
+
+def _kill_switch_buckets(index: pd.DatetimeIndex, pause_hours: int) -> Tuple[list, list, list]:
+    """Day id, hour of day, and first bar at or after the pause end, of every bar."""
+    day_ids = (index.normalize().asi8 // 86_400_000_000_000).tolist()
+    hour_ids = index.hour.tolist()
+    resume_bars = np.searchsorted(index.asi8, (index + pd.Timedelta(hours=pause_hours)).asi8, side="left").tolist()
+    return day_ids, hour_ids, resume_bars
+
+
+def _bucket_starts(values: np.ndarray, ids: np.ndarray, previous_id, carried: float) -> np.ndarray:
+    """
+    Equity at the start of each bar's bucket (a bucket starts when the id
+    changes from the previous bar); the first bar continues `carried` if
+    its id is `previous_id`.
+    """
+    new = np.empty(len(ids), dtype=bool)
+    new[0] = ids[0] != previous_id
+    new[1:] = ids[1:] != ids[:-1]
+    start_pos = np.maximum.accumulate(np.where(new, np.arange(len(ids)), 0))
+    starts = values[start_pos]
+    if not new[0]:
+        starts[start_pos == 0] = carried
+    return starts
+
+
+def _pnl(values: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(starts > 0, (values - starts) / starts, 0.0)
+
+
+def compute_pause_windows(
+    equity: pd.Series,
+    day_pnl_threshold: float = -0.08,
+    hour_pnl_threshold: float = -0.12,
+    pause_hours: int = 24
+) -> pd.DataFrame:
+    """
+    Every kill-switch pause of an equity curve, without a per-bar loop.
+
+    Between two triggers the day / hour start equities and PnLs are computed
+    for all bars at once; the next trigger is the first bar past a
+    threshold, and the scan resumes at the first bar after its pause. The
+    triggers are those of KillSwitch.update() called on every bar.
+
+    Args:
+        equity: Equity per bar, indexed by bar date (sorted)
+
+    Returns:
+        DataFrame, one row per pause: start / end (pause_until) dates,
+        trigger ("day PnL" or "1h PnL"), pnl_pct, start_bar and resume_bar
+        (first bar after the pause, len(equity) if none)
+    """
+    columns = ["start", "end", "trigger", "pnl_pct", "start_bar", "resume_bar"]
+    values = equity.to_numpy(dtype=np.float64)
+    if len(values) == 0:
+        return pd.DataFrame(columns=columns)
+    day_ids, hour_ids, resume_bars = (np.asarray(ids) for ids in _kill_switch_buckets(equity.index, pause_hours))
+
+    rows = []
+    start = 0
+    previous_day = previous_hour = None
+    day_start = hour_start = np.nan
+    while start < len(values):
+        segment = values[start:]
+        day_starts = _bucket_starts(segment, day_ids[start:], previous_day, day_start)
+        hour_starts = _bucket_starts(segment, hour_ids[start:], previous_hour, hour_start)
+        day_pnl = _pnl(segment, day_starts)
+        hour_pnl = _pnl(segment, hour_starts)
+        hits = (day_pnl <= day_pnl_threshold) | (hour_pnl <= hour_pnl_threshold)
+        if not hits.any():
+            break
+        hit = int(np.argmax(hits))
+        bar = start + hit
+        if day_pnl[hit] <= day_pnl_threshold:
+            trigger, pnl = "day PnL", day_pnl[hit]
+        else:
+            trigger, pnl = "1h PnL", hour_pnl[hit]
+        rows.append({
+            "start": equity.index[bar],
+            "end": equity.index[bar] + pd.Timedelta(hours=pause_hours),
+            "trigger": trigger,
+            "pnl_pct": pnl * 100,
+            "start_bar": bar,
+            "resume_bar": int(resume_bars[bar]),
+        })
+        # State at the trigger bar, carried over the pause
+        previous_day, previous_hour = day_ids[bar], hour_ids[bar]
+        day_start, hour_start = day_starts[hit], hour_starts[hit]
+        start = int(resume_bars[bar])
+    return pd.DataFrame(rows, columns=columns)
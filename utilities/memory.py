@@ -0,0 +1,182 @@
+"""
+Memory accounting helpers for the backtest data pipeline.
+
+Used to compare the standard and compact (float32 / uint8 signals) modes
+and to size multi-process runs:
+
+    report = strategy_memory(strat)
+    print(report["bytes_per_pair_year"] / 1e6, "MB per pair-year")
+    print(estimate_universe_mb(report["bytes_per_pair_year"], n_pairs=28, years=5, workers=16))
+
+and to bound what optimisation sweeps keep in memory: run_backtest(keep=...)
+retains the full result, a summary (no trade / exposure / margin / event
+frames) or the metrics only, result_nbytes() measures what a result holds and
+peak_rss_mb() the peak memory of the current (worker) process.
+"""
+import sys
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+YEAR = pd.Timedelta(days=365.25)
+
+# Result retention levels of run_backtest(keep=...), most to least data
+KEEP_LEVELS = ("full", "summary", "metrics")
+_DROPPED = {
+    "full": (),
+    "summary": ("trades", "exposure_history", "margin_history", "events"),
+    "metrics": ("trades", "days", "exposure_history", "margin_history", "events"),
+}
+
+
+def frame_nbytes(df: pd.DataFrame) -> int:
+    """Deep memory usage of a DataFrame (index included)."""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def df_list_nbytes(df_list: Dict[str, pd.DataFrame]) -> int:
+    """Deep memory usage of a dict of DataFrames."""
+    return sum(frame_nbytes(df) for df in df_list.values())
+
+
+def pair_years(df_list: Dict[str, pd.DataFrame]) -> float:
+    """Sum over pairs of the covered period, in years."""
+    total = 0.0
+    for df in df_list.values():
+        if len(df) > 1:
+            total += (df.index[-1] - df.index[0]) / YEAR
+    return total
+
+
+def strategy_memory(strategy) -> dict:
+    """
+    Memory held by a multi-pair strategy after populate_buy_sell().
+
+    Returns:
+        dict with frames / signals / panel / total bytes and bytes_per_pair_year
+    """
+    frames = df_list_nbytes(strategy.df_list)
+    signals = 0
+    if hasattr(strategy, "signal_matrix"):
+        signals += int(strategy.signal_matrix.nbytes)
+    # Per-level open bits of the envelope engines
+    for bits in getattr(strategy, "level_bits", {}).values():
+        signals += int(bits.nbytes)
+    for name in ("open_long_obj", "close_long_obj", "open_short_obj", "close_short_obj"):
+        obj = getattr(strategy, name, None)
+        if isinstance(obj, pd.Series):
+            signals += int(obj.memory_usage(index=True, deep=True))
+    panel = getattr(strategy, "panel", None)
+    panel_bytes = int(panel.values.nbytes + panel.mask.nbytes) if panel is not None else 0
+    total = frames + signals + panel_bytes
+    years = pair_years(strategy.df_list)
+    return {
+        "frames": frames,
+        "signals": signals,
+        "panel": panel_bytes,
+        "total": total,
+        "pair_years": years,
+        "bytes_per_pair_year": total / years if years > 0 else float(np.nan),
+    }
+
+
+def estimate_universe_mb(bytes_per_pair_year: float, n_pairs: int = 28, years: float = 5,
+                         workers: int = 1) -> float:
+    """RAM (MB) needed for `workers` processes each holding the full universe."""
+    return bytes_per_pair_year * n_pairs * years * workers / 1e6
+
+
+def trade_summary(df_trades: pd.DataFrame, df_days: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Scalars of the trades / days frames used to score a backtest
+    (core.walk_forward.composite_score), kept when the frames are dropped.
+    """
+    n_trades = len(df_trades)
+    if n_trades:
+        if "trade_result" in df_trades.columns:
+            trade_result = df_trades["trade_result"]
+        else:
+            trade_result = (df_trades["close_trade_size"] - df_trades["open_trade_size"]
+                            - df_trades["open_fee"] - df_trades["close_fee"])
+        trade_win_rate = float((trade_result > 0).mean())
+        gross_profit = float(trade_result[trade_result > 0].sum())
+        gross_loss = float(abs(trade_result[trade_result < 0].sum()))
+    else:
+        trade_win_rate, gross_profit, gross_loss = float("nan"), 0.0, 0.0
+
+    if len(df_days):
+        wallet = df_days["wallet"]
+        cummax = wallet.cummax()
+        day_max_drawdown_pct = float(abs(((wallet - cummax) / cummax).min()) * 100)
+        last_day_wallet = float(wallet.iloc[-1])
+    else:
+        day_max_drawdown_pct, last_day_wallet = 0, float("nan")
+    return {
+        "n_trades": n_trades,
+        "trade_win_rate": trade_win_rate,
+        "gross_profit": gross_profit,
+        "gross_loss": gross_loss,
+        "n_days": len(df_days),
+        "day_max_drawdown_pct": day_max_drawdown_pct,
+        "last_day_wallet": last_day_wallet,
+    }
+
+
+def retain_result(result: Dict[str, Any], keep: str = "full") -> Dict[str, Any]:
+    """
+    Apply a retention level to a run_backtest() result.
+
+    Args:
+        keep: "full" (unchanged), "summary" (drops the trades, exposure,
+              margin and event frames, keeps days / event_counters / config) or
+              "metrics" (scalars and event counters only)
+
+    Returns:
+        The result itself for "full", otherwise a new dict with the kept
+        entries plus trade_summary() and "keep"
+    """
+    if keep not in KEEP_LEVELS:
+        raise ValueError(f"Invalid keep: {keep}. Must be one of {KEEP_LEVELS}")
+    if keep == "full":
+        return result
+    retained = {key: value for key, value in result.items() if key not in _DROPPED[keep]}
+    retained.update(trade_summary(result["trades"], result["days"]))
+    retained["keep"] = keep
+    return retained
+
+
+def result_nbytes(obj: Any) -> int:
+    """Approximate deep size of a backtest result (frames, arrays, nested dicts)."""
+    if isinstance(obj, pd.DataFrame):
+        return frame_nbytes(obj)
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(index=True, deep=True))
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(sys.getsizeof(key) + result_nbytes(value) for key, value in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return sys.getsizeof(obj) + sum(result_nbytes(value) for value in obj)
+    return sys.getsizeof(obj)
+
+
+def peak_rss_mb() -> Optional[float]:
+    """
+    Peak resident memory of the current process in MB (None if unavailable:
+    on Windows it needs psutil).
+    """
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # bytes on macOS, kilobytes on Linux
+        return peak / 1e6 if sys.platform == "darwin" else peak * 1024 / 1e6
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / 1e6
+    except (ImportError, AttributeError):
+        return None
@@ -0,0 +1,134 @@
+"""
+Aligned multi-pair OHLCV panel.
+
+Pairs are listed at different dates and can have holes, so the multi-pair
+engines used to test `index in df.index` for every pair on every bar. A
+DataPanel aligns all pairs once on the union of their timestamps:
+
+    values[bar, pair, field]   float64, NaN where the pair has no bar
+    mask[bar, pair]            True where the pair has a bar
+
+Usage:
+    panel = exchange.load_panel(pairs, "1h", start_date="2023-01-01")
+    close = panel.field("close")            # (n_bars, n_pairs)
+    df_list = panel.to_df_list()            # dict for the existing engines
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+OHLCV_FIELDS = ("open", "high", "low", "close", "volume")
+
+
+class DataPanel:
+    """Bars x pairs x fields array with a validity mask."""
+
+    def __init__(self, index: pd.DatetimeIndex, pairs: Sequence[str], fields: Sequence[str],
+                 values: np.ndarray, mask: np.ndarray):
+        if values.shape != (len(index), len(pairs), len(fields)):
+            raise ValueError(f"values shape {values.shape} does not match "
+                             f"({len(index)}, {len(pairs)}, {len(fields)})")
+        if mask.shape != (len(index), len(pairs)):
+            raise ValueError(f"mask shape {mask.shape} does not match ({len(index)}, {len(pairs)})")
+        self.index = index
+        self.pairs = list(pairs)
+        self.fields = list(fields)
+        self.values = values
+        self.mask = mask
+        self.pair_pos = {pair: i for i, pair in enumerate(self.pairs)}
+        self.field_pos = {field: i for i, field in enumerate(self.fields)}
+
+    def __repr__(self) -> str:
+        return (f"DataPanel({len(self.index)} bars x {len(self.pairs)} pairs x "
+                f"{len(self.fields)} fields)")
+
+    @property
+    def shape(self) -> Tuple[int, int, int]:
+        return self.values.shape
+
+    def field(self, name: str) -> np.ndarray:
+        """2-D view (bars x pairs) of one field."""
+        return self.values[:, :, self.field_pos[name]]
+
+    def pair_frame(self, pair: str) -> pd.DataFrame:
+        """DataFrame of one pair, restricted to the bars where it exists."""
+        col = self.pair_pos[pair]
+        present = self.mask[:, col]
+        return pd.DataFrame(self.values[present, col, :], index=self.index[present],
+                            columns=self.fields)
+
+    def to_df_list(self) -> Dict[str, pd.DataFrame]:
+        """dict pair -> DataFrame, the input format of the multi-pair strategies."""
+        return {pair: self.pair_frame(pair) for pair in self.pairs}
+
+    def oldest_pair(self) -> str:
+        """Pair with the earliest first bar (ties: the one with the most bars)."""
+        first = np.where(self.mask.any(axis=0), self.mask.argmax(axis=0), len(self.index))
+        order = np.lexsort((-self.mask.sum(axis=0), first))
+        return self.pairs[int(order[0])]
+
+    def slice(self, start_date=None, end_date=None) -> "DataPanel":
+        """Sub-panel between two dates (inclusive, like DataFrame.loc). Shares memory."""
+        lo, hi = date_window(self.index, start_date, end_date)
+        return DataPanel(self.index[lo:hi], self.pairs, self.fields,
+                         self.values[lo:hi], self.mask[lo:hi])
+
+
+def date_window(index: pd.Index, start_date=None, end_date=None) -> Tuple[int, int]:
+    """
+    (start_idx, end_idx) rows of a sorted index between two dates (inclusive,
+    like DataFrame.loc), for the engines' window= argument.
+    """
+    lo = 0 if start_date is None else int(index.searchsorted(pd.Timestamp(start_date), side="left"))
+    hi = len(index) if end_date is None else int(index.searchsorted(pd.Timestamp(end_date), side="right"))
+    return lo, hi
+
+
+def build_panel(df_list: Dict[str, pd.DataFrame], fields: Sequence[str] = OHLCV_FIELDS,
+                dtype=np.float64) -> DataPanel:
+    """
+    Align a dict of per-pair DataFrames on the union of their timestamps.
+
+    Args:
+        df_list: dict pair -> DataFrame indexed by date (unique, sorted)
+        fields: Columns to keep
+        dtype: Values dtype (np.float32 halves the panel of float32 frames)
+
+    Returns:
+        DataPanel
+    """
+    pairs = list(df_list)
+    if not pairs:
+        raise ValueError("build_panel needs at least one pair")
+
+    index = df_list[pairs[0]].index
+    for pair in pairs[1:]:
+        index = index.union(df_list[pair].index)
+
+    values = np.full((len(index), len(pairs), len(fields)), np.nan, dtype=dtype)
+    mask = np.zeros((len(index), len(pairs)), dtype=bool)
+    for col, pair in enumerate(pairs):
+        df = df_list[pair]
+        rows = index.get_indexer(df.index)
+        mask[rows, col] = True
+        values[rows, col, :] = df[list(fields)].to_numpy(dtype=dtype)
+
+    return DataPanel(index, pairs, fields, values, mask)
+
+
+def presence_mask(df_list: Dict[str, pd.DataFrame], index: pd.Index,
+                  pairs: Optional[List[str]] = None) -> Tuple[np.ndarray, Dict[str, int]]:
+    """
+    Boolean matrix (len(index) x n_pairs) telling which pair has a bar at each date.
+
+    Used by the bar loops instead of `index in df.index` on every bar.
+
+    Returns:
+        (mask, {pair: column})
+    """
+    pairs = list(df_list) if pairs is None else pairs
+    mask = np.empty((len(index), len(pairs)), dtype=bool)
+    for col, pair in enumerate(pairs):
+        mask[:, col] = index.isin(df_list[pair].index)
+    return mask, {pair: col for col, pair in enumerate(pairs)}
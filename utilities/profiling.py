@@ -0,0 +1,74 @@
+"""
+Per-phase wall-time counters for the backtest hot loop.
+
+EnvelopeMulti_v2.run_backtest(profile=...) times each phase of its bar loop
+with perf_counter_ns() and returns the totals next to event_counters:
+
+    result = strategy.run_backtest(**params, profile=True)
+    print(result["phase_profile"])  # calls / total_ms / mean_us / share per phase
+
+Pass the same PhaseProfiler to several runs (e.g. every fold of a
+walk-forward) to accumulate their counters. With profile=None (default)
+the loop only pays an `is not None` test per phase.
+"""
+from time import perf_counter_ns
+from typing import Dict, Optional, Union
+
+import pandas as pd
+
+# Phases of EnvelopeMulti_v2.run_backtest, in loop order. "cap_checks" is
+# nested in "open_long" / "open_short"; "loop" is the whole bar loop.
+PHASES = (
+    "equity_update",
+    "daily_snapshot",
+    "liquidation_scan",
+    "stop_loss_scan",
+    "ma_base_close",
+    "open_long",
+    "open_short",
+    "cap_checks",
+    "intrabar_exits",
+    "loop",
+)
+
+
+class PhaseProfiler:
+    """Accumulated nanoseconds and call count of each phase."""
+
+    def __init__(self):
+        self.ns: Dict[str, int] = dict.fromkeys(PHASES, 0)
+        self.calls: Dict[str, int] = dict.fromkeys(PHASES, 0)
+
+    @staticmethod
+    def resolve(profile: Union[bool, "PhaseProfiler", None]) -> Optional["PhaseProfiler"]:
+        """Profiler for a run_backtest `profile` argument (None when disabled)."""
+        if isinstance(profile, PhaseProfiler):
+            return profile
+        return PhaseProfiler() if profile else None
+
+    def add(self, phase: str, start_ns: int):
+        """Close a phase started at `start_ns` (a perf_counter_ns() value)."""
+        self.ns[phase] = self.ns.get(phase, 0) + perf_counter_ns() - start_ns
+        self.calls[phase] = self.calls.get(phase, 0) + 1
+
+    def reset(self):
+        for phase in self.ns:
+            self.ns[phase] = 0
+            self.calls[phase] = 0
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        One row per phase: calls, total_ms, mean_us and share of the loop time.
+        """
+        loop_ns = self.ns.get("loop", 0)
+        rows = []
+        for phase, ns in self.ns.items():
+            calls = self.calls[phase]
+            rows.append({
+                "phase": phase,
+                "calls": calls,
+                "total_ms": ns / 1e6,
+                "mean_us": ns / calls / 1e3 if calls else 0.0,
+                "share": ns / loop_ns if loop_ns else 0.0,
+            })
+        return pd.DataFrame(rows).set_index("phase")
@@ -0,0 +1,175 @@
+"""
+OHLCV resampling from a single base timeframe.
+
+Derives coarser timeframes (4h, 1d, 1w, ...) from the finest stored one
+instead of downloading every timeframe separately. Buckets follow the
+exchange convention: labelled by their open time, closed on the left and
+anchored on the epoch (UTC midnight), weeks start on Monday and months on
+the 1st.
+
+Derived series are cached as .npz files keyed by the size / mtime of the
+source CSV, so a new timeframe costs one aggregation and is then loaded
+as fast as a native file.
+
+Usage:
+    df_1h = read_ohlcv_csv("database/binance/1h/BTC-USDT-USDT.csv")
+    df_4h = resample_ohlcv(df_1h, "4h")
+"""
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+
+# Timeframe -> pandas resampling rule
+RESAMPLE_RULES = {
+    "1m": "1min",
+    "2m": "2min",
+    "5m": "5min",
+    "15m": "15min",
+    "30m": "30min",
+    "1h": "1h",
+    "2h": "2h",
+    "4h": "4h",
+    "12h": "12h",
+    "1d": "1D",
+    "1w": "W-MON",
+    "1M": "MS",
+}
+
+# Calendar timeframes: aligned on calendar boundaries, not on the epoch
+CALENDAR_TIMEFRAMES = {"1w", "1M"}
+
+OHLCV_AGG = {
+    "open": "first",
+    "high": "max",
+    "low": "min",
+    "close": "last",
+    "volume": "sum",
+}
+
+CACHE_VERSION = 1
+
+
+def can_derive(base: str, target: str, intervals_ms: Dict[str, int]) -> bool:
+    """
+    Check whether `target` bars can be built exactly from `base` bars.
+
+    Args:
+        base: Stored timeframe (e.g. "1h")
+        target: Requested timeframe (e.g. "4h")
+        intervals_ms: Mapping timeframe -> bar duration in ms
+    """
+    if base == target or base not in RESAMPLE_RULES or target not in RESAMPLE_RULES:
+        return False
+    base_ms, target_ms = intervals_ms[base], intervals_ms[target]
+    if target in CALENDAR_TIMEFRAMES:
+        # Any intraday/daily base tiles weeks and months
+        return base not in CALENDAR_TIMEFRAMES and 86400000 % base_ms == 0
+    return target_ms > base_ms and target_ms % base_ms == 0
+
+
+def read_ohlcv_csv(file_name: str) -> pd.DataFrame:
+    """Read a stored CSV the same way ExchangeDataManager.load_data() does (full range)."""
+    df = pd.read_csv(file_name, index_col=0)
+    df.index = pd.to_datetime(df.index, unit='ms')
+    return df.groupby(df.index).first()
+
+
+def resample_ohlcv(df: pd.DataFrame, interval: str,
+                   base_interval_ms: Optional[int] = None,
+                   drop_partial: bool = True) -> pd.DataFrame:
+    """
+    Aggregate OHLCV bars into a coarser timeframe.
+
+    Args:
+        df: OHLCV DataFrame indexed by bar open time (sorted, unique)
+        interval: Target timeframe, a key of RESAMPLE_RULES
+        base_interval_ms: Duration of the source bars, used to detect an
+            incomplete trailing bucket (inferred from the index if None)
+        drop_partial: Drop the last bucket when the source stops before its end
+
+    Returns:
+        DataFrame with the same columns, one row per non-empty bucket
+    """
+    if interval not in RESAMPLE_RULES:
+        raise ValueError(f"Unknown timeframe {interval}")
+    rule = RESAMPLE_RULES[interval]
+    if df.empty:
+        return df.copy()
+
+    kwargs = {"label": "left", "closed": "left"}
+    if interval not in CALENDAR_TIMEFRAMES:
+        kwargs["origin"] = "epoch"
+
+    agg = {col: how for col, how in OHLCV_AGG.items() if col in df.columns}
+    out = df.resample(rule, **kwargs).agg(agg)
+    # Buckets without any source bar (exchange downtime) are not bars
+    out = out.dropna(subset=[c for c in ("open", "close") if c in out.columns], how="all")
+    out.index.name = df.index.name
+
+    if drop_partial and len(out):
+        if base_interval_ms is None and len(df) > 1:
+            base_interval_ms = int(np.diff(df.index.asi8).min() // 1_000_000)
+        if base_interval_ms:
+            bucket_end = out.index[-1] + to_offset(rule)
+            last_bar_end = df.index[-1] + pd.Timedelta(milliseconds=base_interval_ms)
+            if last_bar_end < bucket_end:
+                out = out.iloc[:-1]
+    return out
+
+
+def _source_signature(source_path: str) -> np.ndarray:
+    stat = os.stat(source_path)
+    return np.array([CACHE_VERSION, stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+
+def load_resampled(source_path: str, interval: str, base_interval_ms: int,
+                   cache_path: Optional[str] = None) -> pd.DataFrame:
+    """
+    Derive `interval` bars from a stored CSV, going through an .npz cache.
+
+    The trailing bucket is kept even if incomplete, exactly like the last
+    candle of a native file: callers drop it the same way.
+
+    Args:
+        source_path: CSV of the base timeframe
+        interval: Target timeframe
+        base_interval_ms: Duration of the base bars
+        cache_path: .npz file for the derived arrays (no caching if None)
+    """
+    signature = _source_signature(source_path)
+
+    if cache_path is not None and os.path.exists(cache_path):
+        try:
+            with np.load(cache_path, allow_pickle=False) as cached:
+                if np.array_equal(cached["signature"], signature) and \
+                        int(cached["base_interval_ms"]) == base_interval_ms:
+                    index = pd.to_datetime(cached["index"], unit='ns')
+                    index.name = str(cached["index_name"])
+                    return pd.DataFrame(cached["values"], index=index,
+                                        columns=[str(c) for c in cached["columns"]])
+        except (OSError, KeyError, ValueError):
+            pass
+
+    out = resample_ohlcv(read_ohlcv_csv(source_path), interval,
+                         base_interval_ms=base_interval_ms, drop_partial=False)
+    # Same index as a native file (no frequency attached)
+    out.index = pd.DatetimeIndex(out.index.asi8.astype("datetime64[ns]"), name=out.index.name)
+
+    if cache_path is not None:
+        Path(cache_path).parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = f"{cache_path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            signature=signature,
+            base_interval_ms=np.int64(base_interval_ms),
+            index=out.index.asi8,
+            index_name=np.str_(out.index.name or "date"),
+            columns=np.array(out.columns, dtype=str),
+            values=out.to_numpy(dtype=np.float64),
+        )
+        os.replace(tmp_path, cache_path)
+    return out
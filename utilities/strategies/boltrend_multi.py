@@ -5,6 +5,7 @@ import numpy as np
 import pandas as pd
 from utilities.bt_analysis import get_n_columns, get_metrics
 from utilities.VaR import ValueAtRisk
+from utilities.panel import DataPanel, presence_mask
 import copy
 
 class BollingerTrendMulti():
@@ -15,6 +16,11 @@ class BollingerTrendMulti():
         parameters_obj,
         type=["long"],
     ):
+        # Aligned panel (ExchangeDataManager.load_panel) accepted as input
+        if isinstance(df_list, DataPanel):
+            if oldest_pair is None:
+                oldest_pair = df_list.oldest_pair()
+            df_list = df_list.to_df_list()
         self.df_list = df_list
         self.oldest_pair = oldest_pair
         self.parameters_obj = parameters_obj
@@ -160,8 +166,10 @@ class BollingerTrendMulti():
             positions_exposition[pair] = {"long":0, "short":0}
         var = ValueAtRisk(df_list=self.df_list.copy())
         var_counter = 0
-        
-        for index, row in df_ini.iterrows():
+        presence, pair_col = presence_mask(self.df_list, df_ini.index)
+
+        for bar_i, (index, row) in enumerate(df_ini.iterrows()):
+            present = presence[bar_i]
             if max_var != 0:
                 if var_counter == 0:
                     var.update_cov(current_date=index, occurance_data=1000)
@@ -173,6 +181,8 @@ class BollingerTrendMulti():
             if previous_day != current_day:
                 temp_wallet = wallet
                 for pos in current_positions:
+                    if not present[pair_col[pos]]:
+                        continue
                     actual_row = self.df_list[pos].loc[index]
                     if current_positions[pos]['side'] == "LONG":
                         close_price = actual_row['close']
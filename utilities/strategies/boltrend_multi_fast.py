@@ -0,0 +1,171 @@
+import sys
+sys.path.append('../..')
+import numpy as np
+from utilities.VaR import ValueAtRisk
+from utilities.indicator_store import IndicatorStore
+from utilities.strategies.boltrend_multi import BollingerTrendMulti
+from utilities.strategies.engine_base import MultiPairEngine
+
+"""
+Array-based BollingerTrendMulti engine.
+
+Same inputs, signals, trades and days as BollingerTrendMulti, without the
+per-pair indicator columns, the concatenated signal Series, iterrows(), the
+per-position .loc lookups and the deepcopy + get_var() per entry candidate.
+The loop, panel and recorders come from MultiPairEngine (engine_base.py):
+
+- populate_indicators() reads the Bollinger bands / long MA from an
+  IndicatorStore (pass the same store to every run of a sweep), the missing
+  pairs being computed in one batch over the aligned panel
+- the long/short exposure of each pair is kept in one array and all the
+  entry candidates of a bar are scored with one batched VaR call
+
+Candidates whose batched VaR lands within 1e-9 of max_var (or is NaN) are
+re-evaluated with the exact get_var() arithmetic, so accept / reject
+decisions are identical to the reference engine.
+"""
+
+VAR_TOLERANCE = 1e-9
+
+
+class BollingerTrendMultiFast(MultiPairEngine, BollingerTrendMulti):
+    open_reason = "Limit"
+    close_reason = "Limit"
+
+    def __init__(
+        self,
+        df_list,
+        oldest_pair,
+        parameters_obj,
+        type=["long"],
+        indicator_store=None,
+    ):
+        BollingerTrendMulti.__init__(self, df_list, oldest_pair, parameters_obj, type=type)
+        self.indicator_store = indicator_store if indicator_store is not None else IndicatorStore()
+
+    def populate_indicators(self, show_log=False):
+        closes = {pair: df["close"] for pair, df in self.df_list.items()}
+        params = self.parameters_obj
+        # All pairs in one panel-wide call (utilities/batch_indicators.py)
+        bands = self.indicator_store.bollinger_many(
+            closes, {pair: (params[pair]["bb_window"], params[pair]["bb_std"]) for pair in closes})
+        long_mas = self.indicator_store.sma_many(
+            closes, {pair: params[pair]["long_ma_window"] for pair in closes})
+        self.indicators = {}
+        for pair, close in closes.items():
+            lower_band, higher_band, ma_band = bands[pair]
+            self.indicators[pair] = {
+                "close": close.to_numpy(dtype=np.float64),
+                "lower_band": lower_band,
+                "higher_band": higher_band,
+                "ma_band": ma_band,
+                "long_ma": long_mas[pair],
+            }
+        if show_log:
+            print(self.indicators[self.oldest_pair])
+        return self.df_list[self.oldest_pair]
+
+    def pair_signals(self, pair):
+        ind = self.indicators[pair]
+        close = ind["close"]
+        n1_close = np.r_[np.nan, close[:-1]]
+        signals = {}
+        if self.use_long:
+            n1_higher_band = np.r_[np.nan, ind["higher_band"][:-1]]
+            signals["open_long"] = (n1_close < n1_higher_band) & (close > ind["higher_band"]) & (close > ind["long_ma"])
+            signals["close_long"] = close < ind["ma_band"]
+        if self.use_short:
+            n1_lower_band = np.r_[np.nan, ind["lower_band"][:-1]]
+            signals["open_short"] = (n1_close > n1_lower_band) & (close < ind["lower_band"]) & (close < ind["long_ma"])
+            signals["close_short"] = close > ind["ma_band"]
+        return signals
+
+    def position_size(self, pair, wallet, leverage):
+        return wallet * self.wallet_exposure[pair] * leverage
+
+    def accept_entry(self, side, pair, k, open_row):
+        offset = 0 if side == "LONG" else 1
+        if not self.side_exposition[offset] + self.wallet_exposure[pair] <= 1:
+            return False
+        if self.max_var != 0:
+            if self._risks_row is not open_row:
+                self._risks = self._candidate_risks(
+                    self.var, self.exposure, open_row[k:], self.var_columns[offset],
+                    self.wallet_exposure, self.max_var)
+                self._risks_row = open_row
+            if self._risks[pair] > self.max_var:
+                return False
+        return True
+
+    def on_open(self, side, pair):
+        offset = 0 if side == "LONG" else 1
+        self.side_exposition[offset] += self.wallet_exposure[pair]
+        self.exposure[self.var_columns[offset][pair]] += self.wallet_exposure[pair]
+        # Exposure changed: remaining candidates must be re-scored
+        self._risks_row = None
+
+    def on_close(self, side, pair):
+        offset = 0 if side == "LONG" else 1
+        self.side_exposition[offset] -= self.wallet_exposure[pair]
+        self.exposure[self.var_columns[offset][pair]] -= self.wallet_exposure[pair]
+
+    def on_bar(self, i, b):
+        if self.max_var != 0:
+            if self.var_counter == 0:
+                self.var.update_cov_arrays(
+                    self.var_closes, dict(zip(self.pairs, self.var_rows[b].tolist())), occurance_data=1000)
+                self.var_counter = 1000
+            else:
+                self.var_counter -= 1
+        self._risks_row = None
+
+    def day_report(self, b):
+        if self.max_var != 0:
+            risk = self.var.get_var_from_exposure(self.exposure)
+        else:
+            risk = 0
+        return self.side_exposition[0], self.side_exposition[1], {"risk": risk}
+
+    @staticmethod
+    def _candidate_risks(var, exposure, candidates, columns, wallet_exposure, max_var):
+        """VaR after adding each candidate to the current exposure, in one batch."""
+        trial = np.repeat(exposure[None, :], len(candidates), axis=0)
+        for k, pos in enumerate(candidates):
+            trial[k, columns[pos]] += wallet_exposure[pos]
+        risks = var.get_var_batch(trial)
+        # Too close to the threshold to trust the batched summation order
+        doubtful = ~np.isfinite(risks) | (np.abs(risks - max_var) <= VAR_TOLERANCE * max(1.0, abs(max_var)))
+        for k in np.flatnonzero(doubtful).tolist():
+            risks[k] = var.get_var_from_exposure(trial[k])
+        return dict(zip(candidates, risks.tolist()))
+
+    def run_backtest(self, initial_wallet=1000, leverage=1, max_var=1, maker_fee=0, taker_fee=0.0007, window=None,
+                     keep="full"):
+        pairs = self.pairs
+        self.max_var = max_var
+        self.wallet_exposure = {pair: self.parameters_obj[pair]['wallet_exposure'] for pair in pairs}
+        # [long, short], same int/float arithmetic as the reference variables
+        self.side_exposition = [0, 0]
+        # [long_pair1, short_pair1, long_pair2, ...] like the VaR covariance columns
+        self.exposure = np.zeros(2 * len(pairs))
+        self.var_columns = (
+            {pair: 2 * col for pair, col in self.pair_col.items()},
+            {pair: 2 * col + 1 for pair, col in self.pair_col.items()},
+        )
+        self.var = ValueAtRisk(df_list=self.df_list)
+        self.var_closes = {pair: self.indicators[pair]["close"] for pair in pairs}
+        # Row of each panel bar inside each pair (-1 when the pair has no bar)
+        mask = self.panel.mask
+        self.var_rows = np.where(mask, np.cumsum(mask, axis=0) - 1, -1)
+        self.var_counter = 0
+        self._risks = None
+        self._risks_row = None
+
+        wallet, recorder = self.run_engine(
+            self._loop_index(window=window), initial_wallet, leverage,
+            open_fee_rate=taker_fee, close_fee_rate=maker_fee, valuation_fee_rate=taker_fee,
+        )
+        if len(recorder.trades) == 0:
+            print("No trades")
+            return None
+        return recorder.result(wallet, keep)
@@ -0,0 +1,494 @@
+import sys
+sys.path.append('../..')
+from time import perf_counter_ns
+import numpy as np
+import pandas as pd
+from utilities.bt_analysis import get_metrics
+from utilities.memory import retain_result
+from utilities.panel import DataPanel, build_panel, date_window
+
+"""
+Shared core of the array-based multi-pair engines.
+
+A strategy built on MultiPairEngine only supplies:
+
+- populate_indicators(): per-pair indicators (columns of df_list or arrays)
+- pair_signals(pair): boolean arrays over the pair's own rows, keyed by
+  SIGNALS (missing keys = never)
+- fill rules: price_fields / fill_field / valuation_field / day_price_field,
+  fee rates and reasons, and optionally the sizing / gating hooks
+  (position_size, accept_entry, on_open, on_close, on_bar, day_report)
+- for richer position models, the step hooks: day_snapshot,
+  exit_positions (forced exits before the signal closes), open_signal
+  (entries, e.g. several levels per pair) and after_opens
+
+and gets the aligned panel, the bars x pairs signal matrix, the position
+book, the trade / day recorders and the metrics from here. The loop follows
+the step order of the original engines (daily snapshot, forced exits, long
+closes, short closes, long opens, short opens) so the subclasses reproduce
+their trades. EnvelopeMulti_v2 adds its margin, liquidation, stop-loss,
+kill-switch and intrabar rules through these hooks.
+
+    class MyStrategy(MultiPairEngine):
+        def pair_signals(self, pair):
+            df = self.df_list[pair]
+            return {"open_long": (df["close"] > df["ma"]).to_numpy(),
+                    "close_long": (df["close"] < df["ma"]).to_numpy()}
+"""
+
+SIGNALS = ("open_long", "close_long", "open_short", "close_short")
+# Bit of each signal in the (bars x pairs) uint8 signal_matrix
+SIGNAL_BITS = {name: 1 << bit for bit, name in enumerate(SIGNALS)}
+SIDES = ("LONG", "SHORT")
+
+
+class PositionBook:
+    """Open positions keyed by pair, plus per-side views in insertion order."""
+
+    def __init__(self):
+        self.positions = {}
+        self.by_side = {side: {} for side in SIDES}
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, pair):
+        return pair in self.positions
+
+    def __iter__(self):
+        return iter(self.positions)
+
+    def __getitem__(self, pair):
+        return self.positions[pair]
+
+    def open(self, pair, position):
+        self.positions[pair] = position
+        self.by_side[position["side"]][pair] = True
+
+    def close(self, pair):
+        position = self.positions.pop(pair)
+        del self.by_side[position["side"]][pair]
+        return position
+
+    def to_close(self, side, close_row):
+        """
+        Pairs of `side` listed in close_row.
+
+        Same keys, inserted in the same order, as the original engines'
+        set({k: v ... if v['side'] == side}).intersection(set(close_row)):
+        the set iterates in the same order, so trades come out identical.
+        """
+        if not close_row or not self.by_side[side]:
+            return ()
+        return set(self.by_side[side]).intersection(set(close_row))
+
+
+class BacktestRecorder:
+    """Trade and daily snapshot records, in the format of the original engines."""
+
+    def __init__(self):
+        self.trades = []
+        self.days = []
+
+    def add_day(self, index, wallet, price, long_exposition=0, short_exposition=0, **extra):
+        """Daily snapshot; extra columns (e.g. risk) are appended in keyword order."""
+        self.days.append({
+            "day": str(index.year) + "-" + str(index.month) + "-" + str(index.day),
+            "wallet": wallet,
+            "price": price,
+            "long_exposition": long_exposition,
+            "short_exposition": short_exposition,
+            **extra,
+        })
+
+    def add_trade(self, pair, position, close_date, close_reason, close_price, close_fee,
+                  close_trade_size, wallet):
+        self.trades.append({
+            "pair": pair,
+            "open_date": position["date"],
+            "close_date": close_date,
+            "position": position["side"],
+            "open_reason": position["reason"],
+            "close_reason": close_reason,
+            "open_price": position["price"],
+            "close_price": close_price,
+            "open_fee": position["fee"],
+            "close_fee": close_fee,
+            "open_trade_size": position["size"],
+            "close_trade_size": close_trade_size,
+            "wallet": wallet,
+        })
+
+    def days_frame(self):
+        df_days = pd.DataFrame(self.days)
+        df_days["day"] = pd.to_datetime(df_days["day"])
+        return df_days.set_index(df_days["day"])
+
+    def trades_frame(self):
+        df_trades = pd.DataFrame(self.trades)
+        df_trades["open_date"] = pd.to_datetime(df_trades["open_date"])
+        return df_trades.set_index(df_trades["open_date"])
+
+    def result(self, wallet, keep="full", **extra):
+        """
+        run_backtest() result, with the retention level of
+        utilities.memory.retain_result(). Extra entries are appended in
+        keyword order; without closed trades there are no metrics.
+        """
+        df_days = self.days_frame()
+        if not self.trades:
+            return retain_result({
+                "wallet": wallet,
+                "trades": pd.DataFrame(self.trades),
+                "days": df_days,
+            } | extra, keep)
+        df_trades = self.trades_frame()
+        return retain_result(get_metrics(df_trades, df_days) | {
+            "wallet": wallet,
+            "trades": df_trades,
+            "days": df_days,
+        } | extra, keep)
+
+
+class RiskHistory:
+    """
+    Exposure and margin time series, one sample every `stride` bars, written
+    into arrays preallocated for the whole run (no per-bar dict / list growth).
+
+    Exposures are position notionals ("size"), like check_exposure_caps().
+    """
+
+    def __init__(self, index, stride=1):
+        if stride < 1:
+            raise ValueError(f"Invalid history stride: {stride}. Must be >= 1")
+        self.stride = stride
+        self.index = index
+        size = -(-len(index) // stride)
+        self.bars = np.empty(size, dtype=np.int64)
+        self.values = np.empty((size, 5), dtype=np.float64)
+        self.n = 0
+
+    def due(self, bar_i):
+        return bar_i % self.stride == 0
+
+    def record(self, bar_i, positions, used_margin, equity):
+        long_exposure = 0.0
+        short_exposure = 0.0
+        for position in positions.values():
+            if position["side"] == "LONG":
+                long_exposure += position["size"]
+            else:
+                short_exposure += position["size"]
+        self.bars[self.n] = bar_i
+        self.values[self.n] = (long_exposure, short_exposure, used_margin, equity, equity - used_margin)
+        self.n += 1
+
+    def frames(self):
+        """(exposure DataFrame, margin DataFrame), indexed by bar date."""
+        index = self.index[self.bars[:self.n]]
+        values = self.values[:self.n]
+        long_exposure, short_exposure, used_margin, equity, free_margin = values.T
+        df_exposure = pd.DataFrame({
+            "gross_exposure": long_exposure + short_exposure,
+            "long_exposure": long_exposure,
+            "short_exposure": short_exposure,
+        }, index=index)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            margin_ratio = np.where(equity > 0, used_margin / equity, np.nan)
+        df_margin = pd.DataFrame({
+            "used_margin": used_margin,
+            "equity": equity,
+            "free_margin": free_margin,
+            "margin_ratio": margin_ratio,
+        }, index=index)
+        return df_exposure, df_margin
+
+
+class MultiPairEngine:
+    # Panel fields read by the loop
+    price_fields = ("close",)
+    # Panel dtype: float32 halves the panel, bars are read back in float64
+    panel_dtype = np.float64
+    # Price of opens / closes, of the daily valuation and of the daily "price" column
+    fill_field = "close"
+    valuation_field = "close"
+    day_price_field = "close"
+    open_reason = "Market"
+    close_reason = "Market"
+    # Profiler phase (utilities/profiling.py) of the loop steps timed here
+    phase_names = {"bar": "bar_start", "day": "daily_snapshot", "close": "signal_close",
+                   "LONG": "open_long", "SHORT": "open_short"}
+
+    def __init__(self, df_list, oldest_pair, type=["long"]):
+        # Aligned panel (ExchangeDataManager.load_panel) accepted as input
+        if isinstance(df_list, DataPanel):
+            if oldest_pair is None:
+                oldest_pair = df_list.oldest_pair()
+            df_list = df_list.to_df_list()
+        self.df_list = df_list
+        self.oldest_pair = oldest_pair
+        self.use_long = True if "long" in type else False
+        self.use_short = True if "short" in type else False
+
+    # -- Strategy hooks --
+
+    def pair_signals(self, pair):
+        """dict signal name -> boolean array over the pair's own rows."""
+        raise NotImplementedError
+
+    def signal_rank(self):
+        """
+        (bars x pairs) order of the pairs inside a bar, or None for df_list
+        order. Called once the panel is built.
+        """
+        return None
+
+    def position_size(self, pair, wallet, leverage):
+        raise NotImplementedError
+
+    def accept_entry(self, side, pair, k, open_row):
+        """Gate on open_row[k] (not already in a position). Default: always open."""
+        return True
+
+    def on_open(self, side, pair):
+        pass
+
+    def on_close(self, side, pair):
+        """
+        Called on a signal close, wallet credited, position still in the book.
+        A truthy return stops the closes of this side on the current bar.
+        """
+        pass
+
+    def on_bar(self, i, b):
+        """Called at the start of each loop bar (i: loop bar, b: panel row)."""
+        pass
+
+    def day_report(self, b):
+        """long_exposition / short_exposition / extra columns of the daily snapshot."""
+        return 0, 0, {"risk": 0}
+
+    def exit_positions(self, i, b, index):
+        """Forced exits (e.g. liquidation, stop-loss), before the signal closes."""
+        pass
+
+    def after_opens(self, i, b, index):
+        """Called at the end of each loop bar, after the opens."""
+        pass
+
+    # -- Signals --
+
+    def populate_buy_sell(self, show_log=False):
+        self.pairs = list(self.df_list)
+        self.pair_col = {pair: col for col, pair in enumerate(self.pairs)}
+        self.panel = build_panel(self.df_list, fields=self.price_fields, dtype=self.panel_dtype)
+        n_bars, n_pairs = len(self.panel.index), len(self.pairs)
+
+        # One uint8 per bar and pair, bit SIGNAL_BITS[name] per signal
+        self.signal_matrix = np.zeros((n_bars, n_pairs), dtype=np.uint8)
+        for col, pair in enumerate(self.pairs):
+            rows = self.panel.index.get_indexer(self.df_list[pair].index)
+            for name, values in self.pair_signals(pair).items():
+                self.signal_matrix[rows, col] |= np.asarray(values, dtype=np.uint8) * np.uint8(SIGNAL_BITS[name])
+        self.rank = self.signal_rank()
+
+        if show_log:
+            col = self.pair_col[self.oldest_pair]
+            for name in SIGNALS:
+                count = int(((self.signal_matrix[:, col] & SIGNAL_BITS[name]) != 0).sum())
+                print(f"{name} length on oldest pair :", count)
+        return self.df_list[self.oldest_pair]
+
+    def _signal_lists(self, flag, bar_rows):
+        """List of pair names per loop bar, in signal_rank() (or df_list) order."""
+        sub_mask = (self.signal_matrix[bar_rows] & flag) != 0
+        bars, cols = np.nonzero(sub_mask)
+        if self.rank is not None:
+            order = np.lexsort((self.rank[bar_rows[bars], cols], bars))
+            bars, cols = bars[order], cols[order]
+        pairs = self.pairs
+        names = [pairs[col] for col in cols.tolist()]
+        bounds = np.searchsorted(bars, np.arange(len(bar_rows) + 1)).tolist()
+        return [names[bounds[i]:bounds[i + 1]] for i in range(len(bar_rows))]
+
+    # -- Loop --
+
+    def _loop_index(self, start_date=None, end_date=None, window=None):
+        """
+        Bars of the oldest pair the loop runs on: all of them, a date range,
+        or window=(start_idx, end_idx) rows (a slice, no mask). Indicators stay
+        computed on the whole series, so the window starts warmed up.
+        """
+        oldest_index = self.df_list[self.oldest_pair].index
+        if window is None:
+            window = date_window(oldest_index, start_date, end_date)
+        return oldest_index[slice(*window)]
+
+    def price(self, pair, field):
+        """Current bar's `field` of `pair` (float64)."""
+        return self.bar_prices[self.pair_col[pair], self.field_pos[field]]
+
+    def record_close(self, pair, index, reason, close_price, fee, close_size):
+        """Record the trade of an open position at the current wallet and drop it from the book."""
+        self.recorder.add_trade(pair, self.book[pair], index, reason, close_price, fee, close_size, self.wallet)
+        return self.book.close(pair)
+
+    def day_snapshot(self, b, index):
+        """Daily snapshot: wallet with the open positions valued at valuation_field."""
+        temp_wallet = self.wallet
+        present = self.present
+        pair_col = self.pair_col
+        bar_prices = self.bar_prices
+        valuation_pos = self.field_pos[self.valuation_field]
+        for pair in self.book:
+            col = pair_col[pair]
+            if not present[col]:
+                continue
+            position = self.book[pair]
+            close_price = bar_prices[col, valuation_pos]
+            if position["side"] == "LONG":
+                trade_result = (close_price - position["price"]) / position["price"]
+            else:
+                trade_result = (position["price"] - close_price) / position["price"]
+            close_size = position["size"] + position["size"] * trade_result
+            fee = close_size * self.valuation_fee_rate
+            temp_wallet += close_size - position["size"] - fee
+        long_exposition, short_exposition, extra = self.day_report(b)
+        self.recorder.add_day(index, temp_wallet, bar_prices[pair_col[self.oldest_pair], self.field_pos[self.day_price_field]],
+                              long_exposition, short_exposition, **extra)
+
+    def open_signal(self, side, pair, k, open_row, b, index):
+        """Open `pair` on its open signal: one entry at fill_field, sized by position_size()."""
+        if pair in self.book or not self.accept_entry(side, pair, k, open_row):
+            return
+        open_price = self.bar_prices[self.pair_col[pair], self.fill_pos]
+        pos_size = self.position_size(pair, self.wallet, self.leverage)
+        self.on_open(side, pair)
+        fee = pos_size * self.open_fee_rate
+        pos_size -= fee
+        self.wallet -= fee
+        self.book.open(pair, {
+            "size": pos_size,
+            "date": index,
+            "price": open_price,
+            "fee": fee,
+            "reason": self.open_reason,
+            "side": side,
+        })
+
+    def run_engine(self, loop_index, initial_wallet, leverage, open_fee_rate, close_fee_rate,
+                   valuation_fee_rate, profiler=None):
+        """
+        Run the position loop on loop_index (bars of the oldest pair).
+
+        Each bar runs on_bar(), the daily snapshot of a new day,
+        exit_positions(), the signal closes, open_signal() for each open
+        signal and after_opens(). A hook setting self.halted stops the run
+        after its step (the opens of the bar still run).
+
+        Args:
+            profiler: PhaseProfiler timing the steps (phase_names) and the loop
+
+        Returns:
+            (final wallet, BacktestRecorder)
+        """
+        pair_col = self.pair_col
+        bar_rows = self.panel.index.get_indexer(loop_index)
+        self.bar_rows = bar_rows
+        mask = self.panel.mask
+        values = self.panel.values
+        to_float64 = values.dtype != np.float64
+        self.field_pos = self.panel.field_pos
+        self.fill_pos = fill_pos = self.field_pos[self.fill_field]
+        self.leverage = leverage
+        self.open_fee_rate = open_fee_rate
+        self.close_fee_rate = close_fee_rate
+        self.valuation_fee_rate = valuation_fee_rate
+
+        self.signal_lists = signal_lists = {
+            name: self._signal_lists(SIGNAL_BITS[name], bar_rows) for name in SIGNALS}
+        close_lists = (("LONG", signal_lists["close_long"]), ("SHORT", signal_lists["close_short"]))
+        open_lists = (("LONG", signal_lists["open_long"]), ("SHORT", signal_lists["open_short"]))
+
+        self.wallet = initial_wallet
+        self.halted = False
+        self.book = book = PositionBook()
+        self.recorder = recorder = BacktestRecorder()
+        phases = self.phase_names
+        bar_days = loop_index.day.to_numpy()
+        previous_day = 0
+
+        if profiler is not None:
+            t_loop = perf_counter_ns()
+        for i, index in enumerate(loop_index.tolist()):
+            if self.halted:
+                break
+            b = bar_rows[i]
+            self.bar_date = index
+            self.present = mask[b]
+            bar_prices = values[b]
+            if to_float64:
+                bar_prices = bar_prices.astype(np.float64)
+            self.bar_prices = bar_prices
+
+            if profiler is not None:
+                t_phase = perf_counter_ns()
+            self.on_bar(i, b)
+            if profiler is not None:
+                profiler.add(phases["bar"], t_phase)
+
+            # -- Add daily report --
+            current_day = bar_days[i]
+            if previous_day != current_day:
+                if profiler is not None:
+                    t_phase = perf_counter_ns()
+                self.day_snapshot(b, index)
+                if profiler is not None:
+                    profiler.add(phases["day"], t_phase)
+                if self.halted:
+                    break
+            previous_day = current_day
+
+            self.exit_positions(i, b, index)
+            if self.halted:
+                break
+
+            # -- Check for closing position --
+            if profiler is not None:
+                t_phase = perf_counter_ns()
+            if len(book) > 0:
+                for side, lists in close_lists:
+                    for pair in book.to_close(side, lists[i]):
+                        position = book[pair]
+                        close_price = bar_prices[pair_col[pair], fill_pos]
+                        if side == "LONG":
+                            trade_result = (close_price - position["price"]) / position["price"]
+                        else:
+                            trade_result = (position["price"] - close_price) / position["price"]
+                        close_size = position["size"] + position["size"] * trade_result
+                        fee = close_size * close_fee_rate
+                        self.wallet += close_size - position["size"] - fee
+                        stop = self.on_close(side, pair)
+                        self.record_close(pair, index, self.close_reason, close_price, fee, close_size)
+                        if stop:
+                            break
+            if profiler is not None:
+                profiler.add(phases["close"], t_phase)
+            if self.halted:
+                break
+
+            # -- Check for opening position --
+            for side, lists in open_lists:
+                if profiler is not None:
+                    t_phase = perf_counter_ns()
+                open_row = lists[i]
+                for k, pair in enumerate(open_row):
+                    self.open_signal(side, pair, k, open_row, b, index)
+                if profiler is not None:
+                    profiler.add(phases[side], t_phase)
+
+            self.after_opens(i, b, index)
+        if profiler is not None:
+            profiler.add("loop", t_loop)
+
+        return self.wallet, recorder
@@ -1,18 +1,27 @@
 import sys
 sys.path.append('../..')
+from time import perf_counter_ns
 import ta
 import numpy as np
 import pandas as pd
-from utilities.bt_analysis import get_metrics
+from utilities.logger import EventLog
+from utilities.memory import KEEP_LEVELS
+from utilities.profiling import PhaseProfiler
+from utilities.strategies.engine_base import MultiPairEngine, RiskHistory
 from utilities.margin import (
     compute_liq_price,
     update_equity,
     apply_close,
     check_exposure_caps,
     get_mmr,
-    KillSwitch
+    BarKillSwitch
 )
 
+# Compact per-pair level bits: bit i-1 = envelope i, bit 7 = close
+MAX_COMPACT_LEVELS = 7
+CLOSE_BIT = 1 << 7
+
+
 def calculate_notional_per_level(equity, base_size, leverage, n_levels, risk_mode, max_expo_cap=2.0):
     """
     Calculate notional per envelope level according to risk_mode.
@@ -91,25 +100,46 @@ Slippage Model:
 - Stop Loss SHORT: Fill at stop_price or high if worse (taker)
 
 Priority: Liquidation > Stop-Loss > Normal Close
+
+The bar loop is MultiPairEngine.run_engine() (engine_base.py): margin and
+equity are updated in on_bar(), liquidations and stops are the forced exits
+of exit_positions(), ma_base closes are the engine's signal closes and the
+envelope levels are filled by open_signal().
 """
 
-class EnvelopeMulti_v2():
+class EnvelopeMulti_v2(MultiPairEngine):
+    price_fields = ("open", "high", "low", "ma_base")
+    fill_field = "ma_base"
+    valuation_field = "open"
+    day_price_field = "open"
+    close_reason = "Market"
+    phase_names = {"bar": "equity_update", "day": "daily_snapshot", "close": "ma_base_close",
+                   "LONG": "open_long", "SHORT": "open_short"}
+
     def __init__(
         self,
         df_list,
         oldest_pair,
         type=None,
         params=None,
+        compact=False,
     ):
-        self.df_list = df_list
-        self.oldest_pair = oldest_pair
+        """
+        compact : bool
+            Memory-compact mode: float32 prices/indicators, one uint8 bitmask
+            column per side instead of one boolean column per envelope level,
+            and a float32 price panel for the bar loop. Fills are computed in
+            float64, but signals use float32 levels, so results can differ
+            marginally.
+        """
         if type is None:
             type = ["long"]
         if params is None:
             params = {}
-        self.use_long = True if "long" in type else False
-        self.use_short = True if "short" in type else False
+        MultiPairEngine.__init__(self, df_list, oldest_pair, type=type)
         self.params = params
+        self.compact = compact
+        self.panel_dtype = np.float32 if compact else np.float64
 
         
     def populate_indicators(self):
@@ -120,6 +150,10 @@ class EnvelopeMulti_v2():
                 columns=df.columns.difference(['open','high','low','close','volume']), 
                 inplace=True
             )
+            if self.compact:
+                if len(params["envelopes"]) > MAX_COMPACT_LEVELS:
+                    raise ValueError(f"compact mode supports at most {MAX_COMPACT_LEVELS} envelopes")
+                df = df.astype(np.float32)
             
             # -- Populate indicators --
             if params["src"] == "close":
@@ -130,6 +164,17 @@ class EnvelopeMulti_v2():
                 # Default to close if invalid src
                 src = df["close"]
 
+            if self.compact:
+                # Indicators computed in float64, stored in float32
+                ma_base = ta.trend.sma_indicator(close=src.astype(np.float64), window=params["ma_base_window"]).shift(1)
+                df['ma_base'] = ma_base.astype(np.float32)
+                for i in range(1, len(params["envelopes"]) + 1):
+                    e = params["envelopes"][i-1]
+                    df[f'ma_high_{i}'] = (ma_base / (1 - e)).astype(np.float32)
+                    df[f'ma_low_{i}'] = (ma_base * (1 - e)).astype(np.float32)
+                self.df_list[pair] = df
+                continue
+
             df['ma_base'] = ta.trend.sma_indicator(close=src, window=params["ma_base_window"]).shift(1)
             # Calculate envelopes without round() asymmetry
             for i in range(1, len(params["envelopes"]) + 1):
@@ -142,106 +187,117 @@ class EnvelopeMulti_v2():
         return self.df_list[self.oldest_pair]
     
     def populate_buy_sell(self): 
-        data_open_long = []
-        data_close_long = []
-        data_open_short = []
-        data_close_short = []
-
-        for pair in self.df_list:
-            params = self.params[pair]
-            df = self.df_list[pair]
-            # -- Initiate populate --
-            df["close_long"] = False
-            df["close_short"] = False
-            for i in range(1, len(params["envelopes"]) + 1):
-                df[f"open_short_{i}"] = False
-                df[f"open_long_{i}"] = False
-            df["pair"] = pair
-            df["null"] = np.nan
-            
-            
-            if self.use_long:
+        if self.compact:
+            self._populate_buy_sell_compact()
+        else:
+            for pair in self.df_list:
+                params = self.params[pair]
+                df = self.df_list[pair]
+                # -- Initiate populate --
+                df["close_long"] = False
+                df["close_short"] = False
                 for i in range(1, len(params["envelopes"]) + 1):
+                    df[f"open_short_{i}"] = False
+                    df[f"open_long_{i}"] = False
+
+                if self.use_long:
+                    for i in range(1, len(params["envelopes"]) + 1):
+                        df.loc[
+                            (df['low'] <= df[f'ma_low_{i}'])
+                            , f"open_long_{i}"
+                        ] = True
+
+                    # -- Populate close long --
                     df.loc[
-                        (df['low'] <= df[f'ma_low_{i}'])
-                        , f"open_long_{i}"
+                        (df['high'] >= df['ma_base'])
+                        , "close_long"
                     ] = True
-                
-                # -- Populate close long --
-                df.loc[
-                    (df['high'] >= df['ma_base'])
-                    , "close_long"
-                ] = True
-                
-            
-            if self.use_short:
-                for i in range(1, len(params["envelopes"]) + 1):
+
+                if self.use_short:
+                    for i in range(1, len(params["envelopes"]) + 1):
+                        df.loc[
+                            (df['high'] >= df[f'ma_high_{i}'])
+                            , f"open_short_{i}"
+                        ] = True
+
                     df.loc[
-                        (df['high'] >= df[f'ma_high_{i}'])
-                        , f"open_short_{i}"
+                        (df['low'] <= df['ma_base'])
+                        , "close_short"
                     ] = True
-                
-                df.loc[
-                    (df['low'] <= df['ma_base'])
-                    , "close_short"
-                ] = True
-                
-                
-            # -- Populate pair list per date (do not touch)--
-            data_open_long.append(
-                df.loc[
-                (df['open_long_1']  == True) 
-                ]['pair']
-            )
-            data_close_long.append(
-                df.loc[
-                (df['close_long']  == True) 
-                ]['pair']
-            )
-            data_open_short.append(
-                df.loc[
-                (df['open_short_1']  == True) 
-                ]['pair']
-            )
-            data_close_short.append(
-                df.loc[
-                (df['close_short']  == True)
-                ]['pair']
-            )
 
-        data_open_long.append(self.df_list[self.oldest_pair]['null'])
-        data_close_long.append(self.df_list[self.oldest_pair]['null'])
-        data_open_short.append(self.df_list[self.oldest_pair]['null'])
-        data_close_short.append(self.df_list[self.oldest_pair]['null'])
+                self.df_list[pair] = df
+
+        # Panel and signal matrix of the engine, then the per-level open bits
+        MultiPairEngine.populate_buy_sell(self)
+        n_levels = max(len(self.params[pair]["envelopes"]) for pair in self.pairs)
+        bits_dtype = np.min_scalar_type((1 << n_levels) - 1)
+        self.level_bits = {}
+        for side in ("long", "short"):
+            bits = np.zeros(self.signal_matrix.shape, dtype=bits_dtype)
+            for col, pair in enumerate(self.pairs):
+                rows = self.panel.index.get_indexer(self.df_list[pair].index)
+                bits[rows, col] = self._pair_level_bits(pair, side, bits_dtype)
+            self.level_bits[side.upper()] = bits
+
+        return self.df_list[self.oldest_pair]
 
+    def _populate_buy_sell_compact(self):
+        """
+        Compact signals: per pair, `long_bits` / `short_bits` uint8 columns
+        (bit i-1 = open level i, bit 7 = close).
+        """
         for pair in self.df_list:
+            params = self.params[pair]
             df = self.df_list[pair]
-            del df["pair"]
-            del df["null"]
+            low = df['low'].to_numpy()
+            high = df['high'].to_numpy()
+            ma_base = df['ma_base'].to_numpy()
+            long_bits = np.zeros(len(df), dtype=np.uint8)
+            short_bits = np.zeros(len(df), dtype=np.uint8)
+
+            if self.use_long:
+                for i in range(1, len(params["envelopes"]) + 1):
+                    long_bits |= (low <= df[f'ma_low_{i}'].to_numpy()).astype(np.uint8) << (i - 1)
+                long_bits |= (high >= ma_base).astype(np.uint8) << 7
+            if self.use_short:
+                for i in range(1, len(params["envelopes"]) + 1):
+                    short_bits |= (high >= df[f'ma_high_{i}'].to_numpy()).astype(np.uint8) << (i - 1)
+                short_bits |= (low <= ma_base).astype(np.uint8) << 7
+            df['long_bits'] = long_bits
+            df['short_bits'] = short_bits
             self.df_list[pair] = df
-        df_open_long = pd.concat(data_open_long, axis=1)
-        df_open_long['combined']= df_open_long.values.tolist()
-        df_open_long['combined'] = [[i for i in j if i == i] for j in list(df_open_long['combined'])]
-        df_close_long = pd.concat(data_close_long, axis=1)
-        df_close_long['combined']= df_close_long.values.tolist()
-        df_close_long['combined'] = [[i for i in j if i == i] for j in list(df_close_long['combined'])]
-        df_open_short = pd.concat(data_open_short, axis=1)
-        df_open_short['combined']= df_open_short.values.tolist()
-        df_open_short['combined'] = [[i for i in j if i == i] for j in list(df_open_short['combined'])]
-        df_close_short = pd.concat(data_close_short, axis=1)
-        df_close_short['combined']= df_close_short.values.tolist()
-        df_close_short['combined'] = [[i for i in j if i == i] for j in list(df_close_short['combined'])]
-        self.open_long_obj = df_open_long['combined']
-        self.close_long_obj = df_close_long['combined']
-        self.open_short_obj = df_open_short['combined']
-        self.close_short_obj = df_close_short['combined']
-         
-        return self.df_list[self.oldest_pair]
+
+    def _pair_level_bits(self, pair, side, dtype):
+        """Open bits of a pair's rows for 'long' or 'short' (bit i-1 = envelope i)."""
+        df = self.df_list[pair]
+        if self.compact:
+            return (df[f"{side}_bits"].to_numpy() & (CLOSE_BIT - 1)).astype(dtype)
+        bits = np.zeros(len(df), dtype=dtype)
+        for i in range(1, len(self.params[pair]["envelopes"]) + 1):
+            bits |= df[f"open_{side}_{i}"].to_numpy(dtype=dtype) << (i - 1)
+        return bits
+
+    def pair_signals(self, pair):
+        df = self.df_list[pair]
+        if self.compact:
+            long_bits = df["long_bits"].to_numpy()
+            short_bits = df["short_bits"].to_numpy()
+            return {
+                "open_long": (long_bits & 1) != 0,
+                "close_long": (long_bits & CLOSE_BIT) != 0,
+                "open_short": (short_bits & 1) != 0,
+                "close_short": (short_bits & CLOSE_BIT) != 0,
+            }
+        return {name: df[column].to_numpy(dtype=bool) for name, column in (
+            ("open_long", "open_long_1"), ("close_long", "close_long"),
+            ("open_short", "open_short_1"), ("close_short", "close_short"))}
         
     def run_backtest(self, initial_wallet=1000, leverage=1, maker_fee=0.0002, taker_fee=0.0006, stop_loss=1, reinvest=True, liquidation=True,
                      gross_cap=1.5, per_side_cap=1.0, per_pair_cap=0.3, margin_cap=0.8, use_kill_switch=True,
                      auto_adjust_size=True, extreme_leverage_threshold=50,
-                     risk_mode="neutral", base_size=None, max_expo_cap=2.0, params_adapter=None):
+                     risk_mode="neutral", base_size=None, max_expo_cap=2.0, params_adapter=None,
+                     intrabar=None, window=None, profile=None, keep="full", history_stride=1,
+                     event_log=None, mmr_brackets=None):
         """
         Run backtest with V2 margin system and configurable risk mode.
 
@@ -264,63 +320,99 @@ class EnvelopeMulti_v2():
             Dynamic parameter adapter that modifies params based on date/pair.
             If None, uses static self.params throughout the backtest.
             Example: RegimeBasedAdapter to adapt envelopes based on market regime
-        """
-        params = self.params
-        df_ini = self.df_list[self.oldest_pair][:]
-        wallet = initial_wallet
-        maker_fee = maker_fee
-        taker_fee = taker_fee
-        stop_loss_pourcent = stop_loss
-        reinvest = reinvest
-        use_liquidation = liquidation
-        trades = []
-        days = []
-        current_day = 0
-        previous_day = 0
-        current_positions = {}
-        is_liquidated = False
 
+        intrabar : IntrabarResolver, optional
+            High-resolution mode (see utilities/intrabar.py). Only bars where two
+            events compete are refined with minute data:
+            - liquidation or stop-loss + close at ma_base: the level touched first wins
+            - entry + stop-loss/liquidation: the position is closed in the entry bar
+              if the stop/liquidation is reached after the fill
+            If None (default), the bar-level assumptions are kept.
+
+        window : (start_idx, end_idx), optional
+            Rows of the oldest pair to simulate (e.g. from
+            utilities.panel.date_window). Indicators and signals keep the
+            values computed on the whole series, so the window starts warmed
+            up instead of recomputing them on a sliced copy of the data.
+            If None (default), all bars are simulated.
+
+        profile : bool or PhaseProfiler, optional
+            Time each phase of the bar loop (see utilities/profiling.py). The
+            counters are returned as "phase_profile"; a PhaseProfiler passed in
+            keeps accumulating over several runs. If None (default), nothing
+            is timed.
+
+        keep : str
+            Result retention (see utilities/memory.py): "full" (default, all
+            frames), "summary" (no trades / exposure / margin / event frames) or
+            "metrics" (scalars and event counters only). Sweeps that keep
+            thousands of results should use "metrics".
+
+        history_stride : int or None
+            Sample the exposure (gross / long / short notional) and margin
+            (used margin, equity, free margin, margin ratio) every
+            `history_stride` bars, at the bar open, into "exposure_history"
+            and "margin_history". None records nothing; neither is recorded
+            when `keep` drops these frames.
+
+        event_log : EventLog, optional
+            Sink of the run's events (liquidation, stop_loss, cap_rejection,
+            margin_rejection, kill_switch_on / off, see utilities/logger.py),
+            flushed at the end of the run and returned as "events". If None
+            (default), a new EventLog: the events that used to be printed are
+            echoed in the main process, nothing is echoed in worker processes.
+
+        mmr_brackets : MMRBrackets, optional
+            Tiered maintenance margin (utilities/margin.py): the liquidation
+            price of a position uses the MMR bracket of its notional, and is
+            recomputed with the new notional on every averaging-down fill.
+            If None (default), the flat per-pair MMR_TABLE is used.
+        """
         # V2: Validate risk_mode
         if risk_mode not in ["neutral", "scaling", "hybrid"]:
             raise ValueError(f"Invalid risk_mode: {risk_mode}. Must be 'neutral', 'scaling', or 'hybrid'")
-
-        # V2: Base-size resolver (priority: arg > params.base_size > params.size)
-        def _resolve_base_size(pair: str) -> float:
-            """Resolve base_size for a pair with fallback chain."""
-            if base_size is not None:
-                return float(base_size)
-            p = params[pair]
-            if 'base_size' in p:
-                return float(p['base_size'])
-            if 'size' in p:
-                return float(p['size'])
-            raise KeyError(f"Missing size for {pair}: need 'base_size' or legacy 'size'.")
+        if keep not in KEEP_LEVELS:
+            raise ValueError(f"Invalid keep: {keep}. Must be one of {KEEP_LEVELS}")
+        loop_index = self._loop_index(window=window)
+
+        # Run settings read by the engine hooks
+        self.initial_wallet = initial_wallet
+        self.maker_fee = maker_fee
+        self.taker_fee = taker_fee
+        self.stop_loss_pourcent = stop_loss
+        self.reinvest = reinvest
+        self.use_liquidation = liquidation
+        self.gross_cap = gross_cap
+        self.per_side_cap = per_side_cap
+        self.margin_cap = margin_cap
+        self.risk_mode = risk_mode
+        self.base_size = base_size
+        self.max_expo_cap = max_expo_cap
+        self.params_adapter = params_adapter
+        self.intrabar = intrabar
+        self.mmr_brackets = mmr_brackets
 
         # V2: Margin management
-        used_margin = 0.0
-        equity = initial_wallet
-
-        # V2: Risk mode configuration
-        # print(f"[Risk Mode] {risk_mode.upper()} (leverage={leverage}x)")
+        self.used_margin = 0.0
+        self.equity = initial_wallet
 
-        # if risk_mode == "neutral":
-        #     print(f"  -> Neutral mode: notional = equity * base_size (constant)")
-        # elif risk_mode == "scaling":
-        #     if auto_adjust_size:
-        #         print(f"  -> Scaling mode: ignoring auto_adjust_size (notional scales with leverage)")
-        #     print(f"  -> Scaling mode: notional = equity * base_size * leverage")
-        # elif risk_mode == "hybrid":
-        #     print(f"  -> Hybrid mode: notional = min(equity * base_size * leverage, equity * {max_expo_cap})")
+        # Liquidations, stops, cap rejections and kill-switch events, flushed at the end
+        if event_log is None:
+            event_log = EventLog()
+        self.event_log = event_log
 
         # V2: Adjust per_pair_cap for extreme leverage (optional hardening)
         effective_per_pair_cap = per_pair_cap
         if leverage > extreme_leverage_threshold:
             leverage_factor = (leverage / extreme_leverage_threshold) ** 0.5
             effective_per_pair_cap = per_pair_cap / leverage_factor
-            print(f"[Extreme leverage] per_pair_cap reduced: {per_pair_cap:.2f} -> {effective_per_pair_cap:.2f}")
+            event_log.emit("extreme_leverage", loop_index[0] if len(loop_index) else None, value=effective_per_pair_cap,
+                           detail=f"{per_pair_cap:.2f} -> {effective_per_pair_cap:.2f}")
+        self.effective_per_pair_cap = effective_per_pair_cap
 
         # V2: Kill-switch
-        kill_switch = KillSwitch(day_pnl_threshold=-0.08, hour_pnl_threshold=-0.12, pause_hours=24) if use_kill_switch else None
+        self.kill_switch = (BarKillSwitch(loop_index, day_pnl_threshold=-0.08, hour_pnl_threshold=-0.12,
+                                          pause_hours=24, event_log=event_log) if use_kill_switch else None)
 
         # V2: Event counters & reporting
         event_counters = {
@@ -338,679 +430,40 @@ class EnvelopeMulti_v2():
             'added_margin': 0.0,
             'released_margin': 0.0
         }
-
-        # V2: Exposure & margin tracking
-        exposure_history = []
-        margin_history = []
-
-        for index, row in df_ini.iterrows():
-            if is_liquidated:
-                break
-
-            # V2: Update equity based on current prices
-            last_prices = {}
-            for pair in current_positions:
-                if index in self.df_list[pair].index:
-                    last_prices[pair] = self.df_list[pair].loc[index]['open']
-            equity = update_equity(wallet, current_positions, last_prices)
-
-            # ===================================================================
-            # V2: BUGFIX (2025-10-05) - Recalculate used_margin from open positions
-            # ===================================================================
-            # PROBLEM: Previously, used_margin was incremented/decremented manually
-            #   (used_margin += init_margin on open, used_margin -= released on close)
-            #   This caused accumulation errors where used_margin didn't reflect reality.
-            #
-            # SYMPTOM: With tight stop-loss (5%) + high leverage (10x) + multi-pair (28):
-            #   - Many liquidations/SL closes → used_margin drifted from actual value
-            #   - used_margin reached 99% of equity despite only few positions open
-            #   - rejected_by_margin_cap increased to 6000+, blocking all new trades
-            #   - Backtest stopped trading after a few months despite wallet > 0
-            #
-            # FIX: Recalculate used_margin at each iteration based ONLY on positions
-            #   that are currently open (in current_positions dict).
-            #   This ensures used_margin always reflects the true margin commitment.
-            #
-            # IMPACT: rejected_by_margin_cap reduced from 6116 → 0 in test case
-            #   Backtest now continues trading throughout entire data range.
-            # ===================================================================
-            used_margin = sum(pos.get('init_margin', 0) for pos in current_positions.values())
-
-            # V2: Check kill-switch
-            if kill_switch:
-                is_paused = kill_switch.update(index, equity, initial_wallet)
-                if is_paused:
-                    # Skip opening new positions but continue managing existing ones
-                    pass
-
-            # -- Add daily report --
-            current_day = index.day
-            if previous_day != current_day:
-                temp_wallet = wallet
-                long_exposition = 0
-                short_exposition = 0
-                for pair in current_positions:
-                    if index not in self.df_list[pair].index:
-                        continue
-                    actual_row = self.df_list[pair].loc[index]
-                    if current_positions[pair]['side'] == "LONG":
-                        close_price = actual_row['open']
-                        trade_result = (close_price - current_positions[pair]['price']) / current_positions[pair]['price']
-                        close_size = current_positions[pair]['size'] + current_positions[pair]['size'] * trade_result
-                        temp_wallet += close_size - current_positions[pair]['size']
-                        long_exposition += current_positions[pair]['size']
-
-                    elif current_positions[pair]['side'] == "SHORT":
-                        close_price = actual_row['open']
-                        trade_result = (current_positions[pair]['price'] - close_price) / current_positions[pair]['price']
-                        close_size = current_positions[pair]['size'] + current_positions[pair]['size'] * trade_result
-                        temp_wallet += close_size - current_positions[pair]['size']
-                        short_exposition += current_positions[pair]['size']
-
-                # V2: Use equity for liquidation check
-                if use_liquidation and equity <= 0:
-                    liquidation_date = str(index.year) + "-" + str(index.month) + "-" + str(index.day)
-                    print(f"Liquidation le {liquidation_date}: Equity <= 0 (wallet={wallet:.2f}, equity={equity:.2f})")
-                    wallet = 0
-                    equity = 0
-                    days.append({
-                        "day":str(index.year)+"-"+str(index.month)+"-"+str(index.day),
-                        "wallet":0,
-                        "price":row['open'],
-                        "long_exposition":0,
-                        "short_exposition":0,
-                    })
-                    is_liquidated = True
-                    break
-
-                days.append({
-                    "day":str(index.year)+"-"+str(index.month)+"-"+str(index.day),
-                    "wallet":temp_wallet,
-                    "price":row['open'],
-                    "long_exposition":long_exposition,
-                    "short_exposition":short_exposition,
-                })
-    
-            previous_day = current_day
-
-            closed_pair = []
-
-            # V2: -- Check Liquidation Price FIRST (highest priority) --
-            if use_liquidation and len(current_positions) > 0:
-                for pair in list(current_positions.keys()):
-                    if pair in closed_pair:
-                        continue
-                    if index not in self.df_list[pair].index:
-                        continue
-                    if 'liq_price' not in current_positions[pair]:
-                        continue  # Legacy positions without liq_price
-
-                    actual_row = self.df_list[pair].loc[index]
-                    liq_price = current_positions[pair]['liq_price']
-
-                    # Check LONG liquidation: if low touches liq_price
-                    if current_positions[pair]['side'] == "LONG" and actual_row['low'] <= liq_price:
-                        close_price = liq_price  # Liquidation executes AT liquidation price
-
-                        # Use apply_close for proper PnL/fee calculation
-                        pnl, fee = apply_close(current_positions[pair], close_price, taker_fee, is_taker=True)
-                        wallet += pnl
-                        released = current_positions[pair].get('init_margin', 0)
-                        used_margin = max(0.0, used_margin - released)
-                        event_counters['released_margin'] += released
-
-                        # Force wallet to 0 if negative (total loss)
-                        if wallet < 0:
-                            wallet = 0
-
-                        liquidation_date = str(index.year) + "-" + str(index.month) + "-" + str(index.day)
-                        # print(f"LIQUIDATION {liquidation_date}: {pair} LONG @ {liq_price:.2f} (entry: {current_positions[pair]['price']:.2f})")
-
-                        trades.append({
-                            "pair": pair,
-                            "open_date": current_positions[pair]['date'],
-                            "close_date": index,
-                            "position": current_positions[pair]['side'],
-                            "open_reason": current_positions[pair]['reason'],
-                            "close_reason": "Liquidation",
-                            "open_price": current_positions[pair]['price'],
-                            "close_price": close_price,
-                            "open_fee": current_positions[pair]['fee'],
-                            "close_fee": fee,
-                            "open_trade_size": current_positions[pair]['size'],
-                            "close_trade_size": current_positions[pair]['size'] + pnl,
-                            "wallet": wallet,
-                        })
-                        del current_positions[pair]
-                        closed_pair.append(pair)
-
-                        # Check if total liquidation (wallet = 0)
-                        if wallet == 0:
-                            is_liquidated = True
-                            if len(days) > 0:
-                                days[-1]['wallet'] = 0
-                                days[-1]['long_exposition'] = 0
-                                days[-1]['short_exposition'] = 0
-                            break
-                        continue
-
-                    # Check SHORT liquidation: if high touches liq_price
-                    if current_positions[pair]['side'] == "SHORT" and actual_row['high'] >= liq_price:
-                        close_price = liq_price
-
-                        pnl, fee = apply_close(current_positions[pair], close_price, taker_fee, is_taker=True)
-                        wallet += pnl
-                        released = current_positions[pair].get('init_margin', 0)
-                        used_margin = max(0.0, used_margin - released)
-                        event_counters['released_margin'] += released
-
-                        if wallet < 0:
-                            wallet = 0
-
-                        liquidation_date = str(index.year) + "-" + str(index.month) + "-" + str(index.day)
-                        # print(f"LIQUIDATION {liquidation_date}: {pair} SHORT @ {liq_price:.2f} (entry: {current_positions[pair]['price']:.2f})")
-
-                        trades.append({
-                            "pair": pair,
-                            "open_date": current_positions[pair]['date'],
-                            "close_date": index,
-                            "position": current_positions[pair]['side'],
-                            "open_reason": current_positions[pair]['reason'],
-                            "close_reason": "Liquidation",
-                            "open_price": current_positions[pair]['price'],
-                            "close_price": close_price,
-                            "open_fee": current_positions[pair]['fee'],
-                            "close_fee": fee,
-                            "open_trade_size": current_positions[pair]['size'],
-                            "close_trade_size": current_positions[pair]['size'] + pnl,
-                            "wallet": wallet,
-                        })
-                        del current_positions[pair]
-                        closed_pair.append(pair)
-
-                        if wallet == 0:
-                            is_liquidated = True
-                            if len(days) > 0:
-                                days[-1]['wallet'] = 0
-                                days[-1]['long_exposition'] = 0
-                                days[-1]['short_exposition'] = 0
-                            break
-                        continue
-
-            # Exit if liquidated before checking stop-loss
-            if is_liquidated:
-                break
-
-            # -- Check Stop Loss independently (CRITICAL FIX) --
-            if len(current_positions) > 0:
-                for pair in list(current_positions.keys()):
-                    if pair in closed_pair:
-                        continue
-                    if index not in self.df_list[pair].index:
-                        continue
-                    actual_row = self.df_list[pair].loc[index]
-
-                    # Check LONG stop loss
-                    if current_positions[pair]['side'] == "LONG" and actual_row['low'] <= current_positions[pair]['stop_loss']:
-                        close_price = actual_row['low']
-                        trade_result = (close_price - current_positions[pair]['price']) / current_positions[pair]['price']
-                        close_size = current_positions[pair]['size'] + current_positions[pair]['size'] * trade_result
-                        fee = close_size * taker_fee  # Use taker_fee for SL
-                        wallet += close_size - current_positions[pair]['size'] - fee
-
-                        # Check if liquidated and clamp wallet before recording trade
-                        if use_liquidation and wallet <= 0:
-                            wallet = 0
-                            liquidation_date = str(index.year) + "-" + str(index.month) + "-" + str(index.day)
-                            print(f"Liquidation le {liquidation_date}: Plus d'argent dans le portefeuille.")
-
-                        trades.append({
-                            "pair": pair,
-                            "open_date": current_positions[pair]['date'],
-                            "close_date": index,
-                            "position": current_positions[pair]['side'],
-                            "open_reason": current_positions[pair]['reason'],
-                            "close_reason": "Stop Loss",
-                            "open_price": current_positions[pair]['price'],
-                            "close_price": close_price,
-                            "open_fee": current_positions[pair]['fee'],
-                            "close_fee": fee,
-                            "open_trade_size": current_positions[pair]['size'],
-                            "close_trade_size": close_size,
-                            "wallet": wallet,
-                        })
-                        del current_positions[pair]
-                        closed_pair.append(pair)
-
-                        # Break if liquidated
-                        if wallet == 0 and use_liquidation:
-                            is_liquidated = True
-                            # Update last day in days to reflect liquidation
-                            if len(days) > 0:
-                                days[-1]['wallet'] = 0
-                                days[-1]['long_exposition'] = 0
-                                days[-1]['short_exposition'] = 0
-                            break
-                        continue
-
-                    # Check SHORT stop loss
-                    if current_positions[pair]['side'] == "SHORT" and actual_row['high'] >= current_positions[pair]['stop_loss']:
-                        close_price = actual_row['high']
-                        trade_result = (current_positions[pair]['price'] - close_price) / current_positions[pair]['price']
-                        close_size = current_positions[pair]['size'] + current_positions[pair]['size'] * trade_result
-                        fee = close_size * taker_fee  # Use taker_fee for SL
-                        wallet += close_size - current_positions[pair]['size'] - fee
-
-                        # Check if liquidated and clamp wallet before recording trade
-                        if use_liquidation and wallet <= 0:
-                            wallet = 0
-                            liquidation_date = str(index.year) + "-" + str(index.month) + "-" + str(index.day)
-                            print(f"Liquidation le {liquidation_date}: Plus d'argent dans le portefeuille.")
-
-                        trades.append({
-                            "pair": pair,
-                            "open_date": current_positions[pair]['date'],
-                            "close_date": index,
-                            "position": current_positions[pair]['side'],
-                            "open_reason": current_positions[pair]['reason'],
-                            "close_reason": "Stop Loss",
-                            "open_price": current_positions[pair]['price'],
-                            "close_price": close_price,
-                            "open_fee": current_positions[pair]['fee'],
-                            "close_fee": fee,
-                            "open_trade_size": current_positions[pair]['size'],
-                            "close_trade_size": close_size,
-                            "wallet": wallet,
-                        })
-                        del current_positions[pair]
-                        closed_pair.append(pair)
-
-                        # Break if liquidated
-                        if wallet == 0 and use_liquidation:
-                            is_liquidated = True
-                            # Update last day in days to reflect liquidation
-                            if len(days) > 0:
-                                days[-1]['wallet'] = 0
-                                days[-1]['long_exposition'] = 0
-                                days[-1]['short_exposition'] = 0
-                            break
-                        continue
-
-            # Exit completely if liquidated - no more trading possible
-            if is_liquidated:
-                break
-
-            # -- Close positions at ma_base --
-            close_long_row = self.close_long_obj.loc[index]
-            close_short_row = self.close_short_obj.loc[index]
-            if len(current_positions) > 0:
-                # -- Close LONG at ma_base --
-                long_position_to_close = set({k: v for k,v in current_positions.items() if v['side'] == "LONG"}).intersection(set(close_long_row))
-                for pair in long_position_to_close:
-                    if pair in closed_pair:
-                        continue
-                    if index not in self.df_list[pair].index:
-                        continue
-                    actual_row = self.df_list[pair].loc[index]
-
-                    close_price = actual_row['ma_base']
-                    trade_result = (close_price - current_positions[pair]['price']) / current_positions[pair]['price']
-                    close_size = current_positions[pair]['size'] + current_positions[pair]['size'] * trade_result
-                    fee = close_size * maker_fee
-                    wallet += close_size - current_positions[pair]['size'] - fee
-                    released = current_positions[pair].get('init_margin', 0)
-                    used_margin = max(0.0, used_margin - released)
-                    event_counters['released_margin'] += released
-
-                    # Check if liquidated and clamp wallet before recording trade
-                    if use_liquidation and wallet <= 0:
-                        wallet = 0
-                        liquidation_date = str(index.year) + "-" + str(index.month) + "-" + str(index.day)
-                        print(f"Liquidation le {liquidation_date}: Plus d'argent dans le portefeuille.")
-
-                    trades.append({
-                        "pair": pair,
-                        "open_date": current_positions[pair]['date'],
-                        "close_date": index,
-                        "position": current_positions[pair]['side'],
-                        "open_reason": current_positions[pair]['reason'],
-                        "close_reason": "Market",
-                        "open_price": current_positions[pair]['price'],
-                        "close_price": close_price,
-                        "open_fee": current_positions[pair]['fee'],
-                        "close_fee": fee,
-                        "open_trade_size":current_positions[pair]['size'],
-                        "close_trade_size":close_size,
-                        "wallet": wallet,
-                    })
-                    del current_positions[pair]
-                    closed_pair.append(pair)
-
-                    # Break if liquidated
-                    if wallet == 0 and use_liquidation:
-                        is_liquidated = True
-                        break
-
-                # -- Close SHORT at ma_base --
-                short_position_to_close = set({k: v for k,v in current_positions.items() if v['side'] == "SHORT"}).intersection(set(close_short_row))
-                for pair in short_position_to_close:
-                    if pair in closed_pair:
-                        continue
-                    if index not in self.df_list[pair].index:
-                        continue
-                    actual_row = self.df_list[pair].loc[index]
-
-                    close_price = actual_row['ma_base']
-                    trade_result = (current_positions[pair]['price'] - close_price) / current_positions[pair]['price']
-                    close_size = current_positions[pair]['size'] + current_positions[pair]['size'] * trade_result
-                    fee = close_size * maker_fee
-                    wallet += close_size - current_positions[pair]['size'] - fee
-                    released = current_positions[pair].get('init_margin', 0)
-                    used_margin = max(0.0, used_margin - released)
-                    event_counters['released_margin'] += released
-
-                    # Check if liquidated and clamp wallet before recording trade
-                    if use_liquidation and wallet <= 0:
-                        wallet = 0
-                        liquidation_date = str(index.year) + "-" + str(index.month) + "-" + str(index.day)
-                        print(f"Liquidation le {liquidation_date}: Plus d'argent dans le portefeuille.")
-
-                    trades.append({
-                        "pair": pair,
-                        "open_date": current_positions[pair]['date'],
-                        "close_date": index,
-                        "position": current_positions[pair]['side'],
-                        "open_reason": current_positions[pair]['reason'],
-                        "close_reason": "Market",
-                        "open_price": current_positions[pair]['price'],
-                        "close_price": close_price,
-                        "open_fee": current_positions[pair]['fee'],
-                        "close_fee": fee,
-                        "open_trade_size":current_positions[pair]['size'],
-                        "close_trade_size":close_size,
-                        "wallet": wallet,
-                    })
-                    del current_positions[pair]
-                    closed_pair.append(pair)
-
-                    # Break if liquidated
-                    if wallet == 0 and use_liquidation:
-                        is_liquidated = True
-                        break
-
-            # Exit completely if liquidated - no opening new positions
-            if is_liquidated:
-                break
-
-            # V2: Skip opening if kill-switch is active
-            is_paused = kill_switch.is_paused if kill_switch else False
-
-            # -- Check for opening position --
-            # -- Open LONG market --
-            open_long_row = self.open_long_obj.loc[index]
-            for pair in open_long_row:
-                if is_paused:
-                    break  # Skip all new positions if kill-switch active
-
-                # Check if index exists in pair's dataframe
-                if index not in self.df_list[pair].index:
-                    continue
-                actual_position = None
-                actual_row = self.df_list[pair].loc[index]
-
-                # V2: Get adapted params if adapter provided
-                effective_params = params_adapter.get_params_at_date(index, pair) if params_adapter else params[pair]
-
-                for i in range(1, len(effective_params["envelopes"]) + 1):
-                    if pair in current_positions:
-                        actual_position = current_positions[pair]
-                    if (actual_position and actual_position["side"] == "SHORT") or (actual_row[f"open_long_{i}"] == False) or (pair in closed_pair):
-                        break
-                    # Skip if already at this envelope level or higher (can't add more at same/higher level)
-                    if actual_position and actual_position["envelope"] >= i:
-                        continue
-                    if actual_row[f"open_long_{i}"]:
-                        # V2: Recalculate envelope price with adapted params
-                        ma_base = actual_row['ma_base']
-                        envelope_pct = effective_params["envelopes"][i-1]
-                        open_price = ma_base * (1 - envelope_pct)
-
-                        # V2: Calculate notional and qty based on equity (not wallet)
-                        if reinvest or (wallet <= initial_wallet):
-                            base_capital = equity
-                        else:
-                            base_capital = initial_wallet
-
-                        # V2: Calculate notional according to risk_mode (use effective_params)
-                        eff_base = _resolve_base_size(pair)
-                        notional = calculate_notional_per_level(
-                            equity=base_capital,
-                            base_size=eff_base,
-                            leverage=leverage,
-                            n_levels=len(effective_params["envelopes"]),
-                            risk_mode=risk_mode,
-                            max_expo_cap=max_expo_cap
-                        )
-
-                        qty = notional / open_price
-                        init_margin = notional / leverage
-
-                        # V2: Check exposure caps BEFORE opening
-                        allowed, reason = check_exposure_caps(
-                            notional, "LONG", pair, current_positions, equity,
-                            gross_cap, per_side_cap, effective_per_pair_cap
-                        )
-                        if not allowed:
-                            # Track rejection reason
-                            if "Gross exposure" in reason:
-                                event_counters['rejected_by_gross_cap'] += 1
-                            elif "Per-side exposure" in reason:
-                                event_counters['rejected_by_per_side_cap'] += 1
-                            elif "Per-pair exposure" in reason:
-                                event_counters['rejected_by_per_pair_cap'] += 1
-                            break
-
-                        # V2: Check margin cap (protection against margin cascade)
-                        if used_margin + init_margin > equity * margin_cap:
-                            event_counters['rejected_by_margin_cap'] += 1
-                            break
-
-                        # Calculate fees and pos_size
-                        fee = notional * maker_fee
-                        pos_size = notional - fee
-                        wallet -= fee
-                        used_margin += init_margin
-                        event_counters['added_margin'] += init_margin
-
-                        # Check if liquidated after paying fees
-                        if use_liquidation and wallet <= 0:
-                            wallet = 0
-                            used_margin = max(0.0, used_margin - init_margin)  # Rollback margin with clamp
-                            event_counters['added_margin'] -= init_margin  # Rollback counter
-                            liquidation_date = str(index.year) + "-" + str(index.month) + "-" + str(index.day)
-                            print(f"Liquidation le {liquidation_date}: Plus d'argent dans le portefeuille.")
-                            is_liquidated = True
-                            break
-
-                        # V2: Calculate liquidation price
-                        mmr = get_mmr(pair)
-                        liq_price = compute_liq_price(open_price, "LONG", leverage, mmr)
-
-                        # Stop-loss price (not % of wallet, but price level)
-                        stop_loss = open_price - stop_loss_pourcent * open_price
-
-                        if actual_position:
-                            # Averaging down: recalculate weighted average entry price
-                            actual_position["price"] = (actual_position["size"] * actual_position["price"] + open_price * pos_size) / (actual_position["size"] + pos_size)
-                            actual_position["size"] = actual_position["size"] + pos_size
-                            actual_position["fee"] = actual_position["fee"] + fee
-                            actual_position["envelope"] = i
-                            actual_position["reason"] = f"Limit Envelop {i}"
-                            actual_position["init_margin"] = actual_position.get("init_margin", 0) + init_margin
-                            # V2: Recalculate liq_price based on new average entry
-                            actual_position["liq_price"] = compute_liq_price(actual_position["price"], "LONG", leverage, mmr)
-                            # Keep the lowest stop loss (most protective) when averaging down
-                            if stop_loss < actual_position["stop_loss"]:
-                                actual_position["stop_loss"] = stop_loss
-                        else:
-                            current_positions[pair] = {
-                                "size": pos_size,
-                                "date": index,
-                                "price": open_price,
-                                "fee": fee,
-                                "reason": f"Limit Envelop {i}",
-                                "side": "LONG",
-                                "envelope": i,
-                                "stop_loss": stop_loss,
-                                "liq_price": liq_price,  # V2
-                                "init_margin": init_margin,  # V2
-                                "qty": qty,  # V2
-                            }
-
-            # -- Open SHORT market --
-            open_short_row = self.open_short_obj.loc[index]
-            for pair in open_short_row:
-                if is_paused:
-                    break  # Skip all new positions if kill-switch active
-
-                # Check if index exists in pair's dataframe
-                if index not in self.df_list[pair].index:
-                    continue
-                actual_position = None
-                actual_row = self.df_list[pair].loc[index]
-
-                # V2: Get adapted params if adapter provided
-                effective_params = params_adapter.get_params_at_date(index, pair) if params_adapter else params[pair]
-
-                for i in range(1, len(effective_params["envelopes"]) + 1):
-                    if pair in current_positions:
-                        actual_position = current_positions[pair]
-                    if (actual_position and actual_position["side"] == "LONG") or actual_row[f"open_short_{i}"] == False or (pair in closed_pair):
-                        break
-                    if actual_position and actual_position["envelope"] >= i:
-                        continue
-                    if actual_row[f"open_short_{i}"]:
-                        # V2: Recalculate envelope price with adapted params
-                        ma_base = actual_row['ma_base']
-                        envelope_pct = effective_params["envelopes"][i-1]
-                        open_price = ma_base / (1 - envelope_pct)
-
-                        # V2: Calculate notional and qty based on equity (not wallet)
-                        if reinvest or (wallet <= initial_wallet):
-                            base_capital = equity
-                        else:
-                            base_capital = initial_wallet
-
-                        # V2: Calculate notional according to risk_mode (use effective_params)
-                        eff_base = _resolve_base_size(pair)
-                        notional = calculate_notional_per_level(
-                            equity=base_capital,
-                            base_size=eff_base,
-                            leverage=leverage,
-                            n_levels=len(effective_params["envelopes"]),
-                            risk_mode=risk_mode,
-                            max_expo_cap=max_expo_cap
-                        )
-
-                        qty = notional / open_price
-                        init_margin = notional / leverage
-
-                        # V2: Check exposure caps BEFORE opening
-                        allowed, reason = check_exposure_caps(
-                            notional, "SHORT", pair, current_positions, equity,
-                            gross_cap, per_side_cap, effective_per_pair_cap
-                        )
-                        if not allowed:
-                            # print(f"❌ Position rejected: {reason}")
-                            break
-
-                        # V2: Check margin cap (protection against margin cascade)
-                        if used_margin + init_margin > equity * margin_cap:
-                            # print(f"❌ Margin cap exceeded: {used_margin + init_margin:.2f} > {equity * margin_cap:.2f}")
-                            break
-
-                        # Calculate fees and pos_size
-                        fee = notional * maker_fee
-                        pos_size = notional - fee
-                        wallet -= fee
-                        used_margin += init_margin
-                        event_counters['added_margin'] += init_margin
-
-                        # Check if liquidated after paying fees
-                        if use_liquidation and wallet <= 0:
-                            wallet = 0
-                            used_margin = max(0.0, used_margin - init_margin)  # Rollback margin with clamp
-                            event_counters['added_margin'] -= init_margin  # Rollback counter
-                            liquidation_date = str(index.year) + "-" + str(index.month) + "-" + str(index.day)
-                            print(f"Liquidation le {liquidation_date}: Plus d'argent dans le portefeuille.")
-                            is_liquidated = True
-                            break
-
-                        # V2: Calculate liquidation price
-                        mmr = get_mmr(pair)
-                        liq_price = compute_liq_price(open_price, "SHORT", leverage, mmr)
-
-                        # Stop-loss price (SHORT: above entry)
-                        stop_loss = open_price + stop_loss_pourcent * open_price
-
-                        if actual_position:
-                            # Averaging down: recalculate weighted average entry price
-                            actual_position["price"] = (actual_position["size"] * actual_position["price"] + open_price * pos_size) / (actual_position["size"] + pos_size)
-                            actual_position["size"] = actual_position["size"] + pos_size
-                            actual_position["fee"] = actual_position["fee"] + fee
-                            actual_position["envelope"] = i
-                            actual_position["reason"] = f"Limit Envelop {i}"
-                            actual_position["init_margin"] = actual_position.get("init_margin", 0) + init_margin
-                            # V2: Recalculate liq_price based on new average entry
-                            actual_position["liq_price"] = compute_liq_price(actual_position["price"], "SHORT", leverage, mmr)
-                            # Keep the highest stop loss (most protective) when averaging down SHORT
-                            if stop_loss > actual_position["stop_loss"]:
-                                actual_position["stop_loss"] = stop_loss
-                        else:
-                            current_positions[pair] = {
-                                "size": pos_size,
-                                "date": index,
-                                "price": open_price,
-                                "fee": fee,
-                                "reason": f"Limit Envelop {i}",
-                                "side": "SHORT",
-                                "envelope": i,
-                                "stop_loss": stop_loss,
-                                "liq_price": liq_price,  # V2
-                                "init_margin": init_margin,  # V2
-                                "qty": qty,  # V2
-                            }          
-                        
-        df_days = pd.DataFrame(days)
-        df_days['day'] = pd.to_datetime(df_days['day'])
-        df_days = df_days.set_index(df_days['day'])
-
-        df_trades = pd.DataFrame(trades)
-
-        # Guard against no trades
-        if len(trades) == 0:
-            return {
-                "wallet": wallet,
-                "trades": df_trades,
-                "days": df_days
-            }
-
-        df_trades['open_date'] = pd.to_datetime(df_trades['open_date'])
-        df_trades = df_trades.set_index(df_trades['open_date'])
-
-        # V2: Calculate final reporting metrics
-        df_exposure = pd.DataFrame(exposure_history) if exposure_history else pd.DataFrame()
-        df_margin = pd.DataFrame(margin_history) if margin_history else pd.DataFrame()
-
-        return get_metrics(df_trades, df_days) | {
-            "wallet": wallet,
-            "trades": df_trades,
-            "days": df_days,
+        if intrabar is not None:
+            event_counters['intrabar_refined_bars'] = 0
+            event_counters['intrabar_close_first'] = 0
+            event_counters['intrabar_same_bar_exits'] = 0
+        self.event_counters = event_counters
+
+        profiler = PhaseProfiler.resolve(profile)
+        self.profiler = profiler
+
+        # V2: Exposure & margin tracking (preallocated, one sample per stride)
+        risk_history = None
+        if history_stride is not None and keep == "full":
+            risk_history = RiskHistory(loop_index, history_stride)
+        self.risk_history = risk_history
+
+        # Closes at ma_base are maker fills, the open positions are valued at the open without fee
+        wallet, recorder = self.run_engine(loop_index, initial_wallet, leverage, open_fee_rate=maker_fee,
+                                           close_fee_rate=maker_fee, valuation_fee_rate=0, profiler=profiler)
+
+        # V2: Exposure & margin frames (also without closed trades: positions may have stayed open)
+        if risk_history is not None:
+            df_exposure, df_margin = risk_history.frames()
+        else:
+            df_exposure, df_margin = pd.DataFrame(), pd.DataFrame()
+
+        extra = {
             # V2: Additional reporting
             "event_counters": event_counters,
             "exposure_history": df_exposure,
             "margin_history": df_margin,
-            "config": {
+            "events": event_log.flush(),
+        }
+        if len(recorder.trades) > 0:
+            extra["config"] = {
                 "leverage": leverage,
                 "gross_cap": gross_cap,
                 "per_side_cap": per_side_cap,
@@ -1024,4 +477,458 @@ class EnvelopeMulti_v2():
                 "base_size": base_size,
                 "max_expo_cap": max_expo_cap
             }
-        } 
\ No newline at end of file
+        if profiler is not None:
+            extra["phase_profile"] = profiler.to_frame()
+        return recorder.result(wallet, keep, **extra)
+
+    # -- Engine hooks --
+
+    def _base_size(self, pair):
+        """Resolve base_size for a pair (priority: arg > params.base_size > params.size)."""
+        if self.base_size is not None:
+            return float(self.base_size)
+        p = self.params[pair]
+        if 'base_size' in p:
+            return float(p['base_size'])
+        if 'size' in p:
+            return float(p['size'])
+        raise KeyError(f"Missing size for {pair}: need 'base_size' or legacy 'size'.")
+
+    def _liq_price(self, price, side, pair, notional):
+        """Liquidation price, with the flat MMR table or the notional's MMR bracket."""
+        if self.mmr_brackets is None:
+            return compute_liq_price(price, side, self.leverage, get_mmr(pair))
+        return self.mmr_brackets.liq_price(price, side, self.leverage, pair, notional)
+
+    def _liquidated(self):
+        """Wallet at 0: stop the run and zero the last daily snapshot."""
+        self.halted = True
+        days = self.recorder.days
+        if len(days) > 0:
+            days[-1]['wallet'] = 0
+            days[-1]['long_exposition'] = 0
+            days[-1]['short_exposition'] = 0
+
+    def _intrabar_close_first(self, i, index, pair, side, level):
+        """True if minute data shows the ma_base close was reached before `level`."""
+        close_row = self.signal_lists["close_long" if side == "LONG" else "close_short"][i]
+        if pair not in close_row:
+            return False
+        self.event_counters['intrabar_refined_bars'] += 1
+        ma_base = self.price(pair, 'ma_base')
+        if side == "LONG":
+            first = self.intrabar.first_event(pair, index, ma_base, "up", level, "down")
+        else:
+            first = self.intrabar.first_event(pair, index, ma_base, "down", level, "up")
+        if first == "a":
+            self.event_counters['intrabar_close_first'] += 1
+            return True
+        return False
+
+    def on_bar(self, i, b):
+        # V2: Update equity based on current prices
+        positions = self.book.positions
+        present = self.present
+        last_prices = {}
+        for pair in positions:
+            if present[self.pair_col[pair]]:
+                last_prices[pair] = self.price(pair, 'open')
+        self.equity = update_equity(self.wallet, positions, last_prices)
+
+        # ===================================================================
+        # V2: BUGFIX (2025-10-05) - Recalculate used_margin from open positions
+        # ===================================================================
+        # PROBLEM: Previously, used_margin was incremented/decremented manually
+        #   (used_margin += init_margin on open, used_margin -= released on close)
+        #   This caused accumulation errors where used_margin didn't reflect reality.
+        #
+        # SYMPTOM: With tight stop-loss (5%) + high leverage (10x) + multi-pair (28):
+        #   - Many liquidations/SL closes → used_margin drifted from actual value
+        #   - used_margin reached 99% of equity despite only few positions open
+        #   - rejected_by_margin_cap increased to 6000+, blocking all new trades
+        #   - Backtest stopped trading after a few months despite wallet > 0
+        #
+        # FIX: Recalculate used_margin at each iteration based ONLY on positions
+        #   that are currently open (in current_positions dict).
+        #   This ensures used_margin always reflects the true margin commitment.
+        #
+        # IMPACT: rejected_by_margin_cap reduced from 6116 → 0 in test case
+        #   Backtest now continues trading throughout entire data range.
+        # ===================================================================
+        self.used_margin = sum(pos.get('init_margin', 0) for pos in positions.values())
+        if self.risk_history is not None and self.risk_history.due(i):
+            self.risk_history.record(i, positions, self.used_margin, self.equity)
+
+        # V2: Check kill-switch (new positions are skipped while paused)
+        if self.kill_switch:
+            self.kill_switch.update(i, self.equity)
+
+        self.closed_pair = set()
+        self.intrabar_close_first = set()
+        self.opened_in_bar = {}
+
+    def day_report(self, b):
+        long_exposition = 0
+        short_exposition = 0
+        for pair in self.book:
+            if not self.present[self.pair_col[pair]]:
+                continue
+            position = self.book[pair]
+            if position['side'] == "LONG":
+                long_exposition += position['size']
+            elif position['side'] == "SHORT":
+                short_exposition += position['size']
+        return long_exposition, short_exposition, {}
+
+    def day_snapshot(self, b, index):
+        # V2: Use equity for liquidation check
+        if self.use_liquidation and self.equity <= 0:
+            self.event_log.emit("wallet_depleted", index, value=self.equity,
+                                detail=f"Equity <= 0 (wallet={self.wallet:.2f}, equity={self.equity:.2f})")
+            self.wallet = 0
+            self.equity = 0
+            self.recorder.add_day(index, 0, self.price(self.oldest_pair, 'open'), 0, 0)
+            self.halted = True
+            return
+        MultiPairEngine.day_snapshot(self, b, index)
+
+    def exit_positions(self, i, b, index):
+        profiler = self.profiler
+        book = self.book
+        present = self.present
+        event_counters = self.event_counters
+
+        # V2: -- Check Liquidation Price FIRST (highest priority) --
+        if profiler is not None:
+            t_phase = perf_counter_ns()
+        if self.use_liquidation and len(book) > 0:
+            for pair in list(book):
+                if pair in self.closed_pair:
+                    continue
+                if not present[self.pair_col[pair]]:
+                    continue
+                position = book[pair]
+                if 'liq_price' not in position:
+                    continue  # Legacy positions without liq_price
+
+                liq_price = position['liq_price']
+                side = position['side']
+                # LONG: low touches liq_price, SHORT: high touches liq_price
+                if side == "LONG":
+                    hit = self.price(pair, 'low') <= liq_price
+                else:
+                    hit = self.price(pair, 'high') >= liq_price
+                if not hit:
+                    continue
+                if self.intrabar is not None and self._intrabar_close_first(i, index, pair, side, liq_price):
+                    self.intrabar_close_first.add(pair)
+                    continue
+                close_price = liq_price  # Liquidation executes AT liquidation price
+
+                # Use apply_close for proper PnL/fee calculation
+                pnl, fee = apply_close(position, close_price, self.taker_fee, is_taker=True)
+                self.wallet += pnl
+                released = position.get('init_margin', 0)
+                self.used_margin = max(0.0, self.used_margin - released)
+                event_counters['released_margin'] += released
+
+                # Force wallet to 0 if negative (total loss)
+                if self.wallet < 0:
+                    self.wallet = 0
+
+                self.event_log.emit("liquidation", index, pair, liq_price, side)
+                self.record_close(pair, index, "Liquidation", close_price, fee, position['size'] + pnl)
+                self.closed_pair.add(pair)
+
+                # Check if total liquidation (wallet = 0)
+                if self.wallet == 0:
+                    self._liquidated()
+                    break
+
+        if profiler is not None:
+            profiler.add("liquidation_scan", t_phase)
+
+        # Exit if liquidated before checking stop-loss
+        if self.halted:
+            return
+
+        # -- Check Stop Loss independently (CRITICAL FIX) --
+        if profiler is not None:
+            t_phase = perf_counter_ns()
+        if len(book) > 0:
+            for pair in list(book):
+                if pair in self.closed_pair or pair in self.intrabar_close_first:
+                    continue
+                if not present[self.pair_col[pair]]:
+                    continue
+                position = book[pair]
+                side = position['side']
+                if side == "LONG":
+                    hit = self.price(pair, 'low') <= position['stop_loss']
+                else:
+                    hit = self.price(pair, 'high') >= position['stop_loss']
+                if not hit:
+                    continue
+                if self.intrabar is not None and self._intrabar_close_first(
+                        i, index, pair, side, position['stop_loss']):
+                    self.intrabar_close_first.add(pair)
+                    continue
+                # Fill at the bar's worst price
+                if side == "LONG":
+                    close_price = self.price(pair, 'low')
+                    trade_result = (close_price - position['price']) / position['price']
+                else:
+                    close_price = self.price(pair, 'high')
+                    trade_result = (position['price'] - close_price) / position['price']
+                close_size = position['size'] + position['size'] * trade_result
+                fee = close_size * self.taker_fee  # Use taker_fee for SL
+                self.wallet += close_size - position['size'] - fee
+
+                # Check if liquidated and clamp wallet before recording trade
+                if self.use_liquidation and self.wallet <= 0:
+                    self.wallet = 0
+                    self.event_log.emit("wallet_depleted", index, detail="Plus d'argent dans le portefeuille.")
+
+                self.event_log.emit("stop_loss", index, pair, close_price, side)
+                self.record_close(pair, index, "Stop Loss", close_price, fee, close_size)
+                self.closed_pair.add(pair)
+
+                # Break if liquidated
+                if self.wallet == 0 and self.use_liquidation:
+                    self._liquidated()
+                    break
+
+        if profiler is not None:
+            profiler.add("stop_loss_scan", t_phase)
+
+    def on_close(self, side, pair):
+        # -- Close at ma_base (engine signal close, wallet already credited) --
+        released = self.book[pair].get('init_margin', 0)
+        self.used_margin = max(0.0, self.used_margin - released)
+        self.event_counters['released_margin'] += released
+
+        # Check if liquidated and clamp wallet before recording trade
+        if self.use_liquidation and self.wallet <= 0:
+            self.wallet = 0
+            self.event_log.emit("wallet_depleted", self.bar_date, detail="Plus d'argent dans le portefeuille.")
+        self.closed_pair.add(pair)
+
+        # Stop the side's closes, and the run after the closes, if liquidated
+        if self.wallet == 0 and self.use_liquidation:
+            self.halted = True
+            return True
+        return False
+
+    def open_signal(self, side, pair, k, open_row, b, index):
+        # V2: Skip all new positions if kill-switch active
+        if self.kill_switch and self.kill_switch.is_paused:
+            return
+        col = self.pair_col[pair]
+        # Check if index exists in pair's dataframe
+        if not self.present[col]:
+            return
+        book = self.book
+        event_counters = self.event_counters
+        profiler = self.profiler
+        is_long = side == "LONG"
+        level_bits = int(self.level_bits[side][b, col])
+        actual_position = None
+
+        # V2: Get adapted params if adapter provided
+        effective_params = (self.params_adapter.get_params_at_date(index, pair) if self.params_adapter
+                            else self.params[pair])
+
+        for i in range(1, len(effective_params["envelopes"]) + 1):
+            if pair in book:
+                actual_position = book[pair]
+            if (actual_position and actual_position["side"] != side) or not (level_bits >> (i - 1)) & 1 \
+                    or (pair in self.closed_pair):
+                break
+            # Skip if already at this envelope level or higher (can't add more at same/higher level)
+            if actual_position and actual_position["envelope"] >= i:
+                continue
+
+            # V2: Recalculate envelope price with adapted params
+            ma_base = self.price(pair, 'ma_base')
+            envelope_pct = effective_params["envelopes"][i-1]
+            open_price = ma_base * (1 - envelope_pct) if is_long else ma_base / (1 - envelope_pct)
+
+            # V2: Calculate notional and qty based on equity (not wallet)
+            if self.reinvest or (self.wallet <= self.initial_wallet):
+                base_capital = self.equity
+            else:
+                base_capital = self.initial_wallet
+
+            # V2: Calculate notional according to risk_mode (use effective_params)
+            notional = calculate_notional_per_level(
+                equity=base_capital,
+                base_size=self._base_size(pair),
+                leverage=self.leverage,
+                n_levels=len(effective_params["envelopes"]),
+                risk_mode=self.risk_mode,
+                max_expo_cap=self.max_expo_cap
+            )
+
+            qty = notional / open_price
+            init_margin = notional / self.leverage
+
+            # V2: Check exposure caps BEFORE opening
+            if profiler is not None:
+                t_cap = perf_counter_ns()
+            allowed, reason = check_exposure_caps(
+                notional, side, pair, book.positions, self.equity,
+                self.gross_cap, self.per_side_cap, self.effective_per_pair_cap
+            )
+            if profiler is not None:
+                profiler.add("cap_checks", t_cap)
+            if not allowed:
+                self.event_log.emit("cap_rejection", index, pair, notional, reason)
+                # Track rejection reason (LONG entries only, as in V2)
+                if is_long:
+                    if "Gross exposure" in reason:
+                        event_counters['rejected_by_gross_cap'] += 1
+                    elif "Per-side exposure" in reason:
+                        event_counters['rejected_by_per_side_cap'] += 1
+                    elif "Per-pair exposure" in reason:
+                        event_counters['rejected_by_per_pair_cap'] += 1
+                break
+
+            # V2: Check margin cap (protection against margin cascade)
+            if self.used_margin + init_margin > self.equity * self.margin_cap:
+                self.event_log.emit("margin_rejection", index, pair, self.used_margin + init_margin)
+                if is_long:
+                    event_counters['rejected_by_margin_cap'] += 1
+                break
+
+            # Calculate fees and pos_size
+            fee = notional * self.maker_fee
+            pos_size = notional - fee
+            self.wallet -= fee
+            self.used_margin += init_margin
+            event_counters['added_margin'] += init_margin
+
+            # Check if liquidated after paying fees
+            if self.use_liquidation and self.wallet <= 0:
+                self.wallet = 0
+                self.used_margin = max(0.0, self.used_margin - init_margin)  # Rollback margin with clamp
+                event_counters['added_margin'] -= init_margin  # Rollback counter
+                self.event_log.emit("wallet_depleted", index, detail="Plus d'argent dans le portefeuille.")
+                self.halted = True
+                break
+
+            # V2: Calculate liquidation price
+            liq_price = self._liq_price(open_price, side, pair, pos_size)
+
+            # Stop-loss price (not % of wallet, but price level): LONG below entry, SHORT above
+            if is_long:
+                stop_loss = open_price - self.stop_loss_pourcent * open_price
+            else:
+                stop_loss = open_price + self.stop_loss_pourcent * open_price
+
+            if actual_position:
+                # Averaging down: recalculate weighted average entry price
+                actual_position["price"] = (actual_position["size"] * actual_position["price"] + open_price * pos_size) / (actual_position["size"] + pos_size)
+                actual_position["size"] = actual_position["size"] + pos_size
+                actual_position["fee"] = actual_position["fee"] + fee
+                actual_position["envelope"] = i
+                actual_position["reason"] = f"Limit Envelop {i}"
+                actual_position["init_margin"] = actual_position.get("init_margin", 0) + init_margin
+                # V2: Recalculate liq_price based on new average entry
+                actual_position["liq_price"] = self._liq_price(actual_position["price"], side, pair,
+                                                               actual_position["size"])
+                # Keep the most protective stop loss when averaging down
+                if is_long and stop_loss < actual_position["stop_loss"]:
+                    actual_position["stop_loss"] = stop_loss
+                elif not is_long and stop_loss > actual_position["stop_loss"]:
+                    actual_position["stop_loss"] = stop_loss
+            else:
+                book.open(pair, {
+                    "size": pos_size,
+                    "date": index,
+                    "price": open_price,
+                    "fee": fee,
+                    "reason": f"Limit Envelop {i}",
+                    "side": side,
+                    "envelope": i,
+                    "stop_loss": stop_loss,
+                    "liq_price": liq_price,  # V2
+                    "init_margin": init_margin,  # V2
+                    "qty": qty,  # V2
+                })
+                if self.intrabar is not None:
+                    self.opened_in_bar[pair] = open_price
+
+    def after_opens(self, i, b, index):
+        # -- Intrabar: stop / liquidation reached after an entry of the same bar --
+        if not self.opened_in_bar or self.halted:
+            return
+        profiler = self.profiler
+        if profiler is not None:
+            t_phase = perf_counter_ns()
+        book = self.book
+        intrabar = self.intrabar
+        event_counters = self.event_counters
+        for pair, entry_price in self.opened_in_bar.items():
+            if pair not in book:
+                continue
+            position = book[pair]
+            if position['side'] == "LONG":
+                low = self.price(pair, 'low')
+                liq_hit = self.use_liquidation and low <= position['liq_price']
+                stop_hit = low <= position['stop_loss']
+                direction = "down"
+            else:
+                high = self.price(pair, 'high')
+                liq_hit = self.use_liquidation and high >= position['liq_price']
+                stop_hit = high >= position['stop_loss']
+                direction = "up"
+            if not (liq_hit or stop_hit):
+                continue
+
+            event_counters['intrabar_refined_bars'] += 1
+            t_entry = intrabar.first_touch(pair, index, entry_price, direction)
+            if t_entry is None:
+                continue
+            # Same minute as the fill counts as after it (conservative)
+            t_liq = intrabar.first_touch(pair, index, position['liq_price'], direction, start_ts=t_entry) if liq_hit else None
+            t_stop = intrabar.first_touch(pair, index, position['stop_loss'], direction, start_ts=t_entry) if stop_hit else None
+
+            if t_liq is not None and (t_stop is None or t_liq <= t_stop):
+                close_reason = "Liquidation"
+                close_price = position['liq_price']
+                pnl, fee = apply_close(position, close_price, self.taker_fee, is_taker=True)
+                close_size = position['size'] + pnl
+                self.wallet += pnl
+                released = position.get('init_margin', 0)
+                self.used_margin = max(0.0, self.used_margin - released)
+                event_counters['released_margin'] += released
+                if self.wallet < 0:
+                    self.wallet = 0
+            elif t_stop is not None:
+                close_reason = "Stop Loss"
+                # Worst price after the stop is reached, as for bar-level stops
+                if position['side'] == "LONG":
+                    close_price = intrabar.extreme_after(pair, index, t_stop, "low")
+                    trade_result = (close_price - position['price']) / position['price']
+                else:
+                    close_price = intrabar.extreme_after(pair, index, t_stop, "high")
+                    trade_result = (position['price'] - close_price) / position['price']
+                close_size = position['size'] + position['size'] * trade_result
+                fee = close_size * self.taker_fee
+                self.wallet += close_size - position['size'] - fee
+                if self.use_liquidation and self.wallet <= 0:
+                    self.wallet = 0
+                    self.event_log.emit("wallet_depleted", index, detail="Plus d'argent dans le portefeuille.")
+            else:
+                continue
+
+            event_counters['intrabar_same_bar_exits'] += 1
+            self.event_log.emit("liquidation" if close_reason == "Liquidation" else "stop_loss",
+                                index, pair, close_price, position['side'])
+            self.record_close(pair, index, close_reason, close_price, fee, close_size)
+
+            if self.wallet == 0 and self.use_liquidation:
+                self._liquidated()
+                break
+        if profiler is not None:
+            profiler.add("intrabar_exits", t_phase)
@@ -0,0 +1,234 @@
+import sys
+sys.path.append('../..')
+import itertools
+import numpy as np
+import pandas as pd
+import ta
+from utilities.jit import njit
+
+"""
+Single-pair Envelope grid scan.
+
+Evaluates every (ma_base_window x envelope set) combination of the
+Envelope strategy on one pair in a single call and returns one metrics
+row per combination:
+
+    grid = scan_envelope_grid(df, ma_base_windows=[3, 5, 7],
+                              envelope_sets=[[0.03, 0.05, 0.07], [0.05, 0.1, 0.15]],
+                              type=["long", "short"], leverage=2)
+    grid.sort_values("sharpe_ratio", ascending=False).head()
+
+The moving averages are computed once per window, the signals are plain
+comparisons on numpy arrays and the position loop is a numba kernel
+(utilities/jit.py). Trades and wallets follow Envelope.run_backtest()
+exactly: use it to pre-screen per-pair params before validating the
+shortlist with EnvelopeMulti_v2.
+"""
+
+GRID_COLUMNS = [
+    "ma_base_window", "envelopes", "wallet", "total_trades", "win_rate",
+    "avg_profit", "max_drawdown", "sharpe_ratio",
+]
+
+
+@njit(cache=True)
+def _envelope_grid_kernel(high, low, close, ma_bases, combo_ma, env_table, env_counts,
+                          new_day, use_long, use_short, initial_wallet, leverage, reinvest,
+                          maker_fee, taker_fee, day_wallets):
+    n_combos = len(combo_ma)
+    n_bars = len(close)
+    final_wallet = np.empty(n_combos)
+    total_trades = np.zeros(n_combos, dtype=np.int64)
+    good_trades = np.zeros(n_combos, dtype=np.int64)
+    sum_trade_pct = np.zeros(n_combos)
+
+    for c in range(n_combos):
+        ma_base = ma_bases[combo_ma[c]]
+        envelopes = env_table[c]
+        n_env = env_counts[c]
+        wallet = initial_wallet
+        in_position = False
+        side = 0  # 1 LONG, -1 SHORT
+        size = 0.0
+        price = 0.0
+        position_fee = 0.0
+        envelope = 0  # 1-based, like current_position["envelope"]
+        day = 0
+
+        for b in range(n_bars):
+            base = ma_base[b]
+            # -- Add daily report --
+            if new_day[b]:
+                temp_wallet = wallet
+                if in_position:
+                    if side == 1:
+                        trade_result = (close[b] - price) / price
+                    else:
+                        trade_result = (price - close[b]) / price
+                    temp_wallet += size * trade_result
+                    fee = temp_wallet * taker_fee
+                    temp_wallet -= fee
+                day_wallets[c, day] = temp_wallet
+                day += 1
+
+            # -- Check for closing position --
+            if in_position:
+                close_position = False
+                if side == 1:
+                    if use_long and high[b] >= base:
+                        close_position = envelope == n_env or not (low[b] <= base * (1 - envelopes[envelope]))
+                else:
+                    if use_short and low[b] <= base:
+                        close_position = envelope == n_env or not (high[b] >= base * (1 + envelopes[envelope]))
+                if close_position:
+                    if side == 1:
+                        trade_result = (base - price) / price
+                    else:
+                        trade_result = (price - base) / price
+                    wallet += size * trade_result
+                    close_trade_size = size + (size * trade_result)
+                    fee = close_trade_size * maker_fee
+                    wallet -= fee
+                    trade_pct = (close_trade_size - size - position_fee - fee) / size
+                    total_trades[c] += 1
+                    if trade_pct > 0:
+                        good_trades[c] += 1
+                    sum_trade_pct[c] += trade_pct
+                    in_position = False
+
+            # -- Check for opening position --
+            for i in range(n_env):
+                ma_low = base * (1 - envelopes[i])
+                ma_high = base * (1 + envelopes[i])
+                if use_long and low[b] <= ma_low:
+                    if in_position and (envelope >= i + 1 or side == -1):
+                        continue
+                    new_side = 1
+                    open_price = ma_low
+                elif use_short and high[b] >= ma_high:
+                    if in_position and (envelope >= i + 1 or side == 1):
+                        continue
+                    new_side = -1
+                    open_price = ma_high
+                else:
+                    break
+                fee = wallet * maker_fee * (1 / n_env) * leverage
+                wallet -= fee
+                if reinvest or (wallet <= initial_wallet):
+                    pos_size = wallet * (1 / n_env) * leverage
+                else:
+                    pos_size = initial_wallet * (1 / n_env) * leverage
+                if in_position:
+                    price = (size * price + open_price * pos_size) / (size + pos_size)
+                    size = size + pos_size
+                    position_fee = position_fee + fee
+                else:
+                    in_position = True
+                    side = new_side
+                    size = pos_size
+                    price = open_price
+                    position_fee = fee
+                envelope = i + 1
+
+        final_wallet[c] = wallet
+
+    return final_wallet, total_trades, good_trades, sum_trade_pct
+
+
+def _day_metrics(day_wallets):
+    """sharpe_ratio / max_drawdown of get_metrics() for every row of day_wallets."""
+    n_combos, n_days = day_wallets.shape
+    sharpe_ratio = np.full(n_combos, np.nan)
+    if n_days > 2:
+        daily_return = np.diff(day_wallets, axis=1) / day_wallets[:, :-1]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            sharpe_ratio = (365**0.5) * (daily_return.mean(axis=1) / daily_return.std(axis=1, ddof=1))
+    wallet_ath = np.maximum.accumulate(day_wallets, axis=1)
+    max_drawdown = -((wallet_ath - day_wallets) / wallet_ath).max(axis=1, initial=-np.inf) * 100
+    return sharpe_ratio, max_drawdown
+
+
+def scan_envelope_grid(
+    df,
+    ma_base_windows,
+    envelope_sets,
+    type=["long"],
+    src="close",
+    initial_wallet=1000,
+    leverage=1,
+    reinvest=True,
+    maker_fee=0.0002,
+    taker_fee=0.0007,
+):
+    """
+    Backtest every (ma_base_window, envelopes) combination of Envelope on one pair.
+
+    Args:
+        df: OHLCV DataFrame of the pair (DatetimeIndex)
+        ma_base_windows: list of ma_base_window values
+        envelope_sets: list of envelope lists, each sorted ascending
+            (e.g. [[0.03, 0.05, 0.07], [0.05, 0.1]])
+        type / src / initial_wallet / leverage / reinvest: as Envelope
+        maker_fee / taker_fee: Envelope.run_backtest() fees
+
+    Returns:
+        DataFrame with one row per combination (GRID_COLUMNS), in grid order.
+        Combinations without trades have NaN metrics.
+    """
+    use_long = "long" in type
+    use_short = "short" in type
+    ma_base_windows = list(ma_base_windows)
+    envelope_sets = [list(envelopes) for envelopes in envelope_sets]
+    for envelopes in envelope_sets:
+        if any(low > high for low, high in zip(envelopes, envelopes[1:])):
+            # Envelope.run_backtest() stops at the first untouched level
+            raise ValueError(f"Envelopes must be sorted ascending: {envelopes}")
+
+    if src == "close":
+        source = df["close"]
+    elif src == "ohlc4":
+        source = (df["close"] + df["high"] + df["low"] + df["open"]) / 4
+    else:
+        raise ValueError(f"Unknown src: {src}")
+    ma_bases = np.vstack([
+        ta.trend.sma_indicator(close=source, window=window).shift(1).to_numpy(dtype=np.float64)
+        for window in ma_base_windows
+    ]) if ma_base_windows else np.empty((0, len(df)))
+
+    combos = list(itertools.product(range(len(ma_base_windows)), range(len(envelope_sets))))
+    max_env = max((len(envelopes) for envelopes in envelope_sets), default=0)
+    env_table = np.zeros((len(combos), max_env + 1))
+    env_counts = np.zeros(len(combos), dtype=np.int64)
+    for c, (_, e) in enumerate(combos):
+        env_table[c, :len(envelope_sets[e])] = envelope_sets[e]
+        env_counts[c] = len(envelope_sets[e])
+    combo_ma = np.array([w for w, _ in combos], dtype=np.int64)
+
+    # Same day change test as Envelope.run_backtest() (day of month, previous_day starts at 0)
+    bar_days = df.index.day.to_numpy()
+    new_day = bar_days != np.r_[0, bar_days[:-1]]
+    day_wallets = np.full((len(combos), int(new_day.sum())), np.nan)
+
+    final_wallet, total_trades, good_trades, sum_trade_pct = _envelope_grid_kernel(
+        df["high"].to_numpy(dtype=np.float64), df["low"].to_numpy(dtype=np.float64),
+        df["close"].to_numpy(dtype=np.float64), ma_bases, combo_ma, env_table, env_counts,
+        new_day, use_long, use_short, float(initial_wallet), float(leverage), bool(reinvest),
+        float(maker_fee), float(taker_fee), day_wallets,
+    )
+
+    sharpe_ratio, max_drawdown = _day_metrics(day_wallets)
+    traded = total_trades > 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        win_rate = np.where(traded, good_trades / total_trades, np.nan)
+        avg_profit = np.where(traded, sum_trade_pct / total_trades, np.nan)
+
+    return pd.DataFrame({
+        "ma_base_window": [ma_base_windows[w] for w, _ in combos],
+        "envelopes": [tuple(envelope_sets[e]) for _, e in combos],
+        "wallet": final_wallet,
+        "total_trades": total_trades,
+        "win_rate": win_rate,
+        "avg_profit": avg_profit,
+        "max_drawdown": np.where(traded, max_drawdown, np.nan),
+        "sharpe_ratio": np.where(traded, sharpe_ratio, np.nan),
+    }, columns=GRID_COLUMNS)
@@ -5,6 +5,7 @@ import numpy as np
 import pandas as pd
 from utilities.bt_analysis import get_metrics
 from utilities.custom_indicators import get_n_columns, Trix
+from utilities.panel import DataPanel, date_window, presence_mask
 
 class TrixMulti:
     def __init__(
@@ -14,6 +15,11 @@ class TrixMulti:
         type=["long"],
         params={},
     ):
+        # Aligned panel (ExchangeDataManager.load_panel) accepted as input
+        if isinstance(df_list, DataPanel):
+            if oldest_pair is None:
+                oldest_pair = df_list.oldest_pair()
+            df_list = df_list.to_df_list()
         self.df_list = df_list
         self.oldest_pair = oldest_pair
         self.use_long = True if "long" in type else False
@@ -95,19 +101,17 @@ class TrixMulti:
 
         return self.df_list[self.oldest_pair]
 
-    def run_backtest(self, initial_wallet=1000, leverage=1, start_date=None, end_date=None):
-        if start_date is not None:
-            self.df_list = {
-                k: v[(v.index >= start_date)]
-                for k, v in self.df_list.items()
-            }
-        if end_date is not None:
-            self.df_list = {
-                k: v[(v.index <= end_date)]
-                for k, v in self.df_list.items()
-            }
+    def run_backtest(self, initial_wallet=1000, leverage=1, start_date=None, end_date=None, window=None):
+        """
+        window : (start_idx, end_idx) rows of the oldest pair to simulate
+            (start_date / end_date are turned into one). Indicators keep
+            their values from the whole series, only the loop is restricted.
+        """
         params = self.params
-        df_ini = self.df_list[self.oldest_pair][:]
+        df_ini = self.df_list[self.oldest_pair]
+        if window is None:
+            window = date_window(df_ini.index, start_date, end_date)
+        df_ini = df_ini.iloc[slice(*window)]
         wallet = initial_wallet
         long_exposition = 0
         short_exposition = 0
@@ -118,13 +122,17 @@ class TrixMulti:
         current_day = 0
         previous_day = 0
         current_positions = {}
+        presence, comb_col = presence_mask(self.df_list, df_ini.index)
 
-        for index, ini_row in df_ini.iterrows():
+        for bar_i, (index, ini_row) in enumerate(df_ini.iterrows()):
+            present = presence[bar_i]
             # -- Add daily report --
             current_day = index.day
             if previous_day != current_day:
                 temp_wallet = wallet
                 for comb in current_positions:
+                    if not present[comb_col[comb]]:
+                        continue
                     row = self.df_list[comb].loc[index]
                     position = current_positions[comb]
                     if position["side"] == "LONG":
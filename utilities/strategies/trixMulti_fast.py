@@ -0,0 +1,99 @@
+import sys
+sys.path.append('../..')
+import numpy as np
+from utilities import batch_indicators
+from utilities.panel import build_panel
+from utilities.strategies.engine_base import MultiPairEngine
+from utilities.strategies.trixMulti import TrixMulti
+
+"""
+Array-based TrixMulti engine.
+
+Same inputs, signals, trades and days as TrixMulti, without the
+concatenated/sorted df_full, the groupby("date") dicts, iterrows() and the
+per-position .loc lookups: the loop, panel and recorders come from
+MultiPairEngine (engine_base.py), this class only supplies the signals and
+the fill rules. The Trix / long MA of all combs are computed in one call
+over the aligned panel (utilities/batch_indicators.py) and kept as arrays
+in self.indicators instead of df_list columns.
+
+The order in which combs are opened/closed within a bar follows the
+(unstable) sort of the original df_full, so trades and wallets are
+identical to the reference engine.
+"""
+
+TRIX_FIELDS = ("open", "close")
+
+
+class TrixMultiFast(MultiPairEngine, TrixMulti):
+    price_fields = TRIX_FIELDS
+    fill_field = "close"
+    valuation_field = "open"
+    day_price_field = "open"
+    open_reason = "Market"
+    close_reason = "Market"
+
+    def __init__(self, df_list, oldest_pair, type=["long"], params={}):
+        TrixMulti.__init__(self, df_list, oldest_pair, type=type, params=params)
+
+    def populate_indicators(self):
+        panel = build_panel(self.df_list, fields=("close",))
+        params = [self.params[comb] for comb in panel.pairs]
+        close = panel.field("close")
+        trix, trix_signal, trix_hist = batch_indicators.trix(
+            close,
+            [p["trix_length"] for p in params],
+            [p["trix_signal_length"] for p in params],
+            [p["trix_signal_type"] for p in params],
+            mask=panel.mask,
+        )
+        long_ma = batch_indicators.ema(close, [p["long_ma_length"] for p in params], mask=panel.mask)
+
+        columns = {"trix": trix, "trix_signal": trix_signal, "trix_hist": trix_hist, "long_ma": long_ma}
+        by_name = {name: batch_indicators.split(panel, values) for name, values in columns.items()}
+        self.indicators = {
+            comb: {name: by_name[name][comb] for name in columns} for comb in panel.pairs
+        }
+        return self.df_list[self.oldest_pair]
+
+    def pair_signals(self, comb):
+        ind = self.indicators[comb]
+        trix_hist = ind["trix_hist"]
+        close = self.df_list[comb]["close"].to_numpy()
+        long_ma = ind["long_ma"]
+        signals = {}
+        if self.use_long:
+            signals["open_long"] = (trix_hist > 0) & (close > long_ma)
+            signals["close_long"] = trix_hist < 0
+        if self.use_short:
+            signals["open_short"] = (trix_hist < 0) & (close < long_ma)
+            signals["close_short"] = trix_hist > 0
+        return signals
+
+    def signal_rank(self):
+        # Position of each comb inside its date group once all frames are
+        # concatenated and sorted like TrixMulti.populate_buy_sell() does
+        index = self.panel.index
+        frames = list(self.df_list.values())
+        concatenated_index = frames[0].index.append([df.index for df in frames[1:]])
+        order = concatenated_index.argsort()
+        comb_ids = np.repeat(np.arange(len(frames)), [len(df) for df in frames])[order]
+        rows = index.get_indexer(concatenated_index[order])
+        group_start = np.searchsorted(rows, rows, side="left")
+        comb_rank = np.zeros((len(index), len(frames)), dtype=np.int32)
+        comb_rank[rows, comb_ids] = np.arange(len(rows)) - group_start
+        return comb_rank
+
+    def position_size(self, comb, wallet, leverage):
+        return self.params[comb]["size"] * wallet * leverage
+
+    def run_backtest(self, initial_wallet=1000, leverage=1, start_date=None, end_date=None, window=None,
+                     keep="full"):
+        taker_fee = 0.0005
+        wallet, recorder = self.run_engine(
+            self._loop_index(start_date, end_date, window), initial_wallet, leverage,
+            open_fee_rate=taker_fee, close_fee_rate=taker_fee, valuation_fee_rate=taker_fee,
+        )
+        if len(recorder.trades) == 0:
+            raise ValueError("No trades have been made")
+        return recorder.result(wallet, keep)
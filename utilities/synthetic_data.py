@@ -0,0 +1,162 @@
+"""
+Deterministic synthetic OHLCV data for benchmarks and tests.
+
+Prices follow a geometric random walk whose drift and volatility switch
+between market regimes (bull / bear / range / crash / high_vol) every
+`regime_length` bars; pairs share a common market factor so that they are
+correlated like a crypto universe. Same arguments, same data:
+
+    df = make_ohlcv(50_000, seed=1, regimes=("bull", "crash", "range"))
+    df_list = make_universe(n_pairs=28, bars=50_000, seed=0, stagger=500)
+    write_exchange_csvs(df_list, "/tmp/database")  # files for ExchangeDataManager
+"""
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utilities.data_catalog import pair_to_filename
+
+# regime -> (drift, volatility) of the log return per bar
+REGIMES: Dict[str, Tuple[float, float]] = {
+    "bull": (0.0004, 0.010),
+    "bear": (-0.0004, 0.012),
+    "range": (0.0, 0.006),
+    "crash": (-0.003, 0.030),
+    "high_vol": (0.0, 0.025),
+}
+DEFAULT_REGIMES = ("bull", "range", "bear", "range")
+
+
+def pair_names(n_pairs: int) -> List[str]:
+    """Synthetic ccxt-style symbols: SYN000/USDT:USDT, SYN001/USDT:USDT, ..."""
+    return [f"SYN{i:03d}/USDT:USDT" for i in range(n_pairs)]
+
+
+def regime_schedule(bars: int, regimes: Sequence[str] = DEFAULT_REGIMES,
+                    regime_length: Optional[int] = None) -> np.ndarray:
+    """
+    Regime of each bar: `regimes` in turn, `regime_length` bars each
+    (default: one segment per regime over the whole series).
+    """
+    unknown = set(regimes) - set(REGIMES)
+    if unknown:
+        raise ValueError(f"Unknown regimes: {unknown}")
+    if not regimes:
+        raise ValueError("At least one regime is required")
+    if regime_length is None:
+        regime_length = max(1, -(-bars // len(regimes)))
+    segment = np.arange(bars) // regime_length
+    return np.asarray(regimes, dtype=object)[segment % len(regimes)]
+
+
+def _returns(schedule: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Drift and volatility of each bar of a regime schedule."""
+    drift = np.empty(len(schedule))
+    vol = np.empty(len(schedule))
+    for name, (mu, sigma) in REGIMES.items():
+        bars = schedule == name
+        drift[bars] = mu
+        vol[bars] = sigma
+    return drift, vol
+
+
+def _candles(rng: np.random.Generator, log_returns: np.ndarray, vol: np.ndarray,
+             base_price: float) -> Dict[str, np.ndarray]:
+    """OHLCV columns from the close-to-close log returns."""
+    close = base_price * np.exp(np.cumsum(log_returns))
+    open_ = np.r_[base_price, close[:-1]]
+    wick = np.abs(rng.normal(0, 0.5, (2, len(close)))) * vol
+    high = np.maximum(open_, close) * (1 + wick[0])
+    low = np.minimum(open_, close) * (1 - wick[1])
+    volume = rng.lognormal(3.0, 0.5, len(close)) * (vol / vol.mean())
+    return {"open": open_, "high": high, "low": low, "close": close, "volume": volume}
+
+
+def make_ohlcv(bars: int, seed: int = 0, start: str = "2020-01-01", freq: str = "1h",
+               regimes: Sequence[str] = DEFAULT_REGIMES, regime_length: Optional[int] = None,
+               base_price: float = 100.0) -> pd.DataFrame:
+    """
+    One synthetic OHLCV series.
+
+    Args:
+        bars: Number of bars
+        seed: Random seed (same seed, same series)
+        start: Date of the first bar
+        freq: Bar duration (pandas frequency)
+        regimes: Regimes in turn (keys of REGIMES)
+        regime_length: Bars per regime segment (default: bars / len(regimes))
+        base_price: Open of the first bar
+
+    Returns:
+        DataFrame with open/high/low/close/volume, indexed by bar open time
+    """
+    rng = np.random.default_rng(seed)
+    drift, vol = _returns(regime_schedule(bars, regimes, regime_length))
+    log_returns = drift + vol * rng.standard_normal(bars)
+    index = pd.date_range(start, periods=bars, freq=freq, name="date")
+    return pd.DataFrame(_candles(rng, log_returns, vol, base_price), index=index)
+
+
+def make_universe(n_pairs: int, bars: int, seed: int = 0, start: str = "2020-01-01", freq: str = "1h",
+                  regimes: Sequence[str] = DEFAULT_REGIMES, regime_length: Optional[int] = None,
+                  correlation: float = 0.6, stagger: int = 0,
+                  pairs: Optional[Sequence[str]] = None) -> Dict[str, pd.DataFrame]:
+    """
+    Correlated synthetic universe.
+
+    All pairs go through the same regime schedule; the return of a pair is
+    sqrt(correlation) * market + sqrt(1 - correlation) * its own noise.
+
+    Args:
+        n_pairs: Number of pairs (ignored if `pairs` is given)
+        bars: Bars of the oldest pair
+        seed: Random seed of the whole universe
+        correlation: Share of the return variance coming from the market factor
+        stagger: Pair i is listed i * stagger bars after the first one
+        pairs: Pair names (default pair_names(n_pairs))
+
+    Returns:
+        dict pair -> OHLCV DataFrame (the first pair is the oldest)
+    """
+    if not 0 <= correlation <= 1:
+        raise ValueError("correlation must be between 0 and 1")
+    pairs = list(pairs) if pairs is not None else pair_names(n_pairs)
+    if stagger * (len(pairs) - 1) >= bars:
+        raise ValueError("stagger leaves some pairs without bars")
+    rng = np.random.default_rng(seed)
+    drift, vol = _returns(regime_schedule(bars, regimes, regime_length))
+    market = rng.standard_normal(bars)
+    index = pd.date_range(start, periods=bars, freq=freq, name="date")
+
+    df_list = {}
+    for i, pair in enumerate(pairs):
+        pair_rng = np.random.default_rng([seed, i + 1])
+        shocks = np.sqrt(correlation) * market + np.sqrt(1 - correlation) * pair_rng.standard_normal(bars)
+        first = i * stagger
+        log_returns = (drift + vol * shocks)[first:]
+        base_price = float(10 ** pair_rng.uniform(-1, 4))
+        df_list[pair] = pd.DataFrame(_candles(pair_rng, log_returns, vol[first:], base_price),
+                                     index=index[first:])
+    return df_list
+
+
+def write_exchange_csvs(df_list: Dict[str, pd.DataFrame], path_download: str, exchange: str = "binance",
+                        interval: str = "1h") -> List[str]:
+    """
+    Write a universe in the layout read by ExchangeDataManager(exchange, path_download).
+
+    Returns:
+        Paths of the written files
+    """
+    folder = os.path.join(path_download, exchange, interval)
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for pair, df in df_list.items():
+        out = df[["open", "high", "low", "close", "volume"]].copy()
+        out.insert(0, "date", (df.index - pd.Timestamp(0)) // pd.Timedelta(milliseconds=1))
+        file_name = os.path.join(folder, f"{pair_to_filename(pair)}.csv")
+        out.to_csv(file_name, index=False)
+        paths.append(file_name)
+    return paths
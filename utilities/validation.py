@@ -1,11 +1,219 @@
 """
 Data validation utilities for backtesting framework.
 Ensures data integrity before running backtests.
+
+validate_panel() runs every content check over the whole universe at once
+(the bars x pairs matrices of the aligned panel) and caches its report by
+data fingerprint; validate_multi_pair_data() runs the same checks on the
+rows of all pairs stacked in one array and caches per pair, so repeated
+backtests on unchanged data only pay for hashing it.
 """
+import hashlib
+import warnings
+from collections import OrderedDict
+from dataclasses import dataclass, field
 import pandas as pd
 import numpy as np
 from typing import Dict, List, Optional, Tuple
 
+from utilities.panel import DataPanel
+
+PRICE_COLUMNS = ['open', 'high', 'low', 'close']
+OHLCV_COLUMNS = PRICE_COLUMNS + ['volume']
+# Columns of ValidationReport.counts, in the order of the legacy messages
+CHECKS = ([f"nan_{col}" for col in OHLCV_COLUMNS] + [f"inf_{col}" for col in OHLCV_COLUMNS]
+          + ["gaps", "high_lt_low", "close_outside_range"]
+          + [f"non_positive_{col}" for col in PRICE_COLUMNS] + ["negative_volume"])
+# Reports kept by validate_panel() / pair results kept by validate_multi_pair_data()
+CACHE_SIZE = 256
+
+Range = Tuple[pd.Timestamp, pd.Timestamp]
+
+
+def _digest(*arrays, extra: str = "") -> str:
+    # Content fingerprint, not a security hash: sha1 is the fastest of hashlib here
+    h = hashlib.sha1(usedforsecurity=False)
+    h.update(extra.encode())
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        h.update(str((array.dtype, array.shape)).encode())
+        h.update(array.data)
+    return h.hexdigest()
+
+
+def panel_fingerprint(panel: DataPanel) -> str:
+    """Content hash of a panel (index, pairs, fields, values, mask)."""
+    return _digest(panel.index.asi8, panel.values, panel.mask,
+                   extra=repr((list(panel.pairs), list(panel.fields))))
+
+
+def frame_fingerprint(df: pd.DataFrame) -> str:
+    """Content hash of the index and OHLCV columns of one pair's DataFrame."""
+    return _digest(df.index.asi8, *(df[col].to_numpy() for col in OHLCV_COLUMNS))
+
+
+def series_fingerprint(series: pd.Series) -> str:
+    """Content hash of the index and float64 values of a Series."""
+    return _digest(series.index.asi8, series.to_numpy(dtype=np.float64))
+
+
+@dataclass
+class ValidationReport:
+    """
+    Result of DataValidator.validate_panel().
+
+    counts: DataFrame pairs x CHECKS, number of offending bars per check
+            ("gaps": number of gaps)
+    ranges: pair -> check -> [(first, last)] runs of consecutive offending
+            bars of the pair (gaps: (bar before, bar after))
+    """
+    counts: pd.DataFrame
+    ranges: Dict[str, Dict[str, List[Range]]] = field(default_factory=dict)
+    fingerprint: Optional[str] = None
+
+    @property
+    def valid(self) -> bool:
+        return not self.counts.to_numpy().any()
+
+    def invalid_pairs(self) -> List[str]:
+        return self.counts.index[self.counts.to_numpy().any(axis=1)].tolist()
+
+    def errors(self) -> Dict[str, List[str]]:
+        """Same messages as validate_ohlcv_dataframe(), for the invalid pairs."""
+        return {pair: _messages(pair, self.counts.loc[pair]) for pair in self.invalid_pairs()}
+
+
+def _messages(pair: str, counts: pd.Series) -> List[str]:
+    errors = []
+    nan_counts = {col: int(counts[f"nan_{col}"]) for col in OHLCV_COLUMNS if counts[f"nan_{col}"]}
+    if nan_counts:
+        errors.append(f"{pair}: NaN values found in columns: {nan_counts}")
+    inf_cols = [col for col in OHLCV_COLUMNS if counts[f"inf_{col}"]]
+    if inf_cols:
+        errors.append(f"{pair}: Infinite values found in columns: {inf_cols}")
+    if counts["gaps"]:
+        errors.append(f"{pair}: {counts['gaps']} gaps detected in time series")
+    if counts["high_lt_low"]:
+        errors.append(f"{pair}: {counts['high_lt_low']} rows where high < low")
+    if counts["close_outside_range"]:
+        errors.append(f"{pair}: {counts['close_outside_range']} rows where close outside high/low range")
+    for col in PRICE_COLUMNS:
+        if counts[f"non_positive_{col}"]:
+            errors.append(f"{pair}: {counts[f'non_positive_{col}']} non-positive values in {col}")
+    if counts["negative_volume"]:
+        errors.append(f"{pair}: {counts['negative_volume']} negative volume values")
+    return errors
+
+
+def _runs(bad: np.ndarray) -> List[Tuple[int, int]]:
+    """(first, last) positions of the runs of True in a 1-D bool array."""
+    edges = np.diff(np.r_[0, bad.view(np.int8), 0])
+    return list(zip(np.flatnonzero(edges == 1).tolist(), (np.flatnonzero(edges == -1) - 1).tolist()))
+
+
+def _gap_flags(times: np.ndarray) -> np.ndarray:
+    """
+    Gap after each bar (len(times) - 1 flags): step > 1.5 x the most common
+    step, like the pandas diff().mode() check.
+    """
+    if len(times) < 2:
+        return np.zeros(0, dtype=bool)
+    steps = np.diff(times)
+    values, counts = np.unique(steps, return_counts=True)
+    expected = values[np.argmax(counts)]
+    if expected == 0:
+        return np.zeros(len(steps), dtype=bool)
+    return steps > expected * 1.5
+
+
+def _flags(o, h, l, c, v, present=None) -> Dict[str, np.ndarray]:
+    """
+    Offending-bar mask of every check (arrays of any shape). Comparisons with
+    NaN are False, like in pandas; `present` restricts the NaN checks to real
+    bars of a panel.
+    """
+    flags = {}
+    columns = (o, h, l, c, v)
+    for col, values in zip(OHLCV_COLUMNS, columns):
+        nan = np.isnan(values)
+        flags[f"nan_{col}"] = nan & present if present is not None else nan
+    for col, values in zip(OHLCV_COLUMNS, columns):
+        flags[f"inf_{col}"] = np.isinf(values)
+    flags["high_lt_low"] = h < l
+    flags["close_outside_range"] = (c > h) | (c < l)
+    for col, prices in zip(PRICE_COLUMNS, columns):
+        flags[f"non_positive_{col}"] = prices <= 0
+    flags["negative_volume"] = v < 0
+    return flags
+
+
+def _report(pairs: List[str], counts: np.ndarray, flags: Dict[str, np.ndarray],
+            pair_rows) -> ValidationReport:
+    """
+    Gap counts and offending ranges of each pair, from the other checks' counts.
+
+    Args:
+        counts: (pairs x CHECKS) counts, "gaps" still to fill
+        pair_rows: k -> (DatetimeIndex of the pair's bars, function flag -> its values on them)
+    """
+    gaps_col = CHECKS.index("gaps")
+    ranges = {}
+    for k, pair in enumerate(pairs):
+        index, on_pair = pair_rows(k)
+        gaps = _gap_flags(index.asi8)
+        counts[k, gaps_col] = int(gaps.sum())
+        pair_ranges = {}
+        if gaps.any():
+            after = np.flatnonzero(gaps)
+            pair_ranges["gaps"] = list(zip(index[after], index[after + 1]))
+        for check, bad in flags.items():
+            if counts[k, CHECKS.index(check)]:
+                pair_ranges[check] = [(index[a], index[b]) for a, b in _runs(on_pair(bad))]
+        if pair_ranges:
+            ranges[pair] = pair_ranges
+    return ValidationReport(pd.DataFrame(counts, index=list(pairs), columns=CHECKS), ranges)
+
+
+def _check_rows(pairs: List[str], index: pd.DatetimeIndex, values: np.ndarray,
+                bounds: np.ndarray) -> ValidationReport:
+    """
+    All checks on the rows of every pair stacked one after the other.
+
+    Args:
+        pairs: Pair of each segment
+        index: Date of each stacked row
+        values: (rows x OHLCV) float64
+        bounds: Segment starts, plus the total row count
+    """
+    flags = _flags(*values.T)
+    starts, ends = bounds[:-1], bounds[1:]
+    counts = np.zeros((len(pairs), len(CHECKS)), dtype=np.int64)
+    non_empty = starts < ends
+    if non_empty.any():
+        for check, bad in flags.items():
+            counts[non_empty, CHECKS.index(check)] = np.add.reduceat(bad, starts[non_empty], dtype=np.int64)
+
+    def pair_rows(k):
+        segment = slice(starts[k], ends[k])
+        return index[segment], lambda bad: bad[segment]
+
+    return _report(pairs, counts, flags, pair_rows)
+
+
+def _check_panel(panel: DataPanel) -> ValidationReport:
+    """All checks on the (bars x pairs) field matrices of an aligned panel."""
+    present = panel.mask
+    flags = _flags(*(panel.field(col) for col in OHLCV_COLUMNS), present=present)
+    counts = np.zeros((len(panel.pairs), len(CHECKS)), dtype=np.int64)
+    for check, bad in flags.items():
+        counts[:, CHECKS.index(check)] = bad.sum(axis=0)
+
+    def pair_rows(k):
+        rows = np.flatnonzero(present[:, k])
+        return panel.index[rows], lambda bad: bad[rows, k]
+
+    return _report(list(panel.pairs), counts, flags, pair_rows)
+
 
 class DataValidator:
     """Validates DataFrame structure and content for backtesting."""
@@ -88,25 +296,163 @@ class DataValidator:
 
         return len(errors) == 0, errors
 
+    _panel_cache: "OrderedDict[str, ValidationReport]" = OrderedDict()
+    _pair_cache: "OrderedDict[str, pd.Series]" = OrderedDict()
+
+    @staticmethod
+    def _remember(cache: OrderedDict, key, value):
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > CACHE_SIZE:
+            cache.popitem(last=False)
+
+    @staticmethod
+    def clear_cache():
+        DataValidator._panel_cache.clear()
+        DataValidator._pair_cache.clear()
+
+    @staticmethod
+    def validate_panel(panel: DataPanel, use_cache: bool = True) -> ValidationReport:
+        """
+        Content checks of validate_ohlcv_dataframe() on all pairs at once.
+
+        Args:
+            panel: Aligned panel with the OHLCV fields (utilities/panel.py)
+            use_cache: Reuse the report of a panel with the same content
+
+        Returns:
+            ValidationReport (per-pair counts and offending date ranges)
+        """
+        missing = set(OHLCV_COLUMNS) - set(panel.fields)
+        if missing:
+            raise ValueError(f"Panel is missing fields: {missing}")
+        fingerprint = panel_fingerprint(panel) if use_cache else None
+        if use_cache and fingerprint in DataValidator._panel_cache:
+            DataValidator._panel_cache.move_to_end(fingerprint)
+            return DataValidator._panel_cache[fingerprint]
+
+        report = _check_panel(panel)
+        report.fingerprint = fingerprint
+        if use_cache:
+            DataValidator._remember(DataValidator._panel_cache, fingerprint, report)
+        return report
+
     @staticmethod
-    def validate_multi_pair_data(df_list: Dict[str, pd.DataFrame]) -> Tuple[bool, Dict[str, List[str]]]:
+    def validate_multi_pair_data(df_list: Dict[str, pd.DataFrame],
+                                 use_cache: bool = True) -> Tuple[bool, Dict[str, List[str]]]:
         """
         Validate multiple trading pairs.
 
+        Well-formed pairs (OHLCV columns, sorted unique DatetimeIndex) are
+        checked together in one vectorised pass (same checks as
+        validate_panel(), on their stacked rows); the others get the per-pair
+        validate_ohlcv_dataframe(). With use_cache, a pair whose
+        data did not change since its last validation is not checked again.
+
         Args:
             df_list: Dictionary mapping pair names to DataFrames
+            use_cache: Reuse the result of unchanged pairs
 
         Returns:
             Tuple of (all_valid, dict_of_errors_per_pair)
         """
+        results = {}
+        to_check = {}
+        fingerprints = {}
+        for pair, df in df_list.items():
+            well_formed = (
+                not df.empty
+                and set(OHLCV_COLUMNS) <= set(df.columns)
+                and isinstance(df.index, pd.DatetimeIndex)
+                and df.index.is_monotonic_increasing
+                and df.index.is_unique
+            )
+            if not well_formed:
+                results[pair] = DataValidator.validate_ohlcv_dataframe(df, pair)[1]
+                continue
+            if use_cache:
+                fingerprints[pair] = frame_fingerprint(df)
+                cached = DataValidator._pair_cache.get(fingerprints[pair])
+                if cached is not None:
+                    results[pair] = _messages(pair, cached)
+                    continue
+            to_check[pair] = df
+
+        if to_check:
+            frames = list(to_check.values())
+            report = _check_rows(
+                list(to_check),
+                frames[0].index.append([df.index for df in frames[1:]]),
+                np.concatenate([df[OHLCV_COLUMNS].to_numpy(dtype=np.float64) for df in frames]),
+                np.r_[0, np.cumsum([len(df) for df in frames])],
+            )
+            for pair in to_check:
+                counts = report.counts.loc[pair]
+                results[pair] = _messages(pair, counts)
+                if use_cache:
+                    DataValidator._remember(DataValidator._pair_cache, fingerprints[pair], counts)
+
+        all_errors = {pair: results[pair] for pair in df_list if results[pair]}
+        return len(all_errors) == 0, all_errors
+
+    @staticmethod
+    def validate_catalog_gaps(
+        catalog,
+        pairs: List[str],
+        timeframe: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        max_missing_bars: int = 0,
+        on_gap: str = "warn"
+    ) -> Tuple[bool, Dict[str, List[str]]]:
+        """
+        Check pairs for holes using the data catalogue (no data is read).
+
+        Args:
+            catalog: DataCatalog of the exchange (see ExchangeDataManager.catalog)
+            pairs: Pairs used by the backtest
+            timeframe: Timeframe used by the backtest
+            start_date: Only count gaps overlapping the backtest period
+            end_date: Only count gaps overlapping the backtest period
+            max_missing_bars: Tolerated number of missing bars per pair
+            on_gap: "warn" (warnings.warn), "raise" (ValueError) or "ignore"
+
+        Returns:
+            Tuple of (all_valid, dict_of_errors_per_pair)
+        """
+        if on_gap not in ("warn", "raise", "ignore"):
+            raise ValueError(f"Invalid on_gap: {on_gap}. Must be 'warn', 'raise' or 'ignore'")
+
+        start_ms = int(pd.Timestamp(start_date).value // 10**6) if start_date is not None else None
+        end_ms = int(pd.Timestamp(end_date).value // 10**6) if end_date is not None else None
+        interval_ms = catalog.intervals_ms.get(timeframe)
+
         all_errors = {}
-        all_valid = True
+        for pair in pairs:
+            entry = catalog.get(pair, timeframe)
+            if entry is None:
+                all_errors[pair] = [f"{pair}: not found in catalog for {timeframe}"]
+                continue
 
-        for pair, df in df_list.items():
-            is_valid, errors = DataValidator.validate_ohlcv_dataframe(df, pair)
-            if not is_valid:
-                all_errors[pair] = errors
-                all_valid = False
+            missing = 0
+            n_gaps = 0
+            for gap_start, gap_end in entry["gaps"]:
+                lo = gap_start if start_ms is None else max(gap_start, start_ms)
+                hi = gap_end if end_ms is None else min(gap_end, end_ms)
+                if lo > hi:
+                    continue
+                n_gaps += 1
+                missing += (hi - lo) // interval_ms + 1 if interval_ms else 0
+
+            if n_gaps > 0 and missing > max_missing_bars:
+                all_errors[pair] = [f"{pair}: {n_gaps} gaps detected in time series ({missing} missing bars)"]
+
+        all_valid = len(all_errors) == 0
+        if not all_valid and on_gap != "ignore":
+            message = "; ".join(err for errors in all_errors.values() for err in errors)
+            if on_gap == "raise":
+                raise ValueError(f"Gappy data refused: {message}")
+            warnings.warn(f"Gappy data: {message}", stacklevel=2)
 
         return all_valid, all_errors
 